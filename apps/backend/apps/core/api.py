@@ -0,0 +1,224 @@
+import base64
+import hashlib
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max, Q
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+
+class ApiField:
+    """
+    One output field of a JSON list endpoint.
+
+    The field reads one or more values() lookups; convert() turns them into the
+    JSON value (called with one argument per lookup). Without convert() the
+    value of the single lookup is returned as is.
+    """
+
+    def __init__(self, *lookups, convert=None):
+        self.lookups = lookups
+        self.convert = convert
+
+    def value(self, row):
+        values = [row[lookup] for lookup in self.lookups]
+        if self.convert is None:
+            return values[0]
+        return self.convert(*values)
+
+
+def as_float(value):
+    """Decimal -> float, keeping None."""
+    return float(value) if value is not None else None
+
+
+def as_isoformat(value):
+    """Date/datetime -> ISO 8601 string, keeping None."""
+    return value.isoformat() if value is not None else None
+
+
+def choice_label(choices):
+    """Build a converter returning the display label of a choice value."""
+    labels = dict(choices)
+    return lambda value: labels.get(value, value)
+
+
+class JsonListAPI:
+    """
+    Shared GET handling for the JSON list endpoints.
+
+    Rows are read with values() and shaped by a dict of ApiFields, so no model
+    instances are built. Supports:
+
+    - ``?fields=id,name`` to return only some fields
+    - ``?limit=100`` / ``?cursor=...`` keyset pagination on a stable ordering
+      that ends with the primary key. Without them the whole list is returned,
+      as before, so existing clients keep working.
+    - Strong ETags from the row count and latest updated_at of the underlying
+      tables; a matching If-None-Match is answered with 304 Not Modified.
+    """
+
+    MAX_LIMIT = 1000
+
+    def __init__(self, queryset, fields, ordering=('pk',), fingerprint_querysets=None):
+        """
+        Args:
+            queryset: Rows to list (may carry annotations used by fields)
+            fields: Dict mapping output field name to ApiField
+            ordering: Order lookups, '-' prefix for descending. Must end with 'pk'
+                      so the ordering is total and cursors are stable.
+            fingerprint_querysets: Querysets whose count and max(updated_at) make up
+                                   the ETag. Defaults to the listed queryset; add the
+                                   tables of joined or annotated values.
+        """
+        if ordering[-1].lstrip('-') != 'pk':
+            raise ValueError('Keyset ordering must end with pk')
+
+        self.queryset = queryset
+        self.fields = fields
+        self.ordering = [(lookup.lstrip('-'), lookup.startswith('-')) for lookup in ordering]
+        self.fingerprint_querysets = fingerprint_querysets or [queryset]
+
+    def get(self, request) -> JsonResponse:
+        """
+        Build the list response for a GET request.
+
+        Args:
+            request: HttpRequest
+
+        Returns:
+            JsonResponse {items[, next_cursor]}, 304 response or 400 error response
+        """
+        etag = self.etag(request)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
+
+        rows = self.queryset.order_by(
+            *[f'-{lookup}' if descending else lookup for lookup, descending in self.ordering]
+        )
+        try:
+            fields = self.select_fields(request.GET.get('fields'))
+            limit = self.parse_limit(request.GET.get('limit'))
+            cursor = self.decode_cursor(request.GET.get('cursor'))
+            if cursor is not None:
+                rows = self.filter_after(rows, cursor)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        if cursor is not None and limit is None:
+            limit = self.MAX_LIMIT
+
+        lookups = {lookup for field in fields.values() for lookup in field.lookups}
+        lookups.update(lookup for lookup, _ in self.ordering)
+        rows = rows.values(*lookups)
+
+        payload = {}
+        if limit is not None:
+            rows = list(rows[:limit + 1])
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = self.encode_cursor(rows[-1])
+            payload['next_cursor'] = next_cursor
+
+        payload['items'] = [
+            {name: field.value(row) for name, field in fields.items()}
+            for row in rows
+        ]
+
+        response = JsonResponse(payload)
+        response['ETag'] = etag
+        return response
+
+    def etag(self, request) -> str:
+        """
+        Fingerprint the listed data and the request options.
+
+        Costs one aggregate query per fingerprint queryset.
+
+        Returns:
+            Quoted strong ETag
+        """
+        fingerprint = hashlib.sha256(request.GET.urlencode().encode())
+        for queryset in self.fingerprint_querysets:
+            state = queryset.order_by().aggregate(count=Count('pk'), last_updated=Max('updated_at'))
+            fingerprint.update(f"|{state['count']}|{state['last_updated']}".encode())
+        return quote_etag(fingerprint.hexdigest()[:32])
+
+    def select_fields(self, fields_param) -> dict:
+        """Resolve ?fields= to ApiFields, all fields when absent."""
+        if not fields_param:
+            return self.fields
+
+        names = [name.strip() for name in fields_param.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError(f'Unknown fields: {", ".join(unknown)}. Available: {", ".join(self.fields)}')
+        return {name: self.fields[name] for name in names}
+
+    def parse_limit(self, limit_param):
+        """Parse ?limit=, capped at MAX_LIMIT. None means no pagination."""
+        if limit_param is None:
+            return None
+        try:
+            limit = int(limit_param)
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        return min(limit, self.MAX_LIMIT)
+
+    def encode_cursor(self, row) -> str:
+        """Encode the ordering values of the last returned row."""
+        values = [row[lookup] for lookup, _ in self.ordering]
+        return base64.urlsafe_b64encode(json.dumps(values, cls=DjangoJSONEncoder).encode()).decode()
+
+    def decode_cursor(self, cursor_param):
+        """Decode a cursor from encode_cursor(). None when absent."""
+        if not cursor_param:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor_param.encode()))
+        except (ValueError, TypeError):
+            raise ValueError('Invalid cursor')
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise ValueError('Invalid cursor')
+        # encode_cursor() only writes scalars
+        if any(isinstance(value, (list, dict)) for value in values):
+            raise ValueError('Invalid cursor')
+        return values
+
+    def filter_after(self, rows, cursor):
+        """
+        Narrow rows to those after the cursor.
+
+        A cursor holds client-supplied values, so values the ordering fields
+        cannot take (e.g. text for a primary key) are rejected here.
+
+        Raises:
+            ValueError: If a cursor value has the wrong type for its field
+        """
+        try:
+            return rows.filter(self.after(cursor))
+        except (ValidationError, TypeError, ValueError):
+            raise ValueError('Invalid cursor')
+
+    def after(self, cursor) -> Q:
+        """
+        Filter for rows after the cursor in the keyset ordering.
+
+        For ordering (a, b, pk) this is a > x OR (a = x AND b > y) OR
+        (a = x AND b = y AND pk > z), with < for descending lookups.
+        """
+        condition = Q()
+        equal_prefix = {}
+        for (lookup, descending), value in zip(self.ordering, cursor):
+            operator = 'lt' if descending else 'gt'
+            condition |= Q(**equal_prefix, **{f'{lookup}__{operator}': value})
+            equal_prefix[lookup] = value
+        return condition
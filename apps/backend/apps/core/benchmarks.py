@@ -0,0 +1,280 @@
+import json
+import statistics
+import time
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from typing import Callable
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from apps.costs.calculators import BulkCostEngine, SKUCostAggregator
+from apps.costs.metrics import percentile
+from apps.costs.services import CostService
+from apps.inventory.models import Ingredient, PurchaseOrder, PurchaseOrderLine, Supplier
+from apps.inventory.services import InventoryService
+from apps.products.models import Product
+
+BENCHMARK_USERNAME = 'benchmark'
+
+
+class BenchmarkContext:
+    """
+    Fixtures shared by the benchmarks of one suite run.
+
+    Attributes:
+        client: Test client logged in as a superuser
+        product: An active product with an active BOM, costed by the single-SKU benchmark
+        ingredients: The ingredients used by the most BOM lines, for the receipt benchmarks
+    """
+
+    def __init__(self, receipt_lines=10):
+        user = get_user_model().objects.create_superuser(username=BENCHMARK_USERNAME, password='benchmark')
+        self.client = Client()
+        self.client.force_login(user)
+
+        self.product = Product.objects.filter(is_active=True, active_bom__isnull=False).order_by('pk').first()
+        self.ingredients = list(
+            Ingredient.objects.annotate(usage=Count('bomlineitem')).order_by('-usage', 'pk')[:receipt_lines]
+        )
+        self.supplier = Supplier.objects.order_by('pk').first() or Supplier.objects.create(name='Benchmark')
+
+    def create_purchase_order(self, ingredients=None) -> PurchaseOrder:
+        """Create a confirmed purchase order with one line per ingredient."""
+        purchase_order = PurchaseOrder.objects.create(
+            po_number=f'BENCH-{time.time_ns()}',
+            supplier=self.supplier,
+            order_date=date.today(),
+            status='confirmed',
+        )
+        PurchaseOrderLine.objects.bulk_create([
+            PurchaseOrderLine(
+                purchase_order=purchase_order,
+                ingredient=ingredient,
+                quantity=Decimal('10'),
+                unit_price=ingredient.current_cost_per_unit * Decimal('1.05'),
+            )
+            for ingredient in (ingredients if ingredients is not None else self.ingredients)
+        ])
+        return purchase_order
+
+    def get(self, url, params=None):
+        """GET a URL, failing on non-2xx responses; streamed bodies are consumed."""
+        response = self.client.get(url, params or {})
+        if response.status_code >= 300:
+            raise AssertionError(f'GET {url} returned {response.status_code}')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def post_json(self, url, payload):
+        """POST a JSON body, failing on non-2xx responses."""
+        response = self.client.post(url, json.dumps(payload), content_type='application/json')
+        if response.status_code >= 300:
+            raise AssertionError(f'POST {url} returned {response.status_code}')
+        return response
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    """
+    One measured operation.
+
+    Attributes:
+        name: Name used in reports and --only
+        run: Callable(context, prepared) performing the measured work
+        setup: Optional Callable(context) whose result is passed to run as
+               prepared; not measured
+        group: Report group
+    """
+    name: str
+    run: Callable
+    setup: Callable = None
+    group: str = 'api'
+
+
+def _api(name, url_name, params=None, **url_kwargs):
+    """Benchmark GETting a JSON endpoint; url_kwargs may be callables of the context."""
+    def run(context, prepared):
+        kwargs = {key: value(context) if callable(value) else value for key, value in url_kwargs.items()}
+        context.get(reverse(url_name, kwargs=kwargs), params)
+    return Benchmark(name=name, run=run)
+
+
+BENCHMARKS = [
+    Benchmark(
+        name='single_sku_cost',
+        group='costing',
+        run=lambda context, prepared: SKUCostAggregator().calculate_sku_cost(context.product, force=True),
+    ),
+    Benchmark(
+        name='recalculate_all',
+        group='costing',
+        run=lambda context, prepared: CostService.recalculate_all_costs(),
+    ),
+    Benchmark(
+        name='recalculate_all_forced',
+        group='costing',
+        run=lambda context, prepared: BulkCostEngine(SKUCostAggregator()).run(force=True),
+    ),
+    Benchmark(
+        name='po_line_receipt',
+        group='signals',
+        setup=lambda context: context.create_purchase_order(context.ingredients[:1]).lines.get(),
+        run=lambda context, line: InventoryService.receive_po_line(line, line.quantity),
+    ),
+    Benchmark(
+        name='po_receipt_fan_out',
+        group='signals',
+        setup=lambda context: context.create_purchase_order(),
+        run=lambda context, purchase_order: InventoryService.receive_purchase_order(
+            purchase_order, {line.pk: line.quantity for line in purchase_order.lines.all()}
+        ),
+    ),
+    Benchmark(
+        name='dashboard',
+        group='pages',
+        run=lambda context, prepared: context.get(reverse('dashboard:home')),
+    ),
+    Benchmark(
+        name='csv_export',
+        group='pages',
+        run=lambda context, prepared: context.get(reverse('costs:export_csv')),
+    ),
+    _api('products_api', 'products:product_list_api'),
+    _api('products_api_page', 'products:product_list_api', {'limit': 100}),
+    _api('product_detail_api', 'products:product_detail_api', pk=lambda context: context.product.pk),
+    _api('ingredients_api', 'inventory:ingredient_list_api'),
+    _api('ingredient_detail_api', 'inventory:ingredient_detail_api', pk=lambda context: context.ingredients[0].pk),
+    _api('low_stock_api', 'inventory:ingredient_low_stock_api'),
+    _api('employees_api', 'labor:employee_list_api'),
+    _api('overhead_costs_api', 'overhead:cost_list_api'),
+    _api('costs_api', 'costs:cost_list_api'),
+    _api('recent_costs_api', 'costs:recent_costs_api'),
+    _api('cost_trend_api', 'costs:cost_trend_api', product_id=lambda context: context.product.pk),
+    _api('cost_trends_api', 'costs:cost_trends_api'),
+    _api('point_in_time_costs_api', 'costs:point_in_time_costs_api', {'months': 3}),
+    _api('cost_run_metrics_api', 'costs:cost_run_metrics_api'),
+    _api('delta_sync_api', 'sync:delta_sync'),
+    Benchmark(
+        name='price_shock_api',
+        run=lambda context, prepared: context.post_json(reverse('costs:price_shock_simulation'), {
+            'overrides': [
+                {'ingredient_id': ingredient.pk, 'change_pct': 10} for ingredient in context.ingredients[:3]
+            ],
+        }),
+    ),
+]
+
+BENCHMARKS_BY_NAME = {benchmark.name: benchmark for benchmark in BENCHMARKS}
+
+
+class BenchmarkRunner:
+    """
+    Runs benchmarks against the configured database and reports timings.
+
+    The whole suite runs inside one transaction that is rolled back, and each
+    iteration inside a savepoint that is rolled back too, so every iteration
+    sees the same data and the database is left untouched. Point DATABASE_URL
+    at SQLite or PostgreSQL to compare backends on the same dataset.
+    """
+
+    def __init__(self, repeat=5, warmup=1, cold_cache=False):
+        """
+        Args:
+            repeat: Measured iterations per benchmark
+            warmup: Unmeasured iterations run first
+            cold_cache: Clear the cache before every iteration
+        """
+        self.repeat = repeat
+        self.warmup = warmup
+        self.cold_cache = cold_cache
+
+    def run(self, names=None) -> dict:
+        """
+        Run benchmarks.
+
+        Args:
+            names: Optional benchmark names, defaults to every benchmark
+
+        Returns:
+            dict: {vendor, repeat, cold_cache, results}. Each result is {name, group,
+            median_ms, min_ms, p95_ms, queries} or {name, group, error}.
+
+        Raises:
+            ValueError: If a name is unknown or the database has no products
+        """
+        if names:
+            unknown = [name for name in names if name not in BENCHMARKS_BY_NAME]
+            if unknown:
+                raise ValueError(f'Unknown benchmarks: {", ".join(unknown)}. Available: {", ".join(BENCHMARKS_BY_NAME)}')
+            benchmarks = [BENCHMARKS_BY_NAME[name] for name in names]
+        else:
+            benchmarks = BENCHMARKS
+
+        if not Product.objects.filter(is_active=True, active_bom__isnull=False).exists():
+            raise ValueError('No products with an active BOM; run generate_dataset first')
+
+        results = []
+        with transaction.atomic():
+            context = BenchmarkContext()
+            for benchmark in benchmarks:
+                results.append(self.measure(benchmark, context))
+            transaction.set_rollback(True)
+
+        return {
+            'vendor': connection.vendor,
+            'repeat': self.repeat,
+            'cold_cache': self.cold_cache,
+            'results': results,
+        }
+
+    def measure(self, benchmark, context) -> dict:
+        """Run one benchmark warmup + repeat times and summarize the measured runs."""
+        durations = []
+        queries = []
+        for iteration in range(self.warmup + self.repeat):
+            try:
+                duration, query_count = self._iteration(benchmark, context)
+            except Exception as e:
+                return {'name': benchmark.name, 'group': benchmark.group, 'error': f'{type(e).__name__}: {e}'}
+            if iteration >= self.warmup:
+                durations.append(duration)
+                queries.append(query_count)
+
+        return {
+            'name': benchmark.name,
+            'group': benchmark.group,
+            'median_ms': round(statistics.median(durations), 2),
+            'min_ms': round(min(durations), 2),
+            'p95_ms': round(percentile(durations, 95), 2),
+            'queries': max(queries),
+        }
+
+    def _iteration(self, benchmark, context):
+        """Run one iteration in a rolled-back savepoint; returns (milliseconds, queries)."""
+        query_count = 0
+
+        def count_query(execute, sql, params, many, execute_context):
+            nonlocal query_count
+            query_count += 1
+            return execute(sql, params, many, execute_context)
+
+        with transaction.atomic():
+            prepared = benchmark.setup(context) if benchmark.setup else None
+            if self.cold_cache:
+                cache.clear()
+
+            with connection.execute_wrapper(count_query):
+                started = time.perf_counter()
+                benchmark.run(context, prepared)
+                duration = (time.perf_counter() - started) * 1000
+
+            transaction.set_rollback(True)
+
+        return duration, query_count
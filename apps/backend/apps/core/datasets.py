@@ -0,0 +1,401 @@
+import random
+from collections import defaultdict
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.costs.calculators import BulkCostEngine, IngredientCostMatrix, SKUCostAggregator
+from apps.costs.calculators.point_in_time import last_months, month_end
+from apps.costs.dependencies import CostDependencyService
+from apps.dashboard.services import DashboardService
+from apps.inventory.models import (
+    Ingredient, IngredientPriceHistory, PurchaseOrder, PurchaseOrderLine, StockMovement, Supplier,
+)
+from apps.inventory.services import QUANTITY_PRECISION, VALUE_PRECISION
+from apps.labor.models import Employee, EmployeeWage, ProductionPhase, ProductionTime
+from apps.labor.services import LaborService
+from apps.overhead.models import MonthlyProductionVolume, OverheadCategory, OverheadCost
+from apps.overhead.services import OverheadService
+from apps.products.models import BillOfMaterials, BOMLineItem, Product
+
+BATCH_SIZE = 1000
+LINES_PER_PURCHASE_ORDER = 10
+
+PRODUCT_NAMES = ['Banh mi', 'Banh bong lan', 'Banh quy', 'Banh su kem', 'Croissant', 'Banh flan', 'Banh bao']
+FLAVORS = ['bo', 'dua', 'socola', 'tra xanh', 'dau', 'pho mai', 'ca phe', 'la dua']
+PRODUCT_CATEGORIES = [choice for choice, _ in Product.CATEGORY_CHOICES]
+INGREDIENT_CATEGORIES = [choice for choice, _ in Ingredient.CATEGORY_CHOICES]
+EMPLOYEE_ROLES = ['baker', 'baker', 'assistant', 'decorator', 'packer', 'supervisor']
+PHASES = [
+    ('mixing', 'baker'),
+    ('shaping', 'assistant'),
+    ('baking', 'baker'),
+    ('decorating', 'decorator'),
+    ('packaging', 'packer'),
+]
+OVERHEAD_CATEGORIES = [
+    ('Rent', 'per_unit_produced', None, Decimal('30000000')),
+    ('Electricity', 'per_unit_produced', None, Decimal('12000000')),
+    ('Gas', 'per_unit_produced', None, Decimal('6000000')),
+    ('Maintenance', 'percentage_of_prime_cost', Decimal('3'), None),
+    ('Administration', 'percentage_of_prime_cost', Decimal('5'), None),
+]
+
+
+class SyntheticDataset:
+    """
+    Deterministic, bulk-created bakery dataset for load and benchmark runs.
+
+    Every row is written with bulk_create, so no signals fire; the derived data
+    they would maintain (stock ledger, cost dependency index, caches) is built
+    once at the end instead. The same seed and sizes always produce the same
+    data. Rows are tagged with a prefix (SKU codes, employee ids, PO numbers,
+    names) so a dataset can live next to seed_data records, but only one
+    dataset per prefix.
+
+    Covers the last `months` months: a monthly price history per ingredient,
+    wages with a mid-range raise, overhead costs and production volumes per
+    month, and purchase orders spread over the range. Purchase orders of the
+    current month stay confirmed; older ones are received into the stock ledger.
+    """
+
+    def __init__(self, products=100, ingredients=50, bom_lines_per_product=6, employees=20, months=12,
+                 po_lines=1000, seed=0, prefix='SYN'):
+        """
+        Args:
+            products: Number of products, each with an active BOM and production time
+            ingredients: Number of ingredients
+            bom_lines_per_product: BOM lines per product (capped at the ingredient count)
+            employees: Number of employees, each with one or two wage records
+            months: Months of history, ending with the current month
+            po_lines: Number of purchase order lines, LINES_PER_PURCHASE_ORDER per order
+            seed: Random seed
+            prefix: Tag of the generated rows
+        """
+        if min(products, ingredients, bom_lines_per_product, employees, months) < 1 or po_lines < 0:
+            raise ValueError('Dataset sizes must be positive')
+
+        self.sizes = {
+            'products': products,
+            'ingredients': ingredients,
+            'bom_lines_per_product': min(bom_lines_per_product, ingredients),
+            'employees': employees,
+            'months': months,
+            'po_lines': po_lines,
+        }
+        self.seed = seed
+        self.prefix = prefix
+        self.periods = last_months(months)
+        self.random = random.Random(seed)
+
+    def exists(self) -> bool:
+        """Whether a dataset with this prefix was already generated."""
+        return Product.objects.filter(sku_code__startswith=f'{self.prefix}-').exists()
+
+    @transaction.atomic
+    def generate(self, calculate_costs=True) -> dict:
+        """
+        Write the dataset.
+
+        Args:
+            calculate_costs: Also cost every product for the current month with BulkCostEngine
+
+        Returns:
+            dict: Number of rows created per model
+
+        Raises:
+            ValueError: If a dataset with the same prefix exists
+        """
+        if self.exists():
+            raise ValueError(f"A dataset with prefix '{self.prefix}' already exists")
+
+        counts = {}
+        ingredients = self._create_ingredients(counts)
+        products = self._create_products(counts)
+        self._create_boms(products, ingredients, counts)
+        self._create_employees(counts)
+        self._create_production_times(products, counts)
+        self._create_overhead(counts)
+        self._create_purchase_orders(ingredients, counts)
+
+        # bulk_create skipped the signals that point products at their recipe
+        product_ids = [product.pk for product in products]
+        Product.objects.refresh_active_boms(product_ids)
+        Product.objects.refresh_active_production_times(product_ids)
+
+        counts['CostDependency'] = CostDependencyService.rebuild_for_products(product_ids)
+
+        # Nothing invalidated the cached inputs while signals were bypassed
+        LaborService.invalidate_hourly_rates()
+        OverheadService.invalidate_overhead_context()
+        IngredientCostMatrix.invalidate_cache()
+        DashboardService.invalidate_summary()
+
+        if calculate_costs:
+            result = BulkCostEngine(SKUCostAggregator()).run(
+                products=Product.objects.filter(pk__in=product_ids),
+                calculated_by='generate_dataset',
+                notes='Synthetic dataset',
+            )
+            counts['SKUCost'] = result['success_count']
+
+        return counts
+
+    def _bulk_create(self, model, objects, counts):
+        """bulk_create in batches and count the rows."""
+        created = model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+        counts[model.__name__] = counts.get(model.__name__, 0) + len(created)
+        return created
+
+    def _price(self, low, high, step=100) -> Decimal:
+        """Random price between low and high, rounded to step."""
+        return Decimal(self.random.randrange(low // step, high // step + 1) * step)
+
+    def _create_ingredients(self, counts):
+        suppliers = self._bulk_create(Supplier, [
+            Supplier(name=f'{self.prefix} Supplier {index}')
+            for index in range(max(self.sizes['ingredients'] // 10, 1))
+        ], counts)
+        self.suppliers = suppliers
+
+        ingredients = self._bulk_create(Ingredient, [
+            Ingredient(
+                name=f'{self.prefix} {category} {index}',
+                unit=self.random.choice(['kg', 'kg', 'l', 'piece', 'pack']),
+                category=category,
+                current_cost_per_unit=self._price(5000, 400000),
+                minimum_stock=Decimal(self.random.randrange(5, 50)),
+            )
+            for index, category in enumerate(
+                self.random.choice(INGREDIENT_CATEGORIES) for _ in range(self.sizes['ingredients'])
+            )
+        ], counts)
+
+        # Monthly random walk ending at the current cost
+        history = []
+        for ingredient in ingredients:
+            cost = ingredient.current_cost_per_unit
+            for month, year in reversed(self.periods):
+                previous_cost = (cost / Decimal(1 + self.random.uniform(-0.04, 0.08))).quantize(Decimal('1'))
+                history.append(IngredientPriceHistory(
+                    ingredient=ingredient,
+                    cost_per_unit=cost,
+                    previous_cost=previous_cost,
+                    change_percentage=((cost - previous_cost) / previous_cost * 100).quantize(Decimal('0.01')),
+                    effective_date=date(year, month, 1),
+                    source='Synthetic dataset',
+                ))
+                cost = previous_cost
+        self._bulk_create(IngredientPriceHistory, history, counts)
+
+        return ingredients
+
+    def _create_products(self, counts):
+        return self._bulk_create(Product, [
+            Product(
+                sku_code=f'{self.prefix}-{index:06d}',
+                name=f'{self.random.choice(PRODUCT_NAMES)} {self.random.choice(FLAVORS)} {index}',
+                category=self.random.choice(PRODUCT_CATEGORIES),
+                selling_price=self._price(8000, 250000, step=1000),
+            )
+            for index in range(self.sizes['products'])
+        ], counts)
+
+    def _create_boms(self, products, ingredients, counts):
+        effective_date = date(self.periods[0][1], self.periods[0][0], 1)
+        boms = self._bulk_create(BillOfMaterials, [
+            BillOfMaterials(product=product, version=1, status='active', effective_date=effective_date)
+            for product in products
+        ], counts)
+
+        self._bulk_create(BOMLineItem, [
+            BOMLineItem(
+                bom=bom,
+                ingredient=ingredient,
+                quantity_per_unit=Decimal(self.random.randrange(1, 300)) / 1000,
+                waste_percentage=Decimal(self.random.randrange(0, 8)),
+            )
+            for bom in boms
+            for ingredient in self.random.sample(ingredients, self.sizes['bom_lines_per_product'])
+        ], counts)
+
+    def _create_employees(self, counts):
+        start = date(self.periods[0][1], self.periods[0][0], 1)
+        employees = self._bulk_create(Employee, [
+            Employee(
+                employee_id=f'{self.prefix}-EMP-{index:05d}',
+                name=f'{self.prefix} Employee {index}',
+                role=EMPLOYEE_ROLES[index % len(EMPLOYEE_ROLES)],
+                hire_date=start,
+            )
+            for index in range(self.sizes['employees'])
+        ], counts)
+
+        # Half of the staff get a raise halfway through the range
+        raise_month, raise_year = self.periods[len(self.periods) // 2]
+        raise_date = date(raise_year, raise_month, 1)
+        wages = []
+        for employee in employees:
+            base_rate = self._price(6000000, 12000000, step=100000)
+            if raise_date > start and self.random.random() < 0.5:
+                wages.append(EmployeeWage(
+                    employee=employee,
+                    wage_type='monthly_salary',
+                    base_rate=base_rate,
+                    effective_date=start,
+                    end_date=month_end(*self.periods[len(self.periods) // 2 - 1]),
+                ))
+                base_rate = (base_rate * Decimal('1.08')).quantize(Decimal('1000'))
+                wages.append(EmployeeWage(
+                    employee=employee, wage_type='monthly_salary', base_rate=base_rate, effective_date=raise_date
+                ))
+            else:
+                wages.append(EmployeeWage(
+                    employee=employee, wage_type='monthly_salary', base_rate=base_rate, effective_date=start
+                ))
+        self._bulk_create(EmployeeWage, wages, counts)
+
+    def _create_production_times(self, products, counts):
+        effective_date = date(self.periods[0][1], self.periods[0][0], 1)
+        production_times = self._bulk_create(ProductionTime, [
+            ProductionTime(
+                product=product,
+                total_time_minutes=Decimal(self.random.randrange(30, 240)),
+                batch_size=self.random.choice([10, 20, 24, 30, 50]),
+                effective_date=effective_date,
+            )
+            for product in products
+        ], counts)
+
+        phases = []
+        for production_time in production_times:
+            for phase, role in self.random.sample(PHASES, self.random.randrange(2, len(PHASES) + 1)):
+                phases.append(ProductionPhase(
+                    production_time=production_time,
+                    phase=phase,
+                    duration_minutes=Decimal(self.random.randrange(5, 60)),
+                    employees_required=self.random.randrange(1, 3),
+                    employee_role=role,
+                ))
+        self._bulk_create(ProductionPhase, phases, counts)
+
+    def _create_overhead(self, counts):
+        categories = self._bulk_create(OverheadCategory, [
+            OverheadCategory(
+                name=f'{self.prefix} {name}',
+                allocation_method=method,
+                allocation_percentage=percentage or Decimal('0'),
+            )
+            for name, method, percentage, _ in OVERHEAD_CATEGORIES
+        ], counts)
+
+        costs = []
+        for category, (_, _, _, amount) in zip(categories, OVERHEAD_CATEGORIES):
+            if amount is None:
+                continue
+            for month, year in self.periods:
+                costs.append(OverheadCost(
+                    category=category,
+                    amount=(amount * Decimal(1 + self.random.uniform(-0.1, 0.1))).quantize(Decimal('1000')),
+                    month=month,
+                    year=year,
+                ))
+        self._bulk_create(OverheadCost, costs, counts)
+
+        existing = set(MonthlyProductionVolume.objects.values_list('month', 'year'))
+        self._bulk_create(MonthlyProductionVolume, [
+            MonthlyProductionVolume(
+                month=month,
+                year=year,
+                total_units_produced=Decimal(self.sizes['products'] * self.random.randrange(100, 200)),
+            )
+            for month, year in self.periods
+            if (month, year) not in existing
+        ], counts)
+
+    def _create_purchase_orders(self, ingredients, counts):
+        po_lines = self.sizes['po_lines']
+        if not po_lines:
+            return
+
+        today = date.today()
+        first = date(self.periods[0][1], self.periods[0][0], 1)
+        order_count = -(-po_lines // LINES_PER_PURCHASE_ORDER)
+        order_dates = sorted(
+            date.fromordinal(self.random.randrange(first.toordinal(), today.toordinal() + 1))
+            for _ in range(order_count)
+        )
+        current_month = (today.month, today.year)
+
+        purchase_orders = self._bulk_create(PurchaseOrder, [
+            PurchaseOrder(
+                po_number=f'{self.prefix}-PO-{index:06d}',
+                supplier=self.random.choice(self.suppliers),
+                order_date=order_date,
+                status='confirmed' if (order_date.month, order_date.year) == current_month else 'received',
+            )
+            for index, order_date in enumerate(order_dates)
+        ], counts)
+
+        lines = []
+        totals = defaultdict(Decimal)
+        for index in range(po_lines):
+            purchase_order = purchase_orders[index // LINES_PER_PURCHASE_ORDER]
+            ingredient = self.random.choice(ingredients)
+            quantity = Decimal(self.random.randrange(5, 200))
+            unit_price = (ingredient.current_cost_per_unit * Decimal(self.random.uniform(0.9, 1.1))).quantize(
+                Decimal('1')
+            )
+            lines.append(PurchaseOrderLine(
+                purchase_order=purchase_order,
+                ingredient=ingredient,
+                quantity=quantity,
+                unit_price=unit_price,
+                received_quantity=quantity if purchase_order.status == 'received' else Decimal('0'),
+            ))
+            totals[purchase_order.pk] += quantity * unit_price
+        lines = self._bulk_create(PurchaseOrderLine, lines, counts)
+
+        for purchase_order in purchase_orders:
+            purchase_order.total_amount = totals[purchase_order.pk]
+        PurchaseOrder.objects.bulk_update(purchase_orders, ['total_amount'], batch_size=BATCH_SIZE)
+
+        self._receive_into_ledger(ingredients, purchase_orders, lines, counts)
+
+    def _receive_into_ledger(self, ingredients, purchase_orders, lines, counts):
+        """Record the received lines as receipts with running balances, oldest first."""
+        order_dates = {purchase_order.pk: purchase_order.order_date for purchase_order in purchase_orders}
+        balances = {ingredient.pk: [Decimal('0'), Decimal('0')] for ingredient in ingredients}
+        now = timezone.now()
+
+        movements = []
+        for line in sorted(lines, key=lambda line: (order_dates[line.purchase_order_id], line.pk)):
+            if not line.received_quantity:
+                continue
+            balance = balances[line.ingredient_id]
+            quantity = line.received_quantity.quantize(QUANTITY_PRECISION)
+            value = (quantity * line.unit_price).quantize(VALUE_PRECISION)
+            balance[0] += quantity
+            balance[1] += value
+            movements.append(StockMovement(
+                ingredient_id=line.ingredient_id,
+                movement_type='receipt',
+                movement_date=timezone.make_aware(datetime.combine(order_dates[line.purchase_order_id], time(9))),
+                quantity=quantity,
+                unit_cost=line.unit_price,
+                value=value,
+                balance_quantity=balance[0],
+                balance_value=balance[1],
+                po_line=line,
+                notes=f'Synthetic receipt {line.pk}',
+            ))
+        self._bulk_create(StockMovement, movements, counts)
+
+        for ingredient in ingredients:
+            ingredient.current_stock, ingredient.stock_value = balances[ingredient.pk]
+            ingredient.updated_at = now
+        Ingredient.objects.bulk_update(
+            ingredients, ['current_stock', 'stock_value', 'updated_at'], batch_size=BATCH_SIZE
+        )
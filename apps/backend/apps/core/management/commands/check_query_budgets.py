@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.core.query_budget import QueryBudgetHarness
+
+
+class Command(BaseCommand):
+    help = 'Checks every view and API against the query budget file on generated datasets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--small', type=int, default=4, help='Products in the small dataset (default: 4)')
+        parser.add_argument('--large', type=int, default=16, help='Products in the large dataset (default: 16)')
+        parser.add_argument(
+            '--update',
+            action='store_true',
+            help='Write the measured query counts as the new budgets instead of checking',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            harness = QueryBudgetHarness(small=options['small'], large=options['large'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        # The datasets are generated in the configured database; never keep them
+        with transaction.atomic():
+            report = harness.run()
+            transaction.set_rollback(True)
+
+        for key, measurement in sorted(report['measurements'].items()):
+            small, large = measurement['small'], measurement['large']
+            if 'queries' in small and 'queries' in large:
+                self.stdout.write(
+                    f"{key:<48} {small['queries']:>4} -> {large['queries']:>4} queries {large['ms']:>9.1f} ms"
+                )
+        for key, reason in sorted(report['skipped'].items()):
+            self.stdout.write(f'{key:<48} skipped: {reason}')
+
+        if options['update']:
+            budgets = harness.write_budgets(report)
+            self.stdout.write(self.style.SUCCESS(f'✓ Wrote {len(budgets)} budgets to {harness.budget_file}'))
+            return
+
+        violations = harness.check(report)
+        for violation in violations:
+            self.stderr.write(f'  {violation}')
+        if violations:
+            raise CommandError(f'{len(violations)} query budget violation(s)')
+        self.stdout.write(self.style.SUCCESS('✓ Every view is within its query budget'))
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.datasets import SyntheticDataset
+
+
+class Command(BaseCommand):
+    help = 'Generates a large deterministic synthetic dataset with bulk inserts, for load tests and benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000, help='Number of products (default: 1000)')
+        parser.add_argument('--ingredients', type=int, default=200, help='Number of ingredients (default: 200)')
+        parser.add_argument(
+            '--bom-lines-per-product', type=int, default=8, help='BOM lines per product (default: 8)'
+        )
+        parser.add_argument('--employees', type=int, default=50, help='Number of employees (default: 50)')
+        parser.add_argument(
+            '--months', type=int, default=12, help='Months of history ending this month (default: 12)'
+        )
+        parser.add_argument('--po-lines', type=int, default=5000, help='Purchase order lines (default: 5000)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument('--prefix', default='SYN', help='Tag of the generated rows (default: SYN)')
+        parser.add_argument(
+            '--skip-costs',
+            action='store_true',
+            help='Do not cost the generated products for the current month',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            dataset = SyntheticDataset(
+                products=options['products'],
+                ingredients=options['ingredients'],
+                bom_lines_per_product=options['bom_lines_per_product'],
+                employees=options['employees'],
+                months=options['months'],
+                po_lines=options['po_lines'],
+                seed=options['seed'],
+                prefix=options['prefix'],
+            )
+            started = time.perf_counter()
+            counts = dataset.generate(calculate_costs=not options['skip_costs'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        elapsed = time.perf_counter() - started
+        for model_name, count in counts.items():
+            self.stdout.write(f'  {model_name:<24} {count:>10}')
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Generated {sum(counts.values())} rows in {elapsed:.1f}s'
+        ))
@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.benchmarks import BENCHMARKS, BenchmarkRunner
+
+
+class Command(BaseCommand):
+    help = 'Times the costing, signal, page and JSON API hot paths against the configured database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only',
+            action='append',
+            default=[],
+            help=f"Benchmark to run (repeatable). Available: {', '.join(benchmark.name for benchmark in BENCHMARKS)}",
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='Measured iterations (default: 5)')
+        parser.add_argument('--warmup', type=int, default=1, help='Unmeasured iterations first (default: 1)')
+        parser.add_argument('--cold-cache', action='store_true', help='Clear the cache before every iteration')
+        parser.add_argument('--json', metavar='PATH', help='Also write the report as JSON to PATH')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1 or options['warmup'] < 0:
+            raise CommandError('--repeat must be positive and --warmup not negative')
+
+        runner = BenchmarkRunner(
+            repeat=options['repeat'],
+            warmup=options['warmup'],
+            cold_cache=options['cold_cache'],
+        )
+        try:
+            report = runner.run(options['only'] or None)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"{report['vendor']} | {report['repeat']} runs | {'cold' if report['cold_cache'] else 'warm'} cache"
+        )
+        self.stdout.write(f"{'benchmark':<28} {'median ms':>10} {'min ms':>10} {'p95 ms':>10} {'queries':>8}")
+        failed = 0
+        for result in report['results']:
+            if 'error' in result:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"{result['name']:<28} {result['error']}"))
+                continue
+            self.stdout.write(
+                f"{result['name']:<28} {result['median_ms']:>10.2f} {result['min_ms']:>10.2f} "
+                f"{result['p95_ms']:>10.2f} {result['queries']:>8}"
+            )
+
+        if options['json']:
+            with open(options['json'], 'w') as report_file:
+                json.dump(report, report_file, indent=2)
+            self.stdout.write(f"Report written to {options['json']}")
+
+        if failed:
+            raise CommandError(f'{failed} benchmark(s) failed')
@@ -3,6 +3,7 @@ from django.utils import timezone
 from datetime import date, timedelta
 from decimal import Decimal
 from apps.inventory.models import Supplier, Ingredient, PurchaseOrder, PurchaseOrderLine
+from apps.inventory.services import InventoryService
 from apps.products.models import Product, BillOfMaterials, BOMLineItem
 from apps.labor.models import Employee, EmployeeWage, ProductionTime, ProductionPhase
 from apps.overhead.models import OverheadCategory, OverheadCost, MonthlyProductionVolume
@@ -290,6 +291,9 @@ class Command(BaseCommand):
             action = 'Created' if created else 'Already exists'
             self.stdout.write(f'✓ {action}: {ingredient.name}')
 
+        # Start the stock ledger of the seeded stock
+        InventoryService.open_stock_balances(ingredients.values())
+
         return ingredients
 
     def _create_products(self):
@@ -0,0 +1,272 @@
+import json
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.template import TemplateDoesNotExist
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from apps.inventory.models import Ingredient, PurchaseOrderLine
+from apps.labor.models import Employee
+from apps.overhead.models import OverheadCost
+from apps.products.models import BillOfMaterials, Product
+from .datasets import SyntheticDataset
+
+BUDGET_FILE = Path(__file__).resolve().parent / 'query_budgets.json'
+
+# Django admin is not ours to budget; OCR endpoints need the OCR engine
+EXCLUDED_NAMESPACES = {'admin', 'ocr', 'ocr-api'}
+# GET on these changes state
+EXCLUDED_URLS = {'accounts:logout', 'products:bom_clone'}
+
+# URL kwargs that cannot be derived from the view's model, by app_name:url_name
+URL_KWARGS = {
+    'products:product_detail_api': lambda fixtures: {'pk': fixtures['product'].pk},
+    'inventory:ingredient_detail_api': lambda fixtures: {'pk': fixtures['ingredient'].pk},
+    'inventory:receive_po_line': lambda fixtures: {'po_line_id': fixtures['po_line'].pk},
+    'inventory:receive_purchase_order': lambda fixtures: {'pk': fixtures['po_line'].purchase_order_id},
+    'products:bom_activate': lambda fixtures: {'pk': fixtures['bom'].pk},
+    'labor:employee_detail_api': lambda fixtures: {'pk': fixtures['employee'].pk},
+    'labor:employee_detail': lambda fixtures: {'employee_id': fixtures['employee'].employee_id},
+    'labor:employee_edit': lambda fixtures: {'employee_id': fixtures['employee'].employee_id},
+    'overhead:cost_detail_api': lambda fixtures: {'pk': fixtures['overhead_cost'].pk},
+    'costs:cost_history': lambda fixtures: {'pk': fixtures['product'].pk},
+    'costs:cost_trend_api': lambda fixtures: {'product_id': fixtures['product'].pk},
+    'costs:cost_trend_public_api': lambda fixtures: {'product_id': fixtures['product'].pk},
+}
+
+
+@dataclass(frozen=True)
+class UrlEntry:
+    """
+    One named route of the URL configuration.
+
+    Attributes:
+        key: namespace:name, unique per route (budgets are keyed by it)
+        lookup: app_name:name, shared by the web and /api/ mounts of an app
+        params: Names of the route's path parameters
+        callback: View function
+    """
+    key: str
+    lookup: str
+    params: tuple
+    callback: object
+
+
+def iter_urls(resolver=None, namespaces=(), app_names=(), params=()):
+    """Yield a UrlEntry for every named route, depth first."""
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        pattern_params = tuple(getattr(pattern.pattern, 'converters', {}))
+        if isinstance(pattern, URLResolver):
+            yield from iter_urls(
+                pattern,
+                namespaces + ((pattern.namespace,) if pattern.namespace else ()),
+                app_names + ((pattern.app_name,) if pattern.app_name else ()),
+                params + pattern_params,
+            )
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield UrlEntry(
+                key=':'.join(namespaces + (pattern.name,)),
+                lookup=':'.join(app_names + (pattern.name,)),
+                params=params + pattern_params,
+                callback=pattern.callback,
+            )
+
+
+class QueryBudgetHarness:
+    """
+    Query-count regression harness for every backend view and API.
+
+    Walks every named route in the URL configuration (web views and /api/
+    mounts), GETs it as a superuser against a synthetic dataset at two sizes
+    and records the query count and latency of each. A view fails when its
+    query count grows from the small to the large dataset (a per-row query) or
+    when it exceeds its entry in the checked-in budget file. Routes that do
+    not answer GET (405) or whose template is not written yet are skipped.
+
+    The cache is cleared before every request, so cached views are measured on
+    their cold path. Latency is recorded for the report but never fails a run.
+    """
+
+    def __init__(self, small=4, large=16, budget_file=BUDGET_FILE):
+        """
+        Args:
+            small: Product count of the small dataset
+            large: Product count of the large dataset
+            budget_file: JSON file mapping route keys to maximum query counts
+        """
+        if not 0 < small < large:
+            raise ValueError('Dataset sizes must satisfy 0 < small < large')
+        self.small = small
+        self.large = large
+        self.budget_file = Path(budget_file)
+
+    def run(self) -> dict:
+        """
+        Measure every route at both dataset sizes.
+
+        Writes both datasets; run it in a test database or a transaction.
+
+        Returns:
+            dict: {measurements, skipped}. measurements maps route keys to
+            {path, small: {queries, ms}, large: {queries, ms}}; skipped maps route
+            keys to the reason.
+        """
+        self._generate(self.small, prefix='QBS')
+        fixtures = self._fixtures()
+
+        user = get_user_model().objects.create_superuser(username='query-budget', password='query-budget')
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+
+        paths = {}
+        skipped = {}
+        for entry in iter_urls():
+            namespace = entry.key.split(':')[0]
+            if namespace in EXCLUDED_NAMESPACES or entry.lookup in EXCLUDED_URLS:
+                continue
+            kwargs = self._url_kwargs(entry, fixtures)
+            if kwargs is None:
+                skipped[entry.key] = f'no kwargs for {", ".join(entry.params)}'
+                continue
+            paths[entry.key] = reverse(entry.key, kwargs=kwargs)
+
+        small_results = {}
+        for key, path in paths.items():
+            measurement = self._measure(client, path)
+            if 'skipped' in measurement:
+                skipped[key] = measurement['skipped']
+            else:
+                small_results[key] = measurement
+
+        self._generate(self.large - self.small, prefix='QBL')
+
+        measurements = {}
+        for key, small_result in small_results.items():
+            measurements[key] = {
+                'path': paths[key],
+                'small': small_result,
+                'large': self._measure(client, paths[key]),
+            }
+
+        return {'measurements': measurements, 'skipped': skipped}
+
+    def check(self, report) -> list:
+        """
+        List the budget violations of a run() report.
+
+        Returns:
+            list of human readable violations, empty when every route passes
+        """
+        budgets = self.load_budgets()
+        violations = []
+        for key, measurement in sorted(report['measurements'].items()):
+            small, large = measurement['small'], measurement['large']
+            if 'error' in small or 'error' in large:
+                violations.append(f"{key} ({measurement['path']}): {small.get('error') or large.get('error')}")
+                continue
+            if large['queries'] > small['queries']:
+                violations.append(
+                    f"{key} ({measurement['path']}): {small['queries']} queries with {self.small} products, "
+                    f"{large['queries']} with {self.large}; the view queries per row"
+                )
+            budget = budgets.get(key)
+            if budget is None:
+                violations.append(f'{key}: no query budget; run check_query_budgets --update')
+            elif large['queries'] > budget:
+                violations.append(
+                    f"{key} ({measurement['path']}): {large['queries']} queries, budget {budget}"
+                )
+        return violations
+
+    def load_budgets(self) -> dict:
+        """Read the budget file, empty when missing."""
+        if not self.budget_file.exists():
+            return {}
+        return json.loads(self.budget_file.read_text())
+
+    def write_budgets(self, report) -> dict:
+        """
+        Write the large-dataset query counts of a report as the new budgets.
+
+        Returns:
+            The written budgets
+        """
+        budgets = {
+            key: measurement['large']['queries']
+            for key, measurement in sorted(report['measurements'].items())
+            if 'queries' in measurement['large']
+        }
+        self.budget_file.write_text(json.dumps(budgets, indent=2) + '\n')
+        return budgets
+
+    def _generate(self, products, prefix):
+        SyntheticDataset(
+            products=products,
+            ingredients=max(products, 4),
+            bom_lines_per_product=3,
+            employees=max(products // 2, 2),
+            months=3,
+            po_lines=products * 3,
+            prefix=prefix,
+        ).generate()
+
+    @staticmethod
+    def _fixtures() -> dict:
+        """Objects whose ids fill URL parameters."""
+        return {
+            'product': Product.objects.filter(sku_costs__is_current=True).order_by('pk').first(),
+            'bom': BillOfMaterials.objects.order_by('pk').first(),
+            'ingredient': Ingredient.objects.order_by('pk').first(),
+            'po_line': PurchaseOrderLine.objects.order_by('pk').first(),
+            'employee': Employee.objects.order_by('pk').first(),
+            'overhead_cost': OverheadCost.objects.order_by('pk').first(),
+        }
+
+    @staticmethod
+    def _url_kwargs(entry, fixtures):
+        """Kwargs to reverse a route, or None when they cannot be derived."""
+        if not entry.params:
+            return {}
+        if entry.lookup in URL_KWARGS:
+            return URL_KWARGS[entry.lookup](fixtures)
+
+        model = getattr(getattr(entry.callback, 'view_class', None), 'model', None)
+        if model is not None and entry.params == ('pk',):
+            instance = model.objects.order_by('pk').first()
+            return {'pk': instance.pk} if instance else None
+        return None
+
+    @staticmethod
+    def _measure(client, path):
+        """
+        GET a path with a cold cache.
+
+        Returns:
+            dict: {queries, ms}, {error} for failed requests, or {skipped} when the
+            route does not answer GET or its template does not exist yet
+        """
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            duration = (time.perf_counter() - started) * 1000
+
+        if response.status_code == 405:
+            return {'skipped': 'GET not allowed'}
+        if response.exc_info and issubclass(response.exc_info[0], TemplateDoesNotExist):
+            return {'skipped': f'template {response.exc_info[1]} missing'}
+        if response.status_code >= 400:
+            error = f'status {response.status_code}'
+            if response.exc_info:
+                error = f'{error}: {response.exc_info[0].__name__}: {response.exc_info[1]}'
+            return {'error': error}
+        return {'queries': len(queries.captured_queries), 'ms': round(duration, 2)}
@@ -0,0 +1,212 @@
+import base64
+import json
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from apps.costs.models import SKUCost
+from apps.inventory.models import Ingredient, PurchaseOrder, StockMovement
+from apps.labor.models import Employee, EmployeeWage
+from apps.products.models import Product
+from .benchmarks import BenchmarkRunner
+from .datasets import SyntheticDataset
+from .query_budget import QueryBudgetHarness
+
+
+class JsonListAPITests(TestCase):
+    """Shared list API behaviour, exercised through the products endpoint."""
+
+    def setUp(self):
+        for index in range(5):
+            Product.objects.create(
+                sku_code=f'SKU-{index:04d}',
+                # Duplicate names check that pk breaks ties in the keyset ordering
+                name=f'Banh {index // 2}',
+                category='bread',
+                selling_price=Decimal('15000'),
+            )
+
+    def test_without_pagination_returns_everything(self):
+        response = self.client.get('/api/products/api/')
+
+        items = response.json()['items']
+        self.assertEqual(len(items), 5)
+        self.assertEqual(items[0]['category'], 'Bread')
+        self.assertEqual(items[0]['selling_price'], 15000.0)
+        self.assertNotIn('next_cursor', response.json())
+
+    def test_keyset_pagination_walks_every_row_once(self):
+        seen = []
+        params = {'limit': 2}
+        while True:
+            payload = self.client.get('/api/products/api/', params).json()
+            seen.extend(item['sku_code'] for item in payload['items'])
+            if not payload['next_cursor']:
+                break
+            params['cursor'] = payload['next_cursor']
+
+        self.assertEqual(seen, [f'SKU-{index:04d}' for index in range(5)])
+
+    def test_field_projection(self):
+        response = self.client.get('/api/products/api/', {'fields': 'id,sku_code'})
+        self.assertEqual(set(response.json()['items'][0]), {'id', 'sku_code'})
+
+        response = self.client.get('/api/products/api/', {'fields': 'id,cost'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_cursor_and_limit(self):
+        self.assertEqual(self.client.get('/api/products/api/', {'cursor': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/products/api/', {'limit': '0'}).status_code, 400)
+
+        # Well-formed cursors whose values do not fit the ordering fields (name, pk)
+        for values in (['Banh', 'abc'], ['Banh', {'pk': 1}], [['Banh'], 1]):
+            cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+            response = self.client.get('/api/products/api/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 400, values)
+            self.assertEqual(response.json(), {'error': 'Invalid cursor'})
+
+    def test_etag_answers_unchanged_polls_with_304(self):
+        etag = self.client.get('/api/products/api/')['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/api/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # with_costs() measures the sub-recipe depth, then one fingerprint query per
+        # cost input table: products, BOMs, BOM lines, ingredients
+        self.assertEqual(len(queries.captured_queries), 5)
+
+        # Options are part of the fingerprint
+        self.assertNotEqual(self.client.get('/api/products/api/', {'fields': 'id'})['ETag'], etag)
+
+        product = Product.objects.first()
+        product.selling_price = Decimal('16000')
+        product.save()
+        response = self.client.get('/api/products/api/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_employee_wages_are_joined_without_per_row_queries(self):
+        for index in range(4):
+            employee = Employee.objects.create(
+                employee_id=f'EMP-{index}', name=f'Employee {index}', role='baker', hire_date=date(2024, 1, 1)
+            )
+            EmployeeWage.objects.create(
+                employee=employee, base_rate=Decimal('8800000'), effective_date=date(2024, 1, 1)
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            items = self.client.get('/api/labor/employees/api/').json()['items']
+
+        # ETag fingerprint (employees, wages) plus the list itself
+        self.assertEqual(len(queries.captured_queries), 3)
+        self.assertEqual(len(items), 4)
+        self.assertEqual(items[0]['hourly_rate'], 50000.0)
+        self.assertEqual(items[0]['status'], 'active')
+
+
+class SyntheticDatasetTests(TestCase):
+    """The generator bulk-creates a deterministic, consistent dataset."""
+
+    def generate(self, prefix='SYN', **kwargs):
+        sizes = {'products': 12, 'ingredients': 8, 'bom_lines_per_product': 3, 'employees': 4, 'months': 3,
+                 'po_lines': 25, **kwargs}
+        return SyntheticDataset(prefix=prefix, **sizes).generate()
+
+    def test_generates_requested_sizes(self):
+        counts = self.generate()
+
+        self.assertEqual(counts['Product'], 12)
+        self.assertEqual(counts['BOMLineItem'], 12 * 3)
+        self.assertEqual(counts['PurchaseOrderLine'], 25)
+        self.assertEqual(counts['IngredientPriceHistory'], 8 * 3)
+        self.assertEqual(counts['SKUCost'], 12)
+        self.assertEqual(SKUCost.objects.filter(is_current=True).count(), 12)
+
+    def test_same_seed_gives_same_data(self):
+        self.generate(prefix='A', seed=7)
+        self.generate(prefix='B', seed=7)
+
+        def snapshot(prefix):
+            return [
+                (sku_code.split('-', 1)[1], name, price)
+                for sku_code, name, price in Product.objects.filter(
+                    sku_code__startswith=f'{prefix}-'
+                ).order_by('sku_code').values_list('sku_code', 'name', 'selling_price')
+            ]
+
+        self.assertEqual(snapshot('A'), snapshot('B'))
+        with self.assertRaises(ValueError):
+            self.generate(prefix='A')
+
+    def test_stock_ledger_matches_received_lines(self):
+        self.generate()
+
+        for ingredient in Ingredient.objects.all():
+            last = ingredient.stock_movements.first()
+            self.assertEqual(ingredient.current_stock, last.balance_quantity if last else 0)
+            self.assertEqual(ingredient.stock_value, last.balance_value if last else 0)
+        self.assertEqual(
+            StockMovement.objects.count(),
+            PurchaseOrder.objects.filter(status='received').aggregate(
+                lines=Count('lines')
+            )['lines']
+        )
+
+
+class BenchmarkRunnerTests(TestCase):
+    """Benchmarks measure against the current data and roll their writes back."""
+
+    def setUp(self):
+        SyntheticDataset(products=5, ingredients=6, bom_lines_per_product=3, employees=3, months=2,
+                         po_lines=10).generate()
+
+    def test_runs_and_rolls_back(self):
+        cost_count = SKUCost.objects.count()
+        names = ['single_sku_cost', 'po_receipt_fan_out', 'dashboard', 'csv_export', 'products_api',
+                 'price_shock_api']
+
+        report = BenchmarkRunner(repeat=2, warmup=0).run(names)
+
+        self.assertEqual([result['name'] for result in report['results']], names)
+        for result in report['results']:
+            self.assertNotIn('error', result)
+            self.assertGreater(result['queries'], 0)
+        self.assertEqual(SKUCost.objects.count(), cost_count)
+        self.assertFalse(get_user_model().objects.filter(username='benchmark').exists())
+
+    def test_unknown_benchmark(self):
+        with self.assertRaises(ValueError):
+            BenchmarkRunner().run(['nope'])
+
+
+class QueryBudgetTests(TestCase):
+    """Every view stays within its checked-in query budget and does not query per row."""
+
+    def test_views_are_within_budget(self):
+        harness = QueryBudgetHarness()
+        report = harness.run()
+
+        self.assertIn('products-api:product_list_api', report['measurements'])
+        self.assertEqual(report['skipped']['costs:recalculate'], 'GET not allowed')
+        self.assertEqual(harness.check(report), [])
+
+    def test_growth_and_budget_violations(self):
+        harness = QueryBudgetHarness()
+        report = {'measurements': {
+            'products:product_list_api': {'path': '/', 'small': {'queries': 2}, 'large': {'queries': 2}},
+            'products:product_list': {'path': '/', 'small': {'queries': 3}, 'large': {'queries': 15}},
+            'products:product_detail_api': {'path': '/', 'small': {'queries': 9}, 'large': {'queries': 9}},
+            'products:unknown': {'path': '/', 'small': {'queries': 1}, 'large': {'queries': 1}},
+        }}
+
+        violations = harness.check(report)
+
+        self.assertEqual(len(violations), 4)
+        self.assertIn('queries per row', violations[1])
+        self.assertIn('budget 2', violations[0])
+        self.assertIn('no query budget', violations[3])
@@ -52,6 +52,7 @@ class SKUCostAdmin(admin.ModelAdmin):
         'created_at',
         'updated_at',
         'calculation_details',
+        'input_fingerprint',
     ]
     fieldsets = (
         ('Product Information', {
@@ -82,6 +83,7 @@ class SKUCostAdmin(admin.ModelAdmin):
                 'created_at',
                 'updated_at',
                 'calculation_details',
+                'input_fingerprint',
             ),
             'classes': ('collapse',),
         }),
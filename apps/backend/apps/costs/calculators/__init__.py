@@ -3,6 +3,9 @@ from .ingredient_cost_calculator import IngredientCostCalculator
 from .labor_cost_calculator import LaborCostCalculator
 from .overhead_cost_calculator import OverheadCostCalculator
 from .sku_cost_aggregator import SKUCostAggregator
+from .bulk_cost_engine import BulkCostEngine
+from .ingredient_cost_matrix import IngredientCostMatrix
+from .point_in_time import PointInTimeInputs, PointInTimeCostEngine
 
 __all__ = [
     'BaseCostCalculator',
@@ -10,4 +13,8 @@ __all__ = [
     'LaborCostCalculator',
     'OverheadCostCalculator',
     'SKUCostAggregator',
+    'BulkCostEngine',
+    'IngredientCostMatrix',
+    'PointInTimeInputs',
+    'PointInTimeCostEngine',
 ]
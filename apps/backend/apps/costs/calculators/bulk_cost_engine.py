@@ -0,0 +1,253 @@
+import logging
+from collections import defaultdict
+from datetime import date
+from django.db import transaction
+from django.db.models import Max, OuterRef, QuerySet, Subquery
+from apps.products.models import Product
+from apps.products.services import RecipeGraph
+from apps.labor.models import ProductionPhase
+from apps.labor.services import LaborService
+from apps.overhead.services import OverheadService
+from apps.costs.metrics import CostRunProfiler, profile_stage, record_rows
+from apps.costs.models import SKUCost, CostComponent, InflationTracking
+from apps.costs.rollups import CostRollupService
+
+logger = logging.getLogger(__name__)
+
+
+class BulkCostEngine:
+    """
+    Set-based costing engine for recalculating many SKUs in one run.
+
+    Every calculation input (active BOM lines with their ingredients and
+    sub-recipes, production phases, role wage rates and the month's overhead) is
+    loaded once for the whole run, each sub-recipe is costed once, all SKUs are computed in memory with the regular calculators, and the
+    resulting SKUCost, CostComponent and InflationTracking rows are written with
+    bulk_create. The number of queries does not grow with the number of products.
+
+    SKUs whose input fingerprint matches their latest version are skipped before
+    anything is computed for them.
+
+    Every run with products is timed per stage by a CostRunProfiler and stored
+    as a CostRunMetrics row; the row is kept on last_metrics.
+    """
+
+    def __init__(self, aggregator):
+        """
+        Args:
+            aggregator: SKUCostAggregator whose calculators and builders are reused
+        """
+        self.aggregator = aggregator
+        self.last_metrics = None
+
+    def run(self, products=None, month=None, year=None, calculated_by='system', notes='Bulk recalculation',
+            force=False):
+        """
+        Recalculate and store SKU costs for a set of products.
+
+        Args:
+            products: Optional Product queryset or iterable. Defaults to all active products.
+            month: Month (1-12), defaults to current month
+            year: Year, defaults to current year
+            calculated_by: Username or identifier of who triggered the calculation
+            notes: Notes stored on every created SKUCost
+            force: Create new versions even for products whose inputs are unchanged
+
+        Returns:
+            dict: Summary of recalculation {total_products, success_count, skipped_count,
+                  failed_count, errors}
+        """
+        if month is None or year is None:
+            today = date.today()
+            month = month or today.month
+            year = year or today.year
+
+        with CostRunProfiler('bulk') as profiler:
+            result = self._run(products, month, year, calculated_by, notes, force)
+
+        if result['total_products']:
+            self.last_metrics = profiler.save(
+                product_count=result['total_products'],
+                computed_count=result['success_count'],
+                skipped_count=result['skipped_count'],
+                failed_count=result['failed_count'],
+                month=month,
+                year=year,
+                calculated_by=calculated_by,
+            )
+        return result
+
+    def _run(self, products, month, year, calculated_by, notes, force):
+        """Recalculate and store SKU costs, see run()."""
+        with profile_stage('load_products'):
+            products = self._load_products(products)
+        if not products:
+            return {
+                'total_products': 0,
+                'success_count': 0,
+                'skipped_count': 0,
+                'failed_count': 0,
+                'errors': [],
+            }
+
+        inputs_by_product = self.load_inputs(products, month, year)
+
+        errors = []
+        computed = []
+        skipped_count = 0
+        for product in products:
+            inputs = inputs_by_product[product.pk]
+            with profile_stage('fingerprint'):
+                input_fingerprint = self.aggregator.fingerprint_inputs(month, year, **inputs)
+            if not force and product.latest_input_fingerprint == input_fingerprint:
+                skipped_count += 1
+                continue
+
+            try:
+                breakdown = self.aggregator.compute_costs(product, month, year, **inputs)
+                breakdown['input_fingerprint'] = input_fingerprint
+                computed.append((product, breakdown))
+            except Exception as e:
+                logger.exception('Cost calculation failed for %s', product)
+                errors.append({
+                    'product': str(product),
+                    'product_id': product.pk,
+                    'error': str(e)
+                })
+
+        self._save(computed, calculated_by=calculated_by, notes=notes)
+
+        total_products = len(products)
+        success_count = len(computed)
+        return {
+            'total_products': total_products,
+            'success_count': success_count,
+            'skipped_count': skipped_count,
+            'failed_count': total_products - success_count - skipped_count,
+            'errors': errors,
+        }
+
+    @staticmethod
+    def _load_products(products):
+        """Load products annotated with their latest SKUCost id, fingerprint and highest version."""
+        if products is None:
+            queryset = Product.objects.filter(is_active=True)
+        elif isinstance(products, QuerySet):
+            queryset = products
+        else:
+            queryset = Product.objects.filter(pk__in=[product.pk for product in products])
+
+        latest_cost = SKUCost.objects.filter(
+            product=OuterRef('pk')
+        ).order_by('-created_at')
+
+        return list(queryset.annotate(
+            latest_sku_cost_id=Subquery(latest_cost.values('pk')[:1]),
+            latest_input_fingerprint=Subquery(latest_cost.values('input_fingerprint')[:1]),
+            max_cost_version=Max('sku_costs__version'),
+        ))
+
+    @staticmethod
+    def load_inputs(products, month, year):
+        """
+        Load every calculator input for the given products with a fixed number of queries.
+
+        Returns:
+            dict: product id -> kwargs for SKUCostAggregator.compute_costs()
+        """
+        product_ids = [product.pk for product in products]
+
+        with profile_stage('load_boms'):
+            recipes = RecipeGraph.load(product_ids)
+
+        # Every sub-recipe is costed once and shared by the products using it
+        with profile_stage('sub_recipes'):
+            sub_recipe_costs = recipes.unit_costs()
+
+        with profile_stage('load_production_times'):
+            production_times = LaborService.get_active_production_times(product_ids)
+
+            phases_by_production_time = defaultdict(list)
+            for phase in ProductionPhase.objects.filter(
+                production_time_id__in=[pt.pk for pt in production_times.values()]
+            ).order_by('id'):
+                phases_by_production_time[phase.production_time_id].append(phase)
+
+        with profile_stage('load_hourly_rates'):
+            hourly_rates = LaborService.get_hourly_rate_snapshot()
+
+        # Overhead inputs are shared by every product in the month
+        with profile_stage('load_overhead'):
+            overhead_context = OverheadService.get_overhead_context(month, year)
+
+        inputs_by_product = {}
+        for product_id in product_ids:
+            production_time = production_times.get(product_id)
+
+            inputs_by_product[product_id] = {
+                'line_items': recipes.line_items_by_product[product_id],
+                'sub_recipe_costs': sub_recipe_costs,
+                'production_time': production_time,
+                'phases': phases_by_production_time[production_time.pk] if production_time else [],
+                'hourly_rates': hourly_rates,
+                'overhead_context': overhead_context,
+            }
+
+        return inputs_by_product
+
+    @transaction.atomic
+    def _save(self, computed, calculated_by='system', notes=''):
+        """
+        Write SKUCost, CostComponent and InflationTracking rows for computed breakdowns.
+
+        Args:
+            computed: List of (product, breakdown) tuples from compute_costs()
+            calculated_by: Username or identifier of who triggered the calculation
+            notes: Notes stored on every created SKUCost
+        """
+        if not computed:
+            return []
+
+        with profile_stage('load_previous_costs'):
+            previous_costs = SKUCost.objects.in_bulk([
+                product.latest_sku_cost_id
+                for product, _ in computed
+                if product.latest_sku_cost_id
+            ])
+
+        with profile_stage('save_sku_costs'):
+            sku_costs = SKUCost.objects.bulk_create([
+                self.aggregator.build_sku_cost(
+                    product,
+                    (product.max_cost_version or 0) + 1,
+                    breakdown,
+                    calculated_by=calculated_by,
+                    notes=notes,
+                )
+                for product, breakdown in computed
+            ])
+        record_rows('save_sku_costs', len(sku_costs))
+
+        with profile_stage('save_components'):
+            cost_components = []
+            inflation_records = []
+            for (product, _), sku_cost in zip(computed, sku_costs):
+                cost_components.extend(self.aggregator.build_cost_components(sku_cost))
+
+                previous_sku_cost = previous_costs.get(product.latest_sku_cost_id)
+                if previous_sku_cost:
+                    inflation_records.append(
+                        self.aggregator.build_inflation_tracking(sku_cost, previous_sku_cost)
+                    )
+
+            CostComponent.objects.bulk_create(cost_components)
+            InflationTracking.objects.bulk_create(inflation_records)
+        record_rows('save_components', len(cost_components) + len(inflation_records))
+
+        # bulk_create() bypasses save(), so move the current-cost flags here
+        with profile_stage('refresh_current'):
+            SKUCost.objects.refresh_current([product.pk for product, _ in computed])
+        with profile_stage('rollups'):
+            CostRollupService.record_costs(sku_costs)
+
+        return sku_costs
@@ -1,39 +1,74 @@
 from decimal import Decimal
-from apps.products.services import ProductService
+from apps.products.services import RecipeCycleError, RecipeGraph
 from .base import BaseCostCalculator
 
 
 class IngredientCostCalculator(BaseCostCalculator):
     """Calculator for ingredient costs based on Bill of Materials."""
 
-    def calculate(self, product, **kwargs):
+    def calculate(self, product, line_items=None, ingredient_prices=None, sub_recipe_costs=None, **kwargs):
         """
         Calculate total ingredient cost for a product using its active BOM.
 
+        Sub-recipe lines are costed at the sub-recipe's ingredient cost per unit;
+        the labor and overhead of making the sub-recipe are not included.
+
         Args:
             product: Product instance
+            line_items: Optional preloaded BOMLineItems (with ingredient and
+                        sub_product) of the active BOM. When omitted, the active
+                        BOM and its sub-recipes are looked up.
+            ingredient_prices: Optional dict mapping ingredient id to the unit cost
+                               to use instead of current_cost_per_unit, e.g. the
+                               prices on a past date
+            sub_recipe_costs: Dict mapping sub-recipe product id to its unit cost,
+                              required with line_items that use sub-recipes (see
+                              RecipeGraph.unit_costs())
             **kwargs: Unused, for interface compatibility
 
         Returns:
             tuple: (total_ingredient_cost, components_list)
-                  components_list contains dicts with: name, ingredient_id, quantity, unit,
-                  cost_per_unit, waste_pct, line_cost
-        """
-        # Get active BOM for the product
-        active_bom = ProductService.get_active_bom(product)
+                  components_list contains dicts with: name, ingredient_id (or
+                  sub_product_id), quantity, unit, cost_per_unit, waste_pct, line_cost
 
-        if not active_bom:
-            return (Decimal('0'), [])
+        Raises:
+            RecipeCycleError: If a sub-recipe cannot be costed because of a cycle
+        """
+        if line_items is None:
+            recipes = RecipeGraph.load([product.pk])
+            line_items = recipes.line_items_by_product[product.pk]
+            sub_recipe_costs = recipes.unit_costs(ingredient_prices)
 
+        ingredient_prices = ingredient_prices or {}
+        sub_recipe_costs = sub_recipe_costs or {}
         total_ingredient_cost = Decimal('0')
         components_list = []
 
         # Process each BOM line item
-        for line_item in active_bom.line_items.all():
-            ingredient = line_item.ingredient
-            cost_per_unit = ingredient.current_cost_per_unit
+        for line_item in line_items:
             effective_quantity = line_item.effective_quantity
 
+            if line_item.sub_product_id:
+                sub_product = line_item.sub_product
+                if sub_product.pk not in sub_recipe_costs:
+                    raise RecipeCycleError([product.pk, sub_product.pk])
+                line_cost = effective_quantity * sub_recipe_costs[sub_product.pk]
+                total_ingredient_cost += line_cost
+                components_list.append({
+                    'name': sub_product.name,
+                    'sub_product_id': sub_product.id,
+                    'quantity': float(line_item.quantity_per_unit),
+                    'unit': sub_product.unit,
+                    'cost_per_unit': float(sub_recipe_costs[sub_product.pk]),
+                    'waste_pct': float(line_item.waste_percentage),
+                    'effective_quantity': float(effective_quantity),
+                    'line_cost': float(line_cost),
+                })
+                continue
+
+            ingredient = line_item.ingredient
+            cost_per_unit = ingredient_prices.get(ingredient.id, ingredient.current_cost_per_unit)
+
             # Calculate line cost
             line_cost = effective_quantity * cost_per_unit
             total_ingredient_cost += line_cost
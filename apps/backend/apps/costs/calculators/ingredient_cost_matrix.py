@@ -0,0 +1,225 @@
+import time
+from decimal import Decimal
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import QuerySet
+from apps.products.models import Product
+from apps.products.services import RecipeGraph
+
+INGREDIENT_MATRIX_CACHE_VERSION_KEY = 'costs:ingredient_matrix:version'
+
+
+class IngredientCostMatrix:
+    """
+    Vectorized ingredient costing for a whole catalogue.
+
+    Holds a sparse products x ingredients matrix of waste-adjusted quantities
+    (one entry per raw ingredient of each active recipe, sub-recipes flattened,
+    in coordinate form) and a price vector built
+    from Ingredient.current_cost_per_unit. Every product's ingredient cost is
+    then a single sparse matrix-vector product, which makes what-if runs over
+    thousands of SKUs cheap: only the price vector changes between runs.
+
+    Results are floats converted back to Decimal; reconcile() checks them against
+    the Decimal path of IngredientCostCalculator to the đồng.
+    """
+
+    def __init__(self, product_ids, ingredient_ids, lines, prices):
+        """
+        Args:
+            product_ids: Ordered product ids (matrix rows)
+            ingredient_ids: Ordered ingredient ids (matrix columns)
+            lines: List of (row, column, effective_quantity) tuples, quantities in Decimal
+            prices: List of Decimal unit costs, one per column
+        """
+        self.product_ids = list(product_ids)
+        self.ingredient_ids = list(ingredient_ids)
+        self.ingredient_index = {
+            ingredient_id: column for column, ingredient_id in enumerate(self.ingredient_ids)
+        }
+        self.lines = lines
+        self.decimal_prices = prices
+
+        self.rows = np.array([line[0] for line in lines], dtype=np.int64)
+        self.columns = np.array([line[1] for line in lines], dtype=np.int64)
+        self.quantities = np.array([float(line[2]) for line in lines], dtype=np.float64)
+        self.prices = np.array([float(price) for price in prices], dtype=np.float64)
+
+    @classmethod
+    def build(cls, products=None):
+        """
+        Build the matrix from active BOMs with two queries per level of sub-recipe nesting.
+
+        Args:
+            products: Optional Product queryset or iterable. Defaults to all active products.
+
+        Returns:
+            IngredientCostMatrix
+        """
+        if products is None:
+            product_ids = list(Product.objects.filter(is_active=True).values_list('pk', flat=True))
+        elif isinstance(products, QuerySet):
+            product_ids = list(products.values_list('pk', flat=True))
+        else:
+            product_ids = [product.pk for product in products]
+
+        recipes = RecipeGraph.load(product_ids)
+        raw_quantities = recipes.raw_quantities()
+        ingredients = recipes.ingredients()
+
+        ingredient_index = {}
+        prices = []
+        lines = []
+        for row, product_id in enumerate(product_ids):
+            for ingredient_id, quantity in raw_quantities.get(product_id, {}).items():
+                if ingredient_id not in ingredient_index:
+                    ingredient_index[ingredient_id] = len(prices)
+                    prices.append(ingredients[ingredient_id].current_cost_per_unit)
+                lines.append((row, ingredient_index[ingredient_id], quantity))
+
+        return cls(product_ids, ingredient_index.keys(), lines, prices)
+
+    @classmethod
+    def get_cached(cls):
+        """
+        Get the matrix of all active products, cached across requests.
+
+        The cached matrix is dropped by invalidate_cache() whenever a product,
+        BOM, BOM line or ingredient changes (see signals).
+
+        Returns:
+            IngredientCostMatrix
+        """
+        version = cache.get(INGREDIENT_MATRIX_CACHE_VERSION_KEY)
+        if version is None:
+            version = cls.invalidate_cache()
+
+        cache_key = f'costs:ingredient_matrix:{version}'
+        matrix = cache.get(cache_key)
+        if matrix is None:
+            matrix = cls.build()
+            cache.set(cache_key, matrix, settings.INGREDIENT_MATRIX_CACHE_TIMEOUT)
+        return matrix
+
+    @staticmethod
+    def invalidate_cache() -> int:
+        """
+        Drop the cached catalogue matrix.
+
+        Returns:
+            The new cache version
+        """
+        version = time.time_ns()
+        cache.set(INGREDIENT_MATRIX_CACHE_VERSION_KEY, version, None)
+        return version
+
+    def products_using(self, ingredient_ids) -> list:
+        """
+        Get the products whose active recipe uses any of the given ingredients,
+        directly or through a sub-recipe.
+
+        Args:
+            ingredient_ids: Iterable of ingredient ids
+
+        Returns:
+            list of product ids, in matrix row order
+        """
+        columns = [
+            self.ingredient_index[ingredient_id]
+            for ingredient_id in ingredient_ids
+            if ingredient_id in self.ingredient_index
+        ]
+        rows = np.unique(self.rows[np.isin(self.columns, columns)])
+        return [self.product_ids[row] for row in rows]
+
+    def price_vector(self, overrides=None):
+        """
+        Get the price vector, optionally with some ingredient prices replaced.
+
+        Args:
+            overrides: Optional dict mapping ingredient id to a Decimal unit cost.
+                       Ingredients not used by any BOM in the matrix are ignored.
+
+        Returns:
+            numpy.ndarray of unit costs, one per ingredient column
+        """
+        prices = self.prices.copy()
+        for ingredient_id, price in (overrides or {}).items():
+            column = self.ingredient_index.get(ingredient_id)
+            if column is not None:
+                prices[column] = float(price)
+        return prices
+
+    def compute(self, prices=None):
+        """
+        Compute every product's ingredient cost with one sparse matrix-vector product.
+
+        Args:
+            prices: Optional price vector from price_vector(). Defaults to current costs.
+
+        Returns:
+            numpy.ndarray of ingredient cost per unit, one per product row
+        """
+        if prices is None:
+            prices = self.prices
+        return np.bincount(
+            self.rows,
+            weights=self.quantities * prices[self.columns],
+            minlength=len(self.product_ids)
+        )
+
+    def ingredient_costs(self, overrides=None) -> dict:
+        """
+        Get every product's ingredient cost as Decimal.
+
+        Args:
+            overrides: Optional dict mapping ingredient id to a Decimal unit cost
+
+        Returns:
+            dict mapping product id to Decimal ingredient cost per unit (4 decimal places)
+        """
+        costs = self.compute(self.price_vector(overrides))
+        return {
+            product_id: Decimal(str(round(float(cost), 4)))
+            for product_id, cost in zip(self.product_ids, costs)
+        }
+
+    def decimal_ingredient_costs(self) -> dict:
+        """
+        Compute every product's ingredient cost line by line with Decimal.
+
+        Uses the flattened waste-adjusted quantities of the loaded lines,
+        without querying again.
+
+        Returns:
+            dict mapping product id to Decimal ingredient cost per unit
+        """
+        totals = [Decimal('0')] * len(self.product_ids)
+        for row, column, effective_quantity in self.lines:
+            totals[row] += effective_quantity * self.decimal_prices[column]
+        return dict(zip(self.product_ids, totals))
+
+    def reconcile(self, tolerance=Decimal('0.5')) -> list:
+        """
+        Compare the vectorized costs against the Decimal path.
+
+        Args:
+            tolerance: Largest accepted difference per product, half a đồng by default
+
+        Returns:
+            list of dicts {product_id, vectorized, decimal, difference} for products
+            whose costs differ by more than the tolerance (empty when reconciled)
+        """
+        vectorized_costs = self.ingredient_costs()
+        mismatches = []
+        for product_id, decimal_cost in self.decimal_ingredient_costs().items():
+            difference = vectorized_costs[product_id] - decimal_cost
+            if abs(difference) > tolerance:
+                mismatches.append({
+                    'product_id': product_id,
+                    'vectorized': vectorized_costs[product_id],
+                    'decimal': decimal_cost,
+                    'difference': difference,
+                })
+        return mismatches
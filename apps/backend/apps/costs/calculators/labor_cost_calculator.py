@@ -6,12 +6,19 @@ from .base import BaseCostCalculator
 class LaborCostCalculator(BaseCostCalculator):
     """Calculator for labor costs based on production time and wage rates."""
 
-    def calculate(self, product, **kwargs):
+    def calculate(self, product, production_time=None, phases=None, hourly_rates=None, **kwargs):
         """
         Calculate total labor cost for a product using production time phases.
 
         Args:
             product: Product instance
+            production_time: Optional preloaded active ProductionTime. When omitted,
+                             the active ProductionTime is looked up.
+            phases: Optional preloaded phases of production_time. Passing phases
+                    without a production_time means the product has none.
+            hourly_rates: Optional dict mapping employee role to average fully
+                          loaded hourly rate. Roles missing from it cost nothing.
+                          Defaults to the cached LaborService rate snapshot.
             **kwargs: Unused, for interface compatibility
 
         Returns:
@@ -20,18 +27,25 @@ class LaborCostCalculator(BaseCostCalculator):
                   role, hourly_rate, phase_cost, cost_per_unit
         """
         # Get active ProductionTime for the product
-        production_time = LaborService.get_active_production_time(product)
+        if production_time is None and phases is None:
+            production_time = LaborService.get_active_production_time(product)
 
         if not production_time:
             return (Decimal('0'), [])
 
+        if phases is None:
+            phases = production_time.phases.all()
+
+        if hourly_rates is None:
+            hourly_rates = LaborService.get_hourly_rate_snapshot()
+
         total_labor_cost = Decimal('0')
         components_list = []
 
         # Process each production phase
-        for phase in production_time.phases.all():
+        for phase in phases:
             # Get average hourly rate for this phase's employee role
-            hourly_rate = LaborService.get_average_hourly_rate_by_role(phase.employee_role)
+            hourly_rate = hourly_rates.get(phase.employee_role, Decimal('0'))
 
             # Calculate phase cost (duration in hours * employees * hourly rate)
             duration_hours = Decimal(phase.duration_minutes) / Decimal('60')
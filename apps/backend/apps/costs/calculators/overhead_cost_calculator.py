@@ -1,14 +1,14 @@
 from decimal import Decimal
 from datetime import date
 from apps.overhead.services import OverheadService
-from apps.overhead.models import OverheadCategory, OverheadCost, MonthlyProductionVolume
 from .base import BaseCostCalculator
 
 
 class OverheadCostCalculator(BaseCostCalculator):
     """Calculator for overhead costs using various allocation methods."""
 
-    def calculate(self, product, month=None, year=None, ingredient_cost=Decimal('0'), labor_cost=Decimal('0'), **kwargs):
+    def calculate(self, product, month=None, year=None, ingredient_cost=Decimal('0'), labor_cost=Decimal('0'),
+                  overhead_context=None, **kwargs):
         """
         Calculate overhead cost per unit for a product using allocation methods.
 
@@ -18,6 +18,8 @@ class OverheadCostCalculator(BaseCostCalculator):
             year: Year, defaults to current year
             ingredient_cost: Ingredient cost per unit (for percentage_of_prime_cost calculation)
             labor_cost: Labor cost per unit (for percentage_of_prime_cost calculation)
+            overhead_context: Optional OverheadContext of the month. Defaults to the
+                              cached context from OverheadService.get_overhead_context.
             **kwargs: Unused, for interface compatibility
 
         Returns:
@@ -34,13 +36,15 @@ class OverheadCostCalculator(BaseCostCalculator):
         total_overhead_per_unit = Decimal('0')
         components_list = []
 
+        if overhead_context is None:
+            overhead_context = OverheadService.get_overhead_context(month, year)
+
+        category_costs = overhead_context.category_costs
+        total_units = overhead_context.total_units
+
         # Process each active overhead category
-        for category in OverheadCategory.objects.filter(is_active=True):
-            try:
-                cost_record = OverheadCost.objects.get(category=category, month=month, year=year)
-                category_cost = cost_record.amount
-            except OverheadCost.DoesNotExist:
-                category_cost = Decimal('0')
+        for category in overhead_context.categories:
+            category_cost = category_costs.get(category.id, Decimal('0'))
 
             allocation_amount = Decimal('0')
             allocation_details = {
@@ -49,12 +53,6 @@ class OverheadCostCalculator(BaseCostCalculator):
 
             # Calculate allocation based on method
             if category.allocation_method == 'per_unit_produced':
-                try:
-                    volume = MonthlyProductionVolume.objects.get(month=month, year=year)
-                    total_units = volume.total_units_produced
-                except MonthlyProductionVolume.DoesNotExist:
-                    total_units = Decimal('0')
-
                 if total_units > 0:
                     allocation_amount = category_cost / total_units
                     allocation_details['total_units'] = float(total_units)
@@ -0,0 +1,343 @@
+import calendar
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import QuerySet
+
+from apps.inventory.models import IngredientPriceHistory
+from apps.costs.metrics import CostRunProfiler, profile_stage
+from apps.labor.models import ProductionPhase, ProductionTime
+from apps.labor.services import LaborService
+from apps.overhead.services import OverheadService
+from apps.products.models import Product, BillOfMaterials, BOMLineItem
+from apps.products.services import RecipeCycleError
+
+
+def month_end(month, year) -> date:
+    """Last day of a month, or today for the current month."""
+    return min(date(year, month, calendar.monthrange(year, month)[1]), date.today())
+
+
+def last_months(months=12, end=None) -> list:
+    """
+    List (month, year) periods of the last N months, oldest first.
+
+    Args:
+        months: Number of months, including the end month
+        end: Date in the last month, defaults to today
+    """
+    end = end or date.today()
+    end_index = end.year * 12 + end.month - 1
+    return [
+        (index % 12 + 1, index // 12)
+        for index in range(end_index - months + 1, end_index + 1)
+    ]
+
+
+class _Timeline:
+    """Versions of one input sorted by effective date, resolved by bisection."""
+
+    def __init__(self, versions):
+        """
+        Args:
+            versions: Iterable of (effective_date, tiebreak, value); for equal
+                      dates the highest tiebreak wins
+        """
+        versions = sorted(versions, key=lambda version: (version[0], version[1]))
+        self.dates = [version[0] for version in versions]
+        self.values = [version[2] for version in versions]
+
+    def at(self, as_of, default=None):
+        """Value of the latest version effective on or before as_of."""
+        index = bisect_right(self.dates, as_of)
+        return self.values[index - 1] if index else default
+
+
+class PointInTimeInputs:
+    """
+    Calculator inputs of many products as they were on past dates.
+
+    Every BOM and production time version of the products, the price history
+    of their ingredients and the wages in effect over the whole date range are
+    loaded once, with a fixed number of queries (plus two per level of
+    sub-recipe nesting). Resolving the inputs of a product on a date is then a
+    bisection over effective dates in memory:
+
+    - BOM: latest non-draft version whose effective_date (or creation date,
+      when unset) is on or before the date; sub-recipes are resolved on the
+      same date and each is costed once per date
+    - Production time: latest version effective on or before the date
+    - Ingredient prices: latest IngredientPriceHistory on or before the date,
+      written by manual price updates and by receipts that move the weighted
+      average cost; before the first record its previous_cost, else the
+      current cost
+    - Wages: role averages of the wages whose effective range covers the date
+    """
+
+    def __init__(self, product_ids, dates):
+        """
+        Args:
+            product_ids: Iterable of product ids
+            dates: Iterable of dates inputs will be resolved for
+        """
+        product_ids = list(product_ids)
+
+        boms = defaultdict(list)
+        self.line_items_by_bom = defaultdict(list)
+        ingredients = {}
+        # Load the BOM versions of the products, then of the sub-recipes they use
+        pending = set(product_ids)
+        loaded = set()
+        while pending:
+            loaded |= pending
+            bom_ids = []
+            for bom in BillOfMaterials.objects.filter(product_id__in=pending).exclude(status='draft'):
+                effective_date = bom.effective_date or bom.created_at.date()
+                boms[bom.product_id].append((effective_date, bom.version, bom.pk))
+                bom_ids.append(bom.pk)
+
+            sub_product_ids = set()
+            for line_item in BOMLineItem.objects.filter(
+                bom_id__in=bom_ids
+            ).select_related('ingredient', 'sub_product').order_by('id'):
+                self.line_items_by_bom[line_item.bom_id].append(line_item)
+                if line_item.sub_product_id:
+                    sub_product_ids.add(line_item.sub_product_id)
+                else:
+                    ingredients[line_item.ingredient_id] = line_item.ingredient
+            pending = sub_product_ids - loaded
+        self.bom_timelines = {product_id: _Timeline(versions) for product_id, versions in boms.items()}
+        self._unit_costs = {}
+
+        production_times = defaultdict(list)
+        for production_time in ProductionTime.objects.filter(product_id__in=product_ids):
+            production_times[production_time.product_id].append(
+                (production_time.effective_date, production_time.version, production_time)
+            )
+        self.production_time_timelines = {
+            product_id: _Timeline(versions) for product_id, versions in production_times.items()
+        }
+
+        self.phases_by_production_time = defaultdict(list)
+        for phase in ProductionPhase.objects.filter(
+            production_time__product_id__in=product_ids
+        ).order_by('id'):
+            self.phases_by_production_time[phase.production_time_id].append(phase)
+
+        prices = defaultdict(list)
+        for price in IngredientPriceHistory.objects.filter(
+            ingredient_id__in=ingredients
+        ).order_by('effective_date', 'created_at', 'pk'):
+            prices[price.ingredient_id].append(price)
+
+        self.price_timelines = {}
+        self.opening_prices = {}
+        for ingredient_id, ingredient in ingredients.items():
+            history = prices.get(ingredient_id, [])
+            self.price_timelines[ingredient_id] = _Timeline(
+                (price.effective_date, index, price.cost_per_unit) for index, price in enumerate(history)
+            )
+            opening_price = history[0].previous_cost if history else None
+            self.opening_prices[ingredient_id] = (
+                opening_price if opening_price is not None else ingredient.current_cost_per_unit
+            )
+
+        self.hourly_rates = LaborService.get_average_hourly_rates_for_dates(dates)
+
+    def line_items(self, product_id, as_of) -> list:
+        """Line items of the BOM version of a product in effect on a date."""
+        bom_timeline = self.bom_timelines.get(product_id)
+        bom_id = bom_timeline.at(as_of) if bom_timeline else None
+        return self.line_items_by_bom[bom_id] if bom_id else []
+
+    def price(self, ingredient_id, as_of):
+        """Unit cost of an ingredient on a date."""
+        return self.price_timelines[ingredient_id].at(as_of, self.opening_prices[ingredient_id])
+
+    def unit_cost(self, product_id, as_of, using=()):
+        """
+        Ingredient cost per unit of a sub-recipe on a date, memoized per date.
+
+        Raises:
+            RecipeCycleError: If the sub-recipes in effect on the date form a cycle
+        """
+        key = (product_id, as_of)
+        if key not in self._unit_costs:
+            if product_id in using:
+                raise RecipeCycleError(using)
+            total_cost = Decimal('0')
+            for line_item in self.line_items(product_id, as_of):
+                if line_item.sub_product_id:
+                    unit_cost = self.unit_cost(line_item.sub_product_id, as_of, using + (product_id,))
+                else:
+                    unit_cost = self.price(line_item.ingredient_id, as_of)
+                total_cost += line_item.effective_quantity * unit_cost
+            self._unit_costs[key] = total_cost
+        return self._unit_costs[key]
+
+    def get(self, product_id, as_of) -> dict:
+        """
+        Resolve a product's calculator inputs on a date.
+
+        Args:
+            product_id: Product id
+            as_of: Date, one of the dates passed to the constructor
+
+        Returns:
+            dict: kwargs for SKUCostAggregator.compute_costs(), without overhead_context
+
+        Raises:
+            RecipeCycleError: If the sub-recipes in effect on the date form a cycle
+        """
+        line_items = self.line_items(product_id, as_of)
+
+        production_time_timeline = self.production_time_timelines.get(product_id)
+        production_time = production_time_timeline.at(as_of) if production_time_timeline else None
+
+        return {
+            'line_items': line_items,
+            'ingredient_prices': {
+                line_item.ingredient_id: self.price(line_item.ingredient_id, as_of)
+                for line_item in line_items
+                if line_item.ingredient_id
+            },
+            'sub_recipe_costs': {
+                line_item.sub_product_id: self.unit_cost(line_item.sub_product_id, as_of, (product_id,))
+                for line_item in line_items
+                if line_item.sub_product_id
+            },
+            'production_time': production_time,
+            'phases': self.phases_by_production_time[production_time.pk] if production_time else [],
+            'hourly_rates': self.hourly_rates[as_of],
+        }
+
+
+class PointInTimeCostEngine:
+    """
+    Read-only costing of SKUs as of past months.
+
+    Inputs are resolved with PointInTimeInputs as they were at the end of each
+    month (today for the current month), and overhead comes from that month's
+    OverheadContext. Nothing is written: the results are for audits and
+    comparisons and must not become the products' current cost. Margins use
+    the current selling price. Runs are profiled like BulkCostEngine runs.
+    """
+
+    def __init__(self, aggregator):
+        """
+        Args:
+            aggregator: SKUCostAggregator whose calculators are reused
+        """
+        self.aggregator = aggregator
+
+    def run(self, products=None, periods=None, include_details=False) -> dict:
+        """
+        Cost products for a list of months in one batch.
+
+        Args:
+            products: Optional Product queryset or iterable. Defaults to all active products.
+            periods: List of (month, year) tuples, defaults to the last 12 months
+            include_details: Include each cost's calculation_details
+
+        Returns:
+            dict: {periods, items, errors}. periods are {month, year, as_of}; each
+            item is {product_id, sku_code, name, costs} with one cost per period
+            the product could be costed for: {month, year, as_of, ingredient_cost,
+            labor_cost, overhead_cost, total_cost_per_unit, margin, margin_percentage}
+        """
+        periods = periods or last_months(12)
+
+        with CostRunProfiler('point_in_time') as profiler:
+            result = self._run(products, periods, include_details)
+
+        if result['items']:
+            profiler.save(
+                product_count=len(result['items']),
+                computed_count=sum(len(item['costs']) for item in result['items']),
+                failed_count=len(result['errors']),
+            )
+        return result
+
+    def _run(self, products, periods, include_details):
+        """Cost products for a list of months, see run()."""
+        as_of_dates = {(month, year): month_end(month, year) for month, year in periods}
+
+        if products is None:
+            products = Product.objects.filter(is_active=True)
+        elif not isinstance(products, QuerySet):
+            products = Product.objects.filter(pk__in=[product.pk for product in products])
+        with profile_stage('load_products'):
+            products = list(products.order_by('sku_code'))
+
+        with profile_stage('load_inputs'):
+            inputs = PointInTimeInputs([product.pk for product in products], as_of_dates.values())
+        with profile_stage('load_overhead'):
+            overhead_contexts = {
+                (month, year): OverheadService.get_overhead_context(month, year) for month, year in periods
+            }
+
+        items = []
+        errors = []
+        for product in products:
+            costs = []
+            for month, year in periods:
+                as_of = as_of_dates[(month, year)]
+                try:
+                    breakdown = self.aggregator.compute_costs(
+                        product, month, year,
+                        overhead_context=overhead_contexts[(month, year)],
+                        **inputs.get(product.pk, as_of)
+                    )
+                except Exception as e:
+                    errors.append({
+                        'product': str(product),
+                        'month': month,
+                        'year': year,
+                        'error': str(e)
+                    })
+                    continue
+
+                costs.append(self._cost_row(product, month, year, as_of, breakdown, include_details))
+
+            items.append({
+                'product_id': product.pk,
+                'sku_code': product.sku_code,
+                'name': product.name,
+                'costs': costs,
+            })
+
+        return {
+            'periods': [
+                {'month': month, 'year': year, 'as_of': as_of_dates[(month, year)]}
+                for month, year in periods
+            ],
+            'items': items,
+            'errors': errors,
+        }
+
+    @staticmethod
+    def _cost_row(product, month, year, as_of, breakdown, include_details) -> dict:
+        """Shape one compute_costs() breakdown with its margin."""
+        total_cost = breakdown['total_cost_per_unit']
+        margin = product.selling_price - total_cost
+
+        margin_percentage = Decimal('0')
+        if product.selling_price > 0:
+            margin_percentage = (margin / product.selling_price) * 100
+
+        row = {
+            'month': month,
+            'year': year,
+            'as_of': as_of,
+            'ingredient_cost': breakdown['ingredient_cost'],
+            'labor_cost': breakdown['labor_cost'],
+            'overhead_cost': breakdown['overhead_cost'],
+            'total_cost_per_unit': total_cost,
+            'margin': margin,
+            'margin_percentage': margin_percentage,
+        }
+        if include_details:
+            row['calculation_details'] = breakdown['calculation_details']
+        return row
@@ -1,11 +1,14 @@
+import hashlib
+import json
 from decimal import Decimal
 from datetime import date
 from django.db import transaction, models
-from apps.products.models import Product
+from apps.costs.metrics import profile_stage
 from apps.costs.models import SKUCost, CostComponent, InflationTracking
 from .ingredient_cost_calculator import IngredientCostCalculator
 from .labor_cost_calculator import LaborCostCalculator
 from .overhead_cost_calculator import OverheadCostCalculator
+from .bulk_cost_engine import BulkCostEngine
 
 
 class SKUCostAggregator:
@@ -18,19 +21,24 @@ class SKUCostAggregator:
         self.overhead_calculator = OverheadCostCalculator()
 
     @transaction.atomic
-    def calculate_sku_cost(self, product, month=None, year=None, calculated_by='system', notes=''):
+    def calculate_sku_cost(self, product, month=None, year=None, calculated_by='system', notes='', force=False):
         """
         Calculate and create a complete SKUCost record with all components.
 
+        When the calculation inputs are identical to those of the latest version
+        (same input fingerprint), nothing is written and the latest version is
+        returned instead.
+
         Args:
             product: Product instance to calculate cost for
             month: Month (1-12), defaults to current month
             year: Year, defaults to current year
             calculated_by: Username or identifier of who triggered the calculation
             notes: Optional notes about the calculation
+            force: Create a new version even if the inputs are unchanged
 
         Returns:
-            SKUCost: The newly created SKUCost instance
+            SKUCost: The newly created SKUCost instance, or the latest one if unchanged
         """
         # Use current month/year if not provided
         if month is None or year is None:
@@ -38,26 +46,18 @@ class SKUCostAggregator:
             month = month or today.month
             year = year or today.year
 
-        # Step 1: Calculate ingredient cost
-        ingredient_cost, ingredient_components = self.ingredient_calculator.calculate(product)
-
-        # Step 2: Calculate labor cost
-        labor_cost, labor_components = self.labor_calculator.calculate(product)
-
-        # Step 3: Calculate overhead cost
-        overhead_cost, overhead_components = self.overhead_calculator.calculate(
-            product,
-            month=month,
-            year=year,
-            ingredient_cost=ingredient_cost,
-            labor_cost=labor_cost
-        )
-
-        # Step 4: Calculate total cost
-        total_cost_per_unit = ingredient_cost + labor_cost + overhead_cost
+        # Step 1: Load every calculator input and fingerprint it
+        inputs = BulkCostEngine.load_inputs([product], month, year)[product.pk]
+        input_fingerprint = self.fingerprint_inputs(month, year, **inputs)
 
-        # Step 5: Get previous SKUCost version for comparison
+        # Step 2: Get previous SKUCost version, which is kept if nothing changed
         previous_sku_cost = product.sku_costs.first()
+        if not force and previous_sku_cost and previous_sku_cost.input_fingerprint == input_fingerprint:
+            return previous_sku_cost
+
+        # Steps 3-5: Calculate ingredient, labor, overhead and total cost
+        breakdown = self.compute_costs(product, month, year, **inputs)
+        breakdown['input_fingerprint'] = input_fingerprint
 
         # Step 6: Determine new version number
         latest_version = product.sku_costs.aggregate(
@@ -66,6 +66,143 @@ class SKUCostAggregator:
         new_version = latest_version + 1
 
         # Step 7: Create SKUCost record with calculation details
+        sku_cost = self.build_sku_cost(
+            product,
+            new_version,
+            breakdown,
+            calculated_by=calculated_by,
+            notes=notes,
+        )
+        sku_cost.save()
+
+        # Step 8: Create CostComponent records for each component
+        CostComponent.objects.bulk_create(self.build_cost_components(sku_cost))
+
+        # Step 9: Create InflationTracking record if previous version exists
+        if previous_sku_cost:
+            self._create_inflation_tracking(sku_cost, previous_sku_cost)
+
+        return sku_cost
+
+    @staticmethod
+    def fingerprint_inputs(month, year, line_items=(), production_time=None, phases=(), hourly_rates=None,
+                           overhead_context=None, ingredient_prices=None, sub_recipe_costs=None, **kwargs):
+        """
+        Hash every value a cost calculation reads.
+
+        Covers BOM line quantities and waste, ingredient and sub-recipe unit costs, the batch
+        size, phase durations, headcounts and role rates, overhead categories with
+        their monthly amounts, the production volume and the month itself. Equal
+        inputs always give the same fingerprint, so an unchanged SKU can be skipped
+        before anything is computed.
+
+        Args:
+            month: Month (1-12)
+            year: Year
+            line_items, production_time, phases, hourly_rates, overhead_context, ingredient_prices,
+            sub_recipe_costs:
+                Inputs as returned by BulkCostEngine.load_inputs()
+
+        Returns:
+            str: Hex SHA-256 digest
+        """
+        def canonical(value):
+            # 22000 and 22000.0000 must hash alike
+            return format(Decimal(value or 0).normalize(), 'f')
+
+        hourly_rates = hourly_rates or {}
+        ingredient_prices = ingredient_prices or {}
+        sub_recipe_costs = sub_recipe_costs or {}
+        categories = overhead_context.categories if overhead_context else ()
+        category_costs = overhead_context.category_costs if overhead_context else {}
+        total_units = overhead_context.total_units if overhead_context else Decimal('0')
+
+        payload = {
+            'month': month,
+            'year': year,
+            'ingredients': [
+                [
+                    line_item.ingredient_id,
+                    canonical(line_item.quantity_per_unit),
+                    canonical(line_item.waste_percentage),
+                    canonical(ingredient_prices.get(
+                        line_item.ingredient_id, line_item.ingredient.current_cost_per_unit
+                    )),
+                ]
+                for line_item in line_items
+                if not line_item.sub_product_id
+            ],
+            'batch_size': production_time.batch_size if production_time else None,
+            'phases': [
+                [
+                    phase.phase,
+                    canonical(phase.duration_minutes),
+                    phase.employees_required,
+                    phase.employee_role,
+                    canonical(hourly_rates.get(phase.employee_role)),
+                ]
+                for phase in (phases if production_time else [])
+            ],
+            'overhead': [
+                [
+                    category.id,
+                    category.allocation_method,
+                    canonical(category.allocation_percentage),
+                    canonical(category_costs.get(category.id)),
+                ]
+                for category in categories
+            ],
+            'total_units': canonical(total_units),
+        }
+        # Only present with sub-recipes, so fingerprints of flat recipes are unchanged
+        sub_recipes = [
+            [
+                line_item.sub_product_id,
+                canonical(line_item.quantity_per_unit),
+                canonical(line_item.waste_percentage),
+                canonical(sub_recipe_costs.get(line_item.sub_product_id)),
+            ]
+            for line_item in line_items
+            if line_item.sub_product_id
+        ]
+        if sub_recipes:
+            payload['sub_recipes'] = sub_recipes
+
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def compute_costs(self, product, month, year, **inputs):
+        """
+        Run the three calculators for a product without writing anything.
+
+        Args:
+            product: Product instance
+            month: Month (1-12)
+            year: Year
+            **inputs: Optional preloaded calculator inputs (line_items, production_time,
+                      phases, hourly_rates, overhead_context, ingredient_prices,
+                      sub_recipe_costs).
+                      Anything omitted is looked up by the calculators.
+
+        Returns:
+            dict: {ingredient_cost, labor_cost, overhead_cost, total_cost_per_unit,
+                   calculation_details}
+        """
+        with profile_stage('ingredient_calculator'):
+            ingredient_cost, ingredient_components = self.ingredient_calculator.calculate(product, **inputs)
+
+        with profile_stage('labor_calculator'):
+            labor_cost, labor_components = self.labor_calculator.calculate(product, **inputs)
+
+        with profile_stage('overhead_calculator'):
+            overhead_cost, overhead_components = self.overhead_calculator.calculate(
+                product,
+                month=month,
+                year=year,
+                ingredient_cost=ingredient_cost,
+                labor_cost=labor_cost,
+                **inputs
+            )
+
         calculation_details = {
             'month': month,
             'year': year,
@@ -74,26 +211,80 @@ class SKUCostAggregator:
             'overhead_components': overhead_components,
         }
 
-        sku_cost = SKUCost.objects.create(
+        sub_product_ids = [
+            component['sub_product_id'] for component in ingredient_components if 'sub_product_id' in component
+        ]
+        if sub_product_ids:
+            # Sub-recipes are costed at their ingredient cost only: the labor of
+            # their own production time and their overhead are not rolled in
+            calculation_details['sub_recipes'] = {
+                'product_ids': sub_product_ids,
+                'includes': ['ingredient'],
+                'excludes': ['labor', 'overhead'],
+            }
+
+        return {
+            'ingredient_cost': ingredient_cost,
+            'labor_cost': labor_cost,
+            'overhead_cost': overhead_cost,
+            'total_cost_per_unit': ingredient_cost + labor_cost + overhead_cost,
+            'calculation_details': calculation_details,
+        }
+
+    @staticmethod
+    def build_sku_cost(product, version, breakdown, calculated_by='system', notes=''):
+        """
+        Build an unsaved SKUCost from a compute_costs() breakdown.
+
+        Args:
+            product: Product instance
+            version: Version number for the new record
+            breakdown: Dict returned by compute_costs(), optionally with an
+                       'input_fingerprint' from fingerprint_inputs()
+            calculated_by: Username or identifier of who triggered the calculation
+            notes: Optional notes about the calculation
+
+        Returns:
+            SKUCost: Unsaved SKUCost instance
+        """
+        sku_cost = SKUCost(
             product=product,
-            version=new_version,
+            version=version,
             status='calculated',
-            ingredient_cost=ingredient_cost,
-            labor_cost=labor_cost,
-            overhead_cost=overhead_cost,
-            total_cost_per_unit=total_cost_per_unit,
-            calculation_details=calculation_details,
+            ingredient_cost=breakdown['ingredient_cost'],
+            labor_cost=breakdown['labor_cost'],
+            overhead_cost=breakdown['overhead_cost'],
+            total_cost_per_unit=breakdown['total_cost_per_unit'],
+            calculation_details=breakdown['calculation_details'],
+            input_fingerprint=breakdown.get('input_fingerprint', ''),
             calculated_by=calculated_by,
             notes=notes,
         )
+        # bulk_create() bypasses save(), so fill the stored margin fields here
+        sku_cost.update_derived_fields(product.selling_price)
+        return sku_cost
+
+    @staticmethod
+    def build_cost_components(sku_cost):
+        """
+        Build unsaved CostComponent records from a SKUCost's calculation details.
+
+        Args:
+            sku_cost: Saved SKUCost instance
+
+        Returns:
+            list: Unsaved CostComponent instances
+        """
+        total_cost_per_unit = sku_cost.total_cost_per_unit
+        details = sku_cost.calculation_details
 
-        # Step 8: Create CostComponent records for each component
         all_components = [
-            ('ingredient', ingredient_components),
-            ('labor', labor_components),
-            ('overhead', overhead_components),
+            ('ingredient', details.get('ingredient_components', [])),
+            ('labor', details.get('labor_components', [])),
+            ('overhead', details.get('overhead_components', [])),
         ]
 
+        cost_components = []
         for component_type, components in all_components:
             for component_data in components:
                 # Extract amount based on component type
@@ -112,20 +303,16 @@ class SKUCostAggregator:
                 if total_cost_per_unit > 0:
                     percentage_of_total = (amount / total_cost_per_unit) * 100
 
-                CostComponent.objects.create(
+                cost_components.append(CostComponent(
                     sku_cost=sku_cost,
                     component_type=component_type,
                     name=name,
                     amount=amount,
                     percentage_of_total=percentage_of_total,
                     details=component_data,
-                )
+                ))
 
-        # Step 9: Create InflationTracking record if previous version exists
-        if previous_sku_cost:
-            self._create_inflation_tracking(sku_cost, previous_sku_cost)
-
-        return sku_cost
+        return cost_components
 
     @staticmethod
     def _create_inflation_tracking(sku_cost, previous_sku_cost):
@@ -136,6 +323,22 @@ class SKUCostAggregator:
             sku_cost: Current SKUCost instance
             previous_sku_cost: Previous SKUCost instance for comparison
         """
+        inflation_tracking = SKUCostAggregator.build_inflation_tracking(sku_cost, previous_sku_cost)
+        inflation_tracking.save()
+        return inflation_tracking
+
+    @staticmethod
+    def build_inflation_tracking(sku_cost, previous_sku_cost):
+        """
+        Build an unsaved InflationTracking record comparing current and previous SKUCost.
+
+        Args:
+            sku_cost: Current SKUCost instance
+            previous_sku_cost: Previous SKUCost instance for comparison
+
+        Returns:
+            InflationTracking: Unsaved InflationTracking instance
+        """
         # Calculate cost changes
         ingredient_change = sku_cost.ingredient_cost - previous_sku_cost.ingredient_cost
         ingredient_change_pct = Decimal('0')
@@ -157,8 +360,7 @@ class SKUCostAggregator:
         if previous_sku_cost.total_cost_per_unit > 0:
             total_change_pct = (total_change / previous_sku_cost.total_cost_per_unit) * 100
 
-        # Create inflation tracking record
-        InflationTracking.objects.create(
+        return InflationTracking(
             sku_cost=sku_cost,
             previous_sku_cost=previous_sku_cost,
             ingredient_cost_change=ingredient_change,
@@ -175,40 +377,22 @@ class SKUCostAggregator:
         """
         Recalculate SKU costs for all active products.
 
+        Inputs are loaded once for the whole run and results are written in bulk
+        (see BulkCostEngine), so the query count does not grow with the catalogue.
+        Products whose inputs are unchanged since their latest version are skipped.
+
         Args:
             month: Month (1-12), defaults to current month
             year: Year, defaults to current year
             calculated_by: Username or identifier of who triggered the calculation
 
         Returns:
-            dict: Summary of recalculation {total_products, success_count, errors}
-        """
-        # Get all active products
-        active_products = Product.objects.filter(is_active=True)
-
-        total_products = active_products.count()
-        success_count = 0
-        errors = []
-
-        for product in active_products:
-            try:
-                self.calculate_sku_cost(
-                    product,
-                    month=month,
-                    year=year,
-                    calculated_by=calculated_by,
-                    notes=f'Bulk recalculation'
-                )
-                success_count += 1
-            except Exception as e:
-                errors.append({
-                    'product': str(product),
-                    'error': str(e)
-                })
-
-        return {
-            'total_products': total_products,
-            'success_count': success_count,
-            'failed_count': total_products - success_count,
-            'errors': errors,
-        }
+            dict: Summary of recalculation {total_products, success_count, skipped_count,
+                  failed_count, errors}
+        """
+        return BulkCostEngine(self).run(
+            month=month,
+            year=year,
+            calculated_by=calculated_by,
+            notes='Bulk recalculation'
+        )
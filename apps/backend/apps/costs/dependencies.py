@@ -0,0 +1,175 @@
+from django.db import transaction
+from django.db.models import Q
+
+from apps.labor.models import ProductionPhase
+from apps.labor.services import LaborService
+from apps.overhead.models import OverheadCategory
+from apps.products.models import Product
+from apps.products.services import RecipeGraph
+from .models import CostDependency
+
+
+class CostDependencyService:
+    """
+    Service maintaining the input -> product cost dependency index.
+
+    A product's active cost depends on the ingredients of its active BOM and of
+    its sub-recipes' active BOMs, the sub-recipes themselves, the production time
+    in use and the employee roles of its phases, and every active overhead
+    category. Only active products are indexed.
+    """
+
+    @staticmethod
+    def collect_dependencies(product_ids) -> dict:
+        """
+        Resolve the dependencies of many products with a fixed number of queries.
+
+        Args:
+            product_ids: Iterable of product ids
+
+        Returns:
+            dict mapping product id to a set of (dependency_type, object_key) tuples
+        """
+        product_ids = list(Product.objects.filter(
+            pk__in=list(product_ids),
+            is_active=True
+        ).values_list('pk', flat=True))
+
+        dependencies = {product_id: set() for product_id in product_ids}
+        if not product_ids:
+            return dependencies
+
+        # Sub-recipes and the ingredients of each active BOM, nested ones included
+        recipes = RecipeGraph.load(product_ids)
+        for product_id in product_ids:
+            sub_product_ids = recipes.reachable(product_id)
+            for sub_product_id in sub_product_ids:
+                dependencies[product_id].add(('sub_recipe', str(sub_product_id)))
+            for recipe_id in sub_product_ids | {product_id}:
+                for line_item in recipes.line_items_by_product[recipe_id]:
+                    if line_item.ingredient_id:
+                        dependencies[product_id].add(('ingredient', str(line_item.ingredient_id)))
+
+        # Active production time and the roles of its phases
+        production_times = LaborService.get_active_production_times(product_ids)
+        product_by_production_time = {}
+        for product_id, production_time in production_times.items():
+            product_by_production_time[production_time.pk] = product_id
+            dependencies[product_id].add(('production_time', str(production_time.pk)))
+        for production_time_id, role in ProductionPhase.objects.filter(
+            production_time_id__in=product_by_production_time.keys()
+        ).values_list('production_time_id', 'employee_role'):
+            dependencies[product_by_production_time[production_time_id]].add(('employee_role', role))
+
+        # Every active overhead category is allocated to every product
+        for category_id in OverheadCategory.objects.filter(is_active=True).values_list('pk', flat=True):
+            for product_dependencies in dependencies.values():
+                product_dependencies.add(('overhead_category', str(category_id)))
+
+        return dependencies
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild_for_products(product_ids) -> int:
+        """
+        Replace the index rows of the given products.
+
+        Args:
+            product_ids: Iterable of product ids
+
+        Returns:
+            Number of index rows written
+        """
+        product_ids = list(product_ids)
+        dependencies = CostDependencyService.collect_dependencies(product_ids)
+
+        CostDependency.objects.filter(product_id__in=product_ids).delete()
+        rows = CostDependency.objects.bulk_create([
+            CostDependency(
+                product_id=product_id,
+                dependency_type=dependency_type,
+                object_key=object_key,
+            )
+            for product_id, product_dependencies in dependencies.items()
+            for dependency_type, object_key in product_dependencies
+        ])
+        return len(rows)
+
+    @staticmethod
+    def with_dependents(product_ids) -> list:
+        """
+        Add the products using any of the given products as a sub-recipe.
+
+        Args:
+            product_ids: Iterable of product ids
+
+        Returns:
+            list of the given product ids followed by their indexed dependents
+        """
+        product_ids = list(product_ids)
+        dependents = CostDependency.objects.filter(
+            dependency_type='sub_recipe',
+            object_key__in=[str(product_id) for product_id in product_ids],
+        ).exclude(product_id__in=product_ids).values_list('product_id', flat=True).distinct()
+        return product_ids + list(dependents)
+
+    @staticmethod
+    def rebuild_all() -> int:
+        """
+        Rebuild the whole index from current BOMs, production times and categories.
+
+        Returns:
+            Number of index rows written
+        """
+        return CostDependencyService.rebuild_for_products(
+            Product.objects.values_list('pk', flat=True)
+        )
+
+    @staticmethod
+    @transaction.atomic
+    def refresh_overhead_category(category: OverheadCategory) -> None:
+        """
+        Update the index after an overhead category is created, toggled or deleted.
+
+        Args:
+            category: OverheadCategory instance
+        """
+        CostDependency.objects.filter(
+            dependency_type='overhead_category',
+            object_key=str(category.pk)
+        ).delete()
+
+        if category.is_active and OverheadCategory.objects.filter(pk=category.pk).exists():
+            CostDependency.objects.bulk_create([
+                CostDependency(
+                    product_id=product_id,
+                    dependency_type='overhead_category',
+                    object_key=str(category.pk),
+                )
+                for product_id in Product.objects.filter(is_active=True).values_list('pk', flat=True)
+            ])
+
+    @staticmethod
+    def get_affected_products(dependency_type: str, object_key):
+        """
+        Get the products whose active cost depends on an input.
+
+        Args:
+            dependency_type: One of CostDependency.DEPENDENCY_TYPE_CHOICES
+            object_key: Ingredient/category/production time/sub-recipe product id,
+                        or employee role, or a list of them
+
+        Returns:
+            QuerySet of Product instances, each at most once
+        """
+        if isinstance(object_key, (list, tuple, set)):
+            keys = Q(object_key__in=[str(key) for key in object_key])
+        else:
+            keys = Q(object_key=str(object_key))
+
+        return Product.objects.filter(
+            pk__in=CostDependency.objects.filter(
+                keys,
+                dependency_type=dependency_type,
+            ).values('product_id')
+        )
@@ -0,0 +1,58 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.costs.queue import CostRecalculationQueue
+
+
+class Command(BaseCommand):
+    help = 'Recalculates queued product costs once their debounce window has passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the currently due requests and exit',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Seconds to sleep between polls when the queue is idle (default: 2)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=500,
+            help='Maximum number of requests to process per batch (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            self._process(options['limit'])
+            return
+
+        self.stdout.write('Waiting for cost recalculation requests...')
+        try:
+            while True:
+                result = self._process(options['limit'])
+                if result['claimed_count'] < options['limit']:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
+
+    def _process(self, limit):
+        result = CostRecalculationQueue.process_due(limit=limit)
+        if result['claimed_count']:
+            self.stdout.write(self.style.SUCCESS(
+                f"✓ Recalculated {result['success_count']}/{result['claimed_count']} queued product costs"
+            ))
+            for error in result['errors']:
+                self.stderr.write(f"  {error}")
+            if result['dead_lettered_count']:
+                self.stderr.write(self.style.ERROR(
+                    f"✗ Gave up on {result['dead_lettered_count']} products after "
+                    f"{settings.COST_RECALC_MAX_ATTEMPTS} failed attempts"
+                ))
+        return result
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.costs.dependencies import CostDependencyService
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the ingredient/role/overhead/production time -> product cost dependency index'
+
+    def handle(self, *args, **options):
+        row_count = CostDependencyService.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f'✓ Indexed {row_count} cost dependencies'))
@@ -0,0 +1,84 @@
+import cProfile
+import io
+import pstats
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.costs.calculators import BulkCostEngine, SKUCostAggregator
+from apps.products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recalculates product costs in one bulk run and prints per-stage timings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', type=int, help='Month (1-12), defaults to the current month')
+        parser.add_argument('--year', type=int, help='Year, defaults to the current year')
+        parser.add_argument(
+            '--sku',
+            action='append',
+            default=[],
+            help='SKU code to recalculate (repeatable), defaults to all active products',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Create new versions even for products whose inputs are unchanged',
+        )
+        parser.add_argument(
+            '--profile',
+            nargs='?',
+            const='',
+            metavar='PATH',
+            help='Run under cProfile and dump the stats to PATH (default: cost_run_<timestamp>.prof)',
+        )
+
+    def handle(self, *args, **options):
+        products = None
+        if options['sku']:
+            products = Product.objects.filter(sku_code__in=options['sku'])
+            missing = set(options['sku']) - set(products.values_list('sku_code', flat=True))
+            if missing:
+                raise CommandError(f"Unknown SKU codes: {', '.join(sorted(missing))}")
+
+        engine = BulkCostEngine(SKUCostAggregator())
+        run_kwargs = {
+            'products': products,
+            'month': options['month'],
+            'year': options['year'],
+            'calculated_by': 'recalculate_costs',
+            'notes': 'Command recalculation',
+            'force': options['force'],
+        }
+
+        if options['profile'] is None:
+            result = engine.run(**run_kwargs)
+        else:
+            path = options['profile'] or f"cost_run_{timezone.now():%Y%m%d_%H%M%S}.prof"
+            profiler = cProfile.Profile()
+            result = profiler.runcall(engine.run, **run_kwargs)
+            profiler.dump_stats(path)
+
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(15)
+            self.stdout.write(stream.getvalue())
+            self.stdout.write(f'Profile written to {path}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Recalculated {result['success_count']}/{result['total_products']} products "
+            f"({result['skipped_count']} unchanged, {result['failed_count']} failed)"
+        ))
+        for error in result['errors']:
+            self.stderr.write(f"  {error['product']}: {error['error']}")
+
+        metrics = engine.last_metrics
+        if metrics:
+            self.stdout.write(
+                f'{metrics.duration_ms:.1f} ms, {metrics.query_count} queries, {metrics.rows_written} rows written'
+            )
+            for name, stats in metrics.stages.items():
+                self.stdout.write(
+                    f"  {name:<24} {stats['duration_ms']:>10.1f} ms {stats['queries']:>6} queries "
+                    f"{stats['rows']:>7} rows {stats['calls']:>7} calls"
+                )
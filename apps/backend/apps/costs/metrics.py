@@ -0,0 +1,179 @@
+import math
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+
+from .models import CostRunMetrics
+
+_active_profiler = ContextVar('cost_run_profiler', default=None)
+
+
+class CostRunProfiler:
+    """
+    Collects wall time, DB query count and rows written per stage of a cost run.
+
+    While a profiler is active (inside its with block), profile_stage() and
+    record_rows() calls anywhere down the call stack add to it; without one
+    they do nothing, so instrumented code needs no profiler argument. Stages
+    entered repeatedly, like the per-product calculators, accumulate.
+    Queries are counted with a connection execute wrapper, so counts do not
+    depend on DEBUG.
+    """
+
+    def __init__(self, run_type):
+        """
+        Args:
+            run_type: One of CostRunMetrics.RUN_TYPE_CHOICES
+        """
+        self.run_type = run_type
+        self.stages = defaultdict(lambda: {'duration_ms': 0.0, 'queries': 0, 'rows': 0, 'calls': 0})
+        self.query_count = 0
+        self.duration_ms = 0.0
+
+    def __enter__(self):
+        self._token = _active_profiler.set(self)
+        self._query_counter = connection.execute_wrapper(self._count_query)
+        self._query_counter.__enter__()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        self._query_counter.__exit__(*exc_info)
+        _active_profiler.reset(self._token)
+        return False
+
+    def _count_query(self, execute, sql, params, many, context):
+        self.query_count += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def stage(self, name):
+        """Measure a block as (part of) a stage."""
+        stats = self.stages[name]
+        started = time.perf_counter()
+        query_count = self.query_count
+        try:
+            yield stats
+        finally:
+            stats['duration_ms'] += (time.perf_counter() - started) * 1000
+            stats['queries'] += self.query_count - query_count
+            stats['calls'] += 1
+
+    def save(self, product_count=0, computed_count=0, skipped_count=0, failed_count=0, month=None, year=None,
+             calculated_by='') -> CostRunMetrics:
+        """
+        Store the run's figures and drop runs beyond COST_RUN_METRICS_KEEP.
+
+        Returns:
+            The created CostRunMetrics
+        """
+        metrics = CostRunMetrics.objects.create(
+            run_type=self.run_type,
+            calculated_by=calculated_by[:100],
+            month=month,
+            year=year,
+            product_count=product_count,
+            computed_count=computed_count,
+            skipped_count=skipped_count,
+            failed_count=failed_count,
+            duration_ms=self.duration_ms,
+            query_count=self.query_count,
+            rows_written=sum(stats['rows'] for stats in self.stages.values()),
+            stages={
+                name: {**stats, 'duration_ms': round(stats['duration_ms'], 3)}
+                for name, stats in self.stages.items()
+            },
+        )
+
+        # Rotate: keep only the most recent runs
+        CostRunMetrics.objects.filter(pk__lte=metrics.pk - settings.COST_RUN_METRICS_KEEP).delete()
+        return metrics
+
+
+@contextmanager
+def profile_stage(name):
+    """Measure a block as a stage of the active CostRunProfiler, if any."""
+    profiler = _active_profiler.get()
+    if profiler is None:
+        yield None
+        return
+    with profiler.stage(name) as stats:
+        yield stats
+
+
+def record_rows(name, count):
+    """Add rows written to a stage of the active CostRunProfiler, if any."""
+    profiler = _active_profiler.get()
+    if profiler is not None:
+        profiler.stages[name]['rows'] += count
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers, None when empty."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(math.ceil(pct / 100 * len(values)) - 1, 0)]
+
+
+class CostRunMetricsService:
+    """Service summarizing recorded cost run metrics."""
+
+    @staticmethod
+    def get_summary(run_type=None, limit=200) -> dict:
+        """
+        Get p50/p95 figures of the most recent cost runs, overall and per stage.
+
+        Args:
+            run_type: Optional run type to filter on
+            limit: Number of most recent runs to summarize
+
+        Returns:
+            dict: {run_count, totals, stages, recent_runs}. totals maps duration_ms,
+            query_count and rows_written to {p50, p95}; stages maps each stage to
+            {duration_ms, queries, rows}, each {p50, p95}, over the runs that had
+            the stage.
+        """
+        runs = CostRunMetrics.objects.all()
+        if run_type:
+            runs = runs.filter(run_type=run_type)
+        runs = list(runs.order_by('-created_at', '-pk')[:limit])
+
+        def summarize(values):
+            return {'p50': percentile(values, 50), 'p95': percentile(values, 95)}
+
+        stage_values = defaultdict(lambda: defaultdict(list))
+        for run in runs:
+            for name, stats in run.stages.items():
+                for key in ('duration_ms', 'queries', 'rows'):
+                    stage_values[name][key].append(stats.get(key, 0))
+
+        return {
+            'run_count': len(runs),
+            'totals': {
+                key: summarize([getattr(run, key) for run in runs])
+                for key in ('duration_ms', 'query_count', 'rows_written')
+            },
+            'stages': {
+                name: {key: summarize(values) for key, values in stage_values[name].items()}
+                for name in sorted(stage_values)
+            },
+            'recent_runs': [
+                {
+                    'id': run.pk,
+                    'run_type': run.run_type,
+                    'created_at': run.created_at.isoformat(),
+                    'product_count': run.product_count,
+                    'computed_count': run.computed_count,
+                    'duration_ms': run.duration_ms,
+                    'query_count': run.query_count,
+                    'rows_written': run.rows_written,
+                }
+                for run in runs[:20]
+            ],
+        }
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_cost_dependencies(apps, schema_editor):
+    """Index the current dependencies of every active product."""
+    Product = apps.get_model('products', 'Product')
+    BillOfMaterials = apps.get_model('products', 'BillOfMaterials')
+    BOMLineItem = apps.get_model('products', 'BOMLineItem')
+    ProductionTime = apps.get_model('labor', 'ProductionTime')
+    ProductionPhase = apps.get_model('labor', 'ProductionPhase')
+    OverheadCategory = apps.get_model('overhead', 'OverheadCategory')
+    CostDependency = apps.get_model('costs', 'CostDependency')
+
+    product_ids = list(Product.objects.filter(is_active=True).values_list('pk', flat=True))
+    dependencies = {product_id: set() for product_id in product_ids}
+
+    active_bom_ids = {}
+    for bom_id, product_id in BillOfMaterials.objects.filter(
+        product_id__in=product_ids, status='active'
+    ).order_by('product_id', '-version').values_list('id', 'product_id'):
+        active_bom_ids.setdefault(product_id, bom_id)
+    product_by_bom = {bom_id: product_id for product_id, bom_id in active_bom_ids.items()}
+    for bom_id, ingredient_id in BOMLineItem.objects.filter(
+        bom_id__in=product_by_bom.keys()
+    ).values_list('bom_id', 'ingredient_id'):
+        dependencies[product_by_bom[bom_id]].add(('ingredient', str(ingredient_id)))
+
+    active_production_time_ids = {}
+    for production_time_id, product_id in ProductionTime.objects.filter(
+        product_id__in=product_ids
+    ).order_by('product_id', '-effective_date').values_list('id', 'product_id'):
+        active_production_time_ids.setdefault(product_id, production_time_id)
+    product_by_production_time = {}
+    for product_id, production_time_id in active_production_time_ids.items():
+        product_by_production_time[production_time_id] = product_id
+        dependencies[product_id].add(('production_time', str(production_time_id)))
+    for production_time_id, role in ProductionPhase.objects.filter(
+        production_time_id__in=product_by_production_time.keys()
+    ).values_list('production_time_id', 'employee_role'):
+        dependencies[product_by_production_time[production_time_id]].add(('employee_role', role))
+
+    for category_id in OverheadCategory.objects.filter(is_active=True).values_list('pk', flat=True):
+        for product_dependencies in dependencies.values():
+            product_dependencies.add(('overhead_category', str(category_id)))
+
+    CostDependency.objects.bulk_create([
+        CostDependency(product_id=product_id, dependency_type=dependency_type, object_key=object_key)
+        for product_id, product_dependencies in dependencies.items()
+        for dependency_type, object_key in product_dependencies
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costs', '0001_initial'),
+        ('labor', '0001_initial'),
+        ('overhead', '0001_initial'),
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CostDependency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('dependency_type', models.CharField(choices=[('ingredient', 'Ingredient'), ('employee_role', 'Employee Role'), ('overhead_category', 'Overhead Category'), ('production_time', 'Production Time')], max_length=30)),
+                ('object_key', models.CharField(help_text='Ingredient, overhead category or production time id, or employee role', max_length=50)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_dependencies', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Cost Dependency',
+                'verbose_name_plural': 'Cost Dependencies',
+                'indexes': [models.Index(fields=['dependency_type', 'object_key'], name='costs_costd_depende_95a85b_idx')],
+                'unique_together': {('product', 'dependency_type', 'object_key')},
+            },
+        ),
+        migrations.RunPython(populate_cost_dependencies, migrations.RunPython.noop),
+    ]
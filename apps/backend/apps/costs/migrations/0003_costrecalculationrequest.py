@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costs', '0002_costdependency'),
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CostRecalculationRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('month', models.PositiveIntegerField()),
+                ('year', models.PositiveIntegerField()),
+                ('run_after', models.DateTimeField(db_index=True, help_text='Earliest time the worker may recalculate (debounce window)')),
+                ('calculated_by', models.CharField(default='system', max_length=100)),
+                ('notes', models.TextField(blank=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_recalculation_requests', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Cost Recalculation Request',
+                'verbose_name_plural': 'Cost Recalculation Requests',
+                'ordering': ['run_after'],
+                'unique_together': {('product', 'month', 'year')},
+            },
+        ),
+    ]
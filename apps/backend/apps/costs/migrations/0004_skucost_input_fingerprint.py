@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costs', '0003_costrecalculationrequest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='skucost',
+            name='input_fingerprint',
+            field=models.CharField(blank=True, help_text='Hash of the calculation inputs; unchanged inputs do not create a new version', max_length=64),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:52
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def populate_stored_margins(apps, schema_editor):
+    """Fill the new percentage and margin columns of existing SKU costs."""
+    SKUCost = apps.get_model('costs', 'SKUCost')
+
+    sku_costs = list(SKUCost.objects.select_related('product'))
+    for sku_cost in sku_costs:
+        total = sku_cost.total_cost_per_unit
+        selling_price = sku_cost.product.selling_price
+        if total > 0:
+            sku_cost.ingredient_percentage = sku_cost.ingredient_cost / total * 100
+            sku_cost.labor_percentage = sku_cost.labor_cost / total * 100
+            sku_cost.overhead_percentage = sku_cost.overhead_cost / total * 100
+        sku_cost.margin = selling_price - total
+        if selling_price > 0:
+            sku_cost.margin_percentage = sku_cost.margin / selling_price * 100
+        else:
+            sku_cost.margin_percentage = Decimal('0')
+
+    SKUCost.objects.bulk_update(
+        sku_costs,
+        ['ingredient_percentage', 'labor_percentage', 'overhead_percentage', 'margin', 'margin_percentage'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costs', '0004_skucost_input_fingerprint'),
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='skucost',
+            name='ingredient_percentage',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=9),
+        ),
+        migrations.AddField(
+            model_name='skucost',
+            name='labor_percentage',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=9),
+        ),
+        migrations.AddField(
+            model_name='skucost',
+            name='margin',
+            field=models.DecimalField(decimal_places=4, default=0, help_text='Selling price - total cost per unit', max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='skucost',
+            name='margin_percentage',
+            field=models.DecimalField(decimal_places=4, default=0, help_text='Margin as percentage of selling price', max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='skucost',
+            name='overhead_percentage',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=9),
+        ),
+        migrations.RunPython(populate_stored_margins, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:55
+
+from django.db import migrations, models
+
+
+def flag_current_costs(apps, schema_editor):
+    """Flag each product's latest active, else latest calculated, SKU cost."""
+    SKUCost = apps.get_model('costs', 'SKUCost')
+
+    latest_active = {}
+    latest_calculated = {}
+    for product_id, sku_cost_id, status in SKUCost.objects.filter(
+        status__in=['active', 'calculated']
+    ).order_by('product_id', '-created_at', '-pk').values_list('product_id', 'id', 'status'):
+        latest = latest_active if status == 'active' else latest_calculated
+        latest.setdefault(product_id, sku_cost_id)
+
+    SKUCost.objects.filter(
+        pk__in=list({**latest_calculated, **latest_active}.values())
+    ).update(is_current=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costs', '0005_skucost_stored_margins'),
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='skucost',
+            name='is_current',
+            field=models.BooleanField(default=False, help_text="The product's current cost: latest active, else latest calculated"),
+        ),
+        migrations.RunPython(flag_current_costs, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='skucost',
+            index=models.Index(fields=['is_current', 'product'], name='costs_skucost_current_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='skucost',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_current', True)), fields=('product',), name='unique_current_sku_cost_per_product'),
+        ),
+    ]
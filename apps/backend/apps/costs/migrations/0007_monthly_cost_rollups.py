@@ -0,0 +1,122 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:59
+
+import django.db.models.deletion
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+COST_FIELDS = ['ingredient_cost', 'labor_cost', 'overhead_cost', 'total_cost_per_unit', 'margin', 'margin_percentage']
+
+
+def build_monthly_rollups(apps, schema_editor):
+    """Roll existing SKU costs up into the product and category monthly tables."""
+    SKUCost = apps.get_model('costs', 'SKUCost')
+    ProductMonthlyCost = apps.get_model('costs', 'ProductMonthlyCost')
+    CategoryMonthlyCost = apps.get_model('costs', 'CategoryMonthlyCost')
+
+    latest = {}
+    version_counts = defaultdict(int)
+    for sku_cost in SKUCost.objects.select_related('product').order_by('-created_at', '-pk'):
+        key = (sku_cost.product_id, sku_cost.effective_date.year, sku_cost.effective_date.month)
+        version_counts[key] += 1
+        latest.setdefault(key, sku_cost)
+
+    product_rows = [
+        ProductMonthlyCost(
+            product_id=product_id,
+            category=sku_cost.product.category,
+            month=month,
+            year=year,
+            sku_cost=sku_cost,
+            version_count=version_counts[(product_id, year, month)],
+            **{field: getattr(sku_cost, field) for field in COST_FIELDS},
+        )
+        for (product_id, year, month), sku_cost in latest.items()
+    ]
+    ProductMonthlyCost.objects.bulk_create(product_rows, batch_size=500)
+
+    rows_by_category = defaultdict(list)
+    for row in product_rows:
+        rows_by_category[(row.category, row.year, row.month)].append(row)
+
+    CategoryMonthlyCost.objects.bulk_create(
+        [
+            CategoryMonthlyCost(
+                category=category,
+                month=month,
+                year=year,
+                product_count=len(rows),
+                **{
+                    field: (sum(getattr(row, field) for row in rows) / len(rows)).quantize(Decimal('0.0001'))
+                    for field in COST_FIELDS
+                },
+            )
+            for (category, year, month), rows in rows_by_category.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costs', '0006_skucost_is_current'),
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryMonthlyCost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.CharField(max_length=50)),
+                ('month', models.PositiveIntegerField()),
+                ('year', models.PositiveIntegerField()),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('ingredient_cost', models.DecimalField(decimal_places=4, default=0, max_digits=12)),
+                ('labor_cost', models.DecimalField(decimal_places=4, default=0, max_digits=12)),
+                ('overhead_cost', models.DecimalField(decimal_places=4, default=0, max_digits=12)),
+                ('total_cost_per_unit', models.DecimalField(decimal_places=4, default=0, max_digits=12)),
+                ('margin', models.DecimalField(decimal_places=4, default=0, max_digits=12)),
+                ('margin_percentage', models.DecimalField(decimal_places=4, default=0, max_digits=12)),
+            ],
+            options={
+                'verbose_name': 'Category Monthly Cost',
+                'verbose_name_plural': 'Category Monthly Costs',
+                'ordering': ['category', 'year', 'month'],
+                'unique_together': {('category', 'month', 'year')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductMonthlyCost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.CharField(help_text="Copy of the product's category", max_length=50)),
+                ('month', models.PositiveIntegerField()),
+                ('year', models.PositiveIntegerField()),
+                ('version_count', models.PositiveIntegerField(default=0, help_text='Cost versions written in the month')),
+                ('ingredient_cost', models.DecimalField(decimal_places=4, default=0, max_digits=12)),
+                ('labor_cost', models.DecimalField(decimal_places=4, default=0, max_digits=12)),
+                ('overhead_cost', models.DecimalField(decimal_places=4, default=0, max_digits=12)),
+                ('total_cost_per_unit', models.DecimalField(decimal_places=4, default=0, max_digits=12)),
+                ('margin', models.DecimalField(decimal_places=4, default=0, max_digits=12)),
+                ('margin_percentage', models.DecimalField(decimal_places=4, default=0, max_digits=12)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_costs', to='products.product')),
+                ('sku_cost', models.ForeignKey(blank=True, help_text='Latest cost version of the month', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='costs.skucost')),
+            ],
+            options={
+                'verbose_name': 'Product Monthly Cost',
+                'verbose_name_plural': 'Product Monthly Costs',
+                'ordering': ['product', 'year', 'month'],
+                'indexes': [models.Index(fields=['category', 'year', 'month'], name='costs_produ_categor_dd0eb7_idx')],
+                'unique_together': {('product', 'month', 'year')},
+            },
+        ),
+        migrations.RunPython(build_monthly_rollups, migrations.RunPython.noop),
+    ]
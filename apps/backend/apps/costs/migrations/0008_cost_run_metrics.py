@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costs', '0007_monthly_cost_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CostRunMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('run_type', models.CharField(choices=[('bulk', 'Bulk recalculation'), ('point_in_time', 'Point-in-time costing')], max_length=20)),
+                ('calculated_by', models.CharField(blank=True, max_length=100)),
+                ('month', models.PositiveIntegerField(blank=True, null=True)),
+                ('year', models.PositiveIntegerField(blank=True, null=True)),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('computed_count', models.PositiveIntegerField(default=0)),
+                ('skipped_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0)),
+                ('duration_ms', models.FloatField(default=0)),
+                ('query_count', models.PositiveIntegerField(default=0)),
+                ('rows_written', models.PositiveIntegerField(default=0)),
+                ('stages', models.JSONField(default=dict)),
+            ],
+            options={
+                'verbose_name': 'Cost Run Metrics',
+                'verbose_name_plural': 'Cost Run Metrics',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costs', '0008_cost_run_metrics'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='costdependency',
+            name='dependency_type',
+            field=models.CharField(choices=[('ingredient', 'Ingredient'), ('employee_role', 'Employee Role'), ('overhead_category', 'Overhead Category'), ('production_time', 'Production Time'), ('sub_recipe', 'Sub-recipe')], max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='costdependency',
+            name='object_key',
+            field=models.CharField(help_text='Ingredient, overhead category, production time or sub-recipe product id, or employee role', max_length=50),
+        ),
+    ]
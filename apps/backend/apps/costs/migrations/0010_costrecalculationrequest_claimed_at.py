@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costs', '0009_costdependency_sub_recipe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='costrecalculationrequest',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, help_text='When a worker claimed the request; it is deleted once recalculated', null=True),
+        ),
+    ]
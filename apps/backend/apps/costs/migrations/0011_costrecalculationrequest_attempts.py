@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costs', '0010_costrecalculationrequest_claimed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='costrecalculationrequest',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, help_text='Failed recalculations since the product was last queued'),
+        ),
+    ]
@@ -1,8 +1,54 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from decimal import Decimal
 from django.core.validators import MinValueValidator
 from apps.core.models import ActiveModel, TimestampedModel
 
+# Largest magnitude SKUCost.margin_percentage holds (max_digits=12, decimal_places=4).
+# A selling price near zero makes the ratio unbounded, so stored values are clamped.
+MARGIN_PERCENTAGE_LIMIT = Decimal('99999999.9999')
+
+
+class SKUCostManager(models.Manager):
+    """Manager maintaining the current-cost flag of SKU costs."""
+
+    @transaction.atomic
+    def refresh_current(self, product_ids) -> list:
+        """
+        Re-flag the current cost of the given products.
+
+        A product's current cost is its latest 'active' cost or, if it has none,
+        its latest 'calculated' cost. Exactly that record gets is_current=True.
+
+        Args:
+            product_ids: Iterable of product ids
+
+        Returns:
+            list of the current SKUCost ids
+        """
+        product_ids = list(product_ids)
+
+        latest_active = {}
+        latest_calculated = {}
+        for product_id, sku_cost_id, status in self.filter(
+            product_id__in=product_ids,
+            status__in=['active', 'calculated']
+        ).order_by('product_id', '-created_at', '-pk').values_list('product_id', 'id', 'status'):
+            latest = latest_active if status == 'active' else latest_calculated
+            latest.setdefault(product_id, sku_cost_id)
+
+        current_ids = list({**latest_calculated, **latest_active}.values())
+
+        # Clear first so at most one record per product is flagged at any time.
+        # update() skips auto_now, so bump updated_at for delta sync clients.
+        now = timezone.now()
+        self.filter(product_id__in=product_ids, is_current=True).exclude(
+            pk__in=current_ids
+        ).update(is_current=False, updated_at=now)
+        self.filter(pk__in=current_ids, is_current=False).update(is_current=True, updated_at=now)
+
+        return current_ids
+
 
 class SKUCost(TimestampedModel):
     """Model representing cost calculation for a product SKU."""
@@ -52,55 +98,115 @@ class SKUCost(TimestampedModel):
         validators=[MinValueValidator(0)]
     )
 
+    # Derived from the costs above and product.selling_price (see update_derived_fields)
+    ingredient_percentage = models.DecimalField(max_digits=9, decimal_places=4, default=0)
+    labor_percentage = models.DecimalField(max_digits=9, decimal_places=4, default=0)
+    overhead_percentage = models.DecimalField(max_digits=9, decimal_places=4, default=0)
+    margin = models.DecimalField(
+        max_digits=12,
+        decimal_places=4,
+        default=0,
+        help_text='Selling price - total cost per unit'
+    )
+    margin_percentage = models.DecimalField(
+        max_digits=12,
+        decimal_places=4,
+        default=0,
+        help_text='Margin as percentage of selling price'
+    )
+
     calculation_details = models.JSONField(
         default=dict,
         blank=True,
         help_text='Detailed breakdown for audit trail'
     )
+    input_fingerprint = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text='Hash of the calculation inputs; unchanged inputs do not create a new version'
+    )
     calculated_by = models.CharField(max_length=100, default='system')
     notes = models.TextField(blank=True)
+    is_current = models.BooleanField(
+        default=False,
+        help_text="The product's current cost: latest active, else latest calculated"
+    )
+
+    objects = SKUCostManager()
+
+    DERIVED_FIELDS = [
+        'ingredient_percentage',
+        'labor_percentage',
+        'overhead_percentage',
+        'margin',
+        'margin_percentage',
+    ]
 
     class Meta:
         ordering = ['-created_at']
         unique_together = ['product', 'version']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product'],
+                condition=models.Q(is_current=True),
+                name='unique_current_sku_cost_per_product',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['is_current', 'product'], name='costs_skucost_current_idx'),
+        ]
         verbose_name = 'SKU Cost'
         verbose_name_plural = 'SKU Costs'
 
     def __str__(self):
         return f"{self.product.name} v{self.version}: {self.total_cost_per_unit}"
 
-    @property
-    def ingredient_percentage(self) -> Decimal:
-        """Calculate ingredient cost as percentage of total cost."""
-        if self.total_cost_per_unit > 0:
-            return (self.ingredient_cost / self.total_cost_per_unit) * 100
-        return Decimal('0')
-
-    @property
-    def labor_percentage(self) -> Decimal:
-        """Calculate labor cost as percentage of total cost."""
-        if self.total_cost_per_unit > 0:
-            return (self.labor_cost / self.total_cost_per_unit) * 100
-        return Decimal('0')
-
-    @property
-    def overhead_percentage(self) -> Decimal:
-        """Calculate overhead cost as percentage of total cost."""
-        if self.total_cost_per_unit > 0:
-            return (self.overhead_cost / self.total_cost_per_unit) * 100
-        return Decimal('0')
-
-    @property
-    def margin(self) -> Decimal:
-        """Calculate margin (selling price - total cost per unit)."""
-        return self.product.selling_price - self.total_cost_per_unit
-
-    @property
-    def margin_percentage(self) -> Decimal:
-        """Calculate margin as percentage of selling price."""
-        if self.product.selling_price > 0:
-            return (self.margin / self.product.selling_price) * 100
-        return Decimal('0')
+    def save(self, *args, **kwargs):
+        """Keep the stored percentages, margin and current-cost flag in sync."""
+        self.update_derived_fields()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | set(self.DERIVED_FIELDS)
+
+        with transaction.atomic():
+            # The flag is owned by refresh_current(); never write a stale True
+            self.is_current = False
+            super().save(*args, **kwargs)
+            self.is_current = self.pk in SKUCost.objects.refresh_current([self.product_id])
+
+    def update_derived_fields(self, selling_price=None):
+        """
+        Compute the component percentages, margin and margin percentage.
+
+        Called on save() and for records created with bulk_create, so they can be
+        filtered, sorted and aggregated in SQL.
+
+        Args:
+            selling_price: Product selling price, defaults to self.product.selling_price
+        """
+        if selling_price is None:
+            selling_price = self.product.selling_price
+
+        total_cost_per_unit = Decimal(self.total_cost_per_unit)
+        ingredient_percentage = labor_percentage = overhead_percentage = Decimal('0')
+        if total_cost_per_unit > 0:
+            ingredient_percentage = (Decimal(self.ingredient_cost) / total_cost_per_unit) * 100
+            labor_percentage = (Decimal(self.labor_cost) / total_cost_per_unit) * 100
+            overhead_percentage = (Decimal(self.overhead_cost) / total_cost_per_unit) * 100
+
+        margin = selling_price - total_cost_per_unit
+        margin_percentage = Decimal('0')
+        if selling_price > 0:
+            margin_percentage = (margin / selling_price) * 100
+
+        # Round to the column scale so in-memory values match what is stored
+        places = Decimal('0.0001')
+        self.ingredient_percentage = ingredient_percentage.quantize(places)
+        self.labor_percentage = labor_percentage.quantize(places)
+        self.overhead_percentage = overhead_percentage.quantize(places)
+        self.margin = margin.quantize(places)
+        self.margin_percentage = max(
+            -MARGIN_PERCENTAGE_LIMIT, min(margin_percentage, MARGIN_PERCENTAGE_LIMIT)
+        ).quantize(places)
 
 
 class CostComponent(TimestampedModel):
@@ -215,3 +321,198 @@ class InflationTracking(TimestampedModel):
 
     def __str__(self):
         return f"{self.sku_cost.product.name} v{self.sku_cost.version}: {self.total_cost_change_pct}%"
+
+
+class CostDependency(TimestampedModel):
+    """
+    Index row recording that a product's active cost depends on an input.
+
+    Maintained by signals whenever BOMs, production times, overhead categories or
+    products change, so recalculation triggers can resolve the affected products
+    with a single lookup instead of walking BOMs and phases.
+    """
+    DEPENDENCY_TYPE_CHOICES = [
+        ('ingredient', 'Ingredient'),
+        ('employee_role', 'Employee Role'),
+        ('overhead_category', 'Overhead Category'),
+        ('production_time', 'Production Time'),
+        ('sub_recipe', 'Sub-recipe'),
+    ]
+
+    product = models.ForeignKey(
+        'products.Product',
+        on_delete=models.CASCADE,
+        related_name='cost_dependencies'
+    )
+    dependency_type = models.CharField(
+        max_length=30,
+        choices=DEPENDENCY_TYPE_CHOICES
+    )
+    object_key = models.CharField(
+        max_length=50,
+        help_text='Ingredient, overhead category, production time or sub-recipe product id, or employee role'
+    )
+
+    class Meta:
+        unique_together = ['product', 'dependency_type', 'object_key']
+        indexes = [
+            models.Index(fields=['dependency_type', 'object_key']),
+        ]
+        verbose_name = 'Cost Dependency'
+        verbose_name_plural = 'Cost Dependencies'
+
+    def __str__(self):
+        return f"{self.product_id} <- {self.dependency_type}:{self.object_key}"
+
+
+class CostRecalculationRequest(TimestampedModel):
+    """
+    Pending cost recalculation for one product and month.
+
+    Signal handlers upsert one row per dirty product instead of recalculating
+    inline; repeated triggers for the same product coalesce into the same row and
+    push run_after back (debounce). The process_cost_recalculations worker claims
+    due rows, recalculates each product once and deletes the rows it finished;
+    a claim that is not finished within COST_RECALC_LEASE_SECONDS expires. Failed
+    rows are retried with exponential backoff and kept as dead letters after
+    COST_RECALC_MAX_ATTEMPTS failures.
+    """
+    product = models.ForeignKey(
+        'products.Product',
+        on_delete=models.CASCADE,
+        related_name='cost_recalculation_requests'
+    )
+    month = models.PositiveIntegerField()
+    year = models.PositiveIntegerField()
+    run_after = models.DateTimeField(
+        db_index=True,
+        help_text='Earliest time the worker may recalculate (debounce window)'
+    )
+    calculated_by = models.CharField(max_length=100, default='system')
+    notes = models.TextField(blank=True)
+    claimed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='When a worker claimed the request; it is deleted once recalculated'
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        help_text='Failed recalculations since the product was last queued'
+    )
+
+    class Meta:
+        ordering = ['run_after']
+        unique_together = ['product', 'month', 'year']
+        verbose_name = 'Cost Recalculation Request'
+        verbose_name_plural = 'Cost Recalculation Requests'
+
+    def __str__(self):
+        return f"{self.product_id} ({self.month}/{self.year}) after {self.run_after}"
+
+
+class CostRunMetrics(TimestampedModel):
+    """
+    Timing, query and write figures of one cost calculation run.
+
+    stages maps each instrumented stage (loading inputs, each calculator, saving)
+    to {duration_ms, queries, rows, calls}. Written by CostRunProfiler; only the
+    most recent COST_RUN_METRICS_KEEP runs are kept.
+    """
+    RUN_TYPE_CHOICES = [
+        ('bulk', 'Bulk recalculation'),
+        ('point_in_time', 'Point-in-time costing'),
+    ]
+
+    run_type = models.CharField(max_length=20, choices=RUN_TYPE_CHOICES)
+    calculated_by = models.CharField(max_length=100, blank=True)
+    month = models.PositiveIntegerField(null=True, blank=True)
+    year = models.PositiveIntegerField(null=True, blank=True)
+    product_count = models.PositiveIntegerField(default=0)
+    computed_count = models.PositiveIntegerField(default=0)
+    skipped_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    duration_ms = models.FloatField(default=0)
+    query_count = models.PositiveIntegerField(default=0)
+    rows_written = models.PositiveIntegerField(default=0)
+    stages = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Cost Run Metrics'
+        verbose_name_plural = 'Cost Run Metrics'
+
+    def __str__(self):
+        return f"{self.get_run_type_display()} {self.created_at:%Y-%m-%d %H:%M} ({self.duration_ms:.0f} ms)"
+
+
+class ProductMonthlyCost(TimestampedModel):
+    """
+    Monthly rollup of one product's cost: the latest SKUCost version of the month.
+
+    Maintained incrementally by CostRollupService whenever costs are written, so
+    trend charts read one row per month instead of every cost version.
+    """
+    product = models.ForeignKey(
+        'products.Product',
+        on_delete=models.CASCADE,
+        related_name='monthly_costs'
+    )
+    category = models.CharField(max_length=50, help_text="Copy of the product's category")
+    month = models.PositiveIntegerField()
+    year = models.PositiveIntegerField()
+    sku_cost = models.ForeignKey(
+        SKUCost,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        help_text='Latest cost version of the month'
+    )
+    version_count = models.PositiveIntegerField(default=0, help_text='Cost versions written in the month')
+
+    ingredient_cost = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+    labor_cost = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+    overhead_cost = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+    total_cost_per_unit = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+    margin = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+    margin_percentage = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+
+    class Meta:
+        ordering = ['product', 'year', 'month']
+        unique_together = ['product', 'month', 'year']
+        indexes = [
+            models.Index(fields=['category', 'year', 'month']),
+        ]
+        verbose_name = 'Product Monthly Cost'
+        verbose_name_plural = 'Product Monthly Costs'
+
+    def __str__(self):
+        return f"{self.product_id} {self.month}/{self.year}: {self.total_cost_per_unit}"
+
+
+class CategoryMonthlyCost(TimestampedModel):
+    """
+    Monthly rollup of a product category: averages over its ProductMonthlyCost rows.
+
+    Only products costed in the month count towards that month's averages.
+    """
+    category = models.CharField(max_length=50)
+    month = models.PositiveIntegerField()
+    year = models.PositiveIntegerField()
+    product_count = models.PositiveIntegerField(default=0)
+
+    ingredient_cost = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+    labor_cost = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+    overhead_cost = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+    total_cost_per_unit = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+    margin = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+    margin_percentage = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+
+    class Meta:
+        ordering = ['category', 'year', 'month']
+        unique_together = ['category', 'month', 'year']
+        verbose_name = 'Category Monthly Cost'
+        verbose_name_plural = 'Category Monthly Costs'
+
+    def __str__(self):
+        return f"{self.category} {self.month}/{self.year}: {self.total_cost_per_unit}"
@@ -0,0 +1,254 @@
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from apps.products.models import Product
+from .models import CostRecalculationRequest
+from .services import CostService
+
+logger = logging.getLogger(__name__)
+
+
+class CostRecalculationQueue:
+    """
+    DB-backed, coalescing queue of products whose cost needs recalculating.
+
+    Request paths call enqueue(), which costs a single upsert. A worker
+    (manage.py process_cost_recalculations) calls process_due() in a loop and
+    recalculates every dirty product once per month through the bulk engine.
+    Requests are leased while they are worked on and only deleted once their
+    product was recalculated, so a crashed worker loses nothing. Failed
+    requests are retried with exponential backoff until they become dead
+    letters.
+    """
+
+    @staticmethod
+    def enqueue(products, month=None, year=None, calculated_by='system', notes='') -> int:
+        """
+        Mark products as needing recalculation for a month.
+
+        Products already queued for the same month are coalesced into their
+        existing request, whose debounce window is restarted. A request that is
+        being worked on is released again, so the change is picked up by
+        another run instead of being deleted with the current one. A new change
+        also resets the failed attempts, so dead letters are retried.
+
+        Args:
+            products: Product queryset or iterable of products
+            month: Month (1-12), defaults to current month
+            year: Year, defaults to current year
+            calculated_by: Identifier recorded on the resulting SKUCost
+            notes: Notes recorded on the resulting SKUCost
+
+        Returns:
+            Number of products queued
+        """
+        if month is None or year is None:
+            today = date.today()
+            month = month or today.month
+            year = year or today.year
+
+        if isinstance(products, QuerySet):
+            product_ids = list(products.values_list('pk', flat=True))
+        else:
+            product_ids = [product.pk for product in products]
+
+        if not product_ids:
+            return 0
+
+        run_after = timezone.now() + timedelta(seconds=settings.COST_RECALC_DEBOUNCE_SECONDS)
+
+        CostRecalculationRequest.objects.bulk_create(
+            [
+                CostRecalculationRequest(
+                    product_id=product_id,
+                    month=month,
+                    year=year,
+                    run_after=run_after,
+                    calculated_by=calculated_by,
+                    notes=notes,
+                )
+                for product_id in product_ids
+            ],
+            update_conflicts=True,
+            unique_fields=['product', 'month', 'year'],
+            update_fields=['run_after', 'calculated_by', 'notes', 'claimed_at', 'attempts', 'updated_at'],
+        )
+        return len(product_ids)
+
+    @staticmethod
+    def claim_due(now=None, limit=500) -> list:
+        """
+        Lease and return requests whose debounce window has passed.
+
+        Requests that keep being re-triggered are still released once they have
+        waited COST_RECALC_MAX_DELAY_SECONDS since they were first queued, unless
+        they are backing off after a failure. Dead letters are never claimed. A
+        claimed request stays in the queue until complete() deletes it; when
+        it is not completed within COST_RECALC_LEASE_SECONDS (the worker died)
+        it can be claimed again.
+
+        Args:
+            now: Reference time, defaults to timezone.now()
+            limit: Maximum number of requests to claim
+
+        Returns:
+            list of claimed CostRecalculationRequest instances
+        """
+        now = now or timezone.now()
+        oldest_allowed = now - timedelta(seconds=settings.COST_RECALC_MAX_DELAY_SECONDS)
+        lease_expired = now - timedelta(seconds=settings.COST_RECALC_LEASE_SECONDS)
+
+        with transaction.atomic():
+            due = CostRecalculationRequest.objects.filter(
+                Q(run_after__lte=now) | Q(created_at__lte=oldest_allowed, attempts=0),
+                Q(claimed_at__isnull=True) | Q(claimed_at__lte=lease_expired),
+                attempts__lt=settings.COST_RECALC_MAX_ATTEMPTS,
+            ).order_by('run_after')
+
+            if connection.features.has_select_for_update_skip_locked:
+                due = due.select_for_update(skip_locked=True)
+
+            claimed = list(due[:limit])
+            CostRecalculationRequest.objects.filter(
+                pk__in=[request.pk for request in claimed]
+            ).update(claimed_at=now)
+            for request in claimed:
+                request.claimed_at = now
+
+        return claimed
+
+    @staticmethod
+    def complete(requests) -> int:
+        """
+        Delete claimed requests whose products were recalculated.
+
+        A request re-triggered after it was claimed has lost its claim and is
+        kept, so the newer change gets its own run.
+
+        Args:
+            requests: Claimed CostRecalculationRequest instances
+
+        Returns:
+            Number of requests deleted
+        """
+        deleted = 0
+        by_claim = defaultdict(list)
+        for request in requests:
+            by_claim[request.claimed_at].append(request.pk)
+        for claimed_at, pks in by_claim.items():
+            deleted += CostRecalculationRequest.objects.filter(pk__in=pks, claimed_at=claimed_at).delete()[0]
+        return deleted
+
+    @staticmethod
+    def retry(requests, now=None) -> int:
+        """
+        Release claimed requests whose recalculation failed, with backoff.
+
+        The n-th failure of a request delays its next attempt by
+        COST_RECALC_RETRY_SECONDS * 2 ** (n - 1). After COST_RECALC_MAX_ATTEMPTS
+        failures the request is kept as a dead letter, which claim_due() skips
+        until the product is queued again. As in complete(), a request
+        re-triggered after it was claimed is left alone.
+
+        Args:
+            requests: Claimed CostRecalculationRequest instances
+            now: Reference time, defaults to timezone.now()
+
+        Returns:
+            Number of requests that became dead letters
+        """
+        now = now or timezone.now()
+        by_claim = defaultdict(list)
+        for request in requests:
+            by_claim[(request.claimed_at, request.attempts + 1)].append(request.pk)
+
+        dead_lettered = 0
+        for (claimed_at, attempts), pks in by_claim.items():
+            delay = settings.COST_RECALC_RETRY_SECONDS * 2 ** (attempts - 1)
+            released = CostRecalculationRequest.objects.filter(pk__in=pks, claimed_at=claimed_at).update(
+                attempts=attempts,
+                run_after=now + timedelta(seconds=delay),
+                claimed_at=None,
+            )
+            if attempts >= settings.COST_RECALC_MAX_ATTEMPTS:
+                dead_lettered += released
+        return dead_lettered
+
+    @staticmethod
+    def dead_letters() -> QuerySet:
+        """Requests that failed COST_RECALC_MAX_ATTEMPTS times and are no longer retried."""
+        return CostRecalculationRequest.objects.filter(attempts__gte=settings.COST_RECALC_MAX_ATTEMPTS)
+
+    @staticmethod
+    def process_due(now=None, limit=500) -> dict:
+        """
+        Recalculate every product with a due request, each once.
+
+        Requests are grouped by month and origin so each group is one bulk
+        engine run. Requests are deleted once their product is recalculated (or
+        skipped as unchanged); products that failed, alone or with their whole
+        group, are retried later (see retry()).
+
+        Args:
+            now: Reference time, defaults to timezone.now()
+            limit: Maximum number of requests to process
+
+        Returns:
+            dict: {claimed_count, success_count, failed_count, dead_lettered_count, errors}
+        """
+        now = now or timezone.now()
+        claimed = CostRecalculationQueue.claim_due(now=now, limit=limit)
+
+        groups = defaultdict(list)
+        for request in claimed:
+            groups[(request.month, request.year, request.calculated_by, request.notes)].append(request)
+
+        success_count = 0
+        dead_lettered_count = 0
+        errors = []
+        for (month, year, calculated_by, notes), requests in groups.items():
+            product_ids = [request.product_id for request in requests]
+            try:
+                result = CostService.recalculate_products(
+                    Product.objects.filter(pk__in=product_ids),
+                    month=month,
+                    year=year,
+                    calculated_by=calculated_by,
+                    notes=notes
+                )
+            except Exception as e:
+                logger.exception('Cost recalculation of %s/%s failed for products %s', month, year, product_ids)
+                failed_ids = set(product_ids)
+                errors.append({
+                    'month': month,
+                    'year': year,
+                    'products': product_ids,
+                    'error': str(e)
+                })
+            else:
+                # Products whose inputs did not change are done as well
+                success_count += result['success_count'] + result['skipped_count']
+                failed_ids = {error['product_id'] for error in result['errors']}
+                errors.extend(result['errors'])
+
+            CostRecalculationQueue.complete(
+                [request for request in requests if request.product_id not in failed_ids]
+            )
+            if failed_ids:
+                dead_lettered_count += CostRecalculationQueue.retry(
+                    [request for request in requests if request.product_id in failed_ids], now=now
+                )
+
+        return {
+            'claimed_count': len(claimed),
+            'success_count': success_count,
+            'failed_count': len(claimed) - success_count,
+            'dead_lettered_count': dead_lettered_count,
+            'errors': errors,
+        }
@@ -0,0 +1,353 @@
+import math
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Avg, Count, F, OuterRef, Q, Subquery
+
+from .models import SKUCost, ProductMonthlyCost, CategoryMonthlyCost
+
+ROLLUP_COST_FIELDS = [
+    'ingredient_cost',
+    'labor_cost',
+    'overhead_cost',
+    'total_cost_per_unit',
+    'margin',
+    'margin_percentage',
+]
+
+# Keys used for rollup fields in trend points, matching CostService.get_cost_trend()
+TREND_KEYS = {
+    'ingredient_cost': 'ingredient',
+    'labor_cost': 'labor',
+    'overhead_cost': 'overhead',
+    'total_cost_per_unit': 'total',
+    'margin': 'margin',
+    'margin_percentage': 'margin_percentage',
+}
+
+
+def _period_index(year, month) -> int:
+    """Number of months since year 0, so month ranges compare as integers."""
+    return year * 12 + month - 1
+
+
+def _period_label(index) -> str:
+    """Format a period index as YYYY-MM."""
+    return f'{index // 12:04d}-{index % 12 + 1:02d}'
+
+
+class CostRollupService:
+    """
+    Service maintaining and reading the monthly cost rollups.
+
+    Every written SKUCost refreshes the ProductMonthlyCost row of its product and
+    month, which in turn refreshes the CategoryMonthlyCost row of the product's
+    category. Trend charts read these rows, so they cost O(months) per series
+    however many cost versions were calculated.
+    """
+
+    @staticmethod
+    def record_costs(sku_costs) -> int:
+        """
+        Roll newly written (or deleted) SKU costs into the monthly tables.
+
+        Args:
+            sku_costs: Iterable of SKUCost instances
+
+        Returns:
+            Number of product months refreshed
+        """
+        return CostRollupService.refresh_product_months({
+            (sku_cost.product_id, sku_cost.effective_date.year, sku_cost.effective_date.month)
+            for sku_cost in sku_costs
+        })
+
+    @staticmethod
+    @transaction.atomic
+    def refresh_product_months(keys) -> int:
+        """
+        Recompute product rollup rows from their SKU costs.
+
+        Args:
+            keys: Iterable of (product_id, year, month) tuples
+
+        Returns:
+            Number of product months refreshed
+        """
+        keys = set(keys)
+        if not keys:
+            return 0
+
+        product_ids = {product_id for product_id, _, _ in keys}
+        first_period = min(_period_index(year, month) for _, year, month in keys)
+        last_period = max(_period_index(year, month) for _, year, month in keys) + 1
+
+        latest = {}
+        version_counts = defaultdict(int)
+        for sku_cost in SKUCost.objects.filter(
+            product_id__in=product_ids,
+            effective_date__gte=date(first_period // 12, first_period % 12 + 1, 1),
+            effective_date__lt=date(last_period // 12, last_period % 12 + 1, 1),
+        ).select_related('product').order_by('-created_at', '-pk'):
+            key = (sku_cost.product_id, sku_cost.effective_date.year, sku_cost.effective_date.month)
+            if key in keys:
+                version_counts[key] += 1
+                latest.setdefault(key, sku_cost)
+
+        # Categories whose averages change: the previous and the current category of each row
+        category_keys = {
+            (category, year, month)
+            for product_id, category, year, month in ProductMonthlyCost.objects.filter(
+                product_id__in=product_ids,
+                year__in={year for _, year, _ in keys},
+                month__in={month for _, _, month in keys},
+            ).values_list('product_id', 'category', 'year', 'month')
+            if (product_id, year, month) in keys
+        }
+        category_keys.update(
+            (sku_cost.product.category, year, month)
+            for (_, year, month), sku_cost in latest.items()
+        )
+
+        ProductMonthlyCost.objects.bulk_create(
+            [
+                ProductMonthlyCost(
+                    product_id=product_id,
+                    category=sku_cost.product.category,
+                    month=month,
+                    year=year,
+                    sku_cost=sku_cost,
+                    version_count=version_counts[(product_id, year, month)],
+                    **{field: getattr(sku_cost, field) for field in ROLLUP_COST_FIELDS},
+                )
+                for (product_id, year, month), sku_cost in latest.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['product', 'month', 'year'],
+            update_fields=['category', 'sku_cost', 'version_count', *ROLLUP_COST_FIELDS, 'updated_at'],
+        )
+
+        # Months whose last cost version was deleted
+        emptied = Q()
+        for product_id, year, month in keys - latest.keys():
+            emptied |= Q(product_id=product_id, year=year, month=month)
+        if emptied:
+            ProductMonthlyCost.objects.filter(emptied).delete()
+
+        CostRollupService.refresh_category_months(category_keys)
+        return len(keys)
+
+    @staticmethod
+    @transaction.atomic
+    def refresh_category_months(keys) -> int:
+        """
+        Recompute category rollup rows from the product rollup rows.
+
+        Args:
+            keys: Iterable of (category, year, month) tuples
+
+        Returns:
+            Number of category months refreshed
+        """
+        keys = set(keys)
+        if not keys:
+            return 0
+
+        groups = [
+            group for group in ProductMonthlyCost.objects.filter(
+                category__in={category for category, _, _ in keys},
+                year__in={year for _, year, _ in keys},
+                month__in={month for _, _, month in keys},
+            ).values('category', 'year', 'month').annotate(
+                product_count=Count('pk'),
+                **{field: Avg(field) for field in ROLLUP_COST_FIELDS}
+            ).order_by()
+            if (group['category'], group['year'], group['month']) in keys
+        ]
+
+        CategoryMonthlyCost.objects.bulk_create(
+            [
+                CategoryMonthlyCost(
+                    category=group['category'],
+                    month=group['month'],
+                    year=group['year'],
+                    product_count=group['product_count'],
+                    **{
+                        field: Decimal(str(group[field])).quantize(Decimal('0.0001'))
+                        for field in ROLLUP_COST_FIELDS
+                    },
+                )
+                for group in groups
+            ],
+            update_conflicts=True,
+            unique_fields=['category', 'month', 'year'],
+            update_fields=['product_count', *ROLLUP_COST_FIELDS, 'updated_at'],
+        )
+
+        emptied = Q()
+        for category, year, month in keys - {(g['category'], g['year'], g['month']) for g in groups}:
+            emptied |= Q(category=category, year=year, month=month)
+        if emptied:
+            CategoryMonthlyCost.objects.filter(emptied).delete()
+
+        return len(keys)
+
+    @staticmethod
+    @transaction.atomic
+    def refresh_product(product) -> int:
+        """
+        Follow a product's selling price or category change in its rollup rows.
+
+        Margins are copied from the (already refreshed) SKU cost each row points
+        at, so this costs one UPDATE plus the category refresh.
+
+        Args:
+            product: Product instance
+
+        Returns:
+            Number of product months updated
+        """
+        rows = ProductMonthlyCost.objects.filter(product=product, sku_cost__isnull=False)
+        months = set(rows.values_list('category', 'year', 'month'))
+        if not months:
+            return 0
+
+        latest_cost = SKUCost.objects.filter(pk=OuterRef('sku_cost_id'))
+        updated = rows.update(
+            category=product.category,
+            margin=Subquery(latest_cost.values('margin')[:1]),
+            margin_percentage=Subquery(latest_cost.values('margin_percentage')[:1]),
+        )
+
+        CostRollupService.refresh_category_months(
+            months | {(product.category, year, month) for _, year, month in months}
+        )
+        return updated
+
+    @staticmethod
+    def rebuild_all() -> int:
+        """
+        Rebuild every rollup row from SKUCost.
+
+        Returns:
+            Number of product months refreshed
+        """
+        with transaction.atomic():
+            ProductMonthlyCost.objects.all().delete()
+            CategoryMonthlyCost.objects.all().delete()
+            return CostRollupService.record_costs(SKUCost.objects.only('product_id', 'effective_date'))
+
+    @staticmethod
+    def filter_months(queryset, months=12, end=None):
+        """
+        Limit a rollup queryset to the last N calendar months.
+
+        Args:
+            queryset: ProductMonthlyCost or CategoryMonthlyCost queryset
+            months: Number of months, including the end month
+            end: Date in the last month, defaults to today
+
+        Returns:
+            QuerySet annotated with 'period' (see _period_index) and ordered by it
+        """
+        end = end or date.today()
+        end_period = _period_index(end.year, end.month)
+        return queryset.annotate(
+            period=F('year') * 12 + F('month') - 1
+        ).filter(
+            period__gt=end_period - months,
+            period__lte=end_period
+        ).order_by('period')
+
+    @staticmethod
+    def get_series(product_ids=None, categories=None, months=12, max_points=None, end=None) -> dict:
+        """
+        Get monthly cost series of many products and categories at once.
+
+        Long ranges are downsampled: when months exceeds max_points, consecutive
+        months are averaged into buckets of ceil(months / max_points) months.
+
+        Args:
+            product_ids: Optional iterable of product ids
+            categories: Optional iterable of product categories
+            months: Number of months to look back, including the current one
+            max_points: Optional maximum number of points per series
+            end: Date in the last month, defaults to today
+
+        Returns:
+            dict: {start, end, bucket_months, series}. Each series is
+            {type, key, label, points}; each point is {period, months, ingredient,
+            labor, overhead, total, margin, margin_percentage}.
+        """
+        end = end or date.today()
+        end_period = _period_index(end.year, end.month)
+        start_period = end_period - months + 1
+
+        bucket_months = 1
+        if max_points and months > max_points:
+            bucket_months = math.ceil(months / max_points)
+
+        series = []
+
+        if product_ids:
+            rows = CostRollupService.filter_months(
+                ProductMonthlyCost.objects.filter(product_id__in=list(product_ids)), months, end
+            ).values('product_id', 'product__sku_code', 'product__name', 'period', *ROLLUP_COST_FIELDS)
+
+            rows_by_product = defaultdict(list)
+            labels = {}
+            for row in rows:
+                rows_by_product[row['product_id']].append(row)
+                labels[row['product_id']] = f"{row['product__sku_code']} - {row['product__name']}"
+
+            for product_id in sorted(rows_by_product, key=labels.get):
+                series.append({
+                    'type': 'product',
+                    'key': product_id,
+                    'label': labels[product_id],
+                    'points': CostRollupService._downsample(rows_by_product[product_id], start_period, bucket_months),
+                })
+
+        if categories:
+            rows = CostRollupService.filter_months(
+                CategoryMonthlyCost.objects.filter(category__in=list(categories)), months, end
+            ).values('category', 'period', *ROLLUP_COST_FIELDS)
+
+            rows_by_category = defaultdict(list)
+            for row in rows:
+                rows_by_category[row['category']].append(row)
+
+            for category in sorted(rows_by_category):
+                series.append({
+                    'type': 'category',
+                    'key': category,
+                    'label': category,
+                    'points': CostRollupService._downsample(rows_by_category[category], start_period, bucket_months),
+                })
+
+        return {
+            'start': _period_label(start_period),
+            'end': _period_label(end_period),
+            'bucket_months': bucket_months,
+            'series': series,
+        }
+
+    @staticmethod
+    def _downsample(rows, start_period, bucket_months) -> list:
+        """Average period-ordered rollup rows into buckets of bucket_months months."""
+        buckets = defaultdict(list)
+        for row in rows:
+            buckets[(row['period'] - start_period) // bucket_months].append(row)
+
+        points = []
+        for bucket, bucket_rows in sorted(buckets.items()):
+            point = {
+                'period': _period_label(start_period + bucket * bucket_months),
+                'months': len(bucket_rows),
+            }
+            for field, key in TREND_KEYS.items():
+                point[key] = float(sum(row[field] for row in bucket_rows) / len(bucket_rows))
+            points.append(point)
+        return points
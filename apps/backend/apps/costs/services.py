@@ -1,12 +1,43 @@
 from decimal import Decimal
-from datetime import date, timedelta
-from django.db.models import Q, Avg, Sum
+from datetime import date
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Q, Avg, Count, Sum, F, Value, DecimalField, ExpressionWrapper
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
 import csv
-from io import StringIO
+import tempfile
 
 from apps.products.models import Product
-from .models import SKUCost, CostComponent, InflationTracking
-from .calculators import SKUCostAggregator
+from .models import MARGIN_PERCENTAGE_LIMIT, SKUCost, CostComponent, InflationTracking
+from .calculators import SKUCostAggregator, BulkCostEngine, PointInTimeCostEngine
+from .calculators.point_in_time import last_months
+from .rollups import CostRollupService
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_COLUMNS = [
+    'SKU Code',
+    'Product Name',
+    'Version',
+    'Status',
+    'Ingredient Cost',
+    'Labor Cost',
+    'Overhead Cost',
+    'Total Cost Per Unit',
+    'Selling Price',
+    'Margin',
+    'Margin %',
+    'Effective Date',
+    'Calculated By',
+]
+
+
+class _EchoBuffer:
+    """File-like object whose write() returns the value, so csv.writer rows can be yielded."""
+
+    def write(self, value):
+        return value
 
 
 class CostService:
@@ -44,38 +75,62 @@ class CostService:
         """
         Get cost data over the last N months for charting/analysis.
 
+        Reads the monthly rollup, so the cost is one row per month with the
+        latest cost version of that month, however many versions were calculated.
+
         Args:
             product: Product instance
-            months: Number of months to look back
+            months: Number of months to look back, including the current one
 
         Returns:
             list: List of dicts with cost data {date, ingredient, labor, overhead, total, margin}
         """
-        # Calculate date cutoff
-        cutoff_date = date.today() - timedelta(days=30 * months)
-
-        # Get SKUCosts created after cutoff date
-        sku_costs = product.sku_costs.filter(
-            created_at__date__gte=cutoff_date
-        ).order_by('created_at')
+        monthly_costs = CostRollupService.filter_months(
+            product.monthly_costs.select_related('sku_cost'), months
+        )
 
         trend_data = []
-        for sku_cost in sku_costs:
+        for monthly_cost in monthly_costs:
             trend_data.append({
-                'date': sku_cost.effective_date.isoformat(),
-                'created_at': sku_cost.created_at.isoformat(),
-                'version': sku_cost.version,
-                'ingredient': float(sku_cost.ingredient_cost),
-                'labor': float(sku_cost.labor_cost),
-                'overhead': float(sku_cost.overhead_cost),
-                'total': float(sku_cost.total_cost_per_unit),
-                'margin': float(sku_cost.margin),
-                'margin_percentage': float(sku_cost.margin_percentage),
+                'date': date(monthly_cost.year, monthly_cost.month, 1).isoformat(),
+                'version': monthly_cost.sku_cost.version if monthly_cost.sku_cost else None,
+                'version_count': monthly_cost.version_count,
+                'ingredient': float(monthly_cost.ingredient_cost),
+                'labor': float(monthly_cost.labor_cost),
+                'overhead': float(monthly_cost.overhead_cost),
+                'total': float(monthly_cost.total_cost_per_unit),
+                'margin': float(monthly_cost.margin),
+                'margin_percentage': float(monthly_cost.margin_percentage),
             })
 
         return trend_data
 
     @staticmethod
+    def get_costs_as_of(products=None, months=1, end=None, include_details=False) -> dict:
+        """
+        Re-cost products as of past months, without writing anything.
+
+        BOM and production time versions, ingredient prices and wages are
+        resolved from their effective dates at each month end (see
+        PointInTimeCostEngine), so past months can be audited and compared.
+
+        Args:
+            products: Optional Product queryset or iterable, defaults to all active products
+            months: Number of months ending with the end month
+            end: Date in the last month, defaults to today
+            include_details: Include each cost's calculation_details
+
+        Returns:
+            dict: {periods, items, errors} from PointInTimeCostEngine.run()
+        """
+        return PointInTimeCostEngine(SKUCostAggregator()).run(
+            products=products,
+            periods=last_months(months, end),
+            include_details=include_details,
+        )
+
+    @staticmethod
+    @transaction.atomic
     def approve_cost(sku_cost: SKUCost) -> SKUCost:
         """
         Change SKUCost status to 'approved'.
@@ -91,6 +146,7 @@ class CostService:
         return sku_cost
 
     @staticmethod
+    @transaction.atomic
     def activate_cost(sku_cost: SKUCost) -> SKUCost:
         """
         Activate a SKUCost and archive any previous active cost for the same product.
@@ -107,7 +163,7 @@ class CostService:
             status='active'
         ).exclude(pk=sku_cost.pk)
 
-        previous_active.update(status='archived', end_date=date.today())
+        previous_active.update(status='archived', end_date=date.today(), updated_at=timezone.now())
 
         # Activate the provided cost
         sku_cost.status = 'active'
@@ -120,72 +176,71 @@ class CostService:
         """
         Get all currently active SKU costs (status='active' or latest 'calculated').
 
-        For products with no 'active' cost, returns the latest 'calculated' cost.
+        For products with no 'active' cost, returns the latest 'calculated' cost
+        of active products. Reads the is_current flag maintained by
+        SKUCost.objects.refresh_current(), so this is one query however large
+        the catalogue is.
 
         Returns:
             QuerySet of active SKUCost instances
         """
-        # Get all products with active costs
-        active_costs = SKUCost.objects.filter(status='active')
+        return SKUCost.objects.filter(
+            is_current=True
+        ).filter(
+            Q(status='active') | Q(product__is_active=True)
+        ).select_related('product').order_by('product__sku_code')
 
-        # Get products that don't have active costs
-        products_with_active = set(active_costs.values_list('product_id', flat=True))
-        products_without_active = Product.objects.filter(
-            is_active=True
-        ).exclude(id__in=products_with_active)
+    @staticmethod
+    def get_export_queryset(products=None, all_versions=False):
+        """
+        Get the SKU costs to export, with their products joined in.
 
-        # For products without active costs, get the latest calculated
-        latest_calculated = []
-        for product in products_without_active:
-            latest = product.sku_costs.filter(status='calculated').first()
-            if latest:
-                latest_calculated.append(latest.pk)
+        Without all_versions, a full export has the current cost of each
+        product. An export of given products keeps the contents it always had:
+        every 'active' cost version of those products, plus the latest
+        'calculated' cost of the active ones without an active cost.
 
-        # Combine active costs with latest calculated
-        all_cost_ids = list(active_costs.values_list('id', flat=True)) + latest_calculated
+        Args:
+            products: Optional queryset/list of products to export. If None, exports all.
+            all_versions: Export every cost version instead of only current costs
 
-        return SKUCost.objects.filter(id__in=all_cost_ids).order_by('product__sku_code')
+        Returns:
+            QuerySet of SKUCost instances
+        """
+        if all_versions:
+            cost_records = SKUCost.objects.select_related('product').order_by('product__sku_code', '-version')
+        elif products is not None:
+            # is_current marks the latest 'calculated' cost only when there is no 'active' one
+            cost_records = SKUCost.objects.filter(
+                Q(status='active') | Q(status='calculated', is_current=True, product__is_active=True)
+            ).select_related('product').order_by('product__sku_code', '-version')
+        else:
+            cost_records = CostService.get_all_active_costs()
+
+        if products is not None:
+            cost_records = cost_records.filter(product__in=products)
+        return cost_records
 
     @staticmethod
-    def export_costs_csv(products=None):
+    def iter_export_rows(products=None, all_versions=False, chunk_size=EXPORT_CHUNK_SIZE):
         """
-        Export current SKU costs to CSV format.
+        Yield export rows one at a time.
+
+        Rows are read with iterator(), through a server-side cursor where the
+        database supports one, so memory use does not grow with the row count.
 
         Args:
             products: Optional queryset/list of products to export. If None, exports all.
+            all_versions: Export every cost version instead of only current costs
+            chunk_size: Number of rows fetched from the database at a time
 
-        Returns:
-            String: CSV content
+        Yields:
+            list of column values in EXPORT_COLUMNS order
         """
-        if products is None:
-            cost_records = CostService.get_all_active_costs()
-        else:
-            cost_records = SKUCost.objects.filter(product__in=products, status__in=['active', 'calculated'])
-
-        # Create CSV string
-        output = StringIO()
-        writer = csv.writer(output)
-
-        # Write header
-        writer.writerow([
-            'SKU Code',
-            'Product Name',
-            'Version',
-            'Status',
-            'Ingredient Cost',
-            'Labor Cost',
-            'Overhead Cost',
-            'Total Cost Per Unit',
-            'Selling Price',
-            'Margin',
-            'Margin %',
-            'Effective Date',
-            'Calculated By',
-        ])
-
-        # Write data rows
-        for sku_cost in cost_records:
-            writer.writerow([
+        cost_records = CostService.get_export_queryset(products=products, all_versions=all_versions)
+
+        for sku_cost in cost_records.iterator(chunk_size=chunk_size):
+            yield [
                 sku_cost.product.sku_code,
                 sku_cost.product.name,
                 sku_cost.version,
@@ -197,11 +252,78 @@ class CostService:
                 float(sku_cost.product.selling_price),
                 float(sku_cost.margin),
                 float(sku_cost.margin_percentage),
-                sku_cost.effective_date.isoformat(),
+                sku_cost.effective_date,
                 sku_cost.calculated_by,
-            ])
+            ]
+
+    @staticmethod
+    def stream_costs_csv(products=None, all_versions=False):
+        """
+        Export SKU costs to CSV, one line at a time.
 
-        return output.getvalue()
+        Suitable for a StreamingHttpResponse.
+
+        Args:
+            products: Optional queryset/list of products to export. If None, exports all.
+            all_versions: Export every cost version instead of only current costs
+
+        Yields:
+            String: CSV lines, header first
+        """
+        writer = csv.writer(_EchoBuffer())
+
+        yield writer.writerow(EXPORT_COLUMNS)
+        for row in CostService.iter_export_rows(products=products, all_versions=all_versions):
+            yield writer.writerow(row)
+
+    @staticmethod
+    def export_costs_csv(products=None, all_versions=False):
+        """
+        Export current SKU costs to CSV format.
+
+        Args:
+            products: Optional queryset/list of products to export. If None, exports all.
+            all_versions: Export every cost version instead of only current costs
+
+        Returns:
+            String: CSV content
+        """
+        return ''.join(CostService.stream_costs_csv(products=products, all_versions=all_versions))
+
+    @staticmethod
+    def export_costs_xlsx(products=None, all_versions=False):
+        """
+        Export SKU costs to an XLSX workbook in a temporary file.
+
+        The workbook is written in openpyxl's write-only mode, which flushes
+        rows to disk as they are appended, so memory stays flat.
+
+        Args:
+            products: Optional queryset/list of products to export. If None, exports all.
+            all_versions: Export every cost version instead of only current costs
+
+        Returns:
+            Binary file object positioned at the start of the workbook.
+            The caller is responsible for closing it.
+
+        Raises:
+            ImproperlyConfigured: If openpyxl is not installed
+        """
+        try:
+            from openpyxl import Workbook
+        except ImportError as exc:
+            raise ImproperlyConfigured('XLSX export requires openpyxl (see requirements.txt).') from exc
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('SKU Costs')
+        sheet.append(EXPORT_COLUMNS)
+        for row in CostService.iter_export_rows(products=products, all_versions=all_versions):
+            sheet.append(row)
+
+        output = tempfile.TemporaryFile()
+        workbook.save(output)
+        output.seek(0)
+        return output
 
     @staticmethod
     def get_cost_summary():
@@ -213,7 +335,16 @@ class CostService:
         """
         active_costs = CostService.get_all_active_costs()
 
-        if not active_costs.exists():
+        averages = active_costs.aggregate(
+            total_products=Count('id'),
+            avg_margin=Avg('margin'),
+            avg_margin_percentage=Avg('margin_percentage'),
+            avg_ingredient_percentage=Avg('ingredient_percentage'),
+            avg_labor_percentage=Avg('labor_percentage'),
+            avg_overhead_percentage=Avg('overhead_percentage'),
+        )
+
+        if not averages['total_products']:
             return {
                 'avg_margin': 0,
                 'avg_margin_percentage': 0,
@@ -225,33 +356,14 @@ class CostService:
                 'avg_overhead_percentage': 0,
             }
 
-        # Calculate averages
-        total_costs = active_costs.count()
-        avg_margin = active_costs.aggregate(avg=Avg('margin'))['avg'] or 0
-        avg_margin_pct = Decimal('0')
-        avg_ingredient_pct = Decimal('0')
-        avg_labor_pct = Decimal('0')
-        avg_overhead_pct = Decimal('0')
-
-        for cost in active_costs:
-            avg_margin_pct += cost.margin_percentage
-            avg_ingredient_pct += cost.ingredient_percentage
-            avg_labor_pct += cost.labor_percentage
-            avg_overhead_pct += cost.overhead_percentage
-
-        avg_margin_pct = avg_margin_pct / total_costs if total_costs > 0 else Decimal('0')
-        avg_ingredient_pct = avg_ingredient_pct / total_costs if total_costs > 0 else Decimal('0')
-        avg_labor_pct = avg_labor_pct / total_costs if total_costs > 0 else Decimal('0')
-        avg_overhead_pct = avg_overhead_pct / total_costs if total_costs > 0 else Decimal('0')
-
         # Find extremes
-        highest_cost = active_costs.order_by('-total_cost_per_unit').first()
-        lowest_margin = active_costs.order_by('margin').first()
+        highest_cost = active_costs.select_related('product').order_by('-total_cost_per_unit').first()
+        lowest_margin = active_costs.select_related('product').order_by('margin').first()
 
         return {
-            'avg_margin': float(avg_margin),
-            'avg_margin_percentage': float(avg_margin_pct),
-            'total_products': total_costs,
+            'avg_margin': float(averages['avg_margin'] or 0),
+            'avg_margin_percentage': float(averages['avg_margin_percentage'] or 0),
+            'total_products': averages['total_products'],
             'highest_cost_sku': {
                 'product': highest_cost.product.sku_code,
                 'cost': float(highest_cost.total_cost_per_unit),
@@ -261,11 +373,56 @@ class CostService:
                 'margin': float(lowest_margin.margin),
                 'margin_pct': float(lowest_margin.margin_percentage),
             } if lowest_margin else None,
-            'avg_ingredient_percentage': float(avg_ingredient_pct),
-            'avg_labor_percentage': float(avg_labor_pct),
-            'avg_overhead_percentage': float(avg_overhead_pct),
+            'avg_ingredient_percentage': float(averages['avg_ingredient_percentage'] or 0),
+            'avg_labor_percentage': float(averages['avg_labor_percentage'] or 0),
+            'avg_overhead_percentage': float(averages['avg_overhead_percentage'] or 0),
         }
 
+    @staticmethod
+    @transaction.atomic
+    def refresh_margins(product: Product) -> int:
+        """
+        Update the stored margin of every SKUCost of a product after its selling price changed.
+
+        The product's monthly cost rollups follow the new margins and category.
+
+        Args:
+            product: Product instance with the new selling_price
+
+        Returns:
+            Number of SKUCost rows updated
+        """
+        selling_price = product.selling_price
+        margin = ExpressionWrapper(
+            Value(selling_price) - F('total_cost_per_unit'),
+            output_field=DecimalField(max_digits=12, decimal_places=4)
+        )
+
+        if selling_price > 0:
+            # Clamped like SKUCost.update_derived_fields(), so tiny prices cannot overflow the column
+            margin_percentage = Least(
+                Greatest(
+                    ExpressionWrapper(
+                        margin * Value(Decimal('100')) / Value(selling_price),
+                        output_field=DecimalField(max_digits=12, decimal_places=4)
+                    ),
+                    Value(-MARGIN_PERCENTAGE_LIMIT),
+                ),
+                Value(MARGIN_PERCENTAGE_LIMIT),
+            )
+        else:
+            margin_percentage = Value(Decimal('0'))
+
+        updated = SKUCost.objects.filter(product=product).update(
+            margin=margin,
+            margin_percentage=margin_percentage,
+            updated_at=timezone.now()
+        )
+
+        # Monthly rollups copy margins and the product category
+        CostRollupService.refresh_product(product)
+        return updated
+
     @staticmethod
     def calculate_and_create_cost(product: Product, month=None, year=None, calculated_by='system', notes='') -> SKUCost:
         """
@@ -281,7 +438,7 @@ class CostService:
             notes: Optional notes about the calculation
 
         Returns:
-            SKUCost: The newly created SKUCost instance
+            SKUCost: The newly created SKUCost instance, or the latest one if its inputs are unchanged
         """
         aggregator = SKUCostAggregator()
         return aggregator.calculate_sku_cost(
@@ -304,7 +461,7 @@ class CostService:
             calculated_by: Username or system identifier
 
         Returns:
-            SKUCost: The newly created SKUCost instance
+            SKUCost: The newly created SKUCost instance, or the latest one if its inputs are unchanged
         """
         return CostService.calculate_and_create_cost(
             product,
@@ -314,6 +471,31 @@ class CostService:
             notes='Manual recalculation'
         )
 
+    @staticmethod
+    def recalculate_products(products, month=None, year=None, calculated_by='system', notes='') -> dict:
+        """
+        Recalculate costs for a set of products, each exactly once.
+
+        Uses BulkCostEngine so inputs are loaded once for the whole set.
+
+        Args:
+            products: Product queryset or iterable
+            month: Month (1-12)
+            year: Year
+            calculated_by: Username or system identifier
+            notes: Optional notes stored on every created SKUCost
+
+        Returns:
+            dict: Summary of recalculation results
+        """
+        return BulkCostEngine(SKUCostAggregator()).run(
+            products=products,
+            month=month,
+            year=year,
+            calculated_by=calculated_by,
+            notes=notes
+        )
+
     @staticmethod
     def recalculate_all_costs(month=None, year=None, calculated_by='system'):
         """
@@ -1,45 +1,192 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 
-from apps.inventory.models import PurchaseOrderLine
+from apps.inventory.models import Ingredient, PurchaseOrderLine
+from apps.inventory.signals import stock_received
 from apps.labor.models import EmployeeWage, ProductionTime, ProductionPhase
-from apps.overhead.models import OverheadCost
-from apps.products.models import BillOfMaterials
+from apps.overhead.models import OverheadCategory, OverheadCost
+from apps.products.models import Product, BillOfMaterials, BOMLineItem
+from apps.products.signals import boms_activated
 
+from .calculators import IngredientCostMatrix
+from .dependencies import CostDependencyService
+from .models import SKUCost
+from .queue import CostRecalculationQueue
+from .rollups import CostRollupService
 from .services import CostService
 
 
+# Dependency index maintenance. These receivers are connected before the
+# recalculation triggers below so the triggers always see an up-to-date index.
+
+@receiver(post_save, sender=Product)
+def update_dependency_index_for_product(sender, instance, **kwargs):
+    """Re-index a product when it is created or (de)activated."""
+    if kwargs.get('raw'):
+        return
+    CostDependencyService.rebuild_for_products([instance.pk])
+
+
+@receiver(post_save, sender=BillOfMaterials)
+@receiver(post_delete, sender=BillOfMaterials)
+def update_dependency_index_for_bom(sender, instance, **kwargs):
+    """Re-index the product and its sub-recipe users when a BOM is activated, archived or deleted."""
+    if kwargs.get('raw'):
+        return
+    CostDependencyService.rebuild_for_products(CostDependencyService.with_dependents([instance.product_id]))
+
+
+@receiver(post_save, sender=BOMLineItem)
+@receiver(post_delete, sender=BOMLineItem)
+def update_dependency_index_for_bom_line(sender, instance, **kwargs):
+    """Re-index the product and its sub-recipe users when a line of its active BOM changes."""
+    if kwargs.get('raw'):
+        return
+    bom = BillOfMaterials.objects.filter(pk=instance.bom_id).values('status', 'product_id').first()
+    if bom and bom['status'] == 'active':
+        CostDependencyService.rebuild_for_products(CostDependencyService.with_dependents([bom['product_id']]))
+
+
+@receiver(boms_activated)
+def update_dependency_index_for_activated_boms(sender, product_ids, **kwargs):
+    """Re-index the products whose BOMs were activated in bulk and their sub-recipe users."""
+    CostDependencyService.rebuild_for_products(CostDependencyService.with_dependents(product_ids))
+
+
+@receiver(post_save, sender=ProductionTime)
+@receiver(post_delete, sender=ProductionTime)
+def update_dependency_index_for_production_time(sender, instance, **kwargs):
+    """Re-index the product when a production time version is added, changed or removed."""
+    if kwargs.get('raw'):
+        return
+    CostDependencyService.rebuild_for_products([instance.product_id])
+
+
+@receiver(post_save, sender=ProductionPhase)
+@receiver(post_delete, sender=ProductionPhase)
+def update_dependency_index_for_production_phase(sender, instance, **kwargs):
+    """Re-index the product when the roles of its production phases change."""
+    if kwargs.get('raw'):
+        return
+    product_id = ProductionTime.objects.filter(
+        pk=instance.production_time_id
+    ).values_list('product_id', flat=True).first()
+    if product_id:
+        CostDependencyService.rebuild_for_products([product_id])
+
+
+@receiver(post_save, sender=OverheadCategory)
+@receiver(post_delete, sender=OverheadCategory)
+def update_dependency_index_for_overhead_category(sender, instance, **kwargs):
+    """Re-index an overhead category when it is created, (de)activated or deleted."""
+    if kwargs.get('raw'):
+        return
+    CostDependencyService.refresh_overhead_category(instance)
+
+
+@receiver(pre_save, sender=Product)
+def remember_stored_pricing(sender, instance, **kwargs):
+    """Remember the stored selling price and category so sync_cost_margins only reacts to changes."""
+    instance._stored_pricing = None
+    update_fields = kwargs.get('update_fields')
+    if instance.pk is None or kwargs.get('raw'):
+        return
+    if update_fields is not None and not {'selling_price', 'category'} & set(update_fields):
+        return
+    instance._stored_pricing = Product.objects.filter(pk=instance.pk).values_list('selling_price', 'category').first()
+
+
+@receiver(post_save, sender=Product)
+def sync_cost_margins(sender, instance, created, **kwargs):
+    """
+    Keep the stored SKUCost margins and monthly rollups in sync with the product's
+    selling price and category.
+
+    Saves that change neither (a rename, toggling is_active) leave the SKU costs
+    and their updated_at alone, so delta sync clients are not re-sent the history.
+    """
+    stored_pricing = getattr(instance, '_stored_pricing', None)
+    if created or kwargs.get('raw') or stored_pricing is None:
+        return
+    selling_price, category = stored_pricing
+    if instance.selling_price != selling_price:
+        CostService.refresh_margins(instance)
+    elif instance.category != category:
+        CostRollupService.refresh_product(instance)
+
+
+@receiver(post_save, sender=SKUCost)
+@receiver(post_delete, sender=SKUCost)
+def update_monthly_cost_rollups(sender, instance, **kwargs):
+    """Roll a new or deleted SKU cost into the monthly cost tables."""
+    if kwargs.get('raw') or kwargs.get('created') is False:
+        return
+    CostRollupService.record_costs([instance])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=BillOfMaterials)
+@receiver(post_delete, sender=BillOfMaterials)
+@receiver(post_save, sender=BOMLineItem)
+@receiver(post_delete, sender=BOMLineItem)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(stock_received)
+@receiver(boms_activated)
+def invalidate_ingredient_cost_matrix(sender, **kwargs):
+    """Drop the cached catalogue cost matrix when BOMs or ingredient prices change."""
+    # After commit, so a request cannot re-cache prices from before the write
+    transaction.on_commit(IngredientCostMatrix.invalidate_cache)
+
+
+# Recalculation triggers. They only queue the affected products; the
+# process_cost_recalculations worker recalculates each of them once after a
+# short debounce window, so saving many rows does not recalculate inline.
+
+def _enqueue_affected(products, **kwargs):
+    """Queue affected products for recalculation without failing the triggering save."""
+    try:
+        CostRecalculationQueue.enqueue(products, **kwargs)
+    except Exception:
+        # Log error but don't fail the signal
+        pass
+
+
 @receiver(post_save, sender=PurchaseOrderLine)
 def trigger_ingredient_cost_recalculation(sender, instance, created, **kwargs):
     """
     Trigger ingredient cost recalculation when a purchase order line is received.
 
-    When received_quantity changes, recalculate affected product costs.
+    When received_quantity changes, queue affected product costs. Receiving a
+    whole PO queues each affected product once.
     """
-    # Get the ingredient from this PO line
-    ingredient = instance.ingredient
-
     # Find all products that use this ingredient in their active BOM
-    from apps.products.models import BOMLineItem
+    affected_products = CostDependencyService.get_affected_products('ingredient', instance.ingredient_id)
+
+    _enqueue_affected(
+        affected_products,
+        calculated_by='system - ingredient_update',
+        notes=f'Triggered by ingredient cost update: {instance.ingredient.name}'
+    )
 
-    affected_bom_lines = BOMLineItem.objects.filter(ingredient=ingredient)
 
-    for bom_line in affected_bom_lines:
-        # Get the product from the BOM
-        product = bom_line.bom.product
+@receiver(stock_received)
+def trigger_purchase_order_cost_recalculation(sender, purchase_order, ingredient_ids, **kwargs):
+    """
+    Trigger ingredient cost recalculation when a whole purchase order is received.
+
+    Queues the products using any received ingredient, each once.
+    """
+    affected_products = CostDependencyService.get_affected_products('ingredient', ingredient_ids)
 
-        # Only recalculate if BOM is active
-        if bom_line.bom.status == 'active':
-            try:
-                CostService.recalculate_product_cost(
-                    product,
-                    calculated_by='system - ingredient_update',
-                    notes=f'Triggered by ingredient cost update: {ingredient.name}'
-                )
-            except Exception:
-                # Log error but don't fail the signal
-                pass
+    _enqueue_affected(
+        affected_products,
+        calculated_by='system - ingredient_update',
+        notes=f'Triggered by receipt of PO {purchase_order.po_number}'
+    )
 
 
 @receiver(post_save, sender=EmployeeWage)
@@ -47,30 +194,18 @@ def trigger_labor_cost_recalculation(sender, instance, created, **kwargs):
     """
     Trigger labor cost recalculation when employee wage is updated.
 
-    When wage rates change, recalculate costs for all products using this role.
+    When wage rates change, queue costs for all products using this role.
     """
-    employee = instance.employee
-    employee_role = employee.role
+    employee_role = instance.employee.role
 
-    # Find all ProductionPhases using this role
-    affected_phases = ProductionPhase.objects.filter(employee_role=employee_role)
+    # Find all products whose active production phases use this role
+    affected_products = CostDependencyService.get_affected_products('employee_role', employee_role)
 
-    # Get unique products from these phases
-    affected_products = set()
-    for phase in affected_phases:
-        affected_products.add(phase.production_time.product)
-
-    # Recalculate for each affected product
-    for product in affected_products:
-        try:
-            CostService.recalculate_product_cost(
-                product,
-                calculated_by='system - wage_update',
-                notes=f'Triggered by wage update for role: {employee_role}'
-            )
-        except Exception:
-            # Log error but don't fail the signal
-            pass
+    _enqueue_affected(
+        affected_products,
+        calculated_by='system - wage_update',
+        notes=f'Triggered by wage update for role: {employee_role}'
+    )
 
 
 @receiver(post_save, sender=OverheadCost)
@@ -78,29 +213,17 @@ def trigger_overhead_cost_recalculation(sender, instance, created, **kwargs):
     """
     Trigger overhead cost recalculation when monthly overhead costs are updated.
 
-    When overhead costs change, recalculate for all active products in that month.
+    When overhead costs change, queue all active products for that month.
     """
-    month = instance.month
-    year = instance.year
-
-    # Get all active products
-    from apps.products.models import Product
+    affected_products = CostDependencyService.get_affected_products('overhead_category', instance.category_id)
 
-    active_products = Product.objects.filter(is_active=True)
-
-    # Recalculate for each product
-    for product in active_products:
-        try:
-            CostService.calculate_and_create_cost(
-                product,
-                month=month,
-                year=year,
-                calculated_by='system - overhead_update',
-                notes=f'Triggered by overhead cost update: {instance.category.name}'
-            )
-        except Exception:
-            # Log error but don't fail the signal
-            pass
+    _enqueue_affected(
+        affected_products,
+        month=instance.month,
+        year=instance.year,
+        calculated_by='system - overhead_update',
+        notes=f'Triggered by overhead cost update: {instance.category.name}'
+    )
 
 
 @receiver(post_save, sender=BillOfMaterials)
@@ -108,20 +231,30 @@ def trigger_bom_activation_cost_calculation(sender, instance, created, **kwargs)
     """
     Trigger cost calculation when a BOM is activated.
 
-    When BOM status changes to 'active', recalculate the product cost.
+    When BOM status changes to 'active', queue the product cost and the
+    costs of the products using it as a sub-recipe.
     """
     if instance.status == 'active':
-        product = instance.product
+        _enqueue_affected(
+            Product.objects.filter(pk__in=CostDependencyService.with_dependents([instance.product_id])),
+            calculated_by='system - bom_activation',
+            notes=f'Triggered by BOM v{instance.version} activation'
+        )
 
-        try:
-            CostService.recalculate_product_cost(
-                product,
-                calculated_by='system - bom_activation',
-                notes=f'Triggered by BOM v{instance.version} activation'
-            )
-        except Exception:
-            # Log error but don't fail the signal
-            pass
+
+@receiver(boms_activated)
+def trigger_bulk_bom_activation_cost_calculation(sender, product_ids, bom_ids, **kwargs):
+    """
+    Trigger cost calculation when BOMs are activated together.
+
+    Queues every affected product, and the products using them as a
+    sub-recipe, in one batch.
+    """
+    _enqueue_affected(
+        Product.objects.filter(pk__in=CostDependencyService.with_dependents(product_ids)),
+        calculated_by='system - bom_activation',
+        notes=f'Triggered by activation of {len(bom_ids)} BOM(s)'
+    )
 
 
 @receiver(post_save, sender=ProductionTime)
@@ -129,16 +262,13 @@ def trigger_labor_cost_recalculation_production_time(sender, instance, created,
     """
     Trigger labor cost recalculation when production time is updated.
 
-    When production time or phases change, recalculate the product cost.
+    When production time or phases change, queue the product cost.
+    Saving a production time version that is not in use changes nothing.
     """
-    product = instance.product
+    affected_products = CostDependencyService.get_affected_products('production_time', instance.pk)
 
-    try:
-        CostService.recalculate_product_cost(
-            product,
-            calculated_by='system - production_time_update',
-            notes=f'Triggered by ProductionTime v{instance.version} update'
-        )
-    except Exception:
-        # Log error but don't fail the signal
-        pass
+    _enqueue_affected(
+        affected_products,
+        calculated_by='system - production_time_update',
+        notes=f'Triggered by ProductionTime v{instance.version} update'
+    )
@@ -0,0 +1,229 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from apps.inventory.models import Ingredient
+from apps.labor.models import ProductionPhase
+from apps.labor.services import LaborService
+from apps.overhead.services import OverheadService
+from apps.products.models import Product
+from .calculators import IngredientCostMatrix, LaborCostCalculator, OverheadCostCalculator
+
+
+class PriceShockSimulator:
+    """
+    Read-only what-if costing for ingredient price changes.
+
+    Recomputes ingredient, overhead and total cost plus margin of every SKU that
+    uses an overridden ingredient, entirely in memory. Nothing is written, so no
+    SKUCost versions or recalculation signals are produced. Ingredient costs come
+    from the cached IngredientCostMatrix and labor/overhead from the cached rate
+    snapshot and OverheadContext, so repeated scenarios are cheap.
+    """
+
+    SORT_FIELDS = [
+        'margin_percentage_change',
+        'total_cost_change',
+        'total_cost_change_pct',
+        'simulated_margin_percentage',
+    ]
+
+    @staticmethod
+    def simulate(overrides, month=None, year=None, sort_by='margin_percentage_change') -> dict:
+        """
+        Simulate ingredient price overrides and return the impact on affected SKUs.
+
+        Args:
+            overrides: List of dicts with an 'ingredient_id' and either 'price'
+                       (new absolute unit cost) or 'change_pct' (e.g. 10 for +10%)
+            month: Month (1-12) whose overhead applies, defaults to current month
+            year: Year, defaults to current year
+            sort_by: One of SORT_FIELDS. Changes sort ascending (biggest margin loss
+                     first), cost changes sort descending.
+
+        Returns:
+            dict: {month, year, overrides, affected_count, items}
+
+        Raises:
+            ValueError: If an override or sort_by is invalid
+        """
+        if month is None or year is None:
+            today = date.today()
+            month = month or today.month
+            year = year or today.year
+
+        if sort_by not in PriceShockSimulator.SORT_FIELDS:
+            raise ValueError(f'sort_by must be one of {", ".join(PriceShockSimulator.SORT_FIELDS)}')
+
+        resolved = PriceShockSimulator.resolve_overrides(overrides)
+        prices = {override['ingredient_id']: override['simulated_price'] for override in resolved}
+
+        matrix = IngredientCostMatrix.get_cached()
+        product_ids = matrix.products_using(prices.keys())
+        baseline_ingredient_costs = matrix.ingredient_costs()
+        simulated_ingredient_costs = matrix.ingredient_costs(overrides=prices)
+
+        products = Product.objects.in_bulk(product_ids)
+        labor_costs = PriceShockSimulator._labor_costs(product_ids)
+
+        overhead_calculator = OverheadCostCalculator()
+        overhead_context = OverheadService.get_overhead_context(month, year)
+
+        items = []
+        for product_id in product_ids:
+            product = products[product_id]
+            labor_cost = labor_costs.get(product_id, Decimal('0'))
+
+            baseline = PriceShockSimulator._cost_line(
+                product, baseline_ingredient_costs[product_id], labor_cost,
+                overhead_calculator, overhead_context, month, year
+            )
+            simulated = PriceShockSimulator._cost_line(
+                product, simulated_ingredient_costs[product_id], labor_cost,
+                overhead_calculator, overhead_context, month, year
+            )
+
+            total_cost_change = simulated['total_cost'] - baseline['total_cost']
+            total_cost_change_pct = Decimal('0')
+            if baseline['total_cost'] > 0:
+                total_cost_change_pct = (total_cost_change / baseline['total_cost']) * 100
+
+            items.append({
+                'product_id': product.id,
+                'sku_code': product.sku_code,
+                'product_name': product.name,
+                'selling_price': float(product.selling_price),
+                'baseline': {key: float(value) for key, value in baseline.items()},
+                'simulated': {key: float(value) for key, value in simulated.items()},
+                'total_cost_change': float(total_cost_change),
+                'total_cost_change_pct': float(total_cost_change_pct),
+                'margin_percentage_change': float(simulated['margin_percentage'] - baseline['margin_percentage']),
+                'simulated_margin_percentage': float(simulated['margin_percentage']),
+            })
+
+        if sort_by in ('total_cost_change', 'total_cost_change_pct'):
+            items.sort(key=lambda item: item[sort_by], reverse=True)
+        elif sort_by == 'simulated_margin_percentage':
+            items.sort(key=lambda item: item['simulated_margin_percentage'])
+        else:
+            items.sort(key=lambda item: item['margin_percentage_change'])
+
+        return {
+            'month': month,
+            'year': year,
+            'overrides': [
+                {
+                    'ingredient_id': override['ingredient_id'],
+                    'name': override['name'],
+                    'current_price': float(override['current_price']),
+                    'simulated_price': float(override['simulated_price']),
+                }
+                for override in resolved
+            ],
+            'affected_count': len(items),
+            'items': items,
+        }
+
+    @staticmethod
+    def resolve_overrides(overrides) -> list:
+        """
+        Turn absolute or percentage overrides into new unit costs.
+
+        Args:
+            overrides: List of dicts with 'ingredient_id' and 'price' or 'change_pct'
+
+        Returns:
+            list of dicts {ingredient_id, name, current_price, simulated_price}
+
+        Raises:
+            ValueError: If an override is malformed or names an unknown ingredient
+        """
+        if not overrides:
+            raise ValueError('At least one ingredient override is required')
+
+        try:
+            ingredient_ids = [int(override['ingredient_id']) for override in overrides]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Each override needs an integer ingredient_id')
+
+        ingredients = Ingredient.objects.in_bulk(ingredient_ids)
+
+        resolved = []
+        for ingredient_id, override in zip(ingredient_ids, overrides):
+            ingredient = ingredients.get(ingredient_id)
+            if ingredient is None:
+                raise ValueError(f'Ingredient {ingredient_id} does not exist')
+
+            try:
+                if override.get('price') is not None:
+                    simulated_price = Decimal(str(override['price']))
+                elif override.get('change_pct') is not None:
+                    change_pct = Decimal(str(override['change_pct']))
+                    simulated_price = ingredient.current_cost_per_unit * (1 + change_pct / 100)
+                else:
+                    raise ValueError(f'Override for ingredient {ingredient_id} needs price or change_pct')
+            except InvalidOperation:
+                raise ValueError(f'Override for ingredient {ingredient_id} is not a number')
+
+            if simulated_price < 0:
+                raise ValueError(f'Simulated price for ingredient {ingredient_id} is negative')
+
+            resolved.append({
+                'ingredient_id': ingredient_id,
+                'name': ingredient.name,
+                'current_price': ingredient.current_cost_per_unit,
+                'simulated_price': simulated_price,
+            })
+
+        return resolved
+
+    @staticmethod
+    def _labor_costs(product_ids) -> dict:
+        """Compute labor cost per unit for many products from the cached rate snapshot."""
+        production_times = LaborService.get_active_production_times(product_ids)
+
+        phases_by_production_time = defaultdict(list)
+        for phase in ProductionPhase.objects.filter(
+            production_time_id__in=[pt.pk for pt in production_times.values()]
+        ).order_by('id'):
+            phases_by_production_time[phase.production_time_id].append(phase)
+
+        hourly_rates = LaborService.get_hourly_rate_snapshot()
+        labor_calculator = LaborCostCalculator()
+
+        labor_costs = {}
+        for product_id, production_time in production_times.items():
+            labor_costs[product_id], _ = labor_calculator.calculate(
+                None,
+                production_time=production_time,
+                phases=phases_by_production_time[production_time.pk],
+                hourly_rates=hourly_rates,
+            )
+        return labor_costs
+
+    @staticmethod
+    def _cost_line(product, ingredient_cost, labor_cost, overhead_calculator, overhead_context, month, year) -> dict:
+        """Build one side (baseline or simulated) of an impact table row."""
+        overhead_cost, _ = overhead_calculator.calculate(
+            product,
+            month=month,
+            year=year,
+            ingredient_cost=ingredient_cost,
+            labor_cost=labor_cost,
+            overhead_context=overhead_context,
+        )
+        total_cost = ingredient_cost + labor_cost + overhead_cost
+        margin = product.selling_price - total_cost
+
+        margin_percentage = Decimal('0')
+        if product.selling_price > 0:
+            margin_percentage = (margin / product.selling_price) * 100
+
+        return {
+            'ingredient_cost': ingredient_cost,
+            'labor_cost': labor_cost,
+            'overhead_cost': overhead_cost,
+            'total_cost': total_cost,
+            'margin': margin,
+            'margin_percentage': margin_percentage,
+        }
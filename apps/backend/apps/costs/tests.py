@@ -0,0 +1,1273 @@
+import io
+import os
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.inventory.models import Ingredient, IngredientPriceHistory, PurchaseOrder, PurchaseOrderLine, Supplier
+from apps.inventory.services import InventoryService
+from apps.labor.models import Employee, EmployeeWage, ProductionTime, ProductionPhase
+from apps.overhead.models import OverheadCategory, OverheadCost, MonthlyProductionVolume
+from apps.products.models import Product, BillOfMaterials, BOMLineItem
+from apps.products.services import BulkBOMService, ProductService, RecipeCycleError, RecipeGraph
+
+from .calculators import (
+    SKUCostAggregator, BulkCostEngine, IngredientCostCalculator, IngredientCostMatrix, PointInTimeCostEngine,
+)
+from .calculators.ingredient_cost_matrix import INGREDIENT_MATRIX_CACHE_VERSION_KEY
+from .dependencies import CostDependencyService
+from .metrics import CostRunMetricsService, percentile
+from .models import (
+    MARGIN_PERCENTAGE_LIMIT, SKUCost, CostComponent, InflationTracking, CostDependency, CostRecalculationRequest,
+    ProductMonthlyCost, CategoryMonthlyCost, CostRunMetrics,
+)
+from .queue import CostRecalculationQueue
+from .rollups import CostRollupService
+from .services import CostService
+from .simulation import PriceShockSimulator
+
+MONTH = 3
+YEAR = 2025
+
+
+def create_catalogue(product_count, start=0):
+    """Create products with an active BOM and production time, plus shared labor/overhead data."""
+    flour, _ = Ingredient.objects.get_or_create(
+        name='Bot mi',
+        defaults={'unit': 'kg', 'category': 'flour', 'current_cost_per_unit': Decimal('22000')},
+    )
+    butter, _ = Ingredient.objects.get_or_create(
+        name='Bo',
+        defaults={'unit': 'kg', 'category': 'dairy', 'current_cost_per_unit': Decimal('180000')},
+    )
+
+    if not Employee.objects.exists():
+        for index, (role, base_rate) in enumerate([('baker', '8000000'), ('baker', '9000000'), ('packer', '6000000')]):
+            employee = Employee.objects.create(
+                employee_id=f'EMP-{index}',
+                name=f'Employee {index}',
+                role=role,
+                hire_date=date(2024, 1, 1),
+            )
+            EmployeeWage.objects.create(
+                employee=employee,
+                base_rate=Decimal(base_rate),
+                effective_date=date(2024, 1, 1),
+            )
+
+    if not OverheadCategory.objects.exists():
+        rent = OverheadCategory.objects.create(name='Rent', allocation_method='per_unit_produced')
+        OverheadCategory.objects.create(
+            name='Maintenance',
+            allocation_method='percentage_of_prime_cost',
+            allocation_percentage=Decimal('5'),
+        )
+        MonthlyProductionVolume.objects.create(month=MONTH, year=YEAR, total_units_produced=Decimal('15000'))
+        OverheadCost.objects.create(category=rent, amount=Decimal('30000000'), month=MONTH, year=YEAR)
+
+    products = []
+    for index in range(start, start + product_count):
+        product = Product.objects.create(
+            sku_code=f'SKU-{index:04d}',
+            name=f'Banh {index}',
+            category='bread',
+            selling_price=Decimal('15000'),
+        )
+        bom = BillOfMaterials.objects.create(product=product, version=1, status='active')
+        BOMLineItem.objects.create(bom=bom, ingredient=flour, quantity_per_unit=Decimal('0.15'), waste_percentage=Decimal('2'))
+        BOMLineItem.objects.create(bom=bom, ingredient=butter, quantity_per_unit=Decimal('0.01') * (index + 1))
+
+        production_time = ProductionTime.objects.create(
+            product=product,
+            total_time_minutes=Decimal('120'),
+            batch_size=20,
+            effective_date=date(2024, 1, 1),
+        )
+        ProductionPhase.objects.create(
+            production_time=production_time, phase='mixing', duration_minutes=Decimal('15'), employee_role='baker'
+        )
+        ProductionPhase.objects.create(
+            production_time=production_time, phase='packaging', duration_minutes=Decimal('10'),
+            employees_required=2, employee_role='packer'
+        )
+        products.append(product)
+
+    return products
+
+
+class BulkCostEngineTests(TestCase):
+    def setUp(self):
+        self.products = create_catalogue(3)
+        SKUCost.objects.all().delete()
+
+    def test_bulk_run_matches_single_product_calculation(self):
+        aggregator = SKUCostAggregator()
+        expected = {
+            product.pk: aggregator.calculate_sku_cost(product, month=MONTH, year=YEAR)
+            for product in self.products
+        }
+
+        result = BulkCostEngine(aggregator).run(month=MONTH, year=YEAR, force=True)
+
+        self.assertEqual(result['total_products'], 3)
+        self.assertEqual(result['success_count'], 3)
+        self.assertEqual(result['failed_count'], 0)
+        for product in self.products:
+            single = expected[product.pk]
+            single.refresh_from_db()
+            bulk = product.sku_costs.get(version=2)
+            self.assertEqual(bulk.ingredient_cost, single.ingredient_cost)
+            self.assertEqual(bulk.labor_cost, single.labor_cost)
+            self.assertEqual(bulk.overhead_cost, single.overhead_cost)
+            self.assertEqual(bulk.total_cost_per_unit, single.total_cost_per_unit)
+            self.assertEqual(bulk.components.count(), single.components.count())
+            self.assertEqual(bulk.inflation_records.get().previous_sku_cost, single)
+
+    def test_query_count_does_not_grow_with_products(self):
+        aggregator = SKUCostAggregator()
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as small_run:
+            aggregator.recalculate_all(month=MONTH, year=YEAR)
+
+        create_catalogue(12, start=3)
+        SKUCost.objects.all().delete()
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as large_run:
+            result = aggregator.recalculate_all(month=MONTH, year=YEAR)
+
+        self.assertEqual(result['success_count'], 15)
+        self.assertEqual(len(large_run.captured_queries), len(small_run.captured_queries))
+        self.assertEqual(CostComponent.objects.count(), 15 * 6)
+        self.assertFalse(InflationTracking.objects.exists())
+
+
+class CostRunMetricsTests(TestCase):
+    """Cost runs record wall time, queries and rows written per stage."""
+
+    def setUp(self):
+        self.products = create_catalogue(3)
+        SKUCost.objects.all().delete()
+
+    def test_bulk_run_records_stages(self):
+        engine = BulkCostEngine(SKUCostAggregator())
+        with CaptureQueriesContext(connection) as run:
+            engine.run(month=MONTH, year=YEAR, calculated_by='tester')
+
+        metrics = CostRunMetrics.objects.get()
+        self.assertEqual(engine.last_metrics, metrics)
+        self.assertEqual((metrics.run_type, metrics.product_count, metrics.computed_count), ('bulk', 3, 3))
+        self.assertEqual(metrics.stages['ingredient_calculator']['calls'], 3)
+        self.assertEqual(metrics.stages['save_sku_costs']['rows'], 3)
+        self.assertEqual(metrics.stages['save_components']['rows'], 3 * 6)
+        self.assertEqual(metrics.rows_written, 3 + 3 * 6)
+        # Everything but storing the metrics row and rotating is counted
+        self.assertEqual(metrics.query_count, len(run.captured_queries) - 2)
+        # Only the savepoint statements of the save transaction fall between stages
+        self.assertEqual(
+            sum(stats['queries'] for stats in metrics.stages.values()),
+            metrics.query_count - 2
+        )
+
+    def test_runs_without_products_are_not_recorded(self):
+        BulkCostEngine(SKUCostAggregator()).run(products=[], month=MONTH, year=YEAR)
+        self.assertFalse(CostRunMetrics.objects.exists())
+
+    @override_settings(COST_RUN_METRICS_KEEP=2)
+    def test_old_runs_are_rotated_out(self):
+        engine = BulkCostEngine(SKUCostAggregator())
+        for _ in range(4):
+            engine.run(month=MONTH, year=YEAR, force=True)
+
+        self.assertEqual(CostRunMetrics.objects.count(), 2)
+        self.assertEqual(CostRunMetrics.objects.first(), engine.last_metrics)
+
+    def test_summary_percentiles(self):
+        self.assertEqual(percentile([5, 1, 4, 2, 3], 50), 3)
+        self.assertEqual(percentile(list(range(1, 21)), 95), 19)
+        self.assertIsNone(percentile([], 95))
+
+        engine = BulkCostEngine(SKUCostAggregator())
+        engine.run(month=MONTH, year=YEAR)
+        engine.run(month=MONTH, year=YEAR, force=True)
+        CostService.get_costs_as_of(months=2, end=date(YEAR, MONTH, 1))
+
+        summary = CostRunMetricsService.get_summary(run_type='bulk')
+        self.assertEqual(summary['run_count'], 2)
+        self.assertEqual(summary['stages']['save_sku_costs']['rows'], {'p50': 3, 'p95': 3})
+        self.assertIn('fingerprint', summary['stages'])
+        self.assertEqual(CostRunMetricsService.get_summary()['run_count'], 3)
+
+        user = get_user_model().objects.create_user(username='analyst', password='secret')
+        self.client.force_login(user)
+        response = self.client.get(reverse('costs:cost_run_metrics_api'), {'run_type': 'point_in_time'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['run_count'], 1)
+        self.assertIn('overhead_calculator', response.json()['stages'])
+
+    def test_command_profile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'run.prof')
+            output = io.StringIO()
+            call_command('recalculate_costs', month=MONTH, year=YEAR, profile=path, stdout=output)
+
+            self.assertTrue(os.path.getsize(path) > 0)
+        self.assertIn('Recalculated 3/3 products', output.getvalue())
+        self.assertIn('save_sku_costs', output.getvalue())
+        self.assertEqual(CostRunMetrics.objects.get().calculated_by, 'recalculate_costs')
+
+
+class InputFingerprintTests(TestCase):
+    def setUp(self):
+        self.products = create_catalogue(2)
+        SKUCost.objects.all().delete()
+        self.aggregator = SKUCostAggregator()
+
+    def test_unchanged_inputs_do_not_create_a_new_version(self):
+        product = self.products[0]
+        first = self.aggregator.calculate_sku_cost(product, month=MONTH, year=YEAR)
+
+        again = self.aggregator.calculate_sku_cost(product, month=MONTH, year=YEAR)
+
+        self.assertEqual(again, first)
+        self.assertEqual(product.sku_costs.count(), 1)
+        self.assertEqual(CostComponent.objects.filter(sku_cost__product=product).count(), 6)
+        self.assertFalse(InflationTracking.objects.exists())
+
+    def test_changed_input_creates_a_new_version(self):
+        product = self.products[0]
+        first = self.aggregator.calculate_sku_cost(product, month=MONTH, year=YEAR)
+
+        Ingredient.objects.filter(name='Bo').update(current_cost_per_unit=Decimal('190000'))
+        second = self.aggregator.calculate_sku_cost(product, month=MONTH, year=YEAR)
+        other_month = self.aggregator.calculate_sku_cost(product, month=MONTH + 1, year=YEAR)
+
+        self.assertEqual((first.version, second.version, other_month.version), (1, 2, 3))
+        self.assertNotEqual(first.input_fingerprint, second.input_fingerprint)
+        self.assertNotEqual(second.input_fingerprint, other_month.input_fingerprint)
+
+    def test_force_creates_a_new_version(self):
+        product = self.products[0]
+        self.aggregator.calculate_sku_cost(product, month=MONTH, year=YEAR)
+
+        forced = self.aggregator.calculate_sku_cost(product, month=MONTH, year=YEAR, force=True)
+
+        self.assertEqual(forced.version, 2)
+
+    def test_bulk_run_skips_unchanged_products(self):
+        self.aggregator.recalculate_all(month=MONTH, year=YEAR)
+        ProductionPhase.objects.filter(
+            production_time__product=self.products[1], phase='mixing'
+        ).update(duration_minutes=Decimal('20'))
+
+        result = self.aggregator.recalculate_all(month=MONTH, year=YEAR)
+
+        self.assertEqual(result['skipped_count'], 1)
+        self.assertEqual(result['success_count'], 1)
+        self.assertEqual(result['failed_count'], 0)
+        self.assertEqual(self.products[0].sku_costs.count(), 1)
+        self.assertEqual(self.products[1].sku_costs.count(), 2)
+
+    def test_single_and_bulk_paths_agree_on_fingerprint(self):
+        product = self.products[0]
+        single = self.aggregator.calculate_sku_cost(product, month=MONTH, year=YEAR)
+
+        result = self.aggregator.recalculate_all(month=MONTH, year=YEAR)
+
+        self.assertEqual(result['skipped_count'], 1)
+        self.assertEqual(product.sku_costs.get(), single)
+
+
+class IngredientCostMatrixTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = create_catalogue(4)
+        Ingredient.objects.filter(name='Bot mi').update(current_cost_per_unit=Decimal('22123.4567'))
+        # A product without an active BOM costs nothing
+        self.products.append(Product.objects.create(
+            sku_code='SKU-EMPTY', name='Empty', category='bread', selling_price=Decimal('1000')
+        ))
+
+    def test_matches_decimal_calculator_to_the_dong(self):
+        matrix = IngredientCostMatrix.build()
+        costs = matrix.ingredient_costs()
+
+        calculator = IngredientCostCalculator()
+        for product in self.products:
+            expected, _ = calculator.calculate(product)
+            self.assertAlmostEqual(costs[product.pk], expected, delta=Decimal('0.5'))
+        self.assertEqual(matrix.reconcile(), [])
+
+    def test_build_uses_fixed_number_of_queries(self):
+        with self.assertNumQueries(3):
+            IngredientCostMatrix.build()
+        create_catalogue(10, start=4)
+        with self.assertNumQueries(3):
+            IngredientCostMatrix.build()
+
+    def test_price_overrides(self):
+        matrix = IngredientCostMatrix.build(self.products[:2])
+        butter = Ingredient.objects.get(name='Bo')
+        base = matrix.ingredient_costs()
+
+        shocked = matrix.ingredient_costs(overrides={butter.pk: Decimal('200000')})
+
+        for product in self.products[:2]:
+            line = BOMLineItem.objects.get(bom__product=product, ingredient=butter)
+            expected = base[product.pk] + line.effective_quantity * Decimal('20000')
+            self.assertAlmostEqual(shocked[product.pk], expected, delta=Decimal('0.5'))
+
+    def test_price_change_invalidates_the_cached_matrix_after_commit(self):
+        # A separate cache connection stands in for the cost worker process
+        worker_cache = caches.create_connection('default')
+        butter = Ingredient.objects.get(name='Bo')
+        before = IngredientCostMatrix.get_cached().ingredient_costs()
+        cached_version = worker_cache.get(INGREDIENT_MATRIX_CACHE_VERSION_KEY)
+
+        butter.current_cost_per_unit += Decimal('20000')
+        with self.captureOnCommitCallbacks(execute=True):
+            butter.save()
+            self.assertEqual(worker_cache.get(INGREDIENT_MATRIX_CACHE_VERSION_KEY), cached_version)
+
+        self.assertNotEqual(worker_cache.get(INGREDIENT_MATRIX_CACHE_VERSION_KEY), cached_version)
+        line = BOMLineItem.objects.get(bom__product=self.products[0], ingredient=butter)
+        self.assertAlmostEqual(
+            IngredientCostMatrix.get_cached().ingredient_costs()[self.products[0].pk],
+            before[self.products[0].pk] + line.effective_quantity * Decimal('20000'),
+            delta=Decimal('0.5'),
+        )
+
+
+class StoredMarginTests(TestCase):
+    def setUp(self):
+        self.products = create_catalogue(3)
+        SKUCost.objects.all().delete()
+        CostService.recalculate_products(Product.objects.all(), month=MONTH, year=YEAR)
+
+    def test_bulk_and_single_paths_store_margins(self):
+        single = SKUCostAggregator().calculate_sku_cost(self.products[0], month=MONTH, year=YEAR, force=True)
+
+        for sku_cost in SKUCost.objects.select_related('product'):
+            expected_margin = sku_cost.product.selling_price - sku_cost.total_cost_per_unit
+            self.assertAlmostEqual(sku_cost.margin, expected_margin, places=3)
+            self.assertAlmostEqual(
+                sku_cost.margin_percentage, expected_margin / sku_cost.product.selling_price * 100, places=3
+            )
+            self.assertAlmostEqual(
+                sku_cost.ingredient_percentage + sku_cost.labor_percentage + sku_cost.overhead_percentage,
+                Decimal('100'),
+                places=2,
+            )
+        self.assertEqual(single.version, 2)
+
+    def test_selling_price_change_updates_margins(self):
+        product = self.products[0]
+        product.selling_price = Decimal('30000')
+        product.save()
+
+        sku_cost = product.sku_costs.get()
+        self.assertAlmostEqual(sku_cost.margin, Decimal('30000') - sku_cost.total_cost_per_unit, places=3)
+        self.assertAlmostEqual(sku_cost.margin_percentage, sku_cost.margin / Decimal('300'), places=3)
+
+    def test_tiny_selling_price_clamps_margin_percentage(self):
+        product = self.products[0]
+        # A margin of about -2e10 %, beyond what the column holds
+        SKUCost.objects.filter(product=product).update(total_cost_per_unit=Decimal('2000000'))
+        product.selling_price = Decimal('0.01')
+        product.save()
+
+        # Stored by the SQL update of refresh_margins()
+        sku_cost = product.sku_costs.get()
+        self.assertEqual(sku_cost.margin_percentage, -MARGIN_PERCENTAGE_LIMIT)
+        self.assertEqual(sku_cost.margin, Decimal('-1999999.99'))
+
+        # Computed by SKUCost.update_derived_fields() on save
+        sku_cost.margin_percentage = Decimal('0')
+        sku_cost.update_derived_fields()
+        self.assertEqual(sku_cost.margin_percentage, -MARGIN_PERCENTAGE_LIMIT)
+
+    def test_saves_without_a_price_change_keep_sku_costs(self):
+        product = self.products[0]
+        sku_cost = product.sku_costs.get()
+
+        product.name = 'Banh mi moi'
+        product.is_active = False
+        product.save()
+        product.selling_price = Decimal('15000.00')
+        product.save()
+
+        self.assertEqual(product.sku_costs.get().updated_at, sku_cost.updated_at)
+
+    def test_summary_is_computed_with_sql_aggregates(self):
+        with CaptureQueriesContext(connection) as queries:
+            summary = CostService.get_cost_summary()
+
+        # One aggregate query computes every average
+        self.assertEqual(sum('AVG(' in query['sql'] for query in queries.captured_queries), 1)
+
+        costs = list(SKUCost.objects.all())
+        self.assertEqual(summary['total_products'], 3)
+        self.assertAlmostEqual(summary['avg_margin'], float(sum(c.margin for c in costs) / 3), places=2)
+        self.assertEqual(summary['lowest_margin_sku']['product'], 'SKU-0002')
+
+    def test_min_margin_filter_runs_in_sql(self):
+        threshold = SKUCost.objects.get(product=self.products[1]).margin_percentage
+
+        filtered = CostService.get_all_active_costs().filter(margin_percentage__gte=threshold)
+
+        self.assertEqual(
+            sorted(cost.product.sku_code for cost in filtered),
+            ['SKU-0000', 'SKU-0001'],
+        )
+
+
+class CurrentCostTests(TestCase):
+    def setUp(self):
+        self.products = create_catalogue(2)
+        SKUCost.objects.all().delete()
+
+    def current(self, product):
+        return product.sku_costs.get(is_current=True)
+
+    def test_single_and_bulk_paths_flag_the_latest_cost(self):
+        aggregator = SKUCostAggregator()
+        first = aggregator.calculate_sku_cost(self.products[0], month=MONTH, year=YEAR)
+        self.assertTrue(first.is_current)
+
+        BulkCostEngine(aggregator).run(month=MONTH, year=YEAR, force=True)
+
+        for product in self.products:
+            self.assertEqual(self.current(product), product.sku_costs.order_by('-version').first())
+        self.assertEqual(SKUCost.objects.filter(is_current=True).count(), 2)
+
+    def test_activation_and_approval_move_the_flag(self):
+        aggregator = SKUCostAggregator()
+        product = self.products[0]
+        first = aggregator.calculate_sku_cost(product, month=MONTH, year=YEAR)
+        second = aggregator.calculate_sku_cost(product, month=MONTH, year=YEAR, force=True)
+
+        # An active cost wins over a newer calculated one
+        CostService.activate_cost(first)
+        self.assertEqual(self.current(product), first)
+
+        # Approving the only calculated cost leaves the active one current
+        CostService.approve_cost(second)
+        self.assertEqual(self.current(product), first)
+
+        third = aggregator.calculate_sku_cost(product, month=MONTH, year=YEAR, force=True)
+        CostService.activate_cost(third)
+        self.assertEqual(self.current(product), third)
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'archived')
+        self.assertFalse(first.is_current)
+
+    def test_active_costs_are_read_with_one_query(self):
+        CostService.recalculate_products(Product.objects.all(), month=MONTH, year=YEAR)
+        with CaptureQueriesContext(connection) as small:
+            small_costs = [cost.product.sku_code for cost in CostService.get_all_active_costs()]
+
+        create_catalogue(8, start=2)
+        CostService.recalculate_products(Product.objects.all(), month=MONTH, year=YEAR)
+        with CaptureQueriesContext(connection) as large:
+            large_costs = [cost.product.sku_code for cost in CostService.get_all_active_costs()]
+
+        self.assertEqual(len(small_costs), 2)
+        self.assertEqual(len(large_costs), 10)
+        self.assertEqual(len(small.captured_queries), 1)
+        self.assertEqual(len(large.captured_queries), 1)
+
+    def test_cost_list_api_query_count_does_not_grow(self):
+        CostService.recalculate_products(Product.objects.all(), month=MONTH, year=YEAR)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/costs/list/')
+
+        create_catalogue(8, start=2)
+        CostService.recalculate_products(Product.objects.all(), month=MONTH, year=YEAR)
+        with CaptureQueriesContext(connection) as large:
+            items = self.client.get('/costs/list/', {'fields': 'sku_code,margin_percentage'}).json()['items']
+
+        self.assertEqual(len(items), 10)
+        self.assertEqual(set(items[0]), {'sku_code', 'margin_percentage'})
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+    def test_inactive_products_keep_only_their_active_cost(self):
+        aggregator = SKUCostAggregator()
+        active_cost = aggregator.calculate_sku_cost(self.products[0], month=MONTH, year=YEAR)
+        CostService.activate_cost(active_cost)
+        aggregator.calculate_sku_cost(self.products[1], month=MONTH, year=YEAR)
+
+        Product.objects.filter(pk__in=[p.pk for p in self.products]).update(is_active=False)
+
+        self.assertEqual(list(CostService.get_all_active_costs()), [active_cost])
+
+
+class CostExportTests(TestCase):
+    def setUp(self):
+        self.products = create_catalogue(2)
+        SKUCost.objects.all().delete()
+        aggregator = SKUCostAggregator()
+        for product in self.products:
+            aggregator.calculate_sku_cost(product, month=MONTH, year=YEAR)
+            aggregator.calculate_sku_cost(product, month=MONTH, year=YEAR, force=True)
+
+    def test_csv_stream_has_one_line_per_cost(self):
+        current = list(CostService.stream_costs_csv())
+        all_versions = list(CostService.stream_costs_csv(all_versions=True))
+
+        self.assertTrue(current[0].startswith('SKU Code,Product Name'))
+        self.assertEqual(len(current), 3)
+        self.assertEqual(len(all_versions), 5)
+        self.assertTrue(all_versions[1].startswith('SKU-0000,Banh 0,2,'))
+        self.assertEqual(CostService.export_costs_csv(), ''.join(current))
+
+    def test_filtered_export_keeps_active_versions(self):
+        # A second 'active' version can only come from a direct status write
+        SKUCost.objects.filter(product=self.products[0]).update(status='active')
+        SKUCost.objects.filter(product=self.products[1], version=1).update(status='archived')
+
+        rows = list(CostService.iter_export_rows(products=self.products))
+
+        self.assertEqual([(row[0], row[2]) for row in rows], [('SKU-0000', 2), ('SKU-0000', 1), ('SKU-0001', 2)])
+
+    def test_export_query_count_does_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as small:
+            list(CostService.stream_costs_csv(all_versions=True))
+
+        for product in create_catalogue(6, start=2):
+            SKUCostAggregator().calculate_sku_cost(product, month=MONTH, year=YEAR)
+
+        with CaptureQueriesContext(connection) as large:
+            rows = list(CostService.stream_costs_csv(all_versions=True))
+
+        self.assertEqual(len(rows), 11)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+    def test_xlsx_export(self):
+        from openpyxl import load_workbook
+
+        with CostService.export_costs_xlsx(products=self.products[:1], all_versions=True) as output:
+            rows = list(load_workbook(output, read_only=True).active.values)
+
+        self.assertEqual(rows[0][0], 'SKU Code')
+        self.assertEqual([row[:3] for row in rows[1:]], [('SKU-0000', 'Banh 0', 2), ('SKU-0000', 'Banh 0', 1)])
+
+    def test_endpoint_streams(self):
+        user = get_user_model().objects.create_user(username='accountant', password='secret')
+        self.client.force_login(user)
+
+        response = self.client.get('/costs/export/', {'all_versions': '1'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 5)
+
+        response = self.client.get('/costs/export/', {'format': 'xlsx'})
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['Content-Disposition'].endswith('.xlsx"'))
+
+
+class PointInTimeCostTests(TestCase):
+    """Past months are costed with the BOM, prices and wages in effect then."""
+
+    def setUp(self):
+        cache.clear()
+        self.products = create_catalogue(2)
+        self.product = self.products[0]
+        self.flour = Ingredient.objects.get(name='Bot mi')
+        self.engine = PointInTimeCostEngine(SKUCostAggregator())
+
+        BillOfMaterials.objects.filter(product=self.product).update(effective_date=date(2024, 1, 1), status='archived')
+        new_bom = BillOfMaterials.objects.create(
+            product=self.product, version=2, status='active', effective_date=date(2025, 3, 1)
+        )
+        BOMLineItem.objects.create(bom=new_bom, ingredient=self.flour, quantity_per_unit=Decimal('0.3'))
+
+        IngredientPriceHistory.objects.create(
+            ingredient=self.flour, cost_per_unit=Decimal('20000'), previous_cost=Decimal('18000'),
+            effective_date=date(2025, 1, 1)
+        )
+        IngredientPriceHistory.objects.create(
+            ingredient=self.flour, cost_per_unit=Decimal('22000'), previous_cost=Decimal('20000'),
+            effective_date=date(2025, 3, 1)
+        )
+
+        old_wage = EmployeeWage.objects.get(employee__employee_id='EMP-0')
+        old_wage.end_date = date(2025, 2, 14)
+        old_wage.save()
+        EmployeeWage.objects.create(
+            employee=old_wage.employee, base_rate=Decimal('12000000'), effective_date=date(2025, 2, 15)
+        )
+
+    def costs(self, periods, products=None):
+        result = self.engine.run(products=products or [self.product], periods=periods)
+        self.assertEqual(result['errors'], [])
+        return {(cost['month'], cost['year']): cost for cost in result['items'][0]['costs']}
+
+    def test_inputs_follow_effective_dates(self):
+        costs = self.costs([(12, 2024), (1, 2025), (2, 2025), (3, 2025)])
+
+        # BOM v1: 0.15 kg flour with 2% waste plus butter
+        flour_quantity = Decimal('0.15') / Decimal('0.98')
+        self.assertAlmostEqual(
+            costs[(1, 2025)]['ingredient_cost'] - costs[(12, 2024)]['ingredient_cost'],
+            flour_quantity * 2000, places=4
+        )
+        self.assertEqual(costs[(2, 2025)]['ingredient_cost'], costs[(1, 2025)]['ingredient_cost'])
+        self.assertEqual(costs[(3, 2025)]['ingredient_cost'], Decimal('0.3') * 22000)
+
+        self.assertEqual(costs[(12, 2024)]['labor_cost'], costs[(1, 2025)]['labor_cost'])
+        self.assertGreater(costs[(2, 2025)]['labor_cost'], costs[(1, 2025)]['labor_cost'])
+
+    def test_latest_month_matches_live_costing(self):
+        aggregator = SKUCostAggregator()
+        inputs = BulkCostEngine.load_inputs([self.product], MONTH, YEAR)[self.product.pk]
+        live = aggregator.compute_costs(self.product, MONTH, YEAR, **inputs)
+
+        as_of = self.costs([(MONTH, YEAR)])[(MONTH, YEAR)]
+        self.assertEqual(as_of['total_cost_per_unit'], live['total_cost_per_unit'])
+
+    def test_receipts_move_the_current_month(self):
+        today = date.today()
+        purchase_order = PurchaseOrder.objects.create(
+            po_number='PO-AS-OF', supplier=Supplier.objects.create(name='Mill'), order_date=today, status='confirmed'
+        )
+        line = PurchaseOrderLine.objects.create(
+            purchase_order=purchase_order, ingredient=self.flour, quantity=Decimal('10'), unit_price=Decimal('30000')
+        )
+        InventoryService.receive_po_line(line, Decimal('10'))
+
+        live = SKUCostAggregator().calculate_sku_cost(self.product, month=today.month, year=today.year, force=True)
+        as_of = self.costs([(today.month, today.year)])[(today.month, today.year)]
+
+        self.assertAlmostEqual(as_of['ingredient_cost'], live.ingredient_cost, places=2)
+        self.assertAlmostEqual(as_of['total_cost_per_unit'], live.total_cost_per_unit, places=2)
+        self.assertEqual(as_of['ingredient_cost'], Decimal('0.3') * 30000)
+
+    def test_query_count_does_not_grow_with_products_or_months(self):
+        periods = [(month, 2024) for month in range(1, 13)]
+        products = create_catalogue(3, start=2) + self.products
+        self.engine.run(products=products, periods=periods)
+
+        with CaptureQueriesContext(connection) as one_product:
+            self.engine.run(products=self.products[:1], periods=periods[:1])
+        with CaptureQueriesContext(connection) as many:
+            self.engine.run(products=products, periods=periods)
+
+        self.assertEqual(len(one_product), len(many))
+
+    def test_as_of_api(self):
+        user = get_user_model().objects.create_user(username='auditor', password='secret')
+        self.client.force_login(user)
+
+        response = self.client.get('/costs/as-of/', {
+            'products': self.product.pk, 'month': 3, 'year': 2025, 'months': 3
+        })
+
+        self.assertEqual(response.status_code, 200)
+        item = response.json()['items'][0]
+        self.assertEqual([(cost['month'], cost['year']) for cost in item['costs']], [(1, 2025), (2, 2025), (3, 2025)])
+        self.assertEqual(item['costs'][2]['ingredient_cost'], 6600.0)
+
+        self.assertEqual(self.client.get('/costs/as-of/', {'month': 13}).status_code, 400)
+
+
+class MonthlyCostRollupTests(TestCase):
+    def setUp(self):
+        self.products = create_catalogue(2)
+        SKUCost.objects.all().delete()
+        self.aggregator = SKUCostAggregator()
+
+    def backdate(self, months):
+        """Spread each product's cost versions over consecutive past months, oldest first."""
+        today = date.today()
+        for product in self.products:
+            for offset, sku_cost in enumerate(product.sku_costs.order_by('-version')[:months]):
+                period = today.year * 12 + today.month - 1 - offset
+                SKUCost.objects.filter(pk=sku_cost.pk).update(effective_date=date(period // 12, period % 12 + 1, 1))
+        CostRollupService.rebuild_all()
+
+    def test_versions_of_a_month_roll_up_into_one_row(self):
+        product = self.products[0]
+        self.aggregator.calculate_sku_cost(product, month=MONTH, year=YEAR)
+        BulkCostEngine(self.aggregator).run(month=MONTH, year=YEAR, force=True)
+
+        monthly_cost = product.monthly_costs.get()
+        latest = product.sku_costs.order_by('-version').first()
+        self.assertEqual(monthly_cost.version_count, 2)
+        self.assertEqual(monthly_cost.sku_cost, latest)
+        self.assertEqual(monthly_cost.total_cost_per_unit, latest.total_cost_per_unit)
+
+        category_cost = CategoryMonthlyCost.objects.get(category='bread')
+        self.assertEqual(category_cost.product_count, 2)
+        self.assertAlmostEqual(
+            category_cost.total_cost_per_unit,
+            sum(p.monthly_costs.get().total_cost_per_unit for p in self.products) / 2,
+            places=3,
+        )
+
+    def test_deleting_the_only_version_drops_the_month(self):
+        sku_cost = self.aggregator.calculate_sku_cost(self.products[0], month=MONTH, year=YEAR)
+        sku_cost.delete()
+
+        self.assertFalse(ProductMonthlyCost.objects.exists())
+        self.assertFalse(CategoryMonthlyCost.objects.exists())
+
+    def test_selling_price_and_category_changes_reach_rollups(self):
+        product = self.products[0]
+        self.aggregator.calculate_sku_cost(product, month=MONTH, year=YEAR)
+
+        product.selling_price = Decimal('30000')
+        product.category = 'cake'
+        product.save()
+
+        monthly_cost = product.monthly_costs.get()
+        self.assertEqual(monthly_cost.category, 'cake')
+        self.assertEqual(monthly_cost.margin, product.sku_costs.get().margin)
+        self.assertEqual(list(CategoryMonthlyCost.objects.values_list('category', flat=True)), ['cake'])
+
+    def test_series_cost_does_not_grow_with_versions(self):
+        for _ in range(3):
+            BulkCostEngine(self.aggregator).run(month=MONTH, year=YEAR, force=True)
+        self.backdate(3)
+
+        product_ids = [product.pk for product in self.products]
+        with CaptureQueriesContext(connection) as queries:
+            result = CostRollupService.get_series(product_ids=product_ids, categories=['bread'], months=3)
+
+        self.assertEqual(len(queries.captured_queries), 2)
+        self.assertEqual([series['type'] for series in result['series']], ['product', 'product', 'category'])
+        self.assertEqual([len(series['points']) for series in result['series']], [3, 3, 3])
+
+    def test_long_ranges_are_downsampled(self):
+        for _ in range(3):
+            BulkCostEngine(self.aggregator).run(month=MONTH, year=YEAR, force=True)
+        self.backdate(3)
+
+        result = CostRollupService.get_series(product_ids=[self.products[0].pk], months=4, max_points=2)
+
+        self.assertEqual(result['bucket_months'], 2)
+        points = result['series'][0]['points']
+        self.assertEqual([point['months'] for point in points], [1, 2])
+        monthly = list(self.products[0].monthly_costs.order_by('year', 'month'))
+        self.assertAlmostEqual(
+            points[1]['total'],
+            float((monthly[1].total_cost_per_unit + monthly[2].total_cost_per_unit) / 2),
+            places=3,
+        )
+
+    def test_product_trend_and_endpoint(self):
+        for _ in range(2):
+            BulkCostEngine(self.aggregator).run(month=MONTH, year=YEAR, force=True)
+        self.backdate(2)
+
+        trend = CostService.get_cost_trend(self.products[0], months=6)
+        self.assertEqual([point['version'] for point in trend], [1, 2])
+
+        user = get_user_model().objects.create_user(username='analyst', password='secret')
+        self.client.force_login(user)
+        response = self.client.get('/costs/trends/', {'products': [self.products[0].pk], 'months': 6})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['series'][0]['points']), 2)
+
+        response = self.client.get('/costs/trends/', {'months': 'all'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CostDependencyIndexTests(TestCase):
+    def setUp(self):
+        self.products = create_catalogue(2)
+        self.flour = Ingredient.objects.get(name='Bot mi')
+        self.sugar = Ingredient.objects.create(name='Duong', unit='kg', category='sugar', current_cost_per_unit=Decimal('20000'))
+
+    def affected(self, dependency_type, object_key):
+        return set(CostDependencyService.get_affected_products(dependency_type, object_key))
+
+    def test_index_is_built_from_signals(self):
+        self.assertEqual(self.affected('ingredient', self.flour.pk), set(self.products))
+        self.assertEqual(self.affected('employee_role', 'packer'), set(self.products))
+        self.assertEqual(self.affected('employee_role', 'decorator'), set())
+        rent = OverheadCategory.objects.get(name='Rent')
+        self.assertEqual(self.affected('overhead_category', rent.pk), set(self.products))
+
+    def test_index_follows_bom_activation_and_archival(self):
+        product = self.products[0]
+        old_bom = product.get_active_bom()
+        new_bom = BillOfMaterials.objects.create(product=product, version=2, status='draft')
+        BOMLineItem.objects.create(bom=new_bom, ingredient=self.sugar, quantity_per_unit=Decimal('0.05'))
+        self.assertEqual(self.affected('ingredient', self.sugar.pk), set())
+
+        old_bom.status = 'archived'
+        old_bom.save()
+        new_bom.status = 'active'
+        new_bom.save()
+
+        self.assertEqual(self.affected('ingredient', self.sugar.pk), {product})
+        self.assertEqual(self.affected('ingredient', self.flour.pk), {self.products[1]})
+
+    def test_index_follows_new_production_time_version(self):
+        product = self.products[0]
+        old_production_time = product.production_times.get()
+        new_production_time = ProductionTime.objects.create(
+            product=product, version=2, total_time_minutes=Decimal('60'), batch_size=10, effective_date=date(2025, 1, 1)
+        )
+        ProductionPhase.objects.create(
+            production_time=new_production_time, phase='decorating', duration_minutes=Decimal('20'), employee_role='decorator'
+        )
+
+        self.assertEqual(self.affected('production_time', new_production_time.pk), {product})
+        self.assertEqual(self.affected('production_time', old_production_time.pk), set())
+        self.assertEqual(self.affected('employee_role', 'decorator'), {product})
+        self.assertEqual(self.affected('employee_role', 'packer'), {self.products[1]})
+
+    def test_deactivated_product_is_dropped_from_index(self):
+        product = self.products[0]
+        product.is_active = False
+        product.save()
+
+        self.assertFalse(CostDependency.objects.filter(product=product).exists())
+
+    def test_ingredient_trigger_queues_each_affected_product_once(self):
+        unaffected = create_catalogue(1, start=2)[0]
+        BOMLineItem.objects.filter(bom__product=unaffected, ingredient=self.flour).delete()
+        CostRecalculationRequest.objects.all().delete()
+
+        purchase_order = PurchaseOrder.objects.create(
+            po_number='PO-1', supplier=Supplier.objects.create(name='Mekong'), order_date=date(2025, 3, 1)
+        )
+        for unit_price in ('23000', '23500'):
+            PurchaseOrderLine.objects.create(
+                purchase_order=purchase_order,
+                ingredient=self.flour,
+                quantity=Decimal('10'),
+                unit_price=Decimal(unit_price),
+            )
+
+        queued = CostRecalculationRequest.objects.values_list('product_id', flat=True)
+        self.assertCountEqual(queued, [product.pk for product in self.products])
+
+    def test_bulk_receipt_queues_affected_products_once(self):
+        purchase_order = PurchaseOrder.objects.create(
+            po_number='PO-2', supplier=Supplier.objects.create(name='Mekong'), order_date=date(2025, 3, 1)
+        )
+        lines = [
+            PurchaseOrderLine.objects.create(
+                purchase_order=purchase_order, ingredient=ingredient, quantity=Decimal('10'), unit_price=Decimal('25000')
+            )
+            for ingredient in (self.flour, self.flour, Ingredient.objects.get(name='Bo'))
+        ]
+        CostRecalculationRequest.objects.all().delete()
+
+        with CaptureQueriesContext(connection) as queries:
+            InventoryService.receive_purchase_order(purchase_order, {line.pk: Decimal('10') for line in lines})
+
+        queued = CostRecalculationRequest.objects.values_list('product_id', flat=True)
+        self.assertCountEqual(queued, [product.pk for product in self.products])
+        self.assertEqual(
+            len([query for query in queries.captured_queries if 'costs_costrecalculationrequest' in query['sql']]), 1
+        )
+
+
+class CostRecalculationQueueTests(TestCase):
+    def setUp(self):
+        self.products = create_catalogue(3)
+        CostRecalculationRequest.objects.all().delete()
+        SKUCost.objects.all().delete()
+
+    def test_request_path_only_writes_queue_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            CostRecalculationQueue.enqueue(Product.objects.all(), month=MONTH, year=YEAR)
+
+        self.assertEqual(CostRecalculationRequest.objects.count(), 3)
+        self.assertFalse(SKUCost.objects.exists())
+        self.assertFalse(any('costs_skucost' in query['sql'] for query in queries.captured_queries))
+
+    def test_repeated_triggers_coalesce_and_restart_debounce(self):
+        CostRecalculationQueue.enqueue(self.products, month=MONTH, year=YEAR)
+        first_run_after = CostRecalculationRequest.objects.get(product=self.products[0]).run_after
+
+        CostRecalculationQueue.enqueue(self.products[:1], month=MONTH, year=YEAR, notes='Second change')
+
+        self.assertEqual(CostRecalculationRequest.objects.count(), 3)
+        request = CostRecalculationRequest.objects.get(product=self.products[0])
+        self.assertGreaterEqual(request.run_after, first_run_after)
+        self.assertEqual(request.notes, 'Second change')
+
+    def test_requests_are_not_processed_before_debounce_window(self):
+        CostRecalculationQueue.enqueue(self.products, month=MONTH, year=YEAR)
+
+        result = CostRecalculationQueue.process_due(now=timezone.now())
+
+        self.assertEqual(result['claimed_count'], 0)
+        self.assertEqual(CostRecalculationRequest.objects.count(), 3)
+        self.assertFalse(SKUCost.objects.exists())
+
+    def test_worker_recalculates_each_queued_product_once(self):
+        CostRecalculationQueue.enqueue(self.products, month=MONTH, year=YEAR)
+        CostRecalculationQueue.enqueue(self.products, month=MONTH, year=YEAR)
+
+        result = CostRecalculationQueue.process_due(now=timezone.now() + timedelta(minutes=5))
+
+        self.assertEqual(result['success_count'], 3)
+        self.assertFalse(CostRecalculationRequest.objects.exists())
+        for product in self.products:
+            sku_cost = product.sku_costs.get()
+            self.assertEqual((sku_cost.calculation_details['month'], sku_cost.calculation_details['year']), (MONTH, YEAR))
+
+
+    def test_claimed_requests_survive_a_crashed_worker(self):
+        CostRecalculationQueue.enqueue(self.products, month=MONTH, year=YEAR)
+        later = timezone.now() + timedelta(minutes=5)
+
+        # The worker dies after claiming: nothing is lost, nor claimed twice
+        self.assertEqual(len(CostRecalculationQueue.claim_due(now=later)), 3)
+        self.assertEqual(CostRecalculationRequest.objects.count(), 3)
+        self.assertEqual(CostRecalculationQueue.claim_due(now=later), [])
+
+        with override_settings(COST_RECALC_LEASE_SECONDS=0):
+            result = CostRecalculationQueue.process_due(now=later)
+
+        self.assertEqual(result['success_count'], 3)
+        self.assertFalse(CostRecalculationRequest.objects.exists())
+
+    def test_retrigger_while_claimed_keeps_the_request(self):
+        CostRecalculationQueue.enqueue(self.products, month=MONTH, year=YEAR)
+        claimed = CostRecalculationQueue.claim_due(now=timezone.now() + timedelta(minutes=5))
+
+        CostRecalculationQueue.enqueue(self.products[:1], month=MONTH, year=YEAR)
+
+        self.assertEqual(CostRecalculationQueue.complete(claimed), 2)
+        request = CostRecalculationRequest.objects.get()
+        self.assertEqual(request.product, self.products[0])
+        self.assertIsNone(request.claimed_at)
+
+    def test_failed_products_are_requeued(self):
+        # A zero batch size makes the labor calculation of this product fail
+        ProductionTime.objects.filter(product=self.products[0]).update(batch_size=0)
+        CostRecalculationQueue.enqueue(self.products, month=MONTH, year=YEAR)
+
+        later = timezone.now() + timedelta(minutes=5)
+
+        with self.assertLogs('apps.costs', 'ERROR') as logs:
+            result = CostRecalculationQueue.process_due(now=later)
+
+        self.assertEqual((result['success_count'], result['failed_count']), (2, 1))
+        self.assertEqual(result['errors'][0]['product_id'], self.products[0].pk)
+        self.assertIn('SKU-0000', logs.output[0])
+        request = CostRecalculationRequest.objects.get()
+        self.assertEqual(request.product, self.products[0])
+        self.assertIsNone(request.claimed_at)
+        self.assertEqual(request.attempts, 1)
+        self.assertEqual(request.run_after, later + timedelta(seconds=settings.COST_RECALC_RETRY_SECONDS))
+
+    @override_settings(COST_RECALC_RETRY_SECONDS=10, COST_RECALC_MAX_ATTEMPTS=3)
+    def test_failures_back_off_then_become_dead_letters(self):
+        ProductionTime.objects.filter(product=self.products[0]).update(batch_size=0)
+        CostRecalculationQueue.enqueue(self.products[:1], month=MONTH, year=YEAR)
+        now = timezone.now() + timedelta(minutes=5)
+
+        with self.assertLogs('apps.costs', 'ERROR'):
+            for delay in (10, 20):
+                CostRecalculationQueue.process_due(now=now)
+                run_after = CostRecalculationRequest.objects.get().run_after
+                self.assertEqual(run_after, now + timedelta(seconds=delay))
+                # Backing off: not claimed before run_after, even past the max delay
+                self.assertEqual(CostRecalculationQueue.claim_due(now=run_after - timedelta(seconds=1)), [])
+                now = run_after
+
+            result = CostRecalculationQueue.process_due(now=now)
+
+        self.assertEqual(result['dead_lettered_count'], 1)
+        self.assertEqual(list(CostRecalculationQueue.dead_letters()), [CostRecalculationRequest.objects.get()])
+        self.assertEqual(CostRecalculationQueue.claim_due(now=now + timedelta(days=1)), [])
+
+        # A new change to the product gives it a fresh set of attempts
+        CostRecalculationQueue.enqueue(self.products[:1], month=MONTH, year=YEAR)
+        self.assertFalse(CostRecalculationQueue.dead_letters().exists())
+
+
+class BulkBOMServiceTests(TestCase):
+    def setUp(self):
+        self.products = create_catalogue(3)
+        self.flour = Ingredient.objects.get(name='Bot mi')
+        self.butter = Ingredient.objects.get(name='Bo')
+        self.margarine = Ingredient.objects.create(
+            name='Bo thuc vat', unit='kg', category='dairy', current_cost_per_unit=Decimal('90000')
+        )
+        CostRecalculationRequest.objects.all().delete()
+
+    def test_clone_copies_active_lines_into_new_drafts(self):
+        new_boms = BulkBOMService.clone_boms(Product.objects.all())
+
+        self.assertEqual(len(new_boms), 3)
+        for bom in new_boms:
+            bom.refresh_from_db()
+            self.assertEqual((bom.version, bom.status), (2, 'draft'))
+            self.assertEqual(bom.line_items.count(), 2)
+        self.assertEqual(self.products[1].boms.get(version=2).line_items.get(ingredient=self.butter).quantity_per_unit,
+                         Decimal('0.0200'))
+
+    def test_clone_query_count_does_not_grow_with_products(self):
+        with CaptureQueriesContext(connection) as small:
+            BulkBOMService.clone_boms(self.products[:1])
+        products = self.products + create_catalogue(5, start=3)
+        with CaptureQueriesContext(connection) as large:
+            BulkBOMService.clone_boms(products)
+
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_replace_ingredient_scales_and_merges_lines(self):
+        new_boms = BulkBOMService.clone_boms(self.products)
+        BOMLineItem.objects.create(bom=new_boms[0], ingredient=self.margarine, quantity_per_unit=Decimal('0.005'))
+
+        changed = BulkBOMService.replace_ingredient(new_boms, self.butter, self.margarine, ratio=Decimal('1.2'))
+
+        self.assertEqual(changed, 3)
+        self.assertFalse(BOMLineItem.objects.filter(bom__in=new_boms, ingredient=self.butter).exists())
+        self.assertEqual(new_boms[0].line_items.get(ingredient=self.margarine).quantity_per_unit, Decimal('0.0170'))
+        self.assertEqual(new_boms[2].line_items.get(ingredient=self.margarine).quantity_per_unit, Decimal('0.0360'))
+        # The active BOMs are untouched
+        self.assertEqual(BOMLineItem.objects.filter(bom__status='active', ingredient=self.butter).count(), 3)
+
+    def test_replace_ingredient_rejects_active_boms(self):
+        with self.assertRaises(ValueError):
+            BulkBOMService.replace_ingredient(
+                BillOfMaterials.objects.filter(status='active'), self.butter, self.margarine
+            )
+
+    def test_activate_archives_previous_and_queues_one_batch(self):
+        new_boms = BulkBOMService.clone_boms(self.products)
+        BulkBOMService.replace_ingredient(new_boms, self.butter, self.margarine)
+
+        with CaptureQueriesContext(connection) as queries:
+            BulkBOMService.activate_boms(new_boms)
+
+        self.assertEqual(BillOfMaterials.objects.filter(status='active', version=2).count(), 3)
+        self.assertEqual(BillOfMaterials.objects.filter(status='archived', version=1).count(), 3)
+        self.assertEqual(CostRecalculationRequest.objects.count(), 3)
+        inserts = [query for query in queries.captured_queries
+                   if query['sql'].startswith('INSERT') and 'costs_costrecalculationrequest' in query['sql']]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            CostDependencyService.get_affected_products('ingredient', self.margarine.pk).count(), 3
+        )
+        self.assertFalse(CostDependencyService.get_affected_products('ingredient', self.butter.pk).exists())
+
+    def test_activate_rejects_two_boms_of_one_product(self):
+        first = ProductService.create_new_bom_version(self.products[0])
+        second = ProductService.create_new_bom_version(self.products[0])
+
+        with self.assertRaises(ValueError):
+            BulkBOMService.activate_boms([first, second])
+
+    def test_single_bom_activation_goes_through_bulk_path(self):
+        bom = ProductService.create_new_bom_version(self.products[0])
+
+        ProductService.activate_bom(bom)
+
+        self.assertEqual(self.products[0].get_active_bom(), bom)
+        self.assertEqual(CostRecalculationRequest.objects.get().product, self.products[0])
+
+
+class SubRecipeTests(TestCase):
+    """BOM lines can use an intermediate product whose recipe is costed once per run."""
+
+    def setUp(self):
+        cache.clear()
+        self.products = create_catalogue(2)
+        self.flour = Ingredient.objects.get(name='Bot mi')
+        self.yeast = Ingredient.objects.create(
+            name='Men', unit='kg', category='other', current_cost_per_unit=Decimal('120000')
+        )
+        self.dough = Product.objects.create(sku_code='DOUGH', name='Bot nhao', category='other', unit='kg')
+        dough_bom = BillOfMaterials.objects.create(product=self.dough, version=1, status='active')
+        BOMLineItem.objects.create(bom=dough_bom, ingredient=self.flour, quantity_per_unit=Decimal('0.9'))
+        BOMLineItem.objects.create(
+            bom=dough_bom, ingredient=self.yeast, quantity_per_unit=Decimal('0.02'), waste_percentage=Decimal('20')
+        )
+        BOMLineItem.objects.create(
+            bom=self.products[0].get_active_bom(), sub_product=self.dough, quantity_per_unit=Decimal('0.2'),
+            waste_percentage=Decimal('5')
+        )
+        # 0.9 kg flour plus 0.025 kg yeast per kg of dough
+        self.dough_cost = Decimal('0.9') * Decimal('22000') + Decimal('0.025') * Decimal('120000')
+
+    def test_graph_orders_sub_recipes_first_and_costs_them(self):
+        recipes = RecipeGraph.load([self.products[0].pk])
+
+        order = recipes.topological_order()
+        self.assertLess(order.index(self.dough.pk), order.index(self.products[0].pk))
+        self.assertEqual(recipes.unit_costs()[self.dough.pk], self.dough_cost)
+        self.assertEqual(self.dough.latest_cost, self.dough_cost)
+
+    def test_bulk_engine_rolls_sub_recipe_into_ingredient_cost(self):
+        flat_cost, _ = IngredientCostCalculator().calculate(self.products[1])
+
+        BulkCostEngine(SKUCostAggregator()).run(month=MONTH, year=YEAR)
+
+        sku_cost = self.products[0].sku_costs.get()
+        dough_line = self.dough_cost * Decimal('0.2') / Decimal('0.95')
+        # Product 1 uses 0.01 kg more butter than product 0
+        butter_difference = Decimal('0.01') * Decimal('180000')
+        self.assertAlmostEqual(sku_cost.ingredient_cost, flat_cost - butter_difference + dough_line, places=2)
+        component = next(
+            component for component in sku_cost.calculation_details['ingredient_components']
+            if component.get('sub_product_id') == self.dough.pk
+        )
+        self.assertEqual(component['name'], 'Bot nhao')
+        self.assertEqual(self.dough.sku_costs.get().ingredient_cost, self.dough_cost)
+        self.assertEqual(sku_cost.calculation_details['sub_recipes'], {
+            'product_ids': [self.dough.pk], 'includes': ['ingredient'], 'excludes': ['labor', 'overhead'],
+        })
+        self.assertNotIn('sub_recipes', self.products[1].sku_costs.get().calculation_details)
+
+    def test_load_inputs_query_count_does_not_grow_with_sub_recipe_users(self):
+        for product in create_catalogue(4, start=2):
+            BOMLineItem.objects.create(
+                bom=product.get_active_bom(), sub_product=self.dough, quantity_per_unit=Decimal('0.1')
+            )
+        users = list(Product.objects.exclude(pk=self.dough.pk))
+        BulkCostEngine.load_inputs(self.products[:1], MONTH, YEAR)
+
+        with CaptureQueriesContext(connection) as small:
+            BulkCostEngine.load_inputs(self.products[:1], MONTH, YEAR)
+        with CaptureQueriesContext(connection) as large:
+            BulkCostEngine.load_inputs(users, MONTH, YEAR)
+
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_matrix_flattens_sub_recipes(self):
+        matrix = IngredientCostMatrix.build()
+        ingredient_cost, _ = IngredientCostCalculator().calculate(self.products[0])
+
+        self.assertAlmostEqual(matrix.ingredient_costs()[self.products[0].pk], ingredient_cost, places=2)
+        self.assertEqual(matrix.reconcile(), [])
+        self.assertEqual(sorted(matrix.products_using([self.yeast.pk])), sorted([self.products[0].pk, self.dough.pk]))
+
+    def test_raw_ingredient_change_only_affects_downstream_products(self):
+        affected = CostDependencyService.get_affected_products('ingredient', self.yeast.pk)
+
+        self.assertEqual(set(affected), {self.products[0], self.dough})
+
+    def test_activating_sub_recipe_queues_its_users(self):
+        CostRecalculationRequest.objects.all().delete()
+        new_bom = ProductService.create_new_bom_version(self.dough)
+
+        ProductService.activate_bom(new_bom)
+
+        self.assertEqual(
+            set(CostRecalculationRequest.objects.values_list('product_id', flat=True)),
+            {self.dough.pk, self.products[0].pk}
+        )
+
+    def test_cycles_are_rejected(self):
+        draft = ProductService.create_new_bom_version(self.dough)
+        line = BOMLineItem(bom=draft, sub_product=self.products[0], quantity_per_unit=Decimal('0.1'))
+
+        with self.assertRaises(ValidationError):
+            line.full_clean()
+
+        line.save()
+        with self.assertRaises(RecipeCycleError):
+            BulkBOMService.activate_boms([draft])
+        self.assertEqual(self.dough.get_active_bom().version, 1)
+
+    def test_point_in_time_costs_sub_recipes_on_the_date(self):
+        BulkCostEngine(SKUCostAggregator()).run(month=MONTH, year=YEAR)
+        today = date.today()
+
+        result = PointInTimeCostEngine(SKUCostAggregator()).run(
+            products=[self.products[0]], periods=[(today.month, today.year)]
+        )
+
+        self.assertEqual(result['errors'], [])
+        self.assertAlmostEqual(
+            result['items'][0]['costs'][0]['ingredient_cost'],
+            self.products[0].sku_costs.get().ingredient_cost,
+            places=2
+        )
+
+
+class PriceShockSimulatorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = create_catalogue(3)
+        self.flour = Ingredient.objects.get(name='Bot mi')
+        self.butter = Ingredient.objects.get(name='Bo')
+        self.sugar = Ingredient.objects.create(name='Duong', unit='kg', category='sugar', current_cost_per_unit=Decimal('20000'))
+        SKUCost.objects.all().delete()
+        CostRecalculationRequest.objects.all().delete()
+
+    def test_simulation_matches_recalculation_with_new_price(self):
+        result = PriceShockSimulator.simulate(
+            [{'ingredient_id': self.butter.pk, 'change_pct': 10}], month=MONTH, year=YEAR
+        )
+
+        self.assertEqual(result['affected_count'], 3)
+        self.assertEqual(result['overrides'][0]['simulated_price'], 198000.0)
+
+        Ingredient.objects.filter(pk=self.butter.pk).update(current_cost_per_unit=Decimal('198000'))
+        aggregator = SKUCostAggregator()
+        for item in result['items']:
+            expected = aggregator.compute_costs(Product.objects.get(pk=item['product_id']), MONTH, YEAR)
+            self.assertAlmostEqual(item['simulated']['total_cost'], float(expected['total_cost_per_unit']), delta=0.5)
+            self.assertAlmostEqual(item['simulated']['overhead_cost'], float(expected['overhead_cost']), delta=0.5)
+
+    def test_items_are_sorted_by_margin_loss(self):
+        result = PriceShockSimulator.simulate([{'ingredient_id': self.butter.pk, 'price': 300000}], month=MONTH, year=YEAR)
+
+        changes = [item['margin_percentage_change'] for item in result['items']]
+        self.assertEqual(changes, sorted(changes))
+        # The product using the most butter loses the most margin
+        self.assertEqual(result['items'][0]['sku_code'], 'SKU-0002')
+
+    def test_only_affected_products_are_returned(self):
+        result = PriceShockSimulator.simulate([{'ingredient_id': self.sugar.pk, 'price': 30000}], month=MONTH, year=YEAR)
+
+        self.assertEqual(result['affected_count'], 0)
+
+    def test_simulation_writes_nothing(self):
+        PriceShockSimulator.simulate([{'ingredient_id': self.flour.pk, 'change_pct': 50}], month=MONTH, year=YEAR)
+
+        self.flour.refresh_from_db()
+        self.assertEqual(self.flour.current_cost_per_unit, Decimal('22000'))
+        self.assertFalse(SKUCost.objects.exists())
+        self.assertFalse(CostRecalculationRequest.objects.exists())
+
+    def test_repeated_scenarios_reuse_cached_snapshots(self):
+        PriceShockSimulator.simulate([{'ingredient_id': self.flour.pk, 'change_pct': 5}], month=MONTH, year=YEAR)
+
+        # Only the override ingredients, products and production times are read again
+        with self.assertNumQueries(4):
+            PriceShockSimulator.simulate([{'ingredient_id': self.flour.pk, 'change_pct': 15}], month=MONTH, year=YEAR)
+
+    def test_invalid_overrides(self):
+        for overrides in ([], [{'ingredient_id': self.flour.pk}], [{'ingredient_id': 999999, 'price': 1}],
+                          [{'ingredient_id': self.flour.pk, 'price': 'abc'}]):
+            with self.assertRaises(ValueError):
+                PriceShockSimulator.simulate(overrides, month=MONTH, year=YEAR)
+
+    def test_endpoint(self):
+        user = get_user_model().objects.create_user(username='planner', password='secret')
+        self.client.force_login(user)
+
+        response = self.client.post(
+            '/costs/simulate/',
+            data={'overrides': [{'ingredient_id': self.flour.pk, 'price': 25000}], 'month': MONTH, 'year': YEAR},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['affected_count'], 3)
+
+        response = self.client.post('/costs/simulate/', data={'overrides': []}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
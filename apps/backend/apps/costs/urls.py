@@ -10,7 +10,11 @@ urlpatterns = [
     path('product/<int:pk>/history/', views.CostHistoryView.as_view(), name='cost_history'),
     path('product/<int:product_id>/trend/', views.CostTrendAPIView.as_view(), name='cost_trend_api'),
     path('product/<int:product_id>/trend-public/', views.CostTrendPublicAPIView.as_view(), name='cost_trend_public_api'),
+    path('trends/', views.CostTrendsAPIView.as_view(), name='cost_trends_api'),
+    path('as-of/', views.PointInTimeCostsAPIView.as_view(), name='point_in_time_costs_api'),
+    path('metrics/', views.CostRunMetricsAPIView.as_view(), name='cost_run_metrics_api'),
     path('recent/', views.RecentCostsAPIView.as_view(), name='recent_costs_api'),
     path('export/', views.ExportCSVView.as_view(), name='export_csv'),
     path('recalculate/', views.RecalculateView.as_view(), name='recalculate'),
+    path('simulate/', views.PriceShockSimulationView.as_view(), name='price_shock_simulation'),
 ]
@@ -2,14 +2,38 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, DetailView
 from django.views import View
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, StreamingHttpResponse, FileResponse
 from django.db.models import Q
 from django.utils import timezone
-from datetime import datetime
+from datetime import date, datetime
+from decimal import Decimal
+import json
 
+from apps.core.api import ApiField, JsonListAPI, as_float, as_isoformat, choice_label
 from apps.products.models import Product
+from .metrics import CostRunMetricsService
 from .models import SKUCost
+from .rollups import CostRollupService
 from .services import CostService
+from .simulation import PriceShockSimulator
+
+COST_API_FIELDS = {
+    "id": ApiField('id'),
+    "product_id": ApiField('product_id'),
+    "product_name": ApiField('product__name'),
+    "sku_code": ApiField('product__sku_code'),
+    "category": ApiField('product__category', convert=choice_label(Product.CATEGORY_CHOICES)),
+    "unit": ApiField('product__unit'),
+    "version": ApiField('version'),
+    "status": ApiField('status'),
+    "ingredient_cost": ApiField('ingredient_cost', convert=as_float),
+    "labor_cost": ApiField('labor_cost', convert=as_float),
+    "overhead_cost": ApiField('overhead_cost', convert=as_float),
+    "total_cost_per_unit": ApiField('total_cost_per_unit', convert=as_float),
+    "margin": ApiField('margin', convert=as_float),
+    "margin_percentage": ApiField('margin_percentage', convert=as_float),
+    "updated_at": ApiField('updated_at', convert=as_isoformat),
+}
 
 
 class CostListView(LoginRequiredMixin, ListView):
@@ -54,7 +78,7 @@ class CostListView(LoginRequiredMixin, ListView):
         if min_margin:
             try:
                 min_margin = float(min_margin)
-                queryset = [c for c in queryset if float(c.margin_percentage) >= min_margin]
+                queryset = queryset.filter(margin_percentage__gte=min_margin)
             except (ValueError, TypeError):
                 pass
 
@@ -77,7 +101,7 @@ class CostDetailView(LoginRequiredMixin, DetailView):
     def get_context_data(self, **kwargs):
         """Add related data to context."""
         context = super().get_context_data(**kwargs)
-        cost = self.get_object()
+        cost = self.object
 
         # Get cost history
         context['history'] = CostService.get_cost_history(cost.product, limit=10)
@@ -122,27 +146,13 @@ class CostListAPIView(View):
     """JSON API endpoint returning active SKU costs (no auth for local integration)."""
 
     def get(self, request):
-        costs = CostService.get_all_active_costs()
-        data = []
-        for c in costs:
-            data.append({
-                "id": c.id,
-                "product_id": c.product.id,
-                "product_name": c.product.name,
-                "sku_code": c.product.sku_code,
-                "category": c.product.get_category_display() if hasattr(c.product, "get_category_display") else c.product.category,
-                "unit": getattr(c.product, "unit", None),
-                "version": c.version,
-                "status": c.status,
-                "ingredient_cost": float(c.ingredient_cost),
-                "labor_cost": float(c.labor_cost),
-                "overhead_cost": float(c.overhead_cost),
-                "total_cost_per_unit": float(c.total_cost_per_unit),
-                "margin": float(c.margin),
-                "margin_percentage": float(c.margin_percentage),
-                "updated_at": c.updated_at.isoformat() if c.updated_at else None,
-            })
-        return JsonResponse({"items": data})
+        return JsonListAPI(
+            CostService.get_all_active_costs(),
+            COST_API_FIELDS,
+            ordering=('product__sku_code', 'pk'),
+            # Product names and prices are joined in
+            fingerprint_querysets=[CostService.get_all_active_costs(), Product.objects.all()],
+        ).get(request)
 
 
 class CostTrendPublicAPIView(View):
@@ -236,11 +246,115 @@ class CostTrendAPIView(LoginRequiredMixin, View):
         return JsonResponse(chart_data)
 
 
+class CostTrendsAPIView(LoginRequiredMixin, View):
+    """JSON API endpoint returning monthly cost series of many SKUs and categories."""
+
+    def get(self, request):
+        """
+        Return monthly cost series from the rollup tables.
+
+        Query params:
+        - products: Product ids (repeatable)
+        - categories: Product categories (repeatable). Defaults to every
+          category when no products are given.
+        - months: Number of months to look back (default: 12, max: 120)
+        - max_points: Maximum points per series; longer ranges are averaged
+          into multi-month buckets (default: 24)
+        """
+        try:
+            product_ids = [int(product_id) for product_id in request.GET.getlist('products')]
+            months = min(max(int(request.GET.get('months', 12)), 1), 120)
+            max_points = max(int(request.GET.get('max_points', 24)), 1)
+        except (ValueError, TypeError):
+            return JsonResponse({'error': 'products, months and max_points must be integers'}, status=400)
+
+        categories = request.GET.getlist('categories')
+        if not product_ids and not categories:
+            categories = [value for value, _ in Product.CATEGORY_CHOICES]
+
+        return JsonResponse(CostRollupService.get_series(
+            product_ids=product_ids,
+            categories=categories,
+            months=months,
+            max_points=max_points,
+        ))
+
+
+class PointInTimeCostsAPIView(LoginRequiredMixin, View):
+    """JSON API endpoint re-costing SKUs as of past months."""
+
+    def get(self, request):
+        """
+        Return costs calculated with the inputs in effect at each month end.
+
+        Query params:
+        - products: Product ids (repeatable), defaults to all active products
+        - month, year: Last month to cost (default: current month)
+        - months: Number of months ending with it (default: 1, max: 36)
+        - details: '1' to include the calculation details of each cost
+        """
+        today = date.today()
+        try:
+            product_ids = [int(product_id) for product_id in request.GET.getlist('products')]
+            month = int(request.GET.get('month', today.month))
+            year = int(request.GET.get('year', today.year))
+            months = min(max(int(request.GET.get('months', 1)), 1), 36)
+            end = date(year, month, 1)
+        except (ValueError, TypeError):
+            return JsonResponse({'error': 'products, month, year and months must be valid integers'}, status=400)
+
+        if end > today:
+            return JsonResponse({'error': 'Cannot cost a future month'}, status=400)
+
+        result = CostService.get_costs_as_of(
+            products=Product.objects.filter(pk__in=product_ids) if product_ids else None,
+            months=months,
+            end=end,
+            include_details=request.GET.get('details') == '1',
+        )
+
+        for item in result['items']:
+            for cost in item['costs']:
+                for key, value in cost.items():
+                    if isinstance(value, Decimal):
+                        cost[key] = float(value)
+        return JsonResponse(result)
+
+
+class CostRunMetricsAPIView(LoginRequiredMixin, View):
+    """JSON API endpoint summarizing recorded cost run timings."""
+
+    def get(self, request):
+        """
+        Return p50/p95 duration, query count and rows written, overall and per stage.
+
+        Query params:
+        - run_type: 'bulk' or 'point_in_time' (default: all runs)
+        - limit: Number of most recent runs to summarize (default: 200, max: 1000)
+        """
+        try:
+            limit = min(max(int(request.GET.get('limit', 200)), 1), 1000)
+        except ValueError:
+            return JsonResponse({'error': 'limit must be an integer'}, status=400)
+
+        return JsonResponse(CostRunMetricsService.get_summary(
+            run_type=request.GET.get('run_type') or None,
+            limit=limit,
+        ))
+
+
 class ExportCSVView(LoginRequiredMixin, View):
-    """Download costs as CSV."""
+    """Download costs as CSV or XLSX."""
 
     def get(self, request):
-        """Export all active costs to CSV."""
+        """
+        Stream active costs as CSV, or send them as an XLSX workbook.
+
+        Query params:
+            products: Product ids to export (repeatable), defaults to all
+            all_versions: '1' to export every cost version
+            format: 'csv' (default) or 'xlsx'
+        """
         # Get optional product filter
         product_ids = request.GET.getlist('products')
 
@@ -249,10 +363,21 @@ class ExportCSVView(LoginRequiredMixin, View):
         else:
             products = None
 
-        csv_content = CostService.export_costs_csv(products=products)
-
-        response = HttpResponse(csv_content, content_type='text/csv')
+        all_versions = request.GET.get('all_versions') == '1'
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+        if request.GET.get('format') == 'xlsx':
+            return FileResponse(
+                CostService.export_costs_xlsx(products=products, all_versions=all_versions),
+                as_attachment=True,
+                filename=f'sku_costs_{timestamp}.xlsx',
+                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            )
+
+        response = StreamingHttpResponse(
+            CostService.stream_costs_csv(products=products, all_versions=all_versions),
+            content_type='text/csv'
+        )
         response['Content-Disposition'] = f'attachment; filename="sku_costs_{timestamp}.csv"'
 
         return response
@@ -301,3 +426,36 @@ class RecalculateView(LoginRequiredMixin, View):
                 'success': False,
                 'error': str(e),
             }, status=500)
+
+
+class PriceShockSimulationView(LoginRequiredMixin, View):
+    """POST endpoint simulating ingredient price changes without writing anything."""
+
+    def post(self, request):
+        """
+        Return the margin impact of ingredient price overrides on every affected SKU.
+
+        JSON body:
+        - overrides: List of {"ingredient_id": 1, "price": 25000} or
+                     {"ingredient_id": 1, "change_pct": 10}
+        - month, year: Optional month whose overhead applies (default: current)
+        - sort: Optional sort field (default: margin_percentage_change)
+        """
+        try:
+            payload = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'error': 'Request body must be JSON'}, status=400)
+
+        try:
+            month = int(payload['month']) if payload.get('month') else None
+            year = int(payload['year']) if payload.get('year') else None
+            result = PriceShockSimulator.simulate(
+                payload.get('overrides') or [],
+                month=month,
+                year=year,
+                sort_by=payload.get('sort') or 'margin_percentage_change'
+            )
+        except (ValueError, TypeError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        return JsonResponse(result)
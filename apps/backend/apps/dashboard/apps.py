@@ -5,3 +5,7 @@ class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.dashboard'
     label = 'dashboard'
+
+    def ready(self):
+        """Import signals when app is ready."""
+        import apps.dashboard.signals  # noqa: F401
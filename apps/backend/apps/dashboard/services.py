@@ -0,0 +1,94 @@
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, Q, Sum
+
+from apps.costs.models import SKUCost
+from apps.inventory.models import Ingredient
+from apps.products.models import Product
+
+DASHBOARD_SUMMARY_CACHE_VERSION_KEY = 'dashboard:summary:version'
+
+
+class DashboardService:
+    """
+    Service computing the dashboard figures.
+
+    All home page and overhead figures are computed together with a fixed
+    number of queries and cached; cost, ingredient and product writes drop the
+    cached summary (see signals), so the dashboard can be reloaded constantly.
+    """
+
+    @staticmethod
+    def get_summary() -> dict:
+        """
+        Get the dashboard summary, cached across requests.
+
+        Returns:
+            dict: {total_products, active_cost_count, avg_ingredient_cost,
+            avg_margin_percentage, total_overhead, avg_overhead, low_stock_count,
+            low_stock_items, recent_costs}
+        """
+        version = cache.get(DASHBOARD_SUMMARY_CACHE_VERSION_KEY)
+        if version is None:
+            version = DashboardService.invalidate_summary()
+
+        cache_key = f'dashboard:summary:{version}'
+        summary = cache.get(cache_key)
+        if summary is None:
+            summary = DashboardService.build_summary()
+            cache.set(cache_key, summary, settings.DASHBOARD_SUMMARY_CACHE_TIMEOUT)
+        return summary
+
+    @staticmethod
+    def build_summary() -> dict:
+        """
+        Compute the dashboard summary with four queries.
+
+        Returns:
+            dict, see get_summary()
+        """
+        cost_aggregates = SKUCost.objects.filter(status='active').aggregate(
+            active_cost_count=Count('pk'),
+            avg_ingredient_cost=Avg('ingredient_cost'),
+            avg_margin_percentage=Avg('margin_percentage'),
+            total_overhead=Sum('overhead_cost'),
+            avg_overhead=Avg('overhead_cost'),
+        )
+
+        # Low stock alerts
+        low_stock_items = list(Ingredient.objects.filter(
+            Q(current_stock__lte=Decimal('10')) |
+            Q(current_stock__lte=F('minimum_stock'))
+        ).values('id', 'name', 'unit', 'current_stock', 'minimum_stock'))
+
+        # Latest SKU costs
+        recent_costs = list(SKUCost.objects.filter(
+            status='active'
+        ).select_related('product').order_by('-created_at')[:10])
+
+        return {
+            'total_products': Product.objects.filter(status='active').count(),
+            'active_cost_count': cost_aggregates['active_cost_count'],
+            'avg_ingredient_cost': cost_aggregates['avg_ingredient_cost'] or Decimal('0'),
+            'avg_margin_percentage': cost_aggregates['avg_margin_percentage'] or Decimal('0'),
+            'total_overhead': cost_aggregates['total_overhead'],
+            'avg_overhead': cost_aggregates['avg_overhead'],
+            'low_stock_count': len(low_stock_items),
+            'low_stock_items': low_stock_items[:5],
+            'recent_costs': recent_costs,
+        }
+
+    @staticmethod
+    def invalidate_summary() -> int:
+        """
+        Drop the cached dashboard summary.
+
+        Returns:
+            The new cache version
+        """
+        version = time.time_ns()
+        cache.set(DASHBOARD_SUMMARY_CACHE_VERSION_KEY, version, None)
+        return version
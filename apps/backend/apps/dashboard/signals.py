@@ -0,0 +1,23 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.costs.models import SKUCost
+from apps.inventory.models import Ingredient
+from apps.inventory.signals import stock_received
+from apps.products.models import Product
+
+from .services import DashboardService
+
+
+@receiver(post_save, sender=SKUCost)
+@receiver(post_delete, sender=SKUCost)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(stock_received)
+def invalidate_dashboard_summary(sender, **kwargs):
+    """Drop the cached dashboard summary when costs, stock or products change."""
+    # After commit, so a request cannot re-cache figures from before the write
+    transaction.on_commit(DashboardService.invalidate_summary)
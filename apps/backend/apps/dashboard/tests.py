@@ -0,0 +1,82 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from apps.costs.models import SKUCost
+from apps.inventory.models import Ingredient
+from apps.products.models import Product
+
+from .services import DashboardService
+
+
+class DashboardSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            sku_code='SKU-0001',
+            name='Banh mi',
+            category='bread',
+            selling_price=Decimal('15000'),
+        )
+        self.sku_cost = SKUCost.objects.create(
+            product=self.product,
+            status='active',
+            ingredient_cost=Decimal('5000'),
+            labor_cost=Decimal('3000'),
+            overhead_cost=Decimal('2000'),
+            total_cost_per_unit=Decimal('10000'),
+        )
+        Ingredient.objects.create(
+            name='Bot mi', unit='kg', category='flour',
+            current_cost_per_unit=Decimal('22000'), current_stock=Decimal('5'),
+        )
+
+    def test_summary_is_computed_once_and_cached(self):
+        with CaptureQueriesContext(connection) as first:
+            summary = DashboardService.get_summary()
+        with CaptureQueriesContext(connection) as second:
+            self.assertEqual(DashboardService.get_summary(), summary)
+
+        self.assertEqual(len(first.captured_queries), 4)
+        self.assertEqual(len(second.captured_queries), 0)
+        self.assertEqual(summary['total_products'], 1)
+        self.assertEqual(summary['avg_ingredient_cost'], Decimal('5000'))
+        self.assertAlmostEqual(summary['avg_margin_percentage'], Decimal('33.3333'), places=3)
+        self.assertEqual(summary['total_overhead'], Decimal('2000'))
+        self.assertEqual(summary['low_stock_count'], 1)
+        self.assertEqual(summary['recent_costs'], [self.sku_cost])
+
+    def test_writes_invalidate_the_summary(self):
+        DashboardService.get_summary()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(
+                name='Bo', unit='kg', category='dairy',
+                current_cost_per_unit=Decimal('180000'), current_stock=Decimal('2'),
+            )
+        self.assertEqual(DashboardService.get_summary()['low_stock_count'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.selling_price = Decimal('20000')
+            self.product.save()
+        self.assertAlmostEqual(DashboardService.get_summary()['avg_margin_percentage'], Decimal('50'), places=3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sku_cost.delete()
+        self.assertEqual(DashboardService.get_summary()['recent_costs'], [])
+
+    def test_pages_read_the_cached_summary(self):
+        user = get_user_model().objects.create_user(username='manager', password='secret')
+        self.client.force_login(user)
+
+        for url in ['/dashboard/', '/dashboard/overhead/', '/dashboard/sku-costs/']:
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/dashboard/')
+        self.assertContains(response, 'SKU-0001')
+        self.assertFalse(any('costs_skucost' in query['sql'] for query in queries.captured_queries))
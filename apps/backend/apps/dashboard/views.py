@@ -1,11 +1,11 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView, ListView
-from django.db.models import Q, Avg, Count, Sum, F
-from decimal import Decimal
+from django.db.models import Q, Count
 from apps.costs.models import SKUCost
+from apps.costs.rollups import CostRollupService
 from apps.products.models import Product
-from apps.inventory.models import Ingredient
 from apps.labor.models import Employee, EmployeeWage
+from .services import DashboardService
 
 
 class DashboardHomeView(LoginRequiredMixin, TemplateView):
@@ -16,30 +16,14 @@ class DashboardHomeView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # Get latest SKU costs
-        latest_costs = SKUCost.objects.filter(
-            status='active'
-        ).select_related('product').order_by('-created_at')[:10]
-
-        # Get cost summary
-        active_costs = SKUCost.objects.filter(status='active')
-        context['total_products'] = Product.objects.filter(status='active').count()
-        context['avg_ingredient_cost'] = active_costs.aggregate(
-            avg=Avg('ingredient_cost')
-        )['avg'] or Decimal('0')
-        context['avg_margin_percentage'] = active_costs.aggregate(
-            avg=Avg('total_cost_per_unit')
-        )['avg'] or Decimal('0')
-
-        # Low stock alerts
-        low_stock = Ingredient.objects.filter(
-            Q(current_stock__lte=Decimal('10')) |
-            Q(current_stock__lte=F('minimum_stock'))
-        )
-        context['low_stock_count'] = low_stock.count()
-        context['low_stock_items'] = low_stock[:5]
-
-        context['recent_costs'] = latest_costs
+        # Cost summary, low stock alerts and latest SKU costs (cached)
+        summary = DashboardService.get_summary()
+        context['total_products'] = summary['total_products']
+        context['avg_ingredient_cost'] = summary['avg_ingredient_cost']
+        context['avg_margin_percentage'] = summary['avg_margin_percentage']
+        context['low_stock_count'] = summary['low_stock_count']
+        context['low_stock_items'] = summary['low_stock_items']
+        context['recent_costs'] = summary['recent_costs']
         context['page_title'] = 'Dashboard'
 
         return context
@@ -77,6 +61,13 @@ class SKUCostDashboardView(LoginRequiredMixin, ListView):
 
         return queryset
 
+    def get_paginator(self, queryset, per_page, **kwargs):
+        paginator = super().get_paginator(queryset, per_page, **kwargs)
+        if not self.request.GET.get('category') and not self.request.GET.get('search'):
+            # Unfiltered listing: reuse the cached count instead of a COUNT(*) scan
+            paginator.count = DashboardService.get_summary()['active_cost_count']
+        return paginator
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['categories'] = Product.CATEGORY_CHOICES
@@ -92,12 +83,11 @@ class CostTrendsView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # Get trend data for Chart.js
-        costs = SKUCost.objects.filter(
-            status='active'
-        ).order_by('created_at').values('created_at', 'total_cost_per_unit')
-
-        context['cost_data'] = list(costs)
+        # Monthly category series for Chart.js, read from the cost rollups
+        context['cost_data'] = CostRollupService.get_series(
+            categories=[value for value, _ in Product.CATEGORY_CHOICES],
+            months=12
+        )['series']
         context['page_title'] = 'Cost Trends'
         context['categories'] = Product.CATEGORY_CHOICES
 
@@ -112,15 +102,12 @@ class OverheadBreakdownView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # Get overhead breakdown
-        overhead_data = SKUCost.objects.filter(
-            status='active'
-        ).aggregate(
-            total_overhead=Sum('overhead_cost'),
-            avg_overhead=Avg('overhead_cost')
-        )
-
-        context['overhead_data'] = overhead_data
+        # Get overhead breakdown (cached with the dashboard summary)
+        summary = DashboardService.get_summary()
+        context['overhead_data'] = {
+            'total_overhead': summary['total_overhead'],
+            'avg_overhead': summary['avg_overhead'],
+        }
         context['page_title'] = 'Overhead Breakdown'
 
         return context
@@ -5,6 +5,7 @@ from .models import (
     IngredientPriceHistory,
     PurchaseOrder,
     PurchaseOrderLine,
+    StockMovement,
 )
 
 
@@ -36,12 +37,14 @@ class IngredientAdmin(admin.ModelAdmin):
             'fields': ('name', 'description', 'category', 'unit')
         }),
         ('Pricing & Stock', {
-            'fields': ('current_cost_per_unit', 'minimum_stock', 'current_stock')
+            'fields': ('current_cost_per_unit', 'minimum_stock', 'current_stock', 'stock_value')
         }),
         ('Status', {
             'fields': ('is_active',)
         }),
     )
+    # Maintained by the stock ledger
+    readonly_fields = ('current_stock', 'stock_value')
 
 
 @admin.register(IngredientPriceHistory)
@@ -101,3 +104,26 @@ class PurchaseOrderLineAdmin(admin.ModelAdmin):
         }),
     )
     readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = (
+        'ingredient', 'movement_type', 'movement_date', 'quantity', 'unit_cost',
+        'value', 'balance_quantity', 'balance_value'
+    )
+    list_filter = ('movement_type', 'movement_date', 'ingredient')
+    search_fields = ('ingredient__name', 'notes', 'po_line__purchase_order__po_number')
+    list_select_related = ('ingredient',)
+    raw_id_fields = ('po_line',)
+    # The ledger is append-only; movements are recorded by InventoryService
+    readonly_fields = (
+        'ingredient', 'movement_type', 'movement_date', 'quantity', 'unit_cost', 'value',
+        'balance_quantity', 'balance_value', 'po_line', 'notes', 'created_at', 'updated_at'
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:09
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def open_stock_ledgers(apps, schema_editor):
+    """Record each ingredient's current stock, at its current cost, as the opening balance."""
+    Ingredient = apps.get_model('inventory', 'Ingredient')
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+
+    now = timezone.now()
+    ingredients = list(Ingredient.objects.filter(current_stock__gt=0))
+    for ingredient in ingredients:
+        ingredient.stock_value = (ingredient.current_stock * ingredient.current_cost_per_unit).quantize(Decimal('0.0001'))
+
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            ingredient=ingredient,
+            movement_type='adjustment',
+            movement_date=now,
+            quantity=ingredient.current_stock,
+            unit_cost=ingredient.current_cost_per_unit,
+            value=ingredient.stock_value,
+            balance_quantity=ingredient.current_stock,
+            balance_value=ingredient.stock_value,
+            notes='Opening balance',
+        )
+        for ingredient in ingredients
+    ])
+    Ingredient.objects.bulk_update(ingredients, ['stock_value'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='stock_value',
+            field=models.DecimalField(decimal_places=4, default=0, help_text='Running value of current_stock, maintained by the stock ledger', max_digits=16),
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('movement_type', models.CharField(choices=[('receipt', 'Receipt'), ('issue', 'Issue'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('movement_date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('unit_cost', models.DecimalField(decimal_places=4, max_digits=12, validators=[django.core.validators.MinValueValidator(0)])),
+                ('value', models.DecimalField(decimal_places=4, max_digits=16)),
+                ('balance_quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('balance_value', models.DecimalField(decimal_places=4, max_digits=16)),
+                ('notes', models.CharField(blank=True, max_length=200)),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='inventory.ingredient')),
+                ('po_line', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='inventory.purchaseorderline')),
+            ],
+            options={
+                'verbose_name': 'Stock Movement',
+                'verbose_name_plural': 'Stock Movements',
+                'ordering': ['-movement_date', '-pk'],
+                'indexes': [models.Index(fields=['ingredient', 'movement_date'], name='inventory_movement_date_idx')],
+            },
+        ),
+        migrations.RunPython(open_stock_ledgers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredientpricehistory',
+            index=models.Index(fields=['ingredient', 'effective_date'], name='inventory_price_date_idx'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from apps.core.models import ActiveModel, TimestampedModel
 
 
@@ -69,6 +70,12 @@ class Ingredient(ActiveModel):
         default=0,
         validators=[MinValueValidator(0)]
     )
+    stock_value = models.DecimalField(
+        max_digits=16,
+        decimal_places=4,
+        default=0,
+        help_text='Running value of current_stock, maintained by the stock ledger'
+    )
 
     class Meta:
         ordering = ['name']
@@ -111,6 +118,9 @@ class IngredientPriceHistory(TimestampedModel):
         ordering = ['-effective_date']
         verbose_name = 'Ingredient Price History'
         verbose_name_plural = 'Ingredient Price Histories'
+        indexes = [
+            models.Index(fields=['ingredient', 'effective_date'], name='inventory_price_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.ingredient.name}: {self.cost_per_unit} on {self.effective_date}"
@@ -195,3 +205,61 @@ class PurchaseOrderLine(TimestampedModel):
 
     def __str__(self):
         return f"{self.ingredient.name} x {self.quantity}"
+
+
+class StockMovement(TimestampedModel):
+    """
+    Append-only stock ledger row for one receipt, issue or adjustment.
+
+    quantity and value are signed (negative for stock leaving). balance_quantity
+    and balance_value are the ingredient's running totals after the movement, so
+    the position and weighted average cost at any time is read from a single row.
+    """
+    MOVEMENT_TYPE_CHOICES = [
+        ('receipt', 'Receipt'),
+        ('issue', 'Issue'),
+        ('adjustment', 'Adjustment'),
+    ]
+
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='stock_movements'
+    )
+    movement_type = models.CharField(max_length=20, choices=MOVEMENT_TYPE_CHOICES)
+    movement_date = models.DateTimeField(default=timezone.now)
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    unit_cost = models.DecimalField(
+        max_digits=12,
+        decimal_places=4,
+        validators=[MinValueValidator(0)]
+    )
+    value = models.DecimalField(max_digits=16, decimal_places=4)
+    balance_quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    balance_value = models.DecimalField(max_digits=16, decimal_places=4)
+    po_line = models.ForeignKey(
+        PurchaseOrderLine,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='stock_movements'
+    )
+    notes = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        ordering = ['-movement_date', '-pk']
+        verbose_name = 'Stock Movement'
+        verbose_name_plural = 'Stock Movements'
+        indexes = [
+            models.Index(fields=['ingredient', 'movement_date'], name='inventory_movement_date_idx'),
+        ]
+
+    @property
+    def average_cost(self):
+        """Weighted average cost per unit after this movement."""
+        if self.balance_quantity > 0:
+            return self.balance_value / self.balance_quantity
+        return self.unit_cost
+
+    def __str__(self):
+        return f"{self.ingredient.name}: {self.movement_type} {self.quantity} on {self.movement_date:%Y-%m-%d}"
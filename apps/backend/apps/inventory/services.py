@@ -1,12 +1,19 @@
 from datetime import date
 from decimal import Decimal
 from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
 from .models import (
     Ingredient,
     IngredientPriceHistory,
     PurchaseOrder,
     PurchaseOrderLine,
+    StockMovement,
 )
+from .signals import stock_received
+
+QUANTITY_PRECISION = Decimal('0.01')
+VALUE_PRECISION = Decimal('0.0001')
 
 
 class InventoryService:
@@ -18,23 +25,37 @@ class InventoryService:
         """
         Record receipt of a purchase order line.
 
+        received_qty is the quantity delivered now; it is added to what the line
+        already received, so a line can arrive in several deliveries. The receipt
+        is appended to the stock ledger, which updates the ingredient's stock and
+        weighted average cost from its running totals.
+
         Args:
             po_line: The PurchaseOrderLine to receive
             received_qty: The quantity received
 
         Returns:
             The updated PurchaseOrderLine
+
+        Raises:
+            ValueError: If received_qty is not positive
         """
-        po_line.received_quantity = received_qty
-        po_line.save()
+        received_qty = Decimal(str(received_qty))
+        if received_qty <= 0:
+            raise ValueError('Received quantity must be positive')
 
-        # Update ingredient stock
-        ingredient = po_line.ingredient
-        ingredient.current_stock += received_qty
-        ingredient.save()
+        InventoryService.record_movement(
+            po_line.ingredient,
+            'receipt',
+            received_qty,
+            unit_cost=po_line.unit_price,
+            po_line=po_line,
+            notes=f'PO {po_line.purchase_order.po_number}'
+        )
 
-        # Recalculate weighted average cost
-        InventoryService.calculate_weighted_average_cost(ingredient)
+        po_line.received_quantity = F('received_quantity') + received_qty
+        po_line.save(update_fields=['received_quantity', 'updated_at'])
+        po_line.refresh_from_db(fields=['received_quantity'])
 
         # Update purchase order status
         InventoryService.check_po_status(po_line.purchase_order)
@@ -42,36 +63,413 @@ class InventoryService:
         return po_line
 
     @staticmethod
-    def calculate_weighted_average_cost(ingredient: Ingredient) -> Decimal:
+    @transaction.atomic
+    def receive_purchase_order(purchase_order: PurchaseOrder, received_quantities: dict) -> dict:
         """
-        Calculate weighted average cost for an ingredient from all received PO lines.
+        Receive many lines of a purchase order at once.
+
+        All quantities are applied in one transaction with bulk writes: one
+        ledger insert, one ingredient update (each ingredient's WAC is updated
+        once, from all its receipts) and one line update, then the PO status is
+        set once. Each ingredient whose weighted average cost moved gets one
+        price history record. Instead of one cost recalculation per line,
+        stock_received is sent once with every ingredient received.
 
         Args:
-            ingredient: The ingredient to calculate WAC for
+            purchase_order: The PurchaseOrder to receive
+            received_quantities: Dict of PurchaseOrderLine id to the quantity
+                                 delivered now (added to what was already received)
 
         Returns:
-            The weighted average cost as Decimal
+            dict: {status, received_lines, ingredient_ids}
+
+        Raises:
+            ValueError: If a line is not on the PO or a quantity is not positive
+        """
+        quantities = {}
+        for line_id, quantity in received_quantities.items():
+            quantity = Decimal(str(quantity)).quantize(QUANTITY_PRECISION)
+            if quantity <= 0:
+                raise ValueError(f'Received quantity for line {line_id} must be positive')
+            quantities[int(line_id)] = quantity
+
+        if not quantities:
+            raise ValueError('At least one line quantity is required')
+
+        lines = list(
+            purchase_order.lines.select_for_update().filter(pk__in=quantities).order_by('pk')
+        )
+        unknown = quantities.keys() - {line.pk for line in lines}
+        if unknown:
+            raise ValueError(
+                f'Lines {", ".join(str(pk) for pk in sorted(unknown))} are not on PO {purchase_order.po_number}'
+            )
+
+        ingredients = Ingredient.objects.select_for_update().in_bulk(
+            {line.ingredient_id for line in lines}
+        )
+        previous_costs = {pk: ingredient.current_cost_per_unit for pk, ingredient in ingredients.items()}
+
+        now = timezone.now()
+        movements = []
+        for line in lines:
+            movements.append(InventoryService._apply_movement(
+                ingredients[line.ingredient_id],
+                'receipt',
+                quantities[line.pk],
+                unit_cost=line.unit_price,
+                po_line=line,
+                notes=f'PO {purchase_order.po_number}',
+            ))
+            line.received_quantity += quantities[line.pk]
+            line.updated_at = now
+
+        for ingredient in ingredients.values():
+            ingredient.updated_at = now
+
+        StockMovement.objects.bulk_create(movements)
+        Ingredient.objects.bulk_update(
+            ingredients.values(), ['current_stock', 'stock_value', 'current_cost_per_unit', 'updated_at']
+        )
+        IngredientPriceHistory.objects.bulk_create(filter(None, (
+            InventoryService._price_change(ingredient, previous_costs[pk], f'PO {purchase_order.po_number}')
+            for pk, ingredient in ingredients.items()
+        )))
+        PurchaseOrderLine.objects.bulk_update(lines, ['received_quantity', 'updated_at'])
+
+        status = InventoryService.check_po_status(purchase_order)
+
+        # Bulk writes skip post_save, so announce the receipt once
+        stock_received.send(
+            sender=PurchaseOrder,
+            purchase_order=purchase_order,
+            ingredient_ids=sorted(ingredients),
+        )
+
+        return {
+            'status': status,
+            'received_lines': len(lines),
+            'ingredient_ids': sorted(ingredients),
+        }
+
+    @staticmethod
+    def issue_stock(ingredient: Ingredient, quantity: Decimal, notes: str = '') -> StockMovement:
+        """
+        Take stock out of inventory at the current weighted average cost.
+
+        Args:
+            ingredient: The ingredient to issue
+            quantity: Quantity leaving stock
+            notes: Optional reason, e.g. the production batch
+
+        Returns:
+            The created StockMovement
+
+        Raises:
+            ValueError: If quantity is not positive or exceeds the stock on hand
+        """
+        quantity = Decimal(str(quantity))
+        if quantity <= 0:
+            raise ValueError('Issued quantity must be positive')
+        return InventoryService.record_movement(ingredient, 'issue', -quantity, notes=notes)
+
+    @staticmethod
+    @transaction.atomic
+    def adjust_stock(ingredient: Ingredient, counted_quantity: Decimal, notes: str = ''):
+        """
+        Bring stock on hand to a counted quantity with an adjustment movement.
+
+        Stock found is valued, and stock lost written off, at the current
+        weighted average cost.
+
+        Args:
+            ingredient: The ingredient that was counted
+            counted_quantity: Quantity actually on hand
+            notes: Optional reason for the adjustment
+
+        Returns:
+            The created StockMovement, or None if the count matches the stock
+        """
+        current_stock = Ingredient.objects.select_for_update().values_list(
+            'current_stock', flat=True
+        ).get(pk=ingredient.pk)
+        difference = Decimal(str(counted_quantity)) - current_stock
+        if difference == 0:
+            return None
+        return InventoryService.record_movement(ingredient, 'adjustment', difference, notes=notes)
+
+    @staticmethod
+    @transaction.atomic
+    def record_movement(
+        ingredient: Ingredient,
+        movement_type: str,
+        quantity: Decimal,
+        unit_cost: Decimal = None,
+        po_line: PurchaseOrderLine = None,
+        notes: str = ''
+    ) -> StockMovement:
+        """
+        Append a movement to the stock ledger and update the ingredient's running totals.
+
+        Incoming stock moves the weighted average cost to
+        (stock value + quantity * unit cost) / (stock + quantity). Outgoing stock
+        is valued at the current average, which it leaves unchanged. A changed
+        average is recorded in the price history, so costs as of past dates
+        follow receipts. The work is constant: lock the ingredient row, insert
+        one movement (and at most one price history record), save the totals.
+
+        Args:
+            ingredient: The ingredient moving
+            movement_type: One of StockMovement.MOVEMENT_TYPE_CHOICES
+            quantity: Signed quantity, negative for stock leaving
+            unit_cost: Cost per unit of incoming stock, defaults to the current average
+            po_line: The PurchaseOrderLine being received, if any
+            notes: Optional notes
+
+        Returns:
+            The created StockMovement
+
+        Raises:
+            ValueError: If more stock would leave than is on hand
+        """
+        locked = Ingredient.objects.select_for_update().get(pk=ingredient.pk)
+        previous_cost = locked.current_cost_per_unit
+        movement = InventoryService._apply_movement(
+            locked, movement_type, quantity, unit_cost=unit_cost, po_line=po_line, notes=notes
+        )
+        movement.save()
+
+        price_change = InventoryService._price_change(
+            locked, previous_cost, notes or movement.get_movement_type_display()
+        )
+        if price_change:
+            price_change.save()
+
+        ingredient.current_stock = locked.current_stock
+        ingredient.stock_value = locked.stock_value
+        ingredient.current_cost_per_unit = locked.current_cost_per_unit
+        ingredient.save(update_fields=['current_stock', 'stock_value', 'current_cost_per_unit', 'updated_at'])
+
+        return movement
+
+    @staticmethod
+    def _apply_movement(locked, movement_type, quantity, unit_cost=None, po_line=None, notes='') -> StockMovement:
+        """
+        Apply a movement to a locked ingredient's running totals in memory.
+
+        Returns:
+            The unsaved StockMovement; the caller saves it and the ingredient
+        """
+        quantity = Decimal(str(quantity)).quantize(QUANTITY_PRECISION)
+        average_cost = locked.current_cost_per_unit
+
+        balance_quantity = locked.current_stock + quantity
+        if balance_quantity < 0:
+            raise ValueError(
+                f'Cannot remove {-quantity} {locked.unit} of {locked.name}: '
+                f'only {locked.current_stock} on hand'
+            )
+
+        if quantity > 0:
+            unit_cost = average_cost if unit_cost is None else Decimal(str(unit_cost))
+            value = (quantity * unit_cost).quantize(VALUE_PRECISION)
+        elif balance_quantity == 0:
+            # Write off the whole remaining value so no rounding residue is left
+            unit_cost = average_cost
+            value = -locked.stock_value
+        else:
+            unit_cost = average_cost
+            value = (quantity * average_cost).quantize(VALUE_PRECISION)
+
+        balance_value = locked.stock_value + value
+        if balance_quantity > 0:
+            average_cost = (balance_value / balance_quantity).quantize(VALUE_PRECISION)
+
+        locked.current_stock = balance_quantity
+        locked.stock_value = balance_value
+        locked.current_cost_per_unit = average_cost
+
+        return StockMovement(
+            ingredient=locked,
+            movement_type=movement_type,
+            quantity=quantity,
+            unit_cost=unit_cost,
+            value=value,
+            balance_quantity=balance_quantity,
+            balance_value=balance_value,
+            po_line=po_line,
+            notes=notes,
+        )
+
+    @staticmethod
+    def _price_change(ingredient, previous_cost, source):
         """
-        # Get all received purchase order lines for this ingredient
-        received_lines = PurchaseOrderLine.objects.filter(
+        Price history record for a weighted average cost moved by the ledger.
+
+        Returns:
+            Unsaved IngredientPriceHistory, or None when the cost did not change
+        """
+        new_cost = ingredient.current_cost_per_unit
+        if new_cost == previous_cost:
+            return None
+
+        return IngredientPriceHistory(
             ingredient=ingredient,
-            received_quantity__gt=0
-        ).select_related('purchase_order')
+            cost_per_unit=new_cost,
+            effective_date=date.today(),
+            previous_cost=previous_cost if previous_cost > 0 else None,
+            change_percentage=((new_cost - previous_cost) / previous_cost) * 100 if previous_cost > 0 else None,
+            source=source
+        )
+
+    @staticmethod
+    def get_stock_position(ingredient: Ingredient, as_of=None) -> dict:
+        """
+        Read an ingredient's stock position at a point in time from the ledger.
 
-        total_quantity = Decimal('0')
-        total_cost = Decimal('0')
+        Every movement stores the running totals after it, so this reads a
+        single row however long the ledger is.
 
-        for line in received_lines:
-            total_quantity += line.received_quantity
-            total_cost += line.received_quantity * line.unit_price
+        Args:
+            ingredient: The ingredient
+            as_of: Datetime (or date, meaning the end of that day), defaults to now
 
-        if total_quantity > 0:
-            wac = total_cost / total_quantity
-            ingredient.current_cost_per_unit = wac
-            ingredient.save()
-            return wac
+        Returns:
+            dict: {quantity, value, average_cost}. Before the first movement the
+            quantity and value are zero and average_cost is None.
+        """
+        movements = ingredient.stock_movements.order_by('-movement_date', '-pk')
+        if as_of is not None:
+            if not hasattr(as_of, 'hour'):
+                movements = movements.filter(movement_date__date__lte=as_of)
+            else:
+                movements = movements.filter(movement_date__lte=as_of)
 
-        return ingredient.current_cost_per_unit
+        movement = movements.first()
+        if movement is None:
+            return {'quantity': Decimal('0'), 'value': Decimal('0'), 'average_cost': None}
+
+        return {
+            'quantity': movement.balance_quantity,
+            'value': movement.balance_value,
+            'average_cost': movement.average_cost,
+        }
+
+    @staticmethod
+    def calculate_weighted_average_cost(ingredient: Ingredient, as_of=None) -> Decimal:
+        """
+        Get the weighted average cost of an ingredient.
+
+        Args:
+            ingredient: The ingredient to get WAC for
+            as_of: Optional datetime or date; the WAC at that time is read from
+                   the stock ledger. Defaults to the ingredient's running WAC.
+
+        Returns:
+            The weighted average cost as Decimal
+        """
+        if as_of is None:
+            return ingredient.current_cost_per_unit
+
+        average_cost = InventoryService.get_stock_position(ingredient, as_of)['average_cost']
+        if average_cost is None:
+            return ingredient.current_cost_per_unit
+        return average_cost
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild_stock_balances(ingredient: Ingredient) -> int:
+        """
+        Recompute the running totals of an ingredient's ledger from its movements.
+
+        Incoming movements keep their value; outgoing ones are revalued at the
+        average cost running at the time. Use this to repair the totals after
+        movements were corrected by hand.
+
+        Args:
+            ingredient: The ingredient to rebuild
+
+        Returns:
+            Number of movements in the ledger
+        """
+        locked = Ingredient.objects.select_for_update().get(pk=ingredient.pk)
+
+        balance_quantity = Decimal('0')
+        balance_value = Decimal('0')
+        average_cost = locked.current_cost_per_unit
+        movements = list(locked.stock_movements.order_by('movement_date', 'pk'))
+
+        for movement in movements:
+            balance_quantity += movement.quantity
+            if movement.quantity < 0:
+                movement.unit_cost = average_cost
+                if balance_quantity == 0:
+                    movement.value = -balance_value
+                else:
+                    movement.value = (movement.quantity * average_cost).quantize(VALUE_PRECISION)
+            balance_value += movement.value
+            if balance_quantity > 0:
+                average_cost = (balance_value / balance_quantity).quantize(VALUE_PRECISION)
+
+            movement.balance_quantity = balance_quantity
+            movement.balance_value = balance_value
+
+        StockMovement.objects.bulk_update(
+            movements, ['unit_cost', 'value', 'balance_quantity', 'balance_value'], batch_size=1000
+        )
+
+        ingredient.current_stock = balance_quantity
+        ingredient.stock_value = balance_value
+        ingredient.current_cost_per_unit = average_cost
+        ingredient.save(update_fields=['current_stock', 'stock_value', 'current_cost_per_unit', 'updated_at'])
+
+        return len(movements)
+
+    @staticmethod
+    @transaction.atomic
+    def open_stock_balances(ingredients=None) -> int:
+        """
+        Start the ledger of ingredients whose stock was set without it.
+
+        Records an opening adjustment for the current stock, valued at the
+        current cost per unit, for each ingredient that has no movements yet.
+
+        Args:
+            ingredients: Optional iterable of ingredients, defaults to all
+
+        Returns:
+            Number of ledgers opened
+        """
+        queryset = Ingredient.objects.filter(current_stock__gt=0).exclude(
+            pk__in=StockMovement.objects.values('ingredient_id')
+        )
+        if ingredients is not None:
+            queryset = queryset.filter(pk__in=[ingredient.pk for ingredient in ingredients])
+
+        now = timezone.now()
+        opened = []
+        movements = []
+        for ingredient in queryset.select_for_update():
+            ingredient.stock_value = (ingredient.current_stock * ingredient.current_cost_per_unit).quantize(
+                VALUE_PRECISION
+            )
+            ingredient.updated_at = now
+            opened.append(ingredient)
+            movements.append(StockMovement(
+                ingredient=ingredient,
+                movement_type='adjustment',
+                movement_date=now,
+                quantity=ingredient.current_stock,
+                unit_cost=ingredient.current_cost_per_unit,
+                value=ingredient.stock_value,
+                balance_quantity=ingredient.current_stock,
+                balance_value=ingredient.stock_value,
+                notes='Opening balance',
+            ))
+
+        StockMovement.objects.bulk_create(movements)
+        Ingredient.objects.bulk_update(opened, ['stock_value', 'updated_at'])
+        return len(opened)
 
     @staticmethod
     @transaction.atomic
@@ -108,8 +506,24 @@ class InventoryService:
             source=source
         )
 
+        # Revalue the stock on hand at the new cost
+        locked = Ingredient.objects.select_for_update().get(pk=ingredient.pk)
+        stock_value = (locked.current_stock * new_cost).quantize(VALUE_PRECISION)
+        if stock_value != locked.stock_value:
+            StockMovement.objects.create(
+                ingredient=locked,
+                movement_type='adjustment',
+                quantity=Decimal('0'),
+                unit_cost=new_cost,
+                value=stock_value - locked.stock_value,
+                balance_quantity=locked.current_stock,
+                balance_value=stock_value,
+                notes=f'Revaluation: {source}' if source else 'Revaluation',
+            )
+
         # Update ingredient cost
         ingredient.current_cost_per_unit = new_cost
+        ingredient.stock_value = stock_value
         ingredient.save()
 
         return price_history
@@ -125,25 +539,28 @@ class InventoryService:
         Returns:
             The new status string
         """
-        lines = purchase_order.lines.all()
+        totals = purchase_order.lines.aggregate(
+            line_count=Count('pk'),
+            total_quantity=Sum('quantity'),
+            total_received=Sum('received_quantity'),
+        )
 
-        if not lines.exists():
+        if not totals['line_count']:
             return purchase_order.status
 
-        total_quantity = sum(line.quantity for line in lines)
-        total_received = sum(line.received_quantity for line in lines)
+        total_quantity = totals['total_quantity']
+        total_received = totals['total_received']
 
         # Determine new status
         if total_received == 0:
             new_status = 'confirmed'
         elif total_received < total_quantity:
             new_status = 'partially_received'
-        elif total_received >= total_quantity:
-            new_status = 'received'
         else:
-            new_status = purchase_order.status
+            new_status = 'received'
 
-        purchase_order.status = new_status
-        purchase_order.save()
+        if new_status != purchase_order.status:
+            purchase_order.status = new_status
+            purchase_order.save(update_fields=['status', 'updated_at'])
 
         return new_status
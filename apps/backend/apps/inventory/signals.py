@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# Sent once by InventoryService.receive_purchase_order(), inside its transaction. Its bulk
+# writes skip the per-row post_save signals, so receivers that react to stock
+# or ingredient cost changes listen here too.
+# Arguments: purchase_order, ingredient_ids
+stock_received = Signal()
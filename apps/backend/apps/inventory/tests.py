@@ -0,0 +1,279 @@
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Ingredient, PurchaseOrder, PurchaseOrderLine, StockMovement, Supplier
+from .services import InventoryService
+
+
+class StockLedgerTests(TestCase):
+    """Receipts and issues append to the stock ledger and keep a running WAC."""
+
+    def setUp(self):
+        self.ingredient = Ingredient.objects.create(
+            name='Bot mi', unit='kg', category='flour', current_cost_per_unit=Decimal('20000')
+        )
+        supplier = Supplier.objects.create(name='Mill')
+        self.purchase_order = PurchaseOrder.objects.create(
+            po_number='PO-1', supplier=supplier, order_date=date(2025, 3, 1), status='confirmed'
+        )
+
+    def create_line(self, quantity, unit_price):
+        return PurchaseOrderLine.objects.create(
+            purchase_order=self.purchase_order,
+            ingredient=self.ingredient,
+            quantity=Decimal(quantity),
+            unit_price=Decimal(unit_price),
+        )
+
+    def test_receipts_update_running_weighted_average_cost(self):
+        first = self.create_line('10', '20000')
+        second = self.create_line('30', '24000')
+
+        InventoryService.receive_po_line(first, Decimal('10'))
+        InventoryService.receive_po_line(second, Decimal('30'))
+
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.current_stock, Decimal('40'))
+        self.assertEqual(self.ingredient.stock_value, Decimal('920000'))
+        self.assertEqual(self.ingredient.current_cost_per_unit, Decimal('23000'))
+        self.assertEqual(StockMovement.objects.filter(ingredient=self.ingredient).count(), 2)
+
+    def test_partial_receipts_add_to_received_quantity(self):
+        line = self.create_line('10', '20000')
+
+        InventoryService.receive_po_line(line, Decimal('4'))
+        self.purchase_order.refresh_from_db()
+        self.assertEqual(self.purchase_order.status, 'partially_received')
+
+        InventoryService.receive_po_line(line, Decimal('6'))
+        line.refresh_from_db()
+        self.purchase_order.refresh_from_db()
+        self.ingredient.refresh_from_db()
+
+        self.assertEqual(line.received_quantity, Decimal('10'))
+        self.assertEqual(self.ingredient.current_stock, Decimal('10'))
+        self.assertEqual(self.purchase_order.status, 'received')
+
+    def test_receipt_work_does_not_grow_with_history(self):
+        for _ in range(3):
+            InventoryService.receive_po_line(self.create_line('5', '20000'), Decimal('5'))
+
+        line = self.create_line('5', '26000')
+        with CaptureQueriesContext(connection) as few_receipts:
+            InventoryService.receive_po_line(line, Decimal('5'))
+
+        for _ in range(20):
+            InventoryService.receive_po_line(self.create_line('5', '20000'), Decimal('5'))
+
+        line = self.create_line('5', '26000')
+        with CaptureQueriesContext(connection) as many_receipts:
+            InventoryService.receive_po_line(line, Decimal('5'))
+
+        self.assertEqual(len(few_receipts), len(many_receipts))
+
+    def test_issue_keeps_average_cost(self):
+        InventoryService.receive_po_line(self.create_line('10', '20000'), Decimal('10'))
+        InventoryService.receive_po_line(self.create_line('20', '26000'), Decimal('20'))
+
+        movement = InventoryService.issue_stock(self.ingredient, Decimal('15'), notes='Batch 1')
+
+        self.ingredient.refresh_from_db()
+        self.assertEqual(movement.value, Decimal('-360000'))
+        self.assertEqual(self.ingredient.current_stock, Decimal('15'))
+        self.assertEqual(self.ingredient.current_cost_per_unit, Decimal('24000'))
+
+        with self.assertRaises(ValueError):
+            InventoryService.issue_stock(self.ingredient, Decimal('16'))
+
+        InventoryService.issue_stock(self.ingredient, Decimal('15'))
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.stock_value, Decimal('0'))
+
+    def test_stock_position_at_a_past_date(self):
+        InventoryService.receive_po_line(self.create_line('10', '20000'), Decimal('10'))
+        StockMovement.objects.update(movement_date=timezone.now() - timedelta(days=10))
+        InventoryService.receive_po_line(self.create_line('10', '30000'), Decimal('10'))
+
+        past = InventoryService.get_stock_position(self.ingredient, date.today() - timedelta(days=5))
+        self.assertEqual(past['quantity'], Decimal('10'))
+        self.assertEqual(past['average_cost'], Decimal('20000'))
+
+        self.assertEqual(
+            InventoryService.calculate_weighted_average_cost(self.ingredient, date.today() - timedelta(days=5)),
+            Decimal('20000')
+        )
+        self.assertEqual(InventoryService.get_stock_position(self.ingredient)['average_cost'], Decimal('25000'))
+        self.assertIsNone(
+            InventoryService.get_stock_position(self.ingredient, date.today() - timedelta(days=30))['average_cost']
+        )
+
+    def test_adjustments_and_revaluations(self):
+        InventoryService.receive_po_line(self.create_line('10', '20000'), Decimal('10'))
+
+        self.assertIsNone(InventoryService.adjust_stock(self.ingredient, Decimal('10')))
+        InventoryService.adjust_stock(self.ingredient, Decimal('8'), notes='Spillage')
+        InventoryService.update_ingredient_cost(self.ingredient, Decimal('25000'), source='Supplier list')
+
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.current_stock, Decimal('8'))
+        self.assertEqual(self.ingredient.stock_value, Decimal('200000'))
+
+        last = self.ingredient.stock_movements.first()
+        self.assertEqual(last.balance_value, Decimal('200000'))
+        self.assertEqual(last.value, Decimal('40000'))
+
+    def test_rebuild_matches_running_totals(self):
+        InventoryService.receive_po_line(self.create_line('10', '20000'), Decimal('10'))
+        InventoryService.issue_stock(self.ingredient, Decimal('3'))
+        InventoryService.receive_po_line(self.create_line('5', '29000'), Decimal('5'))
+
+        self.ingredient.refresh_from_db()
+        expected = (self.ingredient.current_stock, self.ingredient.stock_value, self.ingredient.current_cost_per_unit)
+
+        Ingredient.objects.filter(pk=self.ingredient.pk).update(current_stock=0, stock_value=0)
+        self.assertEqual(InventoryService.rebuild_stock_balances(self.ingredient), 3)
+
+        self.ingredient.refresh_from_db()
+        self.assertEqual(
+            (self.ingredient.current_stock, self.ingredient.stock_value, self.ingredient.current_cost_per_unit),
+            expected
+        )
+
+    def test_open_stock_balances(self):
+        Ingredient.objects.filter(pk=self.ingredient.pk).update(current_stock=Decimal('5'))
+
+        self.assertEqual(InventoryService.open_stock_balances(), 1)
+        self.assertEqual(InventoryService.open_stock_balances(), 0)
+
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.stock_value, Decimal('100000'))
+
+
+class BulkReceiveTests(TestCase):
+    """A whole purchase order is received with bulk writes."""
+
+    def setUp(self):
+        supplier = Supplier.objects.create(name='Mill')
+        self.purchase_order = PurchaseOrder.objects.create(
+            po_number='PO-1', supplier=supplier, order_date=date(2025, 3, 1), status='confirmed'
+        )
+        self.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ingredient {index}', unit='kg', category='other', current_cost_per_unit=Decimal('10000')
+            )
+            for index in range(6)
+        ]
+
+    def create_line(self, ingredient, quantity='10', unit_price='10000'):
+        return PurchaseOrderLine.objects.create(
+            purchase_order=self.purchase_order,
+            ingredient=ingredient,
+            quantity=Decimal(quantity),
+            unit_price=Decimal(unit_price),
+        )
+
+    def test_receipt_updates_each_ingredient_once(self):
+        flour = self.ingredients[0]
+        InventoryService.receive_po_line(self.create_line(flour, unit_price='10000'), Decimal('10'))
+        first = self.create_line(flour, unit_price='20000')
+        second = self.create_line(flour, unit_price='30000')
+        other = self.create_line(self.ingredients[1], quantity='8', unit_price='5000')
+
+        result = InventoryService.receive_purchase_order(
+            self.purchase_order, {first.pk: Decimal('10'), second.pk: Decimal('10'), other.pk: Decimal('4')}
+        )
+
+        flour.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(result['status'], 'partially_received')
+        self.assertEqual(flour.current_stock, Decimal('30'))
+        self.assertEqual(flour.current_cost_per_unit, Decimal('20000'))
+        self.assertEqual(other.received_quantity, Decimal('4'))
+        self.assertEqual(flour.stock_movements.first().balance_value, Decimal('600000'))
+
+        InventoryService.receive_purchase_order(self.purchase_order, {other.pk: Decimal('4')})
+        self.purchase_order.refresh_from_db()
+        self.assertEqual(self.purchase_order.status, 'received')
+
+    def test_query_count_does_not_grow_with_lines(self):
+        def receive(po_number, ingredients):
+            self.purchase_order = PurchaseOrder.objects.create(
+                po_number=po_number, supplier=self.purchase_order.supplier, order_date=date(2025, 3, 1)
+            )
+            lines = [self.create_line(ingredient) for ingredient in ingredients]
+            with CaptureQueriesContext(connection) as queries:
+                InventoryService.receive_purchase_order(
+                    self.purchase_order, {line.pk: Decimal('10') for line in lines}
+                )
+            return len(queries)
+
+        self.assertEqual(receive('PO-2', self.ingredients[:2]), receive('PO-3', self.ingredients))
+
+    def test_invalid_receipt_changes_nothing(self):
+        line = self.create_line(self.ingredients[0])
+        other_po = PurchaseOrder.objects.create(
+            po_number='PO-2', supplier=self.purchase_order.supplier, order_date=date(2025, 3, 1)
+        )
+        foreign = PurchaseOrderLine.objects.create(
+            purchase_order=other_po, ingredient=self.ingredients[1], quantity=Decimal('1'), unit_price=Decimal('1')
+        )
+
+        with self.assertRaises(ValueError):
+            InventoryService.receive_purchase_order(self.purchase_order, {line.pk: Decimal('5'), foreign.pk: Decimal('1')})
+        with self.assertRaises(ValueError):
+            InventoryService.receive_purchase_order(self.purchase_order, {line.pk: Decimal('0')})
+
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_receive_view(self):
+        user = get_user_model().objects.create_user(username='storekeeper', password='secret')
+        self.client.force_login(user)
+        line = self.create_line(self.ingredients[0])
+        url = reverse('inventory:receive_purchase_order', kwargs={'pk': self.purchase_order.pk})
+
+        response = self.client.post(
+            url,
+            json.dumps({'lines': [{'line_id': line.pk, 'received_quantity': '10'}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'received')
+
+        response = self.client.post(url, json.dumps({'lines': [{'line_id': line.pk}]}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class IngredientDetailAPITests(TestCase):
+    def setUp(self):
+        self.ingredient = Ingredient.objects.create(
+            name='Bot mi', unit='kg', category='flour', current_cost_per_unit=Decimal('20000')
+        )
+        self.url = reverse('inventory:ingredient_detail_api', kwargs={'pk': self.ingredient.pk})
+
+    def patch(self, data):
+        return self.client.patch(self.url, json.dumps(data), content_type='application/json')
+
+    def test_cost_update_goes_through_the_ledger(self):
+        response = self.patch({'current_cost_per_unit': '21000'})
+
+        self.assertEqual(response.status_code, 200)
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.current_cost_per_unit, Decimal('21000'))
+        self.assertTrue(self.ingredient.price_history.exists())
+
+    def test_invalid_cost_is_rejected_without_changes(self):
+        for cost in ('abc', [1], {'value': 1}, 'NaN', '-5'):
+            response = self.patch({'name': 'Renamed', 'current_cost_per_unit': cost})
+
+            self.assertEqual(response.status_code, 400, cost)
+            self.assertIn('error', response.json())
+        self.ingredient.refresh_from_db()
+        self.assertEqual((self.ingredient.name, self.ingredient.current_cost_per_unit), ('Bot mi', Decimal('20000')))
@@ -22,6 +22,7 @@ urlpatterns = [
     path('purchase-orders/create/', views.PurchaseOrderCreateView.as_view(), name='purchaseorder_create'),
     path('purchase-orders/<int:pk>/', views.PurchaseOrderDetailView.as_view(), name='purchaseorder_detail'),
     path('purchase-orders/<int:pk>/edit/', views.PurchaseOrderUpdateView.as_view(), name='purchaseorder_update'),
+    path('purchase-orders/<int:pk>/receive/', views.receive_purchase_order_view, name='receive_purchase_order'),
 
     # Purchase Order Line URLs
     path('purchase-order-lines/<int:po_line_id>/receive/', views.receive_po_line_view, name='receive_po_line'),
@@ -1,4 +1,4 @@
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import ListView, CreateView, UpdateView, DetailView
 from django.urls import reverse_lazy
@@ -11,6 +11,7 @@ from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 import json
+from apps.core.api import ApiField, JsonListAPI, as_float, choice_label
 from .models import Ingredient, Supplier, PurchaseOrder, PurchaseOrderLine
 from .forms import (
     IngredientForm,
@@ -20,6 +21,16 @@ from .forms import (
 )
 from .services import InventoryService
 
+INGREDIENT_API_FIELDS = {
+    "id": ApiField('id'),
+    "name": ApiField('name'),
+    "category": ApiField('category', convert=choice_label(Ingredient.CATEGORY_CHOICES)),
+    "unit": ApiField('unit'),
+    "current_stock": ApiField('current_stock', convert=as_float),
+    "minimum_stock": ApiField('minimum_stock', convert=as_float),
+    "current_cost_per_unit": ApiField('current_cost_per_unit', convert=as_float),
+}
+
 
 # Ingredient Views
 class IngredientListView(LoginRequiredMixin, ListView):
@@ -62,22 +73,19 @@ class IngredientCreateView(LoginRequiredMixin, CreateView):
     template_name = 'inventory/ingredient_form.html'
     success_url = reverse_lazy('inventory:ingredient_list')
 
+    def form_valid(self, form):
+        """Record the opening stock in the stock ledger."""
+        opening_stock = form.instance.current_stock
+        form.instance.current_stock = 0
+        response = super().form_valid(form)
+        InventoryService.adjust_stock(self.object, opening_stock, notes='Opening stock')
+        return response
+
 
 @csrf_exempt
 def ingredients_api(request):
     if request.method == 'GET':
-        items = []
-        for i in Ingredient.objects.all().order_by('name'):
-            items.append({
-                "id": i.id,
-                "name": i.name,
-                "category": i.get_category_display() if hasattr(i, 'get_category_display') else i.category,
-                "unit": i.unit,
-                "current_stock": float(i.current_stock),
-                "minimum_stock": float(i.minimum_stock),
-                "current_cost_per_unit": float(i.current_cost_per_unit),
-            })
-        return JsonResponse({"items": items})
+        return JsonListAPI(Ingredient.objects.all(), INGREDIENT_API_FIELDS, ordering=('name', 'pk')).get(request)
 
     if request.method == 'POST':
         data = json.loads(request.body or '{}')
@@ -85,11 +93,11 @@ def ingredients_api(request):
             name=data.get('name'),
             category=data.get('category', 'other'),
             unit=data.get('unit', 'kg'),
-            current_stock=data.get('current_stock') or 0,
             minimum_stock=data.get('minimum_stock') or 0,
             current_cost_per_unit=data.get('current_cost_per_unit') or 0,
             is_active=True,
         )
+        InventoryService.adjust_stock(i, data.get('current_stock') or 0, notes='Opening stock')
         return JsonResponse({"id": i.id})
 
     return JsonResponse({"error": "Method not allowed"}, status=405)
@@ -112,13 +120,25 @@ def ingredient_api_detail(request, pk):
 
     if request.method in ['PUT', 'PATCH']:
         data = json.loads(request.body or '{}')
+        # Validate the cost before anything is saved
+        if 'current_cost_per_unit' in data:
+            try:
+                new_cost = Decimal(str(data.get('current_cost_per_unit') or 0))
+            except (InvalidOperation, TypeError, ValueError):
+                new_cost = None
+            if new_cost is None or not new_cost.is_finite() or new_cost < 0:
+                return JsonResponse({"error": "current_cost_per_unit must be a non-negative number"}, status=400)
         for field in ['name','category','unit']:
             if field in data:
                 setattr(i, field, data.get(field))
-        for field in ['current_stock','minimum_stock','current_cost_per_unit']:
-            if field in data:
-                setattr(i, field, data.get(field) or 0)
+        if 'minimum_stock' in data:
+            i.minimum_stock = data.get('minimum_stock') or 0
         i.save()
+        # Stock and cost changes go through the stock ledger
+        if 'current_cost_per_unit' in data and new_cost != i.current_cost_per_unit:
+            InventoryService.update_ingredient_cost(i, new_cost, source='API update')
+        if 'current_stock' in data:
+            InventoryService.adjust_stock(i, data.get('current_stock') or 0, notes='API update')
         return JsonResponse({"ok": True})
 
     if request.method == 'DELETE':
@@ -130,17 +150,12 @@ def ingredient_api_detail(request, pk):
 
 class LowStockAPIView(View):
     def get(self, request):
-        qs = Ingredient.objects.filter(current_stock__lte=models.F('minimum_stock')).order_by('name')
-        items = []
-        for i in qs:
-            items.append({
-                "id": i.id,
-                "name": i.name,
-                "unit": i.unit,
-                "current_stock": float(i.current_stock),
-                "minimum_stock": float(i.minimum_stock),
-            })
-        return JsonResponse({"items": items})
+        qs = Ingredient.objects.filter(current_stock__lte=models.F('minimum_stock'))
+        fields = {
+            name: INGREDIENT_API_FIELDS[name]
+            for name in ["id", "name", "unit", "current_stock", "minimum_stock"]
+        }
+        return JsonListAPI(qs, fields, ordering=('name', 'pk')).get(request)
 
 
 class IngredientUpdateView(LoginRequiredMixin, UpdateView):
@@ -150,6 +165,20 @@ class IngredientUpdateView(LoginRequiredMixin, UpdateView):
     template_name = 'inventory/ingredient_form.html'
     success_url = reverse_lazy('inventory:ingredient_list')
 
+    def form_valid(self, form):
+        """Route stock counts and cost changes through the stock ledger."""
+        counted_stock = form.instance.current_stock
+        new_cost = form.instance.current_cost_per_unit
+        form.instance.current_stock = form.initial['current_stock']
+        form.instance.current_cost_per_unit = form.initial['current_cost_per_unit']
+        response = super().form_valid(form)
+
+        if 'current_cost_per_unit' in form.changed_data:
+            InventoryService.update_ingredient_cost(self.object, new_cost, source='Manual edit')
+        if 'current_stock' in form.changed_data:
+            InventoryService.adjust_stock(self.object, counted_stock, notes='Stock count')
+        return response
+
 
 # Supplier Views
 class SupplierListView(LoginRequiredMixin, ListView):
@@ -278,7 +307,7 @@ def receive_po_line_view(request, po_line_id):
 
         return redirect('inventory:purchaseorder_detail', pk=po_line.purchase_order.pk)
 
-    except (ValueError, TypeError) as e:
+    except (ValueError, TypeError, InvalidOperation) as e:
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({
                 'success': False,
@@ -286,3 +315,39 @@ def receive_po_line_view(request, po_line_id):
             }, status=400)
 
         return redirect('inventory:purchaseorder_detail', pk=po_line.purchase_order.pk)
+
+
+@login_required
+@require_POST
+def receive_purchase_order_view(request, pk):
+    """
+    Receive many lines of a purchase order in one request.
+
+    JSON body: {"lines": [{"line_id": 1, "received_quantity": "5"}, ...]}
+    Quantities are added to what each line already received.
+    """
+    purchase_order = get_object_or_404(PurchaseOrder, pk=pk)
+
+    try:
+        data = json.loads(request.body or '{}')
+        received_quantities = {}
+        for line in data['lines']:
+            line_id = int(line['line_id'])
+            if line_id in received_quantities:
+                raise ValueError(f'Line {line_id} is listed twice')
+            received_quantities[line_id] = Decimal(str(line['received_quantity']))
+
+        result = InventoryService.receive_purchase_order(purchase_order, received_quantities)
+
+    except (ValueError, TypeError, KeyError, InvalidOperation) as e:
+        return JsonResponse({
+            'success': False,
+            'message': f'Invalid receipt: {str(e)}'
+        }, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'status': result['status'],
+        'received_lines': result['received_lines'],
+        'message': f'Received {result["received_lines"]} lines of {purchase_order.po_number}'
+    })
@@ -5,3 +5,7 @@ class LaborConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.labor'
     label = 'labor'
+
+    def ready(self):
+        """Import signals when app is ready."""
+        import apps.labor.signals  # noqa: F401
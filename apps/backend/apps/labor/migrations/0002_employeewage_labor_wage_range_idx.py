@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('labor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employeewage',
+            index=models.Index(fields=['effective_date', 'end_date'], name='labor_wage_range_idx'),
+        ),
+    ]
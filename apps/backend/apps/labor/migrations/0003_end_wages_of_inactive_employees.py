@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.db import migrations
+
+
+def end_wages_of_inactive_employees(apps, schema_editor):
+    """End the open wages of employees deactivated before deactivation ended them."""
+    Employee = apps.get_model('labor', 'Employee')
+    EmployeeWage = apps.get_model('labor', 'EmployeeWage')
+    for employee in Employee.objects.filter(is_active=False, wages__end_date__isnull=True).distinct():
+        EmployeeWage.objects.filter(employee=employee, end_date__isnull=True).update(
+            end_date=employee.updated_at.date() - timedelta(days=1)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('labor', '0002_employeewage_labor_wage_range_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(end_wages_of_inactive_employees, migrations.RunPython.noop),
+    ]
@@ -67,6 +67,9 @@ class EmployeeWage(TimestampedModel):
         ordering = ['-effective_date']
         verbose_name = 'Employee Wage'
         verbose_name_plural = 'Employee Wages'
+        indexes = [
+            models.Index(fields=['effective_date', 'end_date'], name='labor_wage_range_idx'),
+        ]
 
     def __str__(self):
         return f"{self.employee.name}: {self.base_rate} ({self.wage_type}) from {self.effective_date}"
@@ -1,10 +1,15 @@
+import time
 from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
-from django.db.models import Avg, Q
+from django.db.models import Avg, F, OuterRef, Q, Subquery
 from datetime import date
 
 from .models import Employee, EmployeeWage, ProductionTime, ProductionPhase
 
+HOURLY_RATES_CACHE_VERSION_KEY = 'labor:hourly_rates:version'
+
 
 class LaborService:
     """Service class for labor cost calculations and related operations."""
@@ -30,10 +35,34 @@ class LaborService:
             Q(end_date__isnull=True) | Q(end_date__gte=today)
         ).first()
 
+    @staticmethod
+    def with_latest_wage(employees=None):
+        """
+        Annotate employees with their latest wage's wage_type and base_rate.
+
+        Args:
+            employees: Optional Employee queryset, defaults to all employees
+
+        Returns:
+            QuerySet of Employee annotated with wage_type and base_rate
+            (None for employees without a wage)
+        """
+        if employees is None:
+            employees = Employee.objects.all()
+
+        latest_wage = EmployeeWage.objects.filter(employee=OuterRef('pk')).order_by('-effective_date')
+        return employees.annotate(
+            wage_type=Subquery(latest_wage.values('wage_type')[:1]),
+            base_rate=Subquery(latest_wage.values('base_rate')[:1]),
+        )
+
     @staticmethod
     def get_average_hourly_rate_by_role(role: str) -> Decimal:
         """
-        Calculate average fully_loaded_hourly_rate for all active employees with a specific role.
+        Calculate average fully_loaded_hourly_rate of the employees currently paid in a role.
+
+        Reads the cached rate snapshot (see get_hourly_rate_snapshot), so repeated
+        calls do not query wages again.
 
         Args:
             role: Employee role (baker, assistant, decorator, packer, supervisor, other)
@@ -41,27 +70,121 @@ class LaborService:
         Returns:
             Decimal average fully loaded hourly rate, or Decimal('0') if no employees found
         """
-        today = date.today()
+        return LaborService.get_hourly_rate_snapshot().get(role, Decimal('0'))
 
-        # Get active employees with the given role
-        employees = Employee.objects.filter(role=role, is_active=True)
+    @staticmethod
+    def get_average_hourly_rates(as_of=None) -> dict:
+        """
+        Calculate average fully_loaded_hourly_rate for every role in one pass.
 
-        if not employees.exists():
-            return Decimal('0')
+        Loads the wages in effect on the given date with a single query and
+        averages the most recent one of each employee per role.
 
-        total_rate = Decimal('0')
-        count = 0
+        Args:
+            as_of: Date the wages must be in effect on, defaults to today
 
-        for employee in employees:
-            current_wage = LaborService.get_current_wage(employee)
-            if current_wage:
-                total_rate += current_wage.fully_loaded_hourly_rate
-                count += 1
+        Returns:
+            dict mapping role to Decimal average fully loaded hourly rate.
+            Roles without a current wage are omitted.
+        """
+        as_of = as_of or date.today()
+        return LaborService.get_average_hourly_rates_for_dates([as_of])[as_of]
 
-        if count == 0:
-            return Decimal('0')
+    @staticmethod
+    def get_average_hourly_rates_for_dates(dates) -> dict:
+        """
+        Calculate the role -> average hourly rate table for many dates at once.
 
-        return total_rate / count
+        Loads every wage in effect on any of the dates with a single query and
+        resolves each date's effective ranges in memory, so costing a year of
+        months does not query wages once per month.
+
+        Args:
+            dates: Iterable of dates
+
+        Returns:
+            dict mapping each date to a dict of role -> Decimal average fully
+            loaded hourly rate, as returned by get_average_hourly_rates()
+        """
+        dates = sorted(set(dates))
+        if not dates:
+            return {}
+
+        # Wages are selected by their effective range only, so past months still
+        # count employees deactivated since (deactivation ends their open wages).
+        # Roles have no history; employees are grouped by their current role.
+        wages = EmployeeWage.objects.filter(
+            effective_date__lte=dates[-1]
+        ).filter(
+            Q(end_date__isnull=True) | Q(end_date__gte=dates[0])
+        ).select_related('employee').order_by('employee__employee_id', '-effective_date')
+
+        totals_by_date = {as_of: {} for as_of in dates}
+        seen_by_date = {as_of: set() for as_of in dates}
+
+        for wage in wages:
+            for as_of in dates:
+                if wage.effective_date > as_of or (wage.end_date and wage.end_date < as_of):
+                    continue
+                # Only the most recent wage of each employee counts
+                if wage.employee_id in seen_by_date[as_of]:
+                    continue
+                seen_by_date[as_of].add(wage.employee_id)
+
+                totals = totals_by_date[as_of]
+                role = wage.employee.role
+                total_rate, count = totals.get(role, (Decimal('0'), 0))
+                totals[role] = (total_rate + wage.fully_loaded_hourly_rate, count + 1)
+
+        return {
+            as_of: {
+                role: total_rate / count
+                for role, (total_rate, count) in totals.items()
+            }
+            for as_of, totals in totals_by_date.items()
+        }
+
+    @staticmethod
+    def get_hourly_rate_snapshot(as_of=None) -> dict:
+        """
+        Get the role -> average hourly rate table as of a date, cached across requests.
+
+        The snapshot is computed with get_average_hourly_rates() on a cache miss
+        and dropped by invalidate_hourly_rates() whenever a wage or employee changes.
+
+        Args:
+            as_of: Date the wages must be in effect on, defaults to today
+
+        Returns:
+            dict mapping role to Decimal average fully loaded hourly rate
+        """
+        as_of = as_of or date.today()
+
+        version = cache.get(HOURLY_RATES_CACHE_VERSION_KEY)
+        if version is None:
+            version = LaborService.invalidate_hourly_rates()
+
+        cache_key = f'labor:hourly_rates:{version}:{as_of.isoformat()}'
+        rates = cache.get(cache_key)
+        if rates is None:
+            rates = LaborService.get_average_hourly_rates(as_of)
+            cache.set(cache_key, rates, settings.LABOR_RATE_CACHE_TIMEOUT)
+        return rates
+
+    @staticmethod
+    def invalidate_hourly_rates() -> int:
+        """
+        Drop every cached hourly rate snapshot.
+
+        Moves the snapshots to a new cache key version; the old entries are
+        never read again and expire on their own.
+
+        Returns:
+            The new snapshot version
+        """
+        version = time.time_ns()
+        cache.set(HOURLY_RATES_CACHE_VERSION_KEY, version, None)
+        return version
 
     @staticmethod
     def get_active_production_time(product) -> ProductionTime:
@@ -74,7 +197,26 @@ class LaborService:
         Returns:
             ProductionTime instance or None
         """
-        return product.production_times.first()
+        return product.active_production_time
+
+    @staticmethod
+    def get_active_production_times(product_ids) -> dict:
+        """
+        Get the active ProductionTime for many products with one query.
+
+        Args:
+            product_ids: Iterable of product ids
+
+        Returns:
+            dict mapping product id to ProductionTime (products without one are omitted)
+        """
+        return {
+            production_time.product_id: production_time
+            for production_time in ProductionTime.objects.filter(
+                product_id__in=product_ids,
+                product__active_production_time=F('pk')
+            )
+        }
 
     @staticmethod
     def calculate_labor_cost_per_unit(product) -> Decimal:
@@ -96,11 +238,12 @@ class LaborService:
             return Decimal('0')
 
         total_labor_cost = Decimal('0')
+        hourly_rates = LaborService.get_hourly_rate_snapshot()
 
         for phase in production_time.phases.all():
             # Calculate cost for this phase
             hours = phase.duration_minutes / 60
-            avg_hourly_rate = LaborService.get_average_hourly_rate_by_role(phase.employee_role)
+            avg_hourly_rate = hourly_rates.get(phase.employee_role, Decimal('0'))
             phase_cost = hours * phase.employees_required * avg_hourly_rate
             total_labor_cost += phase_cost
 
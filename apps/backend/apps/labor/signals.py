@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from apps.products.models import Product
+
+from .models import Employee, EmployeeWage, ProductionTime
+from .services import LaborService
+
+
+@receiver(pre_save, sender=Employee)
+def remember_stored_active_flag(sender, instance, **kwargs):
+    """Remember whether a deactivated employee was stored as active, so their wages are ended only once."""
+    instance._was_active = False
+    update_fields = kwargs.get('update_fields')
+    if instance.pk is None or kwargs.get('raw') or instance.is_active:
+        return
+    if update_fields is not None and 'is_active' not in update_fields:
+        return
+    instance._was_active = Employee.objects.filter(pk=instance.pk, is_active=True).exists()
+
+
+@receiver(post_save, sender=Employee)
+def end_wages_of_deactivated_employee(sender, instance, **kwargs):
+    """End a deactivated employee's open wages, so current rates drop them while past months keep them."""
+    if getattr(instance, '_was_active', False):
+        # end_date is inclusive: the last day paid is the day before deactivation
+        EmployeeWage.objects.filter(employee=instance, end_date__isnull=True).update(
+            end_date=date.today() - timedelta(days=1)
+        )
+
+
+@receiver(post_save, sender=EmployeeWage)
+@receiver(post_delete, sender=EmployeeWage)
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def invalidate_hourly_rate_snapshots(sender, instance, **kwargs):
+    """Drop cached role rates when a wage, an employee's role or their active flag changes."""
+    # After commit, so a request cannot re-cache rates from before the write
+    transaction.on_commit(LaborService.invalidate_hourly_rates)
+
+
+@receiver(post_save, sender=ProductionTime)
+@receiver(post_delete, sender=ProductionTime)
+def refresh_active_production_time(sender, instance, **kwargs):
+    """Re-point the product at its latest production time when one is saved or deleted."""
+    if kwargs.get('raw'):
+        return
+    Product.objects.refresh_active_production_times([instance.product_id])
+    if 'created' in kwargs and ProductionTime.product.is_cached(instance):
+        instance.product.refresh_from_db(fields=['active_production_time'])
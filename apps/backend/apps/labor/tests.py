@@ -0,0 +1,100 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import TestCase
+
+from .models import Employee, EmployeeWage
+from .services import HOURLY_RATES_CACHE_VERSION_KEY, LaborService
+
+
+class HourlyRateSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.bakers = [
+            self.create_employee('EMP-1', 'baker', '8000000'),
+            self.create_employee('EMP-2', 'baker', '9000000'),
+        ]
+        self.packer = self.create_employee('EMP-3', 'packer', '6000000')
+
+    def create_employee(self, employee_id, role, base_rate):
+        employee = Employee.objects.create(
+            employee_id=employee_id, name=employee_id, role=role, hire_date=date(2024, 1, 1)
+        )
+        EmployeeWage.objects.create(employee=employee, base_rate=Decimal(base_rate), effective_date=date(2024, 1, 1))
+        return employee
+
+    def test_snapshot_matches_per_employee_average(self):
+        rates = LaborService.get_hourly_rate_snapshot()
+
+        expected = sum(
+            LaborService.get_current_wage(baker).fully_loaded_hourly_rate for baker in self.bakers
+        ) / 2
+        self.assertEqual(rates['baker'], expected)
+        self.assertEqual(LaborService.get_average_hourly_rate_by_role('baker'), expected)
+        self.assertEqual(LaborService.get_average_hourly_rate_by_role('decorator'), Decimal('0'))
+
+    def test_snapshot_is_computed_with_one_query_and_then_cached(self):
+        with self.assertNumQueries(1):
+            LaborService.get_hourly_rate_snapshot()
+
+        with self.assertNumQueries(0):
+            for role in ('baker', 'packer', 'decorator'):
+                LaborService.get_average_hourly_rate_by_role(role)
+
+    def test_new_wage_invalidates_snapshot(self):
+        before = LaborService.get_hourly_rate_snapshot()['packer']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            EmployeeWage.objects.create(
+                employee=self.packer, base_rate=Decimal('6600000'), effective_date=date(2025, 1, 1)
+            )
+
+        self.assertEqual(LaborService.get_hourly_rate_snapshot()['packer'], before * Decimal('1.1'))
+
+    def test_role_change_invalidates_snapshot(self):
+        LaborService.get_hourly_rate_snapshot()
+
+        self.packer.role = 'baker'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.packer.save()
+
+        self.assertNotIn('packer', LaborService.get_hourly_rate_snapshot())
+
+    def test_invalidation_reaches_other_processes(self):
+        # A separate cache connection stands in for the cost worker process;
+        # locmem instances share storage only within one process
+        worker_cache = caches.create_connection('default')
+        self.assertNotIsInstance(worker_cache, LocMemCache)
+        LaborService.get_hourly_rate_snapshot()
+        cached_version = worker_cache.get(HOURLY_RATES_CACHE_VERSION_KEY)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            EmployeeWage.objects.create(
+                employee=self.packer, base_rate=Decimal('6600000'), effective_date=date(2025, 1, 1)
+            )
+            self.assertEqual(worker_cache.get(HOURLY_RATES_CACHE_VERSION_KEY), cached_version)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertNotEqual(worker_cache.get(HOURLY_RATES_CACHE_VERSION_KEY), cached_version)
+
+    def test_employee_deactivated_after_a_month_still_counts_in_that_month(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.packer.is_active = False
+            self.packer.save()
+
+        self.assertEqual(self.packer.wages.get().end_date, date.today() - timedelta(days=1))
+        self.assertNotIn('packer', LaborService.get_hourly_rate_snapshot())
+        past_rates = LaborService.get_average_hourly_rates_for_dates([date(2025, 3, 1)])[date(2025, 3, 1)]
+        self.assertEqual(past_rates['packer'], self.packer.wages.get().fully_loaded_hourly_rate)
+
+    def test_snapshot_as_of_date(self):
+        EmployeeWage.objects.create(
+            employee=self.packer, base_rate=Decimal('6600000'), effective_date=date(2030, 1, 1)
+        )
+
+        self.assertEqual(
+            LaborService.get_hourly_rate_snapshot(date(2025, 6, 1))['packer'] * Decimal('1.1'),
+            LaborService.get_hourly_rate_snapshot(date(2030, 6, 1))['packer'],
+        )
@@ -10,6 +10,7 @@ from django.utils.dateparse import parse_date
 from django.utils import timezone
 import json
 
+from apps.core.api import ApiField, JsonListAPI, as_float, as_isoformat
 from .models import Employee, EmployeeWage, ProductionTime, ProductionPhase
 from .forms import (
     EmployeeForm,
@@ -22,26 +23,38 @@ from .forms import (
 from .services import LaborService
 
 
+def _wage_hourly_rate(wage_type, base_rate):
+    """Same as EmployeeWage.hourly_rate, from values() columns."""
+    if base_rate is None:
+        return None
+    return as_float(EmployeeWage(wage_type=wage_type, base_rate=base_rate).hourly_rate)
+
+
+EMPLOYEE_API_FIELDS = {
+    "id": ApiField('id'),
+    "employee_id": ApiField('employee_id'),
+    "name": ApiField('name'),
+    "role": ApiField('role'),
+    "hire_date": ApiField('hire_date', convert=as_isoformat),
+    "phone": ApiField('phone'),
+    "email": ApiField('email'),
+    "wage_type": ApiField('wage_type'),
+    "base_rate": ApiField('base_rate', convert=as_float),
+    "hourly_rate": ApiField('wage_type', 'base_rate', convert=_wage_hourly_rate),
+    "status": ApiField('is_active', convert=lambda is_active: "active" if is_active else "inactive"),
+}
+
+
 @csrf_exempt
 def employees_api(request):
     if request.method == 'GET':
-        items = []
-        for e in Employee.objects.all().order_by('name'):
-            wage = e.wages.order_by('-effective_date').first()
-            items.append({
-                "id": e.id,
-                "employee_id": e.employee_id,
-                "name": e.name,
-                "role": e.role,
-                "hire_date": e.hire_date.isoformat() if e.hire_date else None,
-                "phone": e.phone,
-                "email": e.email,
-                "wage_type": wage.wage_type if wage else None,
-                "base_rate": float(wage.base_rate) if wage else None,
-                "hourly_rate": float(wage.hourly_rate) if wage else None,
-                "status": "active" if e.is_active else "inactive",
-            })
-        return JsonResponse({"items": items})
+        # Latest wage of each employee, joined in as subqueries instead of one query per row
+        return JsonListAPI(
+            LaborService.with_latest_wage(),
+            EMPLOYEE_API_FIELDS,
+            ordering=('name', 'pk'),
+            fingerprint_querysets=[Employee.objects.all(), EmployeeWage.objects.all()],
+        ).get(request)
 
     if request.method == 'POST':
         data = json.loads(request.body or '{}')
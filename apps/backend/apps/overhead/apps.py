@@ -5,3 +5,7 @@ class OverheadConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.overhead'
     label = 'overhead'
+
+    def ready(self):
+        """Import signals when app is ready."""
+        import apps.overhead.signals  # noqa: F401
@@ -1,8 +1,74 @@
+import time
+from dataclasses import dataclass
 from decimal import Decimal
-from django.db.models import Sum
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery, Sum
 
 from .models import OverheadCategory, OverheadCost, MonthlyProductionVolume
 
+OVERHEAD_CONTEXT_CACHE_VERSION_KEY = 'overhead:context:version'
+
+
+@dataclass(frozen=True)
+class OverheadContext:
+    """
+    Immutable overhead allocation inputs for one month.
+
+    Every SKU costed for the same month allocates overhead from the same active
+    categories, monthly amounts and production volume, so they are loaded once
+    and shared by the whole run.
+    """
+    month: int
+    year: int
+    categories: tuple
+    amounts: tuple
+    total_units: Decimal
+
+    @classmethod
+    def build(cls, month: int, year: int) -> 'OverheadContext':
+        """
+        Load the overhead inputs of a month with two queries.
+
+        Args:
+            month: Month (1-12)
+            year: Year
+
+        Returns:
+            OverheadContext for the month
+        """
+        month_amount = OverheadCost.objects.filter(
+            category=OuterRef('pk'),
+            month=month,
+            year=year
+        ).values('amount')[:1]
+
+        categories = tuple(OverheadCategory.objects.filter(
+            is_active=True
+        ).annotate(month_amount=Subquery(month_amount)))
+
+        total_units = MonthlyProductionVolume.objects.filter(
+            month=month,
+            year=year
+        ).values_list('total_units_produced', flat=True).first()
+
+        return cls(
+            month=month,
+            year=year,
+            categories=categories,
+            amounts=tuple(
+                (category.id, category.month_amount)
+                for category in categories
+                if category.month_amount is not None
+            ),
+            total_units=total_units if total_units is not None else Decimal('0'),
+        )
+
+    @property
+    def category_costs(self) -> dict:
+        """Map category id to its amount for the month (categories without one are omitted)."""
+        return dict(self.amounts)
+
 
 class OverheadService:
     """Service class for overhead cost calculations and related operations."""
@@ -85,6 +151,52 @@ class OverheadService:
 
         return overhead_per_unit
 
+    @staticmethod
+    def get_overhead_context(month: int, year: int) -> OverheadContext:
+        """
+        Get the overhead allocation inputs of a month, cached across requests.
+
+        Contexts are memoized per month so bulk runs and multi-month reports build
+        each month once; overhead changes invalidate them (see signals).
+
+        Args:
+            month: Month (1-12)
+            year: Year
+
+        Returns:
+            OverheadContext for the month
+        """
+        cache_key = OverheadService._overhead_context_cache_key(month, year)
+        context = cache.get(cache_key)
+        if context is None:
+            context = OverheadContext.build(month, year)
+            cache.set(cache_key, context, settings.OVERHEAD_CONTEXT_CACHE_TIMEOUT)
+        return context
+
+    @staticmethod
+    def invalidate_overhead_context(month: int = None, year: int = None) -> None:
+        """
+        Drop cached overhead contexts.
+
+        Args:
+            month: Month (1-12) whose context changed
+            year: Year whose context changed. Without month and year, every
+                  month is dropped (e.g. when a category changes).
+        """
+        if month is not None and year is not None:
+            cache.delete(OverheadService._overhead_context_cache_key(month, year))
+        else:
+            cache.set(OVERHEAD_CONTEXT_CACHE_VERSION_KEY, time.time_ns(), None)
+
+    @staticmethod
+    def _overhead_context_cache_key(month: int, year: int) -> str:
+        """Build the cache key of a month's context under the current cache version."""
+        version = cache.get(OVERHEAD_CONTEXT_CACHE_VERSION_KEY)
+        if version is None:
+            version = time.time_ns()
+            cache.set(OVERHEAD_CONTEXT_CACHE_VERSION_KEY, version, None)
+        return f'overhead:context:{version}:{year}:{month}'
+
     @staticmethod
     def get_overhead_breakdown(month: int, year: int) -> list:
         """
@@ -98,14 +210,12 @@ class OverheadService:
             List of dicts with category info, amount, and percentage
         """
         total_overhead = OverheadService.get_monthly_overhead_total(month, year)
+        context = OverheadService.get_overhead_context(month, year)
+        category_costs = context.category_costs
         breakdown = []
 
-        for category in OverheadCategory.objects.filter(is_active=True):
-            try:
-                cost = OverheadCost.objects.get(category=category, month=month, year=year)
-                amount = cost.amount
-            except OverheadCost.DoesNotExist:
-                amount = Decimal('0')
+        for category in context.categories:
+            amount = category_costs.get(category.id, Decimal('0'))
 
             percentage = Decimal('0')
             if total_overhead > 0:
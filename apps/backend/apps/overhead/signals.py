@@ -0,0 +1,24 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import OverheadCategory, OverheadCost, MonthlyProductionVolume
+from .services import OverheadService
+
+
+@receiver(post_save, sender=OverheadCost)
+@receiver(post_delete, sender=OverheadCost)
+@receiver(post_save, sender=MonthlyProductionVolume)
+@receiver(post_delete, sender=MonthlyProductionVolume)
+def invalidate_monthly_overhead_context(sender, instance, **kwargs):
+    """Drop the cached overhead context of the month whose amounts or volume changed."""
+    month, year = instance.month, instance.year
+    # After commit, so a request cannot re-cache the month from before the write
+    transaction.on_commit(lambda: OverheadService.invalidate_overhead_context(month, year))
+
+
+@receiver(post_save, sender=OverheadCategory)
+@receiver(post_delete, sender=OverheadCategory)
+def invalidate_all_overhead_contexts(sender, instance, **kwargs):
+    """Drop every cached overhead context when a category changes."""
+    transaction.on_commit(OverheadService.invalidate_overhead_context)
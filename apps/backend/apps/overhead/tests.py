@@ -0,0 +1,85 @@
+from dataclasses import FrozenInstanceError
+from decimal import Decimal
+
+from django.core.cache import cache, caches
+from django.test import TestCase
+
+from .models import OverheadCategory, OverheadCost, MonthlyProductionVolume
+from .services import OverheadContext, OverheadService
+
+MONTH = 3
+YEAR = 2025
+
+
+class OverheadContextTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.rent = OverheadCategory.objects.create(name='Rent', allocation_method='per_unit_produced')
+        self.maintenance = OverheadCategory.objects.create(
+            name='Maintenance', allocation_method='percentage_of_prime_cost', allocation_percentage=Decimal('5')
+        )
+        OverheadCategory.objects.create(name='Old', is_active=False)
+        OverheadCost.objects.create(category=self.rent, amount=Decimal('30000000'), month=MONTH, year=YEAR)
+        MonthlyProductionVolume.objects.create(month=MONTH, year=YEAR, total_units_produced=Decimal('15000'))
+
+    def test_build_loads_month_with_two_queries(self):
+        with self.assertNumQueries(2):
+            context = OverheadContext.build(MONTH, YEAR)
+
+        self.assertEqual([category.name for category in context.categories], ['Maintenance', 'Rent'])
+        self.assertEqual(context.category_costs, {self.rent.pk: Decimal('30000000')})
+        self.assertEqual(context.total_units, Decimal('15000'))
+        with self.assertRaises(FrozenInstanceError):
+            context.total_units = Decimal('0')
+
+    def test_month_without_data(self):
+        context = OverheadContext.build(MONTH + 1, YEAR)
+
+        self.assertEqual(context.category_costs, {})
+        self.assertEqual(context.total_units, Decimal('0'))
+
+    def test_context_is_memoized_per_month(self):
+        OverheadService.get_overhead_context(MONTH, YEAR)
+
+        with self.assertNumQueries(0):
+            OverheadService.get_overhead_context(MONTH, YEAR)
+        with self.assertNumQueries(2):
+            OverheadService.get_overhead_context(MONTH + 1, YEAR)
+
+    def test_overhead_change_invalidates_only_that_month(self):
+        OverheadService.get_overhead_context(MONTH, YEAR)
+        OverheadService.get_overhead_context(MONTH + 1, YEAR)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            OverheadService.record_monthly_cost(self.maintenance.pk, Decimal('2000000'), MONTH, YEAR)
+
+        self.assertEqual(
+            OverheadService.get_overhead_context(MONTH, YEAR).category_costs[self.maintenance.pk],
+            Decimal('2000000'),
+        )
+        with self.assertNumQueries(0):
+            OverheadService.get_overhead_context(MONTH + 1, YEAR)
+
+    def test_category_change_invalidates_every_month(self):
+        OverheadService.get_overhead_context(MONTH, YEAR)
+
+        self.maintenance.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.maintenance.save()
+
+        self.assertEqual(
+            [category.name for category in OverheadService.get_overhead_context(MONTH, YEAR).categories],
+            ['Rent'],
+        )
+
+    def test_invalidation_reaches_other_processes(self):
+        # A separate cache connection stands in for the cost worker process
+        worker_cache = caches.create_connection('default')
+        OverheadService.get_overhead_context(MONTH, YEAR)
+        cache_key = OverheadService._overhead_context_cache_key(MONTH, YEAR)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            OverheadService.record_monthly_cost(self.maintenance.pk, Decimal('2000000'), MONTH, YEAR)
+            self.assertIsNotNone(worker_cache.get(cache_key))
+
+        self.assertIsNone(worker_cache.get(cache_key))
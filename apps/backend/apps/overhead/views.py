@@ -8,6 +8,7 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
 
+from apps.core.api import ApiField, JsonListAPI, as_float
 from .models import OverheadCategory, OverheadCost, MonthlyProductionVolume
 from .forms import (
     OverheadCategoryForm,
@@ -17,6 +18,13 @@ from .forms import (
 )
 from .services import OverheadService
 
+OVERHEAD_COST_API_FIELDS = {
+    "id": ApiField('id'),
+    "category": ApiField('category__name'),
+    "amount": ApiField('amount', convert=as_float),
+    "month": ApiField('month', convert=lambda month: str(month) if month is not None else None),
+}
+
 
 class OverheadCategoryListView(LoginRequiredMixin, ListView):
     """Display list of overhead categories."""
@@ -55,15 +63,12 @@ class OverheadCategoryUpdateView(LoginRequiredMixin, UpdateView):
 @csrf_exempt
 def overhead_costs_api(request):
     if request.method == 'GET':
-        items = []
-        for c in OverheadCost.objects.select_related('category').order_by('-month'):
-            items.append({
-                "id": c.id,
-                "category": c.category.name,
-                "amount": float(c.amount),
-                "month": c.month.strftime('%Y-%m') if hasattr(c.month, 'strftime') else str(c.month) if c.month is not None else None,
-            })
-        return JsonResponse({"items": items})
+        return JsonListAPI(
+            OverheadCost.objects.all(),
+            OVERHEAD_COST_API_FIELDS,
+            ordering=('-year', '-month', 'pk'),
+            fingerprint_querysets=[OverheadCost.objects.all(), OverheadCategory.objects.all()],
+        ).get(request)
 
     if request.method == 'POST':
         data = json.loads(request.body or '{}')
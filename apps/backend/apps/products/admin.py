@@ -6,7 +6,7 @@ class BOMLineItemInline(admin.TabularInline):
     """Inline admin for BOM line items."""
     model = BOMLineItem
     extra = 1
-    fields = ('ingredient', 'quantity_per_unit', 'waste_percentage', 'notes')
+    fields = ('ingredient', 'sub_product', 'quantity_per_unit', 'waste_percentage', 'notes')
     readonly_fields = ()
 
 
@@ -26,8 +26,11 @@ class ProductAdmin(admin.ModelAdmin):
         ('Status', {
             'fields': ('status', 'is_active')
         }),
+        ('Recipe', {
+            'fields': ('active_bom', 'active_production_time')
+        }),
     )
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'active_bom', 'active_production_time')
 
 
 @admin.register(BillOfMaterials)
@@ -54,12 +57,12 @@ class BillOfMaterialsAdmin(admin.ModelAdmin):
 @admin.register(BOMLineItem)
 class BOMLineItemAdmin(admin.ModelAdmin):
     """Admin interface for BOM line items."""
-    list_display = ('bom', 'ingredient', 'quantity_per_unit', 'waste_percentage', 'effective_quantity')
+    list_display = ('bom', 'ingredient', 'sub_product', 'quantity_per_unit', 'waste_percentage', 'effective_quantity')
     list_filter = ('bom__product', 'ingredient', 'created_at')
     search_fields = ('bom__product__name', 'ingredient__name', 'notes')
     fieldsets = (
         ('BOM & Ingredient', {
-            'fields': ('bom', 'ingredient')
+            'fields': ('bom', 'ingredient', 'sub_product')
         }),
         ('Quantities & Waste', {
             'fields': ('quantity_per_unit', 'waste_percentage')
@@ -66,10 +66,11 @@ class BOMLineItemForm(forms.ModelForm):
 
     class Meta:
         model = BOMLineItem
-        fields = ('bom', 'ingredient', 'quantity_per_unit', 'waste_percentage', 'notes')
+        fields = ('bom', 'ingredient', 'sub_product', 'quantity_per_unit', 'waste_percentage', 'notes')
         widgets = {
             'bom': forms.Select(attrs={'class': 'form-control'}),
             'ingredient': forms.Select(attrs={'class': 'form-control'}),
+            'sub_product': forms.Select(attrs={'class': 'form-control'}),
             'quantity_per_unit': forms.NumberInput(attrs={
                 'class': 'form-control',
                 'step': '0.0001',
@@ -90,9 +91,10 @@ class BOMLineItemInlineForm(forms.ModelForm):
 
     class Meta:
         model = BOMLineItem
-        fields = ('ingredient', 'quantity_per_unit', 'waste_percentage', 'notes')
+        fields = ('ingredient', 'sub_product', 'quantity_per_unit', 'waste_percentage', 'notes')
         widgets = {
             'ingredient': forms.Select(attrs={'class': 'form-control'}),
+            'sub_product': forms.Select(attrs={'class': 'form-control'}),
             'quantity_per_unit': forms.NumberInput(attrs={
                 'class': 'form-control',
                 'step': '0.0001',
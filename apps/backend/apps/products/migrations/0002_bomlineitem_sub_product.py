@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_ingredientpricehistory_inventory_price_date_idx'),
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bomlineitem',
+            name='sub_product',
+            field=models.ForeignKey(blank=True, help_text='Intermediate product used as a sub-recipe instead of an ingredient', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sub_recipe_lines', to='products.product'),
+        ),
+        migrations.AlterField(
+            model_name='bomlineitem',
+            name='ingredient',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='inventory.ingredient'),
+        ),
+        migrations.AddConstraint(
+            model_name='bomlineitem',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('ingredient__isnull', False), ('sub_product__isnull', True)), models.Q(('ingredient__isnull', True), ('sub_product__isnull', False)), _connector='OR'), name='bomlineitem_ingredient_or_sub_product'),
+        ),
+    ]
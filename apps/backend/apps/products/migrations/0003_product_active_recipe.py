@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def point_products_at_active_recipes(apps, schema_editor):
+    """Archive all but the highest active BOM version and point products at their recipes."""
+    Product = apps.get_model('products', 'Product')
+    BillOfMaterials = apps.get_model('products', 'BillOfMaterials')
+    ProductionTime = apps.get_model('labor', 'ProductionTime')
+
+    active_bom_ids = {}
+    superseded_ids = []
+    for product_id, bom_id in BillOfMaterials.objects.filter(
+        status='active'
+    ).order_by('product_id', '-version').values_list('product_id', 'id'):
+        if product_id in active_bom_ids:
+            superseded_ids.append(bom_id)
+        else:
+            active_bom_ids[product_id] = bom_id
+    BillOfMaterials.objects.filter(pk__in=superseded_ids).update(status='archived')
+
+    Product.objects.update(
+        active_bom_id=models.Subquery(BillOfMaterials.objects.filter(
+            product_id=models.OuterRef('pk'), status='active'
+        ).values('pk')[:1]),
+        active_production_time_id=models.Subquery(ProductionTime.objects.filter(
+            product_id=models.OuterRef('pk')
+        ).order_by('-effective_date', '-version').values('pk')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('labor', '0002_employeewage_labor_wage_range_idx'),
+        ('products', '0002_bomlineitem_sub_product'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='active_bom',
+            field=models.ForeignKey(blank=True, editable=False, help_text='The active BOM, kept in sync when BOMs are activated', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='products.billofmaterials'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='active_production_time',
+            field=models.ForeignKey(blank=True, editable=False, help_text='The production time with the latest effective date', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='labor.productiontime'),
+        ),
+        migrations.RunPython(point_products_at_active_recipes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='billofmaterials',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'active')), fields=('product',), name='unique_active_bom_per_product', violation_error_message='This product already has an active BOM; activate this one instead.'),
+        ),
+    ]
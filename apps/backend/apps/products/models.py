@@ -1,9 +1,117 @@
+from collections import defaultdict
 from django.db import models
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
 from decimal import Decimal
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from apps.core.models import ActiveModel, TimestampedModel
 from apps.inventory.models import Ingredient
 
+COST_FIELD = models.DecimalField(max_digits=20, decimal_places=4)
+
+
+class ProductQuerySet(models.QuerySet):
+    """QuerySet of products with SQL-computed BOM costs."""
+
+    def with_costs(self):
+        """
+        Annotate each product's active BOM cost in SQL.
+
+        Adds bom_cost, the ingredient cost per unit of the active BOM with
+        sub-recipes included, which latest_cost, margin and margin_percentage
+        then read instead of querying per product. Sub-recipes are costed by
+        nested subqueries, one per level of nesting in the active recipes
+        (found with one extra query).
+
+        Returns:
+            Annotated ProductQuerySet
+        """
+        return self.annotate(bom_cost=Cast(_recipe_cost(OuterRef('active_bom_id'), _sub_recipe_depth()), COST_FIELD))
+
+    def refresh_active_boms(self, product_ids) -> int:
+        """
+        Re-point active_bom of the given products at their active BOM.
+
+        Args:
+            product_ids: Iterable of product ids
+
+        Returns:
+            Number of products updated
+        """
+        return self.filter(pk__in=list(product_ids)).update(active_bom_id=Subquery(
+            BillOfMaterials.objects.filter(
+                product_id=OuterRef('pk'),
+                status='active'
+            ).order_by('-version').values('pk')[:1]
+        ))
+
+    def refresh_active_production_times(self, product_ids) -> int:
+        """
+        Re-point active_production_time of the given products at their latest production time.
+
+        The latest effective date wins, then the highest version.
+
+        Args:
+            product_ids: Iterable of product ids
+
+        Returns:
+            Number of products updated
+        """
+        ProductionTime = self.model._meta.get_field('active_production_time').related_model
+        return self.filter(pk__in=list(product_ids)).update(active_production_time_id=Subquery(
+            ProductionTime.objects.filter(
+                product_id=OuterRef('pk')
+            ).order_by('-effective_date', '-version').values('pk')[:1]
+        ))
+
+
+def _sub_recipe_depth() -> int:
+    """Longest chain of sub-recipes among the active BOMs."""
+    sub_products = defaultdict(set)
+    for product_id, sub_product_id in BOMLineItem.objects.filter(
+        bom__status='active', sub_product__isnull=False
+    ).values_list('bom__product_id', 'sub_product_id'):
+        sub_products[product_id].add(sub_product_id)
+
+    depths = {}
+
+    def depth(product_id, using=()):
+        if product_id not in depths:
+            # A cycle (rejected when BOMs are saved) would recurse forever
+            children = sub_products[product_id] - set(using)
+            depths[product_id] = max((depth(child, using + (product_id,)) + 1 for child in children), default=0)
+        return depths[product_id]
+
+    return max((depth(product_id) for product_id in list(sub_products)), default=0)
+
+
+def _recipe_cost(bom_ref, depth):
+    """
+    Subquery of the ingredient cost per unit of a product's active BOM.
+
+    Args:
+        bom_ref: Reference to the active BOM id from the enclosing query
+        depth: Levels of sub-recipes to cost; deeper sub-recipe lines cost 0
+    """
+    unit_cost = F('ingredient__current_cost_per_unit')
+    if depth > 0:
+        unit_cost = Coalesce(unit_cost, _recipe_cost(OuterRef('sub_product__active_bom_id'), depth - 1))
+
+    # Same formula as BOMLineItem.effective_quantity * unit_cost, in floating
+    # point like IngredientCostMatrix (SQLite would divide whole decimals as integers)
+    line_cost = Case(
+        When(waste_percentage__gte=100, then=Value(0.0)),
+        default=Cast('quantity_per_unit', models.FloatField()) * unit_cost * Value(100.0)
+        / (Value(100.0) - F('waste_percentage')),
+        output_field=models.FloatField(),
+    )
+    total = BOMLineItem.objects.filter(
+        bom_id=bom_ref
+    ).order_by().values('bom_id').annotate(total=Sum(line_cost)).values('total')
+
+    return Coalesce(Subquery(total, output_field=models.FloatField()), Value(0.0))
+
 
 class Product(ActiveModel):
     """Model representing a bakery product."""
@@ -51,6 +159,28 @@ class Product(ActiveModel):
         choices=STATUS_CHOICES,
         default='active'
     )
+    # Maintained from BillOfMaterials and ProductionTime saves (products and
+    # labor signals) and BulkBOMService.activate_boms(); never set directly
+    active_bom = models.ForeignKey(
+        'BillOfMaterials',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+        help_text='The active BOM, kept in sync when BOMs are activated'
+    )
+    active_production_time = models.ForeignKey(
+        'labor.ProductionTime',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+        help_text='The production time with the latest effective date'
+    )
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         ordering = ['sku_code']
@@ -62,11 +192,14 @@ class Product(ActiveModel):
 
     @property
     def latest_cost(self) -> Decimal:
-        """Get the cost of the latest active BOM."""
-        active_bom = self.get_active_bom()
-        if active_bom:
-            return active_bom.calculate_bom_cost()
-        return Decimal('0')
+        """Get the cost of the latest active BOM, sub-recipes included."""
+        if hasattr(self, 'bom_cost'):
+            # Annotated by Product.objects.with_costs()
+            return self.bom_cost
+
+        from .services import RecipeGraph
+
+        return RecipeGraph.load([self.pk]).unit_costs().get(self.pk, Decimal('0'))
 
     @property
     def margin(self) -> Decimal:
@@ -82,7 +215,7 @@ class Product(ActiveModel):
 
     def get_active_bom(self):
         """Get the active Bill of Materials for this product."""
-        return self.boms.filter(status='active').first()
+        return self.active_bom
 
 
 class BillOfMaterials(TimestampedModel):
@@ -112,6 +245,14 @@ class BillOfMaterials(TimestampedModel):
         unique_together = ['product', 'version']
         verbose_name = 'Bill of Materials'
         verbose_name_plural = 'Bills of Materials'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product'],
+                condition=models.Q(status='active'),
+                name='unique_active_bom_per_product',
+                violation_error_message='This product already has an active BOM; activate this one instead.',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.product.name} BOM v{self.version}"
@@ -125,7 +266,12 @@ class BillOfMaterials(TimestampedModel):
 
 
 class BOMLineItem(TimestampedModel):
-    """Model representing a line item in a Bill of Materials."""
+    """
+    Model representing a line item in a Bill of Materials.
+
+    A line uses either a raw ingredient or a sub-recipe: another product (a
+    dough, filling or glaze) whose own active BOM is costed per unit of it.
+    """
     bom = models.ForeignKey(
         BillOfMaterials,
         on_delete=models.CASCADE,
@@ -133,7 +279,17 @@ class BOMLineItem(TimestampedModel):
     )
     ingredient = models.ForeignKey(
         Ingredient,
-        on_delete=models.PROTECT
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True
+    )
+    sub_product = models.ForeignKey(
+        Product,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='sub_recipe_lines',
+        help_text='Intermediate product used as a sub-recipe instead of an ingredient'
     )
     quantity_per_unit = models.DecimalField(
         max_digits=10,
@@ -151,9 +307,41 @@ class BOMLineItem(TimestampedModel):
     class Meta:
         verbose_name = 'BOM Line Item'
         verbose_name_plural = 'BOM Line Items'
+        constraints = [
+            models.CheckConstraint(
+                condition=(
+                    models.Q(ingredient__isnull=False, sub_product__isnull=True)
+                    | models.Q(ingredient__isnull=True, sub_product__isnull=False)
+                ),
+                name='bomlineitem_ingredient_or_sub_product',
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.ingredient.name}: {self.quantity_per_unit} {self.ingredient.unit}"
+        component = self.sub_product if self.sub_product_id else self.ingredient
+        return f"{component.name}: {self.quantity_per_unit} {component.unit}"
+
+    def clean(self):
+        """Require exactly one of ingredient and sub-recipe, and reject sub-recipe cycles."""
+        if (self.ingredient_id is None) == (self.sub_product_id is None):
+            raise ValidationError('A BOM line uses either an ingredient or a sub-recipe.')
+
+        if self.sub_product_id and self.bom_id:
+            from .services import RecipeGraph
+
+            # The products reachable from the sub-recipe must not include this BOM's product
+            reachable = RecipeGraph.load([self.sub_product_id]).line_items_by_product
+            if self.bom.product_id in reachable:
+                raise ValidationError({
+                    'sub_product': f'{self.sub_product.name} uses {self.bom.product.name}, which would form a cycle.'
+                })
+
+    @property
+    def unit_cost(self) -> Decimal:
+        """Cost per unit of the ingredient, or of the sub-recipe's active BOM."""
+        if self.sub_product_id:
+            return self.sub_product.latest_cost
+        return self.ingredient.current_cost_per_unit
 
     @property
     def effective_quantity(self) -> Decimal:
@@ -165,4 +353,4 @@ class BOMLineItem(TimestampedModel):
     @property
     def estimated_cost(self) -> Decimal:
         """Calculate estimated cost for this line item."""
-        return self.effective_quantity * self.ingredient.current_cost_per_unit
+        return self.effective_quantity * self.unit_cost
@@ -1,6 +1,10 @@
+from collections import defaultdict, deque
 from decimal import Decimal
 from django.db import transaction, models
+from django.db.models import QuerySet
+from django.utils import timezone
 from .models import Product, BillOfMaterials, BOMLineItem
+from .signals import boms_activated
 
 
 class ProductService:
@@ -18,35 +22,7 @@ class ProductService:
         Returns:
             The newly created BillOfMaterials
         """
-        # Get current active BOM
-        current_bom = product.get_active_bom()
-
-        # Calculate next version number
-        latest_version = product.boms.aggregate(
-            max_version=models.Max('version')
-        )['max_version'] or 0
-        next_version = latest_version + 1
-
-        # Create new BOM
-        new_bom = BillOfMaterials.objects.create(
-            product=product,
-            version=next_version,
-            status='draft',
-            notes=f'Created from v{latest_version}'
-        )
-
-        # Copy line items from current BOM if it exists
-        if current_bom:
-            for line_item in current_bom.line_items.all():
-                BOMLineItem.objects.create(
-                    bom=new_bom,
-                    ingredient=line_item.ingredient,
-                    quantity_per_unit=line_item.quantity_per_unit,
-                    waste_percentage=line_item.waste_percentage,
-                    notes=line_item.notes
-                )
-
-        return new_bom
+        return BulkBOMService.clone_boms([product])[0]
 
     @staticmethod
     @transaction.atomic
@@ -60,16 +36,7 @@ class ProductService:
         Returns:
             The activated BOM
         """
-        # Archive current active BOM if exists
-        current_active = bom.product.get_active_bom()
-        if current_active and current_active.pk != bom.pk:
-            current_active.status = 'archived'
-            current_active.save()
-
-        # Activate the provided BOM
-        bom.status = 'active'
-        bom.save()
-
+        BulkBOMService.activate_boms([bom])
         return bom
 
     @staticmethod
@@ -85,6 +52,22 @@ class ProductService:
         """
         return product.get_active_bom()
 
+    @staticmethod
+    def get_active_bom_ids(product_ids) -> dict:
+        """
+        Get the active Bill of Materials id for many products with one query.
+
+        Args:
+            product_ids: Iterable of product ids
+
+        Returns:
+            dict mapping product id to active BOM id (products without one are omitted)
+        """
+        return dict(Product.objects.filter(
+            pk__in=product_ids,
+            active_bom__isnull=False
+        ).values_list('pk', 'active_bom_id'))
+
     @staticmethod
     def calculate_bom_cost(bom: BillOfMaterials) -> Decimal:
         """
@@ -97,3 +80,363 @@ class ProductService:
             The total cost as Decimal
         """
         return bom.calculate_bom_cost()
+
+
+class BulkBOMService:
+    """
+    Set-based BOM versioning for rolling a recipe change out across many products.
+
+    Clone the active BOMs of a product family into new drafts, change their
+    lines, then activate them together. Every step issues a fixed number of
+    queries however many products are involved, and activation sends one
+    boms_activated signal instead of a post_save per BOM.
+    """
+
+    @staticmethod
+    @transaction.atomic
+    def clone_boms(products) -> list:
+        """
+        Create a new draft BOM version for many products, copying the line items
+        of each product's active BOM.
+
+        Args:
+            products: Product queryset or iterable of products
+
+        Returns:
+            list of the new draft BOMs, one per product
+        """
+        products = list(products)
+        product_ids = [product.pk for product in products]
+        if not product_ids:
+            return []
+
+        latest_versions = dict(
+            BillOfMaterials.objects.filter(product_id__in=product_ids)
+            .order_by()
+            .values('product_id')
+            .annotate(max_version=models.Max('version'))
+            .values_list('product_id', 'max_version')
+        )
+        new_boms = BillOfMaterials.objects.bulk_create([
+            BillOfMaterials(
+                product=product,
+                version=latest_versions.get(product.pk, 0) + 1,
+                status='draft',
+                notes=f'Created from v{latest_versions.get(product.pk, 0)}'
+            )
+            for product in products
+        ])
+
+        # Copy line items from the current active BOMs
+        active_bom_ids = ProductService.get_active_bom_ids(product_ids)
+        new_bom_ids = {bom.product_id: bom.pk for bom in new_boms}
+        product_by_active_bom = {bom_id: product_id for product_id, bom_id in active_bom_ids.items()}
+        BOMLineItem.objects.bulk_create([
+            BOMLineItem(
+                bom_id=new_bom_ids[product_by_active_bom[line_item.bom_id]],
+                ingredient_id=line_item.ingredient_id,
+                sub_product_id=line_item.sub_product_id,
+                quantity_per_unit=line_item.quantity_per_unit,
+                waste_percentage=line_item.waste_percentage,
+                notes=line_item.notes
+            )
+            for line_item in BOMLineItem.objects.filter(bom_id__in=active_bom_ids.values()).order_by('pk')
+        ])
+
+        return new_boms
+
+    @staticmethod
+    @transaction.atomic
+    def replace_ingredient(boms, from_ingredient, to_ingredient, ratio=Decimal('1')) -> int:
+        """
+        Replace an ingredient in the line items of many draft BOMs.
+
+        Each quantity of from_ingredient becomes quantity * ratio of
+        to_ingredient. Where a BOM already uses to_ingredient the quantity is
+        added to that line instead. Passing the same ingredient twice scales it.
+
+        Args:
+            boms: Draft BOMs (queryset or iterable)
+            from_ingredient: Ingredient to replace
+            to_ingredient: Replacement ingredient
+            ratio: Quantity of to_ingredient per unit of from_ingredient
+
+        Returns:
+            Number of BOMs changed
+
+        Raises:
+            ValueError: If ratio is negative or a BOM is not a draft
+        """
+        ratio = Decimal(str(ratio))
+        if ratio < 0:
+            raise ValueError('Ratio cannot be negative')
+
+        if isinstance(boms, QuerySet):
+            bom_ids = list(boms.values_list('pk', flat=True))
+        else:
+            bom_ids = [bom.pk for bom in boms]
+        if BillOfMaterials.objects.filter(pk__in=bom_ids).exclude(status='draft').exists():
+            raise ValueError('Only draft BOMs can be changed; clone them first')
+
+        lines = list(BOMLineItem.objects.filter(
+            bom_id__in=bom_ids, ingredient=from_ingredient
+        ).order_by('pk'))
+        existing_lines = {}
+        if to_ingredient.pk != from_ingredient.pk:
+            existing_lines = {
+                line.bom_id: line
+                for line in BOMLineItem.objects.filter(bom_id__in=bom_ids, ingredient=to_ingredient)
+            }
+
+        now = timezone.now()
+        changed = []
+        merged_ids = []
+        for line in lines:
+            quantity = (line.quantity_per_unit * ratio).quantize(Decimal('0.0001'))
+            target = existing_lines.get(line.bom_id)
+            if target is not None:
+                target.quantity_per_unit += quantity
+                target.updated_at = now
+                changed.append(target)
+                merged_ids.append(line.pk)
+            else:
+                line.ingredient = to_ingredient
+                line.quantity_per_unit = quantity
+                line.updated_at = now
+                changed.append(line)
+
+        BOMLineItem.objects.bulk_update(changed, ['ingredient', 'quantity_per_unit', 'updated_at'])
+        if merged_ids:
+            BOMLineItem.objects.filter(pk__in=merged_ids).delete()
+
+        return len({line.bom_id for line in lines})
+
+    @staticmethod
+    @transaction.atomic
+    def activate_boms(boms) -> int:
+        """
+        Activate many BOMs and archive the ones they replace in one transaction.
+
+        Sends boms_activated once, so the affected product costs are queued for
+        a single batched recalculation.
+
+        Args:
+            boms: BOMs to activate (queryset or iterable), at most one per product
+
+        Returns:
+            Number of BOMs activated
+
+        Raises:
+            ValueError: If two BOMs belong to the same product
+            RecipeCycleError: If the new BOMs would make sub-recipes form a cycle
+        """
+        if not isinstance(boms, QuerySet):
+            boms = list(boms)
+            bom_ids = [bom.pk for bom in boms]
+        else:
+            bom_ids = list(boms.values_list('pk', flat=True))
+        product_by_bom = dict(
+            BillOfMaterials.objects.filter(pk__in=bom_ids).values_list('pk', 'product_id')
+        )
+        product_ids = list(set(product_by_bom.values()))
+        if len(product_ids) != len(product_by_bom):
+            raise ValueError('Only one BOM per product can be activated')
+        if not product_ids:
+            return 0
+
+        # The new recipes must not make sub-recipes use each other in a loop
+        RecipeGraph.load(
+            product_ids, bom_ids={product_id: bom_id for bom_id, product_id in product_by_bom.items()}
+        ).topological_order()
+
+        now = timezone.now()
+        BillOfMaterials.objects.filter(
+            product_id__in=product_ids, status='active'
+        ).exclude(pk__in=bom_ids).update(status='archived', updated_at=now)
+        BillOfMaterials.objects.filter(pk__in=bom_ids).update(status='active', updated_at=now)
+        Product.objects.refresh_active_boms(product_ids)
+
+        if isinstance(boms, list):
+            for bom in boms:
+                bom.status = 'active'
+                if BillOfMaterials.product.is_cached(bom):
+                    bom.product.active_bom = bom
+
+        boms_activated.send(sender=BillOfMaterials, product_ids=product_ids, bom_ids=bom_ids)
+        return len(bom_ids)
+
+
+class RecipeCycleError(ValueError):
+    """Raised when sub-recipes use each other in a loop."""
+
+    def __init__(self, product_ids):
+        self.product_ids = sorted(product_ids)
+        super().__init__(
+            f'Sub-recipes form a cycle; products {", ".join(map(str, self.product_ids))} cannot be costed'
+        )
+
+
+class RecipeGraph:
+    """
+    Active recipes of some products and, transitively, of their sub-recipes.
+
+    Products and their sub-recipes form a DAG whose leaves are raw ingredients.
+    topological_order() puts every sub-recipe before the products using it and
+    rejects cycles; unit_costs() rolls ingredient costs up in that order, so each
+    sub-recipe is costed once however many products use it.
+    """
+
+    def __init__(self, line_items_by_product):
+        """
+        Args:
+            line_items_by_product: dict mapping product id to its BOMLineItems (with
+                                   ingredient and sub_product), for every product
+                                   reachable from the loaded ones
+        """
+        self.line_items_by_product = line_items_by_product
+
+    @classmethod
+    def load(cls, product_ids, bom_ids=None):
+        """
+        Load the recipes of products with two queries per level of nesting.
+
+        Args:
+            product_ids: Iterable of product ids
+            bom_ids: Optional dict mapping product id to the BOM id to use instead
+                     of its active BOM, e.g. BOMs about to be activated
+
+        Returns:
+            RecipeGraph
+        """
+        bom_ids = dict(bom_ids or {})
+        line_items_by_product = {}
+        pending = set(product_ids)
+        while pending:
+            for product_id in pending:
+                line_items_by_product[product_id] = []
+
+            level_bom_ids = {
+                product_id: bom_id for product_id, bom_id in bom_ids.items() if product_id in pending
+            }
+            level_bom_ids.update(ProductService.get_active_bom_ids(pending - level_bom_ids.keys()))
+            product_by_bom = {bom_id: product_id for product_id, bom_id in level_bom_ids.items()}
+
+            sub_product_ids = set()
+            for line_item in BOMLineItem.objects.filter(
+                bom_id__in=product_by_bom.keys()
+            ).select_related('ingredient', 'sub_product').order_by('id'):
+                line_items_by_product[product_by_bom[line_item.bom_id]].append(line_item)
+                if line_item.sub_product_id:
+                    sub_product_ids.add(line_item.sub_product_id)
+
+            pending = sub_product_ids - line_items_by_product.keys()
+
+        return cls(line_items_by_product)
+
+    def _sort(self):
+        """Kahn's algorithm; returns (ordered product ids, product ids blocked by a cycle)."""
+        remaining = {
+            product_id: {line_item.sub_product_id for line_item in line_items if line_item.sub_product_id}
+            for product_id, line_items in self.line_items_by_product.items()
+        }
+        users = defaultdict(list)
+        for product_id, sub_product_ids in remaining.items():
+            for sub_product_id in sub_product_ids:
+                users[sub_product_id].append(product_id)
+
+        ready = deque(sorted(product_id for product_id, sub_product_ids in remaining.items() if not sub_product_ids))
+        order = []
+        while ready:
+            product_id = ready.popleft()
+            order.append(product_id)
+            for user_id in users[product_id]:
+                remaining[user_id].discard(product_id)
+                if not remaining[user_id]:
+                    ready.append(user_id)
+
+        return order, set(remaining) - set(order)
+
+    def topological_order(self) -> list:
+        """
+        Order the products so that every sub-recipe comes before its users.
+
+        Returns:
+            list of product ids
+
+        Raises:
+            RecipeCycleError: If sub-recipes use each other in a loop
+        """
+        order, blocked = self._sort()
+        if blocked:
+            raise RecipeCycleError(blocked)
+        return order
+
+    def unit_costs(self, ingredient_prices=None) -> dict:
+        """
+        Roll ingredient costs up the DAG, costing each product once.
+
+        Products in or above a cycle cannot be costed and are left out.
+
+        Args:
+            ingredient_prices: Optional dict mapping ingredient id to the unit cost
+                               to use instead of current_cost_per_unit
+
+        Returns:
+            dict mapping product id to Decimal ingredient cost per unit
+        """
+        ingredient_prices = ingredient_prices or {}
+        costs = {}
+        for product_id in self._sort()[0]:
+            total_cost = Decimal('0')
+            for line_item in self.line_items_by_product[product_id]:
+                if line_item.sub_product_id:
+                    unit_cost = costs[line_item.sub_product_id]
+                else:
+                    unit_cost = ingredient_prices.get(
+                        line_item.ingredient_id, line_item.ingredient.current_cost_per_unit
+                    )
+                total_cost += line_item.effective_quantity * unit_cost
+            costs[product_id] = total_cost
+        return costs
+
+    def raw_quantities(self) -> dict:
+        """
+        Flatten every recipe into waste-adjusted raw ingredient quantities.
+
+        Products in or above a cycle are left out.
+
+        Returns:
+            dict mapping product id to a dict of ingredient id -> Decimal quantity per unit
+        """
+        quantities = {}
+        for product_id in self._sort()[0]:
+            product_quantities = defaultdict(Decimal)
+            for line_item in self.line_items_by_product[product_id]:
+                effective_quantity = line_item.effective_quantity
+                if line_item.sub_product_id:
+                    for ingredient_id, quantity in quantities[line_item.sub_product_id].items():
+                        product_quantities[ingredient_id] += effective_quantity * quantity
+                else:
+                    product_quantities[line_item.ingredient_id] += effective_quantity
+            quantities[product_id] = dict(product_quantities)
+        return quantities
+
+    def ingredients(self) -> dict:
+        """Every raw ingredient used in the graph, by id."""
+        return {
+            line_item.ingredient_id: line_item.ingredient
+            for line_items in self.line_items_by_product.values()
+            for line_item in line_items
+            if line_item.ingredient_id
+        }
+
+    def reachable(self, product_id) -> set:
+        """The sub-recipes a product uses, directly or nested; cycles are tolerated."""
+        seen = set()
+        stack = [product_id]
+        while stack:
+            for line_item in self.line_items_by_product.get(stack.pop(), []):
+                if line_item.sub_product_id and line_item.sub_product_id not in seen:
+                    seen.add(line_item.sub_product_id)
+                    stack.append(line_item.sub_product_id)
+        return seen
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from .models import BillOfMaterials, Product
+
+# Sent once by BulkBOMService.activate_boms(), inside its transaction. Its
+# queryset updates skip the per-row post_save signals, so receivers that react
+# to BOM activation listen here too.
+# Arguments: product_ids, bom_ids
+boms_activated = Signal()
+
+
+# This app is installed before costs, so Product.active_bom is up to date by
+# the time the cost receivers of the same save run.
+
+@receiver(post_save, sender=BillOfMaterials)
+@receiver(post_delete, sender=BillOfMaterials)
+def refresh_active_bom(sender, instance, **kwargs):
+    """Re-point the product at its active BOM when a BOM is saved or deleted."""
+    if kwargs.get('raw'):
+        return
+    Product.objects.refresh_active_boms([instance.product_id])
+    if 'created' in kwargs and BillOfMaterials.product.is_cached(instance):
+        instance.product.refresh_from_db(fields=['active_bom'])
@@ -0,0 +1,144 @@
+from datetime import date
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from apps.inventory.models import Ingredient
+from apps.labor.models import ProductionTime
+from apps.labor.services import LaborService
+from .models import BillOfMaterials, BOMLineItem, Product
+from .services import BulkBOMService, ProductService
+
+
+class ProductWithCostsTests(TestCase):
+    """Product.objects.with_costs() matches the per-product properties in SQL."""
+
+    def setUp(self):
+        self.flour = Ingredient.objects.create(
+            name='Bot mi', unit='kg', category='flour', current_cost_per_unit=Decimal('22000')
+        )
+        self.butter = Ingredient.objects.create(
+            name='Bo', unit='kg', category='dairy', current_cost_per_unit=Decimal('180000')
+        )
+        self.products = [self.create_product(index) for index in range(3)]
+
+    def create_product(self, index):
+        product = Product.objects.create(
+            sku_code=f'SKU-{index:04d}', name=f'Banh {index}', category='bread', selling_price=Decimal('15000')
+        )
+        bom = BillOfMaterials.objects.create(product=product, version=1, status='active')
+        BOMLineItem.objects.create(bom=bom, ingredient=self.flour, quantity_per_unit=Decimal('1'),
+                                   waste_percentage=Decimal('2'))
+        BOMLineItem.objects.create(bom=bom, ingredient=self.butter, quantity_per_unit=Decimal('0.01') * (index + 1))
+        return product
+
+    def assertCostsMatch(self, product):
+        annotated = Product.objects.with_costs().get(pk=product.pk)
+        self.assertAlmostEqual(annotated.latest_cost, product.latest_cost, places=3)
+        self.assertAlmostEqual(annotated.margin, product.margin, places=3)
+        self.assertAlmostEqual(annotated.margin_percentage, product.margin_percentage, places=3)
+
+    def test_annotations_match_properties(self):
+        for product in self.products:
+            self.assertCostsMatch(product)
+
+        # Draft and archived BOMs are ignored; products without a BOM cost 0
+        BillOfMaterials.objects.create(product=self.products[0], version=2, status='draft')
+        empty = Product.objects.create(sku_code='EMPTY', name='Empty', category='other', selling_price=Decimal('0'))
+        self.assertCostsMatch(self.products[0])
+        self.assertEqual(Product.objects.with_costs().get(pk=empty.pk).latest_cost, Decimal('0'))
+
+    def test_sub_recipes_are_rolled_up(self):
+        glaze = Product.objects.create(sku_code='GLAZE', name='Glaze', category='other', unit='kg')
+        glaze_bom = BillOfMaterials.objects.create(product=glaze, version=1, status='active')
+        BOMLineItem.objects.create(bom=glaze_bom, ingredient=self.butter, quantity_per_unit=Decimal('0.5'))
+        dough = Product.objects.create(sku_code='DOUGH', name='Dough', category='other', unit='kg')
+        dough_bom = BillOfMaterials.objects.create(product=dough, version=1, status='active')
+        BOMLineItem.objects.create(bom=dough_bom, ingredient=self.flour, quantity_per_unit=Decimal('0.9'))
+        BOMLineItem.objects.create(bom=dough_bom, sub_product=glaze, quantity_per_unit=Decimal('0.1'),
+                                   waste_percentage=Decimal('10'))
+        BOMLineItem.objects.create(bom=self.products[0].get_active_bom(), sub_product=dough,
+                                   quantity_per_unit=Decimal('0.2'))
+
+        self.assertCostsMatch(self.products[0])
+        self.assertAlmostEqual(
+            Product.objects.with_costs().get(pk=dough.pk).latest_cost,
+            Decimal('0.9') * 22000 + Decimal('0.1') / Decimal('0.9') * Decimal('0.5') * 180000,
+            places=3
+        )
+
+    def test_product_api_query_count_does_not_grow_with_products(self):
+        with CaptureQueriesContext(connection) as small:
+            items = self.client.get('/api/products/api/').json()['items']
+        self.assertAlmostEqual(items[0]['latest_cost'], float(self.products[0].latest_cost), places=3)
+
+        for index in range(3, 10):
+            self.create_product(index)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(len(self.client.get('/api/products/api/').json()['items']), 10)
+
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+
+class ActiveRecipePointerTests(TestCase):
+    """Product.active_bom and active_production_time follow BOM activation and production times."""
+
+    def setUp(self):
+        self.product = Product.objects.create(sku_code='SKU-0001', name='Banh mi', category='bread')
+        self.bom = BillOfMaterials.objects.create(product=self.product, version=1, status='active')
+
+    def test_active_bom_follows_saves_and_activation(self):
+        self.assertEqual(self.product.active_bom, self.bom)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).active_bom_id, self.bom.pk)
+
+        draft = ProductService.create_new_bom_version(self.product)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).active_bom_id, self.bom.pk)
+
+        ProductService.activate_bom(draft)
+        self.assertEqual(self.product.get_active_bom(), draft)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).active_bom_id, draft.pk)
+        self.assertEqual(ProductService.get_active_bom_ids([self.product.pk]), {self.product.pk: draft.pk})
+
+        draft.status = 'archived'
+        draft.save()
+        self.assertIsNone(Product.objects.get(pk=self.product.pk).active_bom)
+        self.assertEqual(ProductService.get_active_bom_ids([self.product.pk]), {})
+
+    def test_bulk_activation_points_every_product(self):
+        other = Product.objects.create(sku_code='SKU-0002', name='Banh bao', category='bread')
+        drafts = BulkBOMService.clone_boms(Product.objects.filter(pk__in=[self.product.pk, other.pk]))
+
+        BulkBOMService.activate_boms(BillOfMaterials.objects.filter(pk__in=[bom.pk for bom in drafts]))
+
+        self.assertEqual(
+            dict(Product.objects.values_list('pk', 'active_bom_id')),
+            {bom.product_id: bom.pk for bom in drafts},
+        )
+
+    def test_one_active_bom_per_product(self):
+        second = BillOfMaterials(product=self.product, version=2, status='active')
+        with self.assertRaises(ValidationError):
+            second.validate_constraints()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            second.save()
+
+    def test_active_production_time_is_the_latest(self):
+        first = ProductionTime.objects.create(
+            product=self.product, version=1, total_time_minutes=Decimal('60'), effective_date=date(2026, 1, 1)
+        )
+        latest = ProductionTime.objects.create(
+            product=self.product, version=2, total_time_minutes=Decimal('45'), effective_date=date(2026, 6, 1)
+        )
+        self.assertEqual(LaborService.get_active_production_time(self.product), latest)
+        self.assertEqual(LaborService.get_active_production_times([self.product.pk]), {self.product.pk: latest})
+
+        latest.delete()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).active_production_time, first)
+
+        product = Product.objects.select_related('active_bom', 'active_production_time').get(pk=self.product.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(product.get_active_bom(), self.bom)
+            self.assertEqual(LaborService.get_active_production_time(product), first)
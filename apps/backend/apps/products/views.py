@@ -10,6 +10,8 @@ from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 import json
+from apps.core.api import ApiField, JsonListAPI, as_float, choice_label
+from apps.inventory.models import Ingredient
 from .models import Product, BillOfMaterials, BOMLineItem
 from .forms import (
     ProductForm,
@@ -19,23 +21,45 @@ from .forms import (
 )
 from .services import ProductService
 
+PRODUCT_API_FIELDS = {
+    "id": ApiField('id'),
+    "name": ApiField('name'),
+    "sku_code": ApiField('sku_code'),
+    "category": ApiField('category', convert=choice_label(Product.CATEGORY_CHOICES)),
+    "unit": ApiField('unit'),
+    "selling_price": ApiField('selling_price', convert=as_float),
+    "status": ApiField('status'),
+}
+
+# Read from Product.objects.with_costs(); not part of the sync feed, whose
+# change detection cannot see ingredient price changes
+PRODUCT_COST_API_FIELDS = {
+    **PRODUCT_API_FIELDS,
+    "latest_cost": ApiField('bom_cost', convert=as_float),
+    "margin": ApiField('selling_price', 'bom_cost', convert=lambda price, cost: float(price - cost)),
+    "margin_percentage": ApiField(
+        'selling_price', 'bom_cost',
+        convert=lambda price, cost: float((price - cost) / price * 100) if price > 0 else 0.0,
+    ),
+}
+
 
 # Product Views
 @csrf_exempt
 def products_api(request):
     if request.method == 'GET':
-        items = []
-        for p in Product.objects.all().order_by('name'):
-            items.append({
-                "id": p.id,
-                "name": p.name,
-                "sku_code": p.sku_code,
-                "category": p.get_category_display() if hasattr(p, 'get_category_display') else p.category,
-                "unit": getattr(p, 'unit', None),
-                "selling_price": float(p.selling_price),
-                "status": p.status,
-            })
-        return JsonResponse({"items": items})
+        return JsonListAPI(
+            Product.objects.with_costs(),
+            PRODUCT_COST_API_FIELDS,
+            ordering=('name', 'pk'),
+            # Costs change with BOMs, their lines and ingredient prices
+            fingerprint_querysets=[
+                Product.objects.all(),
+                BillOfMaterials.objects.all(),
+                BOMLineItem.objects.all(),
+                Ingredient.objects.all(),
+            ],
+        ).get(request)
 
     if request.method == 'POST':
         data = json.loads(request.body or '{}')
@@ -55,9 +79,8 @@ def products_api(request):
 
 @csrf_exempt
 def product_api_detail(request, pk):
-    p = get_object_or_404(Product, pk=pk)
-
     if request.method == 'GET':
+        p = get_object_or_404(Product.objects.with_costs(), pk=pk)
         return JsonResponse({
             "id": p.id,
             "name": p.name,
@@ -66,8 +89,13 @@ def product_api_detail(request, pk):
             "unit": p.unit,
             "selling_price": float(p.selling_price),
             "status": p.status,
+            "latest_cost": float(p.latest_cost),
+            "margin": float(p.margin),
+            "margin_percentage": float(p.margin_percentage),
         })
 
+    p = get_object_or_404(Product, pk=pk)
+
     if request.method in ['PUT', 'PATCH']:
         data = json.loads(request.body or '{}')
         for field in ['sku_code','name','category','unit','status','description']:
@@ -94,7 +122,7 @@ class ProductListView(LoginRequiredMixin, ListView):
 
     def get_queryset(self):
         """Filter products based on search and category."""
-        queryset = Product.objects.filter(is_active=True)
+        queryset = Product.objects.with_costs().filter(is_active=True)
 
         search_query = self.request.GET.get('search', '')
         if search_query:
@@ -147,6 +175,10 @@ class ProductDetailView(LoginRequiredMixin, DetailView):
     template_name = 'products/product_detail.html'
     context_object_name = 'product'
 
+    def get_queryset(self):
+        """Annotate costs and join the active BOM so neither needs its own query."""
+        return Product.objects.with_costs().select_related('active_bom')
+
     def get_context_data(self, **kwargs):
         """Add BOMs and active BOM to context."""
         context = super().get_context_data(**kwargs)
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class SyncConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.sync'
+    label = 'sync'
+
+    def ready(self):
+        """Import signals when app is ready."""
+        import apps.sync.signals  # noqa: F401
@@ -0,0 +1,25 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Tombstone(models.Model):
+    """
+    Record of a deleted row, so delta sync clients learn about deletions.
+
+    Written by post_delete signals for every table in the sync feed and pruned
+    after SYNC_TOMBSTONE_RETENTION_DAYS.
+    """
+    feed = models.CharField(max_length=50, help_text='Sync feed name, e.g. products')
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['deleted_at']
+        indexes = [
+            models.Index(fields=['deleted_at', 'feed']),
+        ]
+        verbose_name = 'Tombstone'
+        verbose_name_plural = 'Tombstones'
+
+    def __str__(self):
+        return f"{self.feed}:{self.object_id} deleted at {self.deleted_at}"
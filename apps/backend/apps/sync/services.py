@@ -0,0 +1,209 @@
+import base64
+import json
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.core.api import ApiField
+from apps.costs.models import SKUCost
+from apps.costs.views import COST_API_FIELDS
+from apps.inventory.models import Ingredient
+from apps.inventory.views import INGREDIENT_API_FIELDS
+from apps.labor.models import EmployeeWage
+from apps.labor.services import LaborService
+from apps.labor.views import EMPLOYEE_API_FIELDS
+from apps.overhead.models import OverheadCost
+from apps.overhead.views import OVERHEAD_COST_API_FIELDS
+from apps.products.models import Product
+from apps.products.views import PRODUCT_API_FIELDS
+from .models import Tombstone
+
+
+@dataclass(frozen=True)
+class SyncFeed:
+    """
+    One table of the delta sync feed.
+
+    Attributes:
+        name: Feed name used in responses, ?feeds= and tombstones
+        get_queryset: Callable returning the rows of the feed
+        fields: Dict of output field name to ApiField, as in the list APIs
+        changed: Callable(since) returning a Q for rows changed after since
+        initial: Q selecting the rows of a full sync
+    """
+    name: str
+    get_queryset: Callable
+    fields: dict
+    changed: Callable = lambda since: Q(updated_at__gt=since)
+    initial: Q = Q()
+
+
+FEEDS = [
+    SyncFeed(
+        name='products',
+        get_queryset=Product.objects.all,
+        fields=PRODUCT_API_FIELDS,
+    ),
+    SyncFeed(
+        name='ingredients',
+        get_queryset=Ingredient.objects.all,
+        fields=INGREDIENT_API_FIELDS,
+    ),
+    SyncFeed(
+        name='sku_costs',
+        get_queryset=SKUCost.objects.all,
+        fields={**COST_API_FIELDS, 'is_current': ApiField('is_current')},
+        # Costs that stop being current are sent with is_current=False; current
+        # costs are re-sent when their product's name or price changes
+        changed=lambda since: Q(updated_at__gt=since) | Q(is_current=True, product__updated_at__gt=since),
+        initial=Q(is_current=True),
+    ),
+    SyncFeed(
+        name='overhead_costs',
+        get_queryset=OverheadCost.objects.all,
+        fields=OVERHEAD_COST_API_FIELDS,
+        changed=lambda since: Q(updated_at__gt=since) | Q(category__updated_at__gt=since),
+    ),
+    SyncFeed(
+        name='employees',
+        get_queryset=LaborService.with_latest_wage,
+        fields=EMPLOYEE_API_FIELDS,
+        changed=lambda since: Q(updated_at__gt=since) | Q(
+            pk__in=EmployeeWage.objects.filter(updated_at__gt=since).values('employee_id')
+        ),
+    ),
+]
+
+FEEDS_BY_NAME = {feed.name: feed for feed in FEEDS}
+
+
+class DeltaSyncService:
+    """
+    Service building the delta sync change feed.
+
+    A client calls get_changes() without a cursor once to receive every row, then
+    passes the returned cursor back to receive only rows created, updated or
+    deleted since. Changes are detected from updated_at, deletions from the
+    Tombstone log. Each cursor reaches back SYNC_OVERLAP_SECONDS so rows committed
+    while the previous sync ran are not missed; clients upsert by id, so the
+    rows sent twice are harmless. updated_at is the time a row was saved, not
+    committed, so only rows of transactions shorter than the overlap are
+    guaranteed to be sent.
+    """
+
+    @staticmethod
+    def get_changes(cursor=None, feeds=None) -> dict:
+        """
+        Get the rows changed since a cursor.
+
+        Args:
+            cursor: Cursor from a previous call, or None for a full sync
+            feeds: Optional list of feed names, defaults to every feed
+
+        Returns:
+            dict: {cursor, full, changes}. changes maps each feed name to
+            {updated: [rows], deleted: [ids]}. When full is True the client
+            must replace its copy with the updated rows.
+
+        Raises:
+            ValueError: If the cursor or a feed name is invalid
+        """
+        if feeds:
+            unknown = [name for name in feeds if name not in FEEDS_BY_NAME]
+            if unknown:
+                raise ValueError(f'Unknown feeds: {", ".join(unknown)}. Available: {", ".join(FEEDS_BY_NAME)}')
+            selected = [FEEDS_BY_NAME[name] for name in feeds]
+        else:
+            selected = FEEDS
+
+        now = timezone.now()
+        since = DeltaSyncService.decode_cursor(cursor)
+
+        # Tombstones older than the retention window are gone, so resync fully
+        full = since is None or since < now - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+        if not full:
+            since -= timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+
+        deleted = defaultdict(set)
+        if not full:
+            for feed_name, object_id in Tombstone.objects.filter(
+                deleted_at__gt=since,
+                feed__in=[feed.name for feed in selected]
+            ).values_list('feed', 'object_id'):
+                deleted[feed_name].add(object_id)
+
+        changes = {}
+        for feed in selected:
+            rows = feed.get_queryset().filter(feed.initial if full else feed.changed(since))
+            lookups = {lookup for field in feed.fields.values() for lookup in field.lookups}
+
+            changes[feed.name] = {
+                'updated': [
+                    {name: field.value(row) for name, field in feed.fields.items()}
+                    for row in rows.order_by('pk').values(*lookups)
+                ],
+                'deleted': sorted(deleted[feed.name]),
+            }
+
+        return {
+            'cursor': DeltaSyncService.encode_cursor(now),
+            'full': full,
+            'changes': changes,
+        }
+
+    @staticmethod
+    def record_deletion(feed_name: str, object_id) -> Tombstone:
+        """
+        Log a deleted row of a feed.
+
+        Args:
+            feed_name: Feed name
+            object_id: Primary key of the deleted row
+
+        Returns:
+            Created Tombstone
+        """
+        return Tombstone.objects.create(feed=feed_name, object_id=object_id)
+
+    @staticmethod
+    def prune_tombstones(now=None) -> int:
+        """
+        Delete tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS.
+
+        Clients with older cursors get a full sync instead.
+
+        Args:
+            now: Reference time, defaults to timezone.now()
+
+        Returns:
+            Number of tombstones deleted
+        """
+        now = now or timezone.now()
+        deleted, _ = Tombstone.objects.filter(
+            deleted_at__lt=now - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+        ).delete()
+        return deleted
+
+    @staticmethod
+    def encode_cursor(moment) -> str:
+        """Encode a sync time as an opaque cursor."""
+        return base64.urlsafe_b64encode(json.dumps({'since': moment.isoformat()}).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Decode a cursor from encode_cursor(). None when absent."""
+        if not cursor:
+            return None
+        try:
+            since = parse_datetime(json.loads(base64.urlsafe_b64decode(cursor.encode()))['since'])
+        except (ValueError, TypeError, KeyError):
+            raise ValueError('Invalid cursor')
+        if since is None:
+            raise ValueError('Invalid cursor')
+        return since
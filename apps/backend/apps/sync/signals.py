@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from apps.costs.models import SKUCost
+from apps.inventory.models import Ingredient
+from apps.labor.models import Employee
+from apps.overhead.models import OverheadCost
+from apps.products.models import Product
+
+from .services import DeltaSyncService
+
+FEED_NAMES = {
+    Product: 'products',
+    Ingredient: 'ingredients',
+    SKUCost: 'sku_costs',
+    OverheadCost: 'overhead_costs',
+    Employee: 'employees',
+}
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=SKUCost)
+@receiver(post_delete, sender=OverheadCost)
+@receiver(post_delete, sender=Employee)
+def record_sync_tombstone(sender, instance, **kwargs):
+    """Log deleted rows so delta sync clients can drop them."""
+    DeltaSyncService.record_deletion(FEED_NAMES[sender], instance.pk)
@@ -0,0 +1,127 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.costs.models import SKUCost
+from apps.inventory.models import Ingredient
+from apps.labor.models import Employee, EmployeeWage
+from apps.products.models import Product
+
+from .models import Tombstone
+from .services import DeltaSyncService
+
+
+@override_settings(SYNC_OVERLAP_SECONDS=0)
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            sku_code='SKU-0001', name='Banh mi', category='bread', selling_price=Decimal('15000')
+        )
+        self.ingredient = Ingredient.objects.create(
+            name='Bot mi', unit='kg', category='flour', current_cost_per_unit=Decimal('22000')
+        )
+        self.sku_cost = SKUCost.objects.create(
+            product=self.product,
+            ingredient_cost=Decimal('5000'),
+            labor_cost=Decimal('3000'),
+            overhead_cost=Decimal('2000'),
+            total_cost_per_unit=Decimal('10000'),
+        )
+        self.employee = Employee.objects.create(
+            employee_id='EMP-1', name='Lan', role='baker', hire_date=date(2024, 1, 1)
+        )
+
+    def ids(self, result, feed):
+        return [row['id'] for row in result['changes'][feed]['updated']]
+
+    def test_full_sync_then_only_changes(self):
+        full = DeltaSyncService.get_changes()
+        self.assertTrue(full['full'])
+        self.assertEqual(self.ids(full, 'products'), [self.product.pk])
+        self.assertEqual(self.ids(full, 'sku_costs'), [self.sku_cost.pk])
+        self.assertEqual(self.ids(full, 'employees'), [self.employee.pk])
+
+        nothing = DeltaSyncService.get_changes(full['cursor'])
+        self.assertFalse(nothing['full'])
+        self.assertTrue(all(not feed['updated'] and not feed['deleted'] for feed in nothing['changes'].values()))
+
+        self.ingredient.current_cost_per_unit = Decimal('23000')
+        self.ingredient.save()
+        delta = DeltaSyncService.get_changes(nothing['cursor'])
+        self.assertEqual(self.ids(delta, 'ingredients'), [self.ingredient.pk])
+        self.assertEqual(self.ids(delta, 'products'), [])
+
+    def test_deletions_come_from_tombstones(self):
+        cursor = DeltaSyncService.get_changes()['cursor']
+        ingredient_id = self.ingredient.pk
+        self.ingredient.delete()
+
+        delta = DeltaSyncService.get_changes(cursor)
+        self.assertEqual(delta['changes']['ingredients']['deleted'], [ingredient_id])
+        self.assertEqual(delta['changes']['products']['deleted'], [])
+
+    def test_cost_changes_follow_current_flag_and_product(self):
+        cursor = DeltaSyncService.get_changes()['cursor']
+
+        newer = SKUCost.objects.create(
+            product=self.product,
+            version=2,
+            ingredient_cost=Decimal('6000'),
+            labor_cost=Decimal('3000'),
+            overhead_cost=Decimal('2000'),
+            total_cost_per_unit=Decimal('11000'),
+        )
+        delta = DeltaSyncService.get_changes(cursor)
+        rows = {row['id']: row for row in delta['changes']['sku_costs']['updated']}
+        self.assertFalse(rows[self.sku_cost.pk]['is_current'])
+        self.assertTrue(rows[newer.pk]['is_current'])
+
+        # A price change re-sends the costs with their new margins
+        self.product.selling_price = Decimal('20000')
+        self.product.save()
+        delta = DeltaSyncService.get_changes(delta['cursor'])
+        rows = {row['id']: row for row in delta['changes']['sku_costs']['updated']}
+        self.assertEqual(rows[newer.pk]['margin'], 9000.0)
+        self.assertEqual(self.ids(delta, 'products'), [self.product.pk])
+
+    def test_wage_change_resends_employee(self):
+        cursor = DeltaSyncService.get_changes(feeds=['employees'])['cursor']
+        EmployeeWage.objects.create(employee=self.employee, base_rate=Decimal('8800000'), effective_date=date(2024, 1, 1))
+
+        delta = DeltaSyncService.get_changes(cursor, feeds=['employees'])
+        self.assertEqual(list(delta['changes']), ['employees'])
+        self.assertEqual(delta['changes']['employees']['updated'][0]['hourly_rate'], 50000.0)
+
+    def test_rows_of_a_long_transaction_are_sent_within_the_overlap(self):
+        Product.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        cursor = DeltaSyncService.get_changes()['cursor']
+        # A cost worker run saved this row a lease ago and committed after the cursor
+        SKUCost.objects.filter(pk=self.sku_cost.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=settings.COST_RECALC_LEASE_SECONDS)
+        )
+
+        self.assertEqual(self.ids(DeltaSyncService.get_changes(cursor), 'sku_costs'), [])
+        with self.settings(SYNC_OVERLAP_SECONDS=settings.COST_RECALC_LEASE_SECONDS + 60):
+            self.assertEqual(self.ids(DeltaSyncService.get_changes(cursor), 'sku_costs'), [self.sku_cost.pk])
+
+    def test_expired_cursor_forces_full_sync(self):
+        old_cursor = DeltaSyncService.encode_cursor(timezone.now() - timedelta(days=31))
+        self.assertTrue(DeltaSyncService.get_changes(old_cursor)['full'])
+
+        Tombstone.objects.create(feed='products', object_id=99, deleted_at=timezone.now() - timedelta(days=31))
+        self.assertEqual(DeltaSyncService.prune_tombstones(), 1)
+
+    def test_endpoint(self):
+        response = self.client.get('/api/sync/', {'feeds': 'products,ingredients'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['changes']), {'products', 'ingredients'})
+
+        response = self.client.get('/api/sync/', {'since': response.json()['cursor']})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['full'])
+
+        self.assertEqual(self.client.get('/api/sync/', {'since': 'garbage'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/sync/', {'feeds': 'suppliers'}).status_code, 400)
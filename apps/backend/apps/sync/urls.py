@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+app_name = 'sync'
+
+urlpatterns = [
+    path('', views.DeltaSyncView.as_view(), name='delta_sync'),
+]
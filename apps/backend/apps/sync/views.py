@@ -0,0 +1,26 @@
+from django.http import JsonResponse
+from django.views import View
+
+from .services import DeltaSyncService
+
+
+class DeltaSyncView(View):
+    """JSON change feed for mirroring the catalogue and costs (no auth for local integration)."""
+
+    def get(self, request):
+        """
+        Return rows changed since a cursor.
+
+        Query params:
+        - since: Cursor returned by the previous call; omit for a full sync
+        - feeds: Comma-separated feed names (products, ingredients, sku_costs,
+          overhead_costs, employees), defaults to all
+        """
+        feeds = [name.strip() for name in request.GET.get('feeds', '').split(',') if name.strip()]
+
+        try:
+            changes = DeltaSyncService.get_changes(cursor=request.GET.get('since'), feeds=feeds)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        return JsonResponse(changes)
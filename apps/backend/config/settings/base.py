@@ -35,6 +35,7 @@ INSTALLED_APPS = [
     'apps.overhead',
     'apps.costs',
     'apps.dashboard',
+    'apps.sync',
     'apps.ocr',
 ]
 
@@ -43,6 +44,40 @@ PADDLEOCR_USE_GPU = env.bool('PADDLEOCR_USE_GPU', default=False)
 PADDLEOCR_LANG = env('PADDLEOCR_LANG', default='en')
 PADDLEOCR_MAX_SIDE = env.int('PADDLEOCR_MAX_SIDE', default=2200)
 
+# Cost recalculation queue: triggers are coalesced per product for this many
+# seconds after the last change, but never delayed longer than the max delay.
+COST_RECALC_DEBOUNCE_SECONDS = env.int('COST_RECALC_DEBOUNCE_SECONDS', default=5)
+COST_RECALC_MAX_DELAY_SECONDS = env.int('COST_RECALC_MAX_DELAY_SECONDS', default=60)
+# A claimed request is handed to another worker when the claiming worker has
+# not finished it within this many seconds (e.g. it was killed mid-run).
+COST_RECALC_LEASE_SECONDS = env.int('COST_RECALC_LEASE_SECONDS', default=600)
+# A failed recalculation is retried after this many seconds, doubling with every
+# further failure; after the max attempts the request is kept as a dead letter
+# and not retried until its product is queued again.
+COST_RECALC_RETRY_SECONDS = env.int('COST_RECALC_RETRY_SECONDS', default=30)
+COST_RECALC_MAX_ATTEMPTS = env.int('COST_RECALC_MAX_ATTEMPTS', default=5)
+
+# Cached role hourly-rate snapshots, monthly overhead contexts and the ingredient
+# cost matrix expire after this many seconds even if no change invalidated them.
+LABOR_RATE_CACHE_TIMEOUT = env.int('LABOR_RATE_CACHE_TIMEOUT', default=3600)
+OVERHEAD_CONTEXT_CACHE_TIMEOUT = env.int('OVERHEAD_CONTEXT_CACHE_TIMEOUT', default=3600)
+INGREDIENT_MATRIX_CACHE_TIMEOUT = env.int('INGREDIENT_MATRIX_CACHE_TIMEOUT', default=3600)
+
+# Cached dashboard summary; cost, ingredient and product writes invalidate it.
+DASHBOARD_SUMMARY_CACHE_TIMEOUT = env.int('DASHBOARD_SUMMARY_CACHE_TIMEOUT', default=300)
+
+# Per-stage timing and query counts of cost runs; only the most recent runs are kept.
+COST_RUN_METRICS_KEEP = env.int('COST_RUN_METRICS_KEEP', default=1000)
+
+# Delta sync: each cursor reaches back this many seconds so rows committed while
+# the previous sync ran are not missed. Rows carry the time they were saved, not
+# committed, so the overlap must exceed the longest write transaction; the
+# longest is a cost worker run, which its lease bounds. Rows of a transaction
+# that stays open longer are missed until they change again. Deletions are
+# logged for the retention period; older cursors get a full sync.
+SYNC_OVERLAP_SECONDS = env.int('SYNC_OVERLAP_SECONDS', default=COST_RECALC_LEASE_SECONDS + 60)
+SYNC_TOMBSTONE_RETENTION_DAYS = env.int('SYNC_TOMBSTONE_RETENTION_DAYS', default=30)
+
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -78,6 +113,14 @@ DATABASES = {
     'default': env.db('DATABASE_URL', default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}")
 }
 
+# The web server and the cost worker (bmq-cost-worker.service) run in separate
+# processes, so the cache must be shared for invalidation to reach both; a
+# per-process locmemcache:// would let the worker cost with stale labor rates,
+# overhead or ingredient prices. rediscache:// or memcache:// work as well.
+CACHES = {
+    'default': env.cache('CACHE_URL', default=f"filecache://{BASE_DIR / 'var' / 'cache'}")
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -23,6 +23,7 @@ urlpatterns = [
     path('api/overhead/', include('apps.overhead.urls', namespace='overhead-api')),
     path('api/costs/', include('apps.costs.urls', namespace='costs-api')),
     path('api/ocr/', include('apps.ocr.urls', namespace='ocr-api')),
+    path('api/sync/', include('apps.sync.urls', namespace='sync-api')),
 
     path('dashboard/', include('apps.dashboard.urls', namespace='dashboard')),
     path('health', health),